@@ -5,21 +5,30 @@ Author: Matthew Lazeroff
 
 import requests
 from bs4 import BeautifulSoup
+import copy
 import json
+import logging
+import threading
 import time
 import os
 import sys #(GRyde) Needed for current solution to creating .exe
 from typing import Callable, List
 from subprocess import Popen, PIPE
 import subprocess
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, colors
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import Bio.Seq
 import Bio.SeqFeature
 import Bio.SeqRecord
 from Bio import SeqIO
-from PyQt5.QtCore import QSettings
-from phagecommander.Utilities import RastPy, MetagenePy, Aragorn
+from phagecommander.Utilities import RastPy, MetagenePy, Aragorn, HttpSession, PollScheduler, QueryCache, QueryJournal, \
+    ProdigalPool, LocalBackends, GeneTable, Consensus, GenbankWriter, ToolParsers, Cancellation, CircuitBreaker
+from phagecommander.Utilities.Cancellation import QueryCancelledError
+from phagecommander.Utilities.PollScheduler import PollPolicy, NOT_READY
+from phagecommander.Utilities.Tools import *
+from phagecommander.Utilities.SequenceFile import SequenceFile
+
+logger = logging.getLogger(__name__)
 
 # Genemark Domains
 FILE_DOMAIN = 'http://exon.gatech.edu/GeneMark/'
@@ -33,12 +42,13 @@ GLIMMER_DOMAIN = 'http://18.220.233.194/glimmer'  # Server DNA master uses
 # species
 # (GRyde) *****************************************************************************
 # PyInstaller creates a temp folder and stores path in _MEIPASS
-# In instances where script is run from python instead of .exe, will use current directory to find species.txt
+# In instances where script is run from python instead of .exe, will use the package directory to find species.txt
+# (the current directory is not used so the package can be imported from anywhere, e.g. by phagecom-batch)
 def resource_path(relative_path):
     try:
         base_path = sys._MEIPASS
     except Exception:
-        base_path = os.path.abspath(".")
+        base_path = os.path.dirname(os.path.abspath(__file__))
         
     return os.path.join(base_path, relative_path)
     
@@ -56,6 +66,12 @@ with open(species_file, 'r') as file:
     SPECIES = [specie.strip() for specie in file]
 # (GRyde) ***************************************************************************** end
 
+# number of records of a multi-record fasta file queried at once by each tool
+CONTIG_WORKERS = 4
+# tools queried on the whole of a multi-record file - their output names the record of each call (RAST gff3 seqid)
+# a RAST job annotates every record of the file it was given, so a job ID given by the user stays usable
+WHOLE_FILE_TOOLS = {RAST}
+
 # tools
 TOOLS = ['gm', 'hmm', 'heuristic', 'gms', 'gms2', 'prodigal', 'glimmer', 'rast', 'metagene', 'aragorn']
 
@@ -80,27 +96,26 @@ class GeneFile:
         def __init__(self, message):
             self.message = message
 
-    def __init__(self, sequence_file, species, prodigalLocation=None):
+    def __init__(self, sequence_file, species, prodigalLocation=None, localBinaries=None, fallbackBinaries=None):
         """
         Constructor
         Generates necessary parameters for post requests from DNA fasta file
         :param sequence_file:
+        :param localBinaries: dict of tool: path of a local executable serving the tool instead of its web server
+            * See LocalBackends.BACKENDS
+        :param fallbackBinaries: dict of tool: path of a local executable serving the tool once its web server stops
+            answering (see fallBackToLocal) - the PATH is searched for the other tools
         """
-        # Load DNA Sequence into memory
-        input_file_data = b''
-        with open(sequence_file, 'rb') as input_file:
-            current_byte = input_file.read(1)
-            while (current_byte):
-                input_file_data += current_byte
-                current_byte = input_file.read(1)
+        # Load DNA Sequence into memory - shared by all queries
+        self.sequence = SequenceFile(sequence_file)
 
         # full path
         self.file_path = sequence_file
         # get base file name
-        self.file_name = str(os.path.basename(sequence_file).split('.')[0])
+        self.file_name = self.sequence.name
 
         # File creation for post requests
-        self.file_info = {'file': (self.file_name, input_file_data, 'application/octet-stream')}
+        self.file_info = {'file': (self.file_name, self.sequence.data, 'application/octet-stream')}
 
         # Gene species - Check if compatible type, if not, exit
         if species not in SPECIES:
@@ -114,110 +129,251 @@ class GeneFile:
         # store prodigal location
         self.prodigalLocation = prodigalLocation
 
-    def glimmer_query(self):
+        # local executables - only tools with a local backend can be served locally
+        # paths are made absolute as the executables run in a temporary directory
+        self.localBinaries = {tool: os.path.abspath(path) for tool, path in (localBinaries or dict()).items()
+                              if path and tool in LocalBackends.BACKENDS}
+        self.fallbackBinaries = {tool: os.path.abspath(path) for tool, path in (fallbackBinaries or dict()).items()
+                                 if path and tool in LocalBackends.BACKENDS}
+
+        # QueryJournal recording the progress of each tool - None to not record progress
+        self.journal = None
+
+        # CancelToken stopping the queries - None if the queries cannot be cancelled
+        # set before querying - the GeneFiles of the records of a multi-record file share it
+        self.cancel = None
+
+        # record of a GeneFile of a single record of a multi-record file (see contigFiles) - None for the whole file
+        self.contig = None
+        self.contigIndex = None
+        self.contigLength = 0
+        self._contigFiles = None
+        self._contigLock = threading.Lock()
+
+    # DNA Master servers (Glimmer/GeneMark): a POST returns a job key, the output is then polled with the job key
+    # tool: (url, submit button text, invalid response error, server error)
+    DNA_MASTER_QUERIES = {GLIMMER: (GLIMMER_DOMAIN, b'Run GLIMMER v3.02',
+                                    'Glimmer POST #1: Invalid response',
+                                    'Glimmer Server Error: Check for DNA for proper format or check server status'),
+                          GENEMARK: (GM_DOMAIN, b'Run GeneMark.hmm',
+                                     'GeneMark - Invalid Response from server',
+                                     'GeneMark Server Error: Check for DNA for proper format or check server status')}
+    DNA_MASTER_HEADERS = {'User-Agent': 'GeneQuery'}
+    # intervals between checks for job completion
+    # DNA Master jobs usually finish within seconds, RAST jobs take from minutes to hours
+    POLL_POLICIES = {GLIMMER: PollPolicy(initialDelay=0.5, maxDelay=10, factor=1.5, deadline=30 * 60),
+                     GENEMARK: PollPolicy(initialDelay=0.5, maxDelay=10, factor=1.5, deadline=30 * 60),
+                     RAST: PollPolicy(initialDelay=15, maxDelay=5 * 60, factor=2, deadline=24 * 60 * 60)}
+
+    # GeneMark servers: a POST of the file returns a page linking to a tmp output file
+    # tool: (url, form data, error)
+    GENEMARK_FORM_QUERIES = {HMM: (GM_HMM_DOMAIN,
+                                   {'sequence': '', 'submit': 'Start GeneMark.hmm', 'format': 'LST',
+                                    'subject': 'GeneMark.hmm prokaryotic', 'email': ''},
+                                   'GeneMark Hmm'),
+                             GENEMARKS: (GMS_DOMAIN,
+                                         {'sequence': '', 'submit': 'Start GeneMarkS', 'mode': 'phage',
+                                          'format': 'LST', 'subject': 'GeneMarkS', 'gcode': 11},
+                                         'GeneMarkS'),
+                             HEURISTIC: (HEURISTIC_DOMAIN,
+                                         {'sequence': '', 'submit': 'Start GeneMark.hmm', 'format': 'LST',
+                                          'email': '', 'subject': 'GeneMark.hmm', 'gcode': 11, 'strand': 'both',
+                                          'mod_type': 1999},
+                                         'GeneMark Heuristic'),
+                             GENEMARKS2: (GMS2_DOMAIN,
+                                          {'sequence': '', 'submit': 'GeneMarkS-2', 'mode': 'auto', 'format': 'lst',
+                                           'email': '', 'subject': 'GeneMarkS-2', 'gcode': 11},
+                                          'GeneMarkS2')}
+
+    def dnaMasterPayload(self, tool):
+        """
+        POST parameters of a Glimmer/GeneMark submission
+        :param tool: GLIMMER or GENEMARK
+        :return: list of (field, value)
+        """
+        return [('sequence', self.file_info['file'][1]),
+                ('gencode', b'11'), ('topology', b'0'),
+                ('submit', GeneFile.DNA_MASTER_QUERIES[tool][1])]
+
+    def queryParameters(self, tool):
+        """
+        Parameters which, with the sequence, determine the output of a tool
+        :param tool: tool name
+        :return: dict of parameters
+        """
+        backend = self.localBackend(tool)
+        if backend is not None:
+            return dict(backend.parameters, backend=LocalBackends.LOCAL)
+        elif tool in GeneFile.DNA_MASTER_QUERIES:
+            return {field: value.decode('utf-8') for field, value in self.dnaMasterPayload(tool)[1:]}
+        elif tool in GeneFile.GENEMARK_FORM_QUERIES:
+            return self.genemarkFormData(tool)
+        elif tool == PRODIGAL:
+            return {'mode': 'meta'}
+        elif tool == ARAGORN:
+            return {'rna_type': 'tRNA', 'use_introns': False, 'seq_topology': 'linear', 'strand': 'both'}
+        else:
+            return dict()
+
+    def localBackend(self, tool):
         """
-        Queries Glimmer for DNA sequence
+        Local backend serving a tool
+        :param tool: tool name
+        :return: LocalBackend, None if the tool is queried on its web server
         """
+        if tool in self.localBinaries:
+            return LocalBackends.BACKENDS[tool]
+        return None
 
-        # parameters
-        payload = [('sequence', self.file_info['file'][1]),
-                   ('gencode', b'11'), ('topology', b'0'),
-                   ('submit', b'Run GLIMMER v3.02')]
+    def fallBackToLocal(self, tool):
+        """
+        Serves a tool with a local executable from now on - called when the tool's web server stops answering
+        :param tool: tool name
+        :return: False if the tool has no local executable, or is already served by one
+        """
+        if tool in self.localBinaries or tool not in LocalBackends.BACKENDS:
+            return False
+        binary = self.fallbackBinaries.get(tool) or LocalBackends.findBinary(tool)
+        if binary is None:
+            return False
 
-        # headers
-        headers = {'User-Agent': 'GeneQuery'}
+        logger.warning('%s: server not answering - using %s', tool, binary)
+        # a new dict - the GeneFiles of the records of a multi-record file share the dict of the whole file
+        self.localBinaries = dict(self.localBinaries, **{tool: os.path.abspath(binary)})
+        return True
 
-        # perform POST of file data
-        file_post = requests.post(GLIMMER_DOMAIN, data=payload, headers=headers)
-        file_post.raise_for_status()
-        # check for job_key in response, if not raise error
+    def localQuery(self, tool):
+        """
+        Runs the local executable of a tool
+        :param tool: tool name - must have a local binary
+        """
         try:
-            if 'job_key' not in file_post.text:
-                raise GeneFile.GeneFileError("Glimmer POST #1: Invalid response")
-        except GeneFile.GeneFileError:
-            raise
+            output = self.localBackend(tool).run(self.localBinaries[tool], self.sequence, self.cancel)
+        except LocalBackends.LocalBackendError as e:
+            raise GeneFile.GeneFileError('{} (local): {}'.format(tool, e))
 
-        # get job_key from response
-        job_key = file_post.text.split('=')
-        payload = [(job_key[0], job_key[1])]
+        self.query_data[tool] = output
 
-        # query server for output file
-        # if output file is not ready, wait 2 seconds and requery
-        try:
-            time.sleep(2)
-            return_post = requests.post(GLIMMER_DOMAIN, data=payload, headers=headers)
-            return_post.raise_for_status()
-            while return_post.status_code != 200:
-                time.sleep(2)
-                return_post = requests.post(GLIMMER_DOMAIN, data=payload, headers=headers)
-                return_post.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            raise GeneFile.GeneFileError(
-                'Glimmer Server Error: Check for DNA for proper format or check server status')
+    def contigFiles(self):
+        """
+        GeneFiles of each record of a multi-record fasta file - each record is queried on its own (see queryTool)
+        Created on first use and shared by all tools
+        :return: list of GeneFiles, empty if the file has a single record
+        """
+        with self._contigLock:
+            if self._contigFiles is None:
+                records = self.sequence.records() if self.contig is None else []
+                self._contigFiles = [self._contigFile(index, header, record)
+                                     for index, (header, record) in enumerate(records)] if len(records) > 1 else []
+            return self._contigFiles
 
-        self.query_data['glimmer'] = return_post.content.decode('utf-8')
+    def _contigFile(self, index, header, record):
+        """
+        GeneFile of a single record - shares the settings, journal and cancel token of this GeneFile
+        """
+        contigFile = copy.copy(self)
+        contigFile.sequence = SequenceFile(self.file_path, data=record)
+        # uploads are named after the file and the number of the record
+        contigFile.file_name = '{}_{}'.format(self.file_name, index + 1)
+        contigFile.file_info = {'file': (contigFile.file_name, record, 'application/octet-stream')}
+        contigFile.query_data = {tool: '' for tool in TOOLS}
+        # record id - first word of the header, as given by SeqIO
+        contigFile.contig = header.split()[0] if header.split() else str(index + 1)
+        contigFile.contigIndex = index
+        contigFile.contigLength = contigFile.sequence.sequenceLength()
+        contigFile._contigFiles = []
+        contigFile._contigLock = threading.Lock()
+        return contigFile
 
-    def genemark_query(self):
+    def journalName(self, tool):
         """
-        Query to GeneMark
+        Name of a tool in the journal - records of a multi-record file have their own entries
         """
-        # parameters
-        payload = [('sequence', self.file_info['file'][1]),
-                   ('gencode', b'11'), ('topology', b'0'),
-                   ('submit', b'Run GeneMark.hmm')]
+        return tool if self.contig is None else '{}#{}'.format(tool, self.contigIndex)
 
-        # headers
-        headers = {'User-Agent': 'GeneQuery'}
+    def outputKey(self, tool):
+        """
+        Key identifying the output of a tool on this sequence with its parameters
+        :param tool: tool name
+        :return: hex digest
+        """
+        return QueryCache.QueryCache.key(self.sequence.digest(), tool, self.queryParameters(tool))
 
-        # perform POST of file data
-        file_post = requests.post(GM_DOMAIN, data=payload, headers=headers)
-        file_post.raise_for_status()
-        # check for job_key in response, if not raise error
-        try:
-            if 'job_key' not in file_post.text:
-                raise GeneFile.GeneFileError("GeneMark - Invalid Response from server")
-        except GeneFile.GeneFileError:
-            raise
+    def journalEntry(self, tool):
+        """
+        Recorded state of a tool from an earlier session
+        :param tool: tool name
+        :return: dict of the entry, None if there is no journal or entry
+        """
+        if self.journal is None:
+            return None
+        return self.journal.entry(self.journalName(tool), self.outputKey(tool))
 
-        # get job_key from response
-        job_key = file_post.text.split('=')
-        payload = [(job_key[0], job_key[1])]
+    def journalOutput(self, tool):
+        """
+        Raw output of a tool which finished in an earlier session
+        :param tool: tool name
+        :return: the output, None if there is no journal or the tool is not done
+        """
+        if self.journal is None:
+            return None
+        return self.journal.output(self.journalName(tool), self.outputKey(tool))
 
-        # query server for output file
-        # if output file is not ready, wait 2 seconds and requery
-        try:
-            time.sleep(2)
-            return_post = requests.post(GM_DOMAIN, data=payload, headers=headers)
-            return_post.raise_for_status()
-            # if job is not ready, HTTP response code 202 is returned
-            while return_post.status_code != 200:
-                time.sleep(2)
-                return_post = requests.post(GM_DOMAIN, data=payload, headers=headers)
-                return_post.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            print(e)
-            raise GeneFile.GeneFileError(
-                'GeneMark Server Error: Check for DNA for proper format or check server status')
+    def journalRecord(self, tool, state, **fields):
+        """
+        Records the state of a tool if a journal is set
+        :param tool: tool name
+        :param state: QueryJournal state
+        :param fields: state specific fields
+        """
+        if self.journal is not None:
+            self.journal.record(self.journalName(tool), self.outputKey(tool), state, **fields)
 
-        self.query_data['gm'] = return_post.content.decode('utf-8')
-        # End GeneMark Lookup -------------------------------------------------------
+    def journalUpdate(self, tool, **fields):
+        """
+        Updates fields of a tool's recorded state if a journal is set
+        """
+        if self.journal is not None:
+            self.journal.update(self.journalName(tool), self.outputKey(tool), **fields)
 
-    def genemarkhmm_query(self):
+    @staticmethod
+    def dnaMasterJobKey(tool, responseText):
         """
-        Query GeneMark Hmm
+        Retrieves the job key from the response of a Glimmer/GeneMark submission
+        :param tool: GLIMMER or GENEMARK
+        :param responseText: text of the submission response
+        :return: POST parameters for polling the job
         """
-        # Begin GeneMark Hmm Lookup -------------------------------------------------
-        gm_hmm_data = {'sequence': '', 'org': self.species,
-                       'submit': 'Start GeneMark.hmm', 'format': 'LST',
-                       'subject': 'GeneMark.hmm prokaryotic',
-                       'email': ''}
+        # check for job_key in response, if not raise error
+        if 'job_key' not in responseText:
+            raise GeneFile.GeneFileError(GeneFile.DNA_MASTER_QUERIES[tool][2])
 
-        # GeneMark hmm post - if unsuccessful, error thrown
-        hmm_post_request = requests.post(GM_HMM_DOMAIN, files=self.file_info, data=gm_hmm_data)
-        hmm_post_request.raise_for_status()
-        soup = BeautifulSoup(hmm_post_request.text, 'html.parser')
+        # get job_key from response
+        job_key = responseText.split('=')
+        return [(job_key[0], job_key[1])]
+
+    def genemarkFormData(self, tool):
+        """
+        Form data of a GeneMark tool which returns a link to a tmp output file
+        :param tool: HMM, GENEMARKS, HEURISTIC or GENEMARKS2
+        :return: dict of form data
+        """
+        data = dict(GeneFile.GENEMARK_FORM_QUERIES[tool][1])
+        if tool == HMM:
+            data['org'] = self.species
+        return data
+
+    @staticmethod
+    def genemarkFileLocation(tool, responseText):
+        """
+        Finds the URL of the output file in the response of a GeneMark submission
+        :param tool: HMM, GENEMARKS, HEURISTIC or GENEMARKS2
+        :param responseText: html of the submission response
+        :return: full URL of the output file
+        """
+        soup = BeautifulSoup(responseText, 'html.parser')
 
-        # Get URL for hmm output
+        # Get URL for output
         file_location = ''
         for a in soup.find_all('a', href=True):
             if 'tmp' in a['href']:
@@ -225,156 +381,191 @@ class GeneFile:
                 break
 
         # if tmp not available, change in response format or invalid post
-        try:
-            if file_location == '':
-                raise GeneFile.GeneFileError("GeneMark Hmm")
-        except GeneFile.GeneFileError:
-            raise
+        if file_location == '':
+            raise GeneFile.GeneFileError(GeneFile.GENEMARK_FORM_QUERIES[tool][2])
 
-        getHmmFile = requests.get(FILE_DOMAIN + file_location)
-        getHmmFile.raise_for_status()
-        self.query_data['hmm'] = getHmmFile.content.decode('utf-8')
-        # End GeneMark Hmm Lookup --------------------------------------------------
+        return FILE_DOMAIN + file_location
 
-    def genemarks_query(self):
+    def _dnaMasterQuery(self, tool):
         """
-        Query GeneMarkS
+        Submits the sequence to a DNA Master server and polls until the output is ready
+        A job submitted in an earlier session is reattached to instead
+        :param tool: GLIMMER or GENEMARK
+        :return: tool output
         """
-        # Begin GeneMarkS Lookup ---------------------------------------------------
-        gms_data = {'sequence': '', 'submit': 'Start GeneMarkS', 'mode': 'phage', 'format': 'LST',
-                    'subject': 'GeneMarkS', 'gcode': 11}
+        url = GeneFile.DNA_MASTER_QUERIES[tool][0]
 
-        # GeneMarkS post - if unsuccessful, error thrown
-        gms_post_request = requests.post(GMS_DOMAIN, files=self.file_info, data=gms_data)
-        gms_post_request.raise_for_status()
-        soup = BeautifulSoup(gms_post_request.text, 'html.parser')
+        entry = self.journalEntry(tool)
+        if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'jobKey' in entry:
+            try:
+                return self._dnaMasterPoll(tool, [tuple(field) for field in entry['jobKey']])
+            except GeneFile.GeneFileError:
+                # job is no longer held by the server - submit again
+                pass
 
-        # Get URL for hmm output
-        file_location = ''
-        for a in soup.find_all('a', href=True):
-            if 'tmp' in a['href']:
-                file_location = a['href']
-                break
-
-        # if tmp not available, change in response format or invalid post
-        try:
-            if file_location == '':
-                raise GeneFile.GeneFileError("GeneMarkS")
-        except GeneFile.GeneFileError:
-            raise
+        # perform POST of file data
+        file_post = HttpSession.post(url, data=self.dnaMasterPayload(tool), headers=GeneFile.DNA_MASTER_HEADERS,
+                                     cancel=self.cancel)
+        file_post.raise_for_status()
+        payload = GeneFile.dnaMasterJobKey(tool, file_post.text)
+        self.journalRecord(tool, QueryJournal.SUBMITTED, jobKey=payload)
 
-        getGmsFile = requests.get(FILE_DOMAIN + file_location)
-        getGmsFile.raise_for_status()
-        self.query_data['gms'] = getGmsFile.content.decode('utf-8')
-        # End GeneMarkS Lookup -----------------------------------------------------
+        return self._dnaMasterPoll(tool, payload)
 
-    def genemark_heuristic_query(self):
+    def _dnaMasterPoll(self, tool, payload):
         """
-        Query GeneMark Heuristic
-        :return: name of file created
+        Polls a DNA Master job until the output is ready
+        :param tool: GLIMMER or GENEMARK
+        :param payload: POST parameters of the job key
+        :return: tool output
         """
-        # Begin GeneMark Heuristic Lookup ------------------------------------------
-        heuristic_data = {'sequence': '', 'submit': 'Start GeneMark.hmm', 'format': 'LST',
-                          'email': '',
-                          'subject': 'GeneMark.hmm', 'gcode': 11, 'strand': 'both',
-                          'mod_type': 1999}
+        url = GeneFile.DNA_MASTER_QUERIES[tool][0]
 
-        # GeneMark Heuristic post - if unsuccessful, error thrown
-        heuristic_post_request = requests.post(HEURISTIC_DOMAIN, files=self.file_info,
-                                               data=heuristic_data)
-        heuristic_post_request.raise_for_status()
-        soup = BeautifulSoup(heuristic_post_request.text, 'html.parser')
-
-        # Get URL for heuristic output
-        file_location = ''
-        for a in soup.find_all('a', href=True):
-            if 'tmp' in a['href']:
-                file_location = a['href']
-                break
+        def checkOutput():
+            return_post = HttpSession.post(url, data=payload, headers=GeneFile.DNA_MASTER_HEADERS, cancel=self.cancel)
+            return_post.raise_for_status()
+            # if job is not ready, HTTP response code 202 is returned
+            if return_post.status_code != 200:
+                self.journalUpdate(tool, lastPoll=time.time())
+                return NOT_READY
+            return return_post.content.decode('utf-8')
 
-        # if tmp not available, change in response format or invalid post
+        # query server for output file until it is ready
         try:
-            if file_location == '':
-                raise GeneFile.GeneFileError("GeneMark Heuristic")
-        except GeneFile.GeneFileError:
-            raise
+            future = PollScheduler.getScheduler().submit(checkOutput, GeneFile.POLL_POLICIES[tool], tool)
+            return Cancellation.result(future, self.cancel)
+        except requests.exceptions.HTTPError as e:
+            raise GeneFile.GeneFileError(GeneFile.DNA_MASTER_QUERIES[tool][3])
 
-        getHeuristicFile = requests.get(FILE_DOMAIN + file_location)
-        getHeuristicFile.raise_for_status()
-        self.query_data['heuristic'] = getHeuristicFile.content.decode('utf-8')
-        # End GeneMark Heuristic Lookup -------------------------------------------
+    def _genemarkFormQuery(self, tool):
+        """
+        Submits the sequence to a GeneMark server and retrieves the linked output file
+        The output file of a submission from an earlier session is retrieved instead if it still exists
+        :param tool: HMM, GENEMARKS, HEURISTIC or GENEMARKS2
+        :return: tool output
+        """
+        entry = self.journalEntry(tool)
+        if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'outputUrl' in entry:
+            getFile = HttpSession.get(entry['outputUrl'], cancel=self.cancel)
+            if getFile.status_code == 200:
+                return getFile.content.decode('utf-8')
+            # tmp output file was removed from the server - submit again
 
-    def genemarks2_query(self):
+        # post - if unsuccessful, error thrown
+        post_request = HttpSession.post(GeneFile.GENEMARK_FORM_QUERIES[tool][0], files=self.file_info,
+                                        data=self.genemarkFormData(tool), cancel=self.cancel)
+        post_request.raise_for_status()
+        outputUrl = GeneFile.genemarkFileLocation(tool, post_request.text)
+        self.journalRecord(tool, QueryJournal.SUBMITTED, outputUrl=outputUrl)
+
+        getFile = HttpSession.get(outputUrl, cancel=self.cancel)
+        getFile.raise_for_status()
+        return getFile.content.decode('utf-8')
+
+    def glimmer_query(self):
         """
-        Query GeneMarkS2
+        Queries Glimmer for DNA sequence
         """
-        # Begin GeneMarkS2 Lookup -------------------------------------------------
-        gmms2_data = {'sequence': '', 'submit': 'GeneMarkS-2', 'mode': 'auto', 'format': 'lst',
-                      'email': '', 'subject': 'GeneMarkS-2', 'gcode': 11}
+        self.query_data['glimmer'] = self._dnaMasterQuery(GLIMMER)
 
-        # GeneMarkS2 Post Request
-        gmms2_post_request = requests.post(GMS2_DOMAIN, files=self.file_info, data=gmms2_data)
-        gmms2_post_request.raise_for_status()
-        soup = BeautifulSoup(gmms2_post_request.text, 'html.parser')
+    def genemark_query(self):
+        """
+        Query to GeneMark
+        """
+        self.query_data['gm'] = self._dnaMasterQuery(GENEMARK)
 
-        # Get URL for GMS2 output
-        file_location = ''
-        for a in soup.find_all('a', href=True):
-            if 'tmp' in a['href']:
-                file_location = a['href']
-                break
+    def genemarkhmm_query(self):
+        """
+        Query GeneMark Hmm
+        """
+        self.query_data['hmm'] = self._genemarkFormQuery(HMM)
 
-        # if tmp not available, change in response format or invalid post
-        try:
-            if file_location == '':
-                raise GeneFile.GeneFileError("GeneMarkS2")
-        except GeneFile.GeneFileError:
-            raise
+    def genemarks_query(self):
+        """
+        Query GeneMarkS
+        """
+        self.query_data['gms'] = self._genemarkFormQuery(GENEMARKS)
+
+    def genemark_heuristic_query(self):
+        """
+        Query GeneMark Heuristic
+        """
+        self.query_data['heuristic'] = self._genemarkFormQuery(HEURISTIC)
 
-        getGMS2File = requests.get(FILE_DOMAIN + file_location)
-        getGMS2File.raise_for_status()
-        self.query_data['gms2'] = getGMS2File.content.decode('utf-8')
-        # End GeneMarkS2 Lookup --------------------------------------------------
+    def genemarks2_query(self):
+        """
+        Query GeneMarkS2
+        """
+        self.query_data['gms2'] = self._genemarkFormQuery(GENEMARKS2)
 
     def prodigal_query(self):
         """
         Calls prodigal to analyze file
+        Each record is run by its own prodigal process through the shared ProdigalPool
         """
-        # # get path for prodigal exe
+        records = [record for _, record in self.sequence.records()]
+        # sequence without a header - pass it as is
+        if len(records) == 0:
+            records = [self.sequence.data]
 
-        # generate prodigal command and run
-        cmd = '\"{}\" -i \"{}\" -p meta'.format(self.prodigalLocation, self.file_path)
-        proc = Popen(cmd, stdout=PIPE, stderr=PIPE, shell=True, stdin=subprocess.DEVNULL)
-        stdout, stderr = proc.communicate()
-
-        # check for error, exit if so
-        if proc.returncode != 0:
-            print(stderr)
-            raise GeneFile.GeneFileError("Prodigal")
+        try:
+            output = ProdigalPool.getPool().run(self.prodigalLocation, records, mode='meta', cancel=self.cancel)
+        except (ProdigalPool.ProdigalError, OSError) as e:
+            raise GeneFile.GeneFileError('Prodigal: {}'.format(e))
 
-        self.query_data['prodigal'] = stdout.decode('utf-8')
+        self.query_data['prodigal'] = output
 
     def rastQuery(self, username, password, jobId: int = None):
         """
         Submit the fasta file to RAST servers for submission
+        If a job ID is given - or a job was submitted in an earlier session - the job is waited on instead
+        The job is deleted from the server if the query is cancelled with deleteJobs (see CancelToken.cancel) -
+        otherwise it is kept so the query can be resumed. Jobs given by ID are never deleted
         :param username: RAST username
         :param password: RAST password
         :param jobId: RAST jobID
         :return:
         """
         # create RAST object
-        rastJob = RastPy.Rast(username, password, jobId=jobId)
-
-        # if a jobID was given, check if it is complete
-        if jobId is None or not rastJob.checkIfComplete():
-            # submit
-            rastJob.submit(self.file_path, self.file_name)
-
-            # check periodically for job completion
-            RAST_COMPLETION_CHECK_DELAY = 15
-            time.sleep(RAST_COMPLETION_CHECK_DELAY)
-            while not rastJob.checkIfComplete():
-                time.sleep(RAST_COMPLETION_CHECK_DELAY)
+        ownJob = False
+        if jobId is not None:
+            rastJob = RastPy.Rast(username, password, jobId=jobId, cancel=self.cancel)
+        else:
+            rastJob = None
+            entry = self.journalEntry(RAST)
+            if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'jobId' in entry:
+                try:
+                    rastJob = RastPy.Rast(username, password, jobId=entry['jobId'], cancel=self.cancel)
+                    ownJob = True
+                except RastPy.RastInvalidJobError:
+                    # job was deleted from the server - submit again
+                    pass
+
+            if rastJob is None:
+                rastJob = RastPy.Rast(username, password, cancel=self.cancel)
+                rastJob.submit(self.file_path, self.file_name, fastaContent=self.sequence.text)
+                self.journalRecord(RAST, QueryJournal.SUBMITTED, jobId=rastJob.jobId)
+                ownJob = True
+
+        def checkComplete():
+            if rastJob.checkIfComplete():
+                return True
+            self.journalUpdate(RAST, lastPoll=time.time())
+            return NOT_READY
+
+        # check periodically for job completion
+        try:
+            if not rastJob.checkIfComplete():
+                future = PollScheduler.getScheduler().submit(checkComplete, GeneFile.POLL_POLICIES[RAST], RAST)
+                Cancellation.result(future, self.cancel)
+        except QueryCancelledError:
+            if ownJob and self.cancel.deleteJobs:
+                try:
+                    rastJob.deleteJob()
+                    self.journalRecord(RAST, QueryJournal.FAILED, error='RAST job {} deleted'.format(rastJob.jobId))
+                except Exception as e:
+                    logger.error('RAST: could not delete job %s: %s', rastJob.jobId, e)
+            raise
 
         # job is complete - retrieve gene annotation
         self.query_data['rast'] = rastJob.retrieveData()
@@ -383,11 +574,12 @@ class GeneFile:
         """
         Query Metagene servers for analysis
         """
-        metaGene = MetagenePy.Metagene(self.file_path, self.file_name)
+        metaGene = MetagenePy.Metagene(self.file_path, self.file_name, fileData=self.sequence.data, cancel=self.cancel)
         self.query_data['metagene'] = metaGene.query()
 
     def aragornQuery(self):
-        self.query_data['aragorn'] = Aragorn.aragorn_query(self.file_path)
+        self.query_data['aragorn'] = Aragorn.aragorn_query(self.file_path, file_data=self.sequence.data,
+                                                           cancel=self.cancel)
 
 
 class GeneError(Error):
@@ -412,20 +604,29 @@ class GeneFeature:
         if self.length < 0:
             self.length = totalLength + stop - start + 1
 
-    def __eq__(self, other):
+    @property
+    def callKey(self) -> tuple:
+        """
+        Exact coordinates of the call - (start, stop, direction)
+        Calls with the same callKey are occurrences of the same prediction (see __eq__)
+        """
+        return self.start, self.stop, self.direction
 
-        if not isinstance(other, GeneFeature):
-            raise TypeError(f'== cannot be used with type: {type(other)}')
-        else:
-            if self.direction == other.direction:
-                if self.direction == '+':
-                    if self.stop == other.stop:
-                        return True
-                else:  # - direction
-                    if self.start == other.start:
-                        return True
+    @property
+    def geneKey(self) -> tuple:
+        """
+        Strand aware position of the call - (direction, stop) for + genes, (direction, start) for - genes
+        Calls with the same geneKey represent the same gene, possibly with different starts
+        """
+        return (self.direction, self.stop) if self.direction == '+' else (self.direction, self.start)
 
-        return False
+    def __hash__(self):
+        return hash(self.callKey)
+
+    def __eq__(self, other):
+        if not isinstance(other, GeneFeature):
+            return NotImplemented
+        return self.callKey == other.callKey
 
 
 class Gene(GeneFeature):
@@ -442,23 +643,23 @@ class Gene(GeneFeature):
         :param direction: +/-
         :param identity: optional identifier
         """
-        # check for "<3" or ">3" style starts, stops
-        if '<' in start:
-            start = start.split('<')[-1]
-            start = int(start)
-        elif '&lt;' in start:
-            start = start.split('&lt;')[-1]
+        # check for "<3" or ">3" style starts, stops - only scanned for when the position is not a plain number
+        try:
             start = int(start)
-        else:
+        except ValueError:
+            if '<' in start:
+                start = start.split('<')[-1]
+            elif '&lt;' in start:
+                start = start.split('&lt;')[-1]
             start = int(start)
 
-        if '>' in stop:
-            stop = stop.split('>')[-1]
-            stop = int(stop)
-        elif '&gt;' in stop:
-            stop = stop.split('&gt;')[-1]
+        try:
             stop = int(stop)
-        else:
+        except ValueError:
+            if '>' in stop:
+                stop = stop.split('>')[-1]
+            elif '&gt;' in stop:
+                stop = stop.split('&gt;')[-1]
             stop = int(stop)
 
         self.identity = identity
@@ -535,6 +736,94 @@ class TRNA(GeneFeature):
         return f'TRNA(start={self.start}, stop={self.stop}, direction={self.direction}, type={self.type}'
 
 
+def _restoreFeature(cls, state):
+    """
+    Creates a Gene / TRNA from its attributes - used to pickle GeneTable views as standalone objects
+    """
+    feature = cls.__new__(cls)
+    feature.__dict__.update(state)
+    return feature
+
+
+class GeneView(Gene):
+    """
+    Gene read from a row of a GeneTable
+    """
+
+    def __init__(self, table, index: int):
+        """
+        :param table: GeneTable
+        :param index: row of the gene
+        """
+        self._table = table
+        self._index = index
+
+    @property
+    def start(self):
+        return int(self._table.start[self._index])
+
+    @property
+    def stop(self):
+        return int(self._table.stop[self._index])
+
+    @property
+    def direction(self):
+        return '+' if self._table.strand[self._index] > 0 else '-'
+
+    @property
+    def length(self):
+        return int(self._table.length[self._index])
+
+    @property
+    def identity(self):
+        return self._table.identities[self._table.identity[self._index]]
+
+    def toGene(self) -> Gene:
+        """
+        :return: standalone Gene of the row
+        """
+        return _restoreFeature(Gene, {'start': self.start, 'stop': self.stop, 'direction': self.direction,
+                                      'length': self.length, 'identity': self.identity})
+
+    def __reduce__(self):
+        gene = self.toGene()
+        return _restoreFeature, (Gene, gene.__dict__)
+
+
+class TRNAView(TRNA):
+    """
+    TRNA read from a row of a GeneTable
+    """
+    start = GeneView.start
+    stop = GeneView.stop
+    direction = GeneView.direction
+    length = GeneView.length
+    identity = GeneView.identity
+
+    def __init__(self, table, index: int):
+        """
+        :param table: GeneTable
+        :param index: row of the tRNA
+        """
+        self._table = table
+        self._index = index
+
+    @property
+    def type(self):
+        return self._table.trnaTypes[self._table.trnaType[self._index]]
+
+    def toGene(self) -> TRNA:
+        """
+        :return: standalone TRNA of the row
+        """
+        return _restoreFeature(TRNA, {'start': self.start, 'stop': self.stop, 'direction': self.direction,
+                                      'length': self.length, 'type': self.type, 'identity': self.identity})
+
+    def __reduce__(self):
+        trna = self.toGene()
+        return _restoreFeature, (TRNA, trna.__dict__)
+
+
 class GeneUtils:
     """
     Class for operations relating to Genes
@@ -578,60 +867,60 @@ class GeneUtils:
             * Arg 1: Quantity (int)
             * Result: bool
             * Ex: lambda x: x <= 10
+        :param exportRNA: True to keep tRNA groups whatever their number of calls, False to drop them
         :return: List[List[Gene]] in order of stop/starts
         """
-        filteredGenes = []
-        sortedGenes = GeneUtils.sortGenes(genes)
+        # groups are computed on arrays, see Consensus.ConsensusGroups
+        # tRNA groups are kept regardless of their number of calls if exporting tRNA, dropped otherwise
+        groups = Consensus.ConsensusGroups(genes)
+        selected = groups.select(comparisonFunc, exportRNA)
+        return [list(groups.calls(index)) for index in np.flatnonzero(selected)]
 
-        # group the genes according to their stops/starts
-        # discard groups with less than <limit> items
-        currentGroup = [sortedGenes[0]]
-        previousGene = sortedGenes[0]
-        for gene in sortedGenes[1:]:
-            # if the current gene is the same as the previous, add to the same group
-            if gene == previousGene:
-                currentGroup.append(gene)
+    @staticmethod
+    def genbankToFile(sequence, genes: List[Gene], fileName: str):
+        """
+        Writes the list of Genes to file in genbank format
+        :param sequence: DNA sequence - str or Bio.Seq.Seq, of any case
+        :param genes: list of Genes or GeneTable
+        :param fileName: name of the file to write to
+        """
+        # (GRyde) The GitHub for the BioPython SeqIO class shows that this exact check (len(locus.split()) > 1) is used to determine if whitespace error should be raised.
+        #         So basically borrowing that check to anticipate and correct/prevent errors
+        #         - File name will still keep the intended spaces used. Only replaces whitespace with '_'s in header of .gb file
+        locusLineName = os.path.split(fileName)[1].split('.')[0]
+        if len(locusLineName.split()) > 1:
+            validLocusName = locusLineName.replace(' ', '_')
+        else:
+            validLocusName = locusLineName
 
-            # different genes, create a new group
-            else:
-                # if comparison is satisfactory, add to genes to be returned
-                # else, they're dropped
-                
-                # (GRyde) If exporting tRNA, check group against filter amount.
-                #         If doesn't match, check if TRNA obj first before discarding.
-                if exportRNA:
-                    if comparisonFunc(len(currentGroup)):
-                        filteredGenes.append(currentGroup)
-                    
-                    elif isinstance(currentGroup[0], TRNA):
-                        filteredGenes.append(currentGroup)
-                # (GRyde) If not exporting tRNA, check first if group is made of TRNA obj(s).
-                #         If yes, no action and move to discard statement.
-                #         If no, check group against selected filter function and append or not as normal.
-                else:
-                    if isinstance(currentGroup[0], TRNA):
-                        pass # Pass since user does NOT want TRNA
-                    elif comparisonFunc(len(currentGroup)):
-                        filteredGenes.append(currentGroup)
-                    
-                # new group of genes
-                currentGroup = [gene]
-
-            previousGene = gene
-
-        # add last group if sufficient
-        if comparisonFunc(len(currentGroup)):
-            filteredGenes.append(currentGroup)
-
-        return filteredGenes
+        # written straight from the gene columns - same output as SeqIO.write of genbankRecord
+        GenbankWriter.writeGenbank(fileName, [(validLocusName, sequence, genes)])
 
     @staticmethod
-    def genbankToFile(sequence: str, genes: List[Gene], fileName: str):
+    def contigsGenbankToFile(contigs: List[Bio.SeqRecord.SeqRecord], genes, fileName: str):
         """
-        Writes the list of Genes to file in genbank format
+        Writes the genes of a multi-record sequence to file in genbank format - one genbank record per record
+        :param contigs: SeqRecord of each record
+        :param genes: GeneTable of the genes (see GeneTable.contig)
+        :param fileName: name of the file to write to
+        """
+        genes = GeneTable.GeneTable.fromGenes(genes)
+
+        def records():
+            for contig in contigs:
+                contigGenes = genes.contigTable(contig.id) if contig.id in genes.contigs else genes.take(slice(0, 0))
+                yield '_'.join(contig.id.split()), contig.seq, contigGenes
+
+        GenbankWriter.writeGenbank(fileName, records())
+
+    @staticmethod
+    def genbankRecord(sequence: str, genes: List[Gene], name: str) -> Bio.SeqRecord.SeqRecord:
+        """
+        Genbank record of a sequence with its genes
+        Files are written by GenbankWriter without building the record - it is the reference of its output
         :param sequence: DNA sequence
         :param genes: list of Genes
-        :param fileName: name of the file to write to
+        :param name: locus name of the record - without whitespace
         """
         # create sequence from sequence string
         seq = Bio.Seq.Seq(sequence)
@@ -717,18 +1006,8 @@ class GeneUtils:
         """
         # (GRyde) As of BioPython version 1.78, molecule_type needs to be explicitly stated in order to write/export
         # to a .gb (GenBank) file
-        
-        # (GRyde) The GitHub for the BioPython SeqIO class shows that this exact check (len(locus.split()) > 1) is used to determine if whitespace error should be raised.
-        #         So basically borrowing that check to anticipate and correct/prevent errors
-        #         - File name will still keep the intended spaces used. Only replaces whitespace with '_'s in header of .gb file
-        locusLineName = os.path.split(fileName)[1].split('.')[0]
-        if len(locusLineName.split()) > 1:
-            validLocusName = locusLineName.replace(' ', '_')
-        else:
-            validLocusName = locusLineName
-            
         gbRecord = Bio.SeqRecord.SeqRecord(seq, features=features,
-                                           name=validLocusName,
+                                           name=name,
                                            annotations={'molecule_type': 'DNA'})
         
         """
@@ -738,7 +1017,7 @@ class GeneUtils:
                                            name=os.path.split(fileName)[1].split('.')[0],
                                            annotations={'molecule_type': 'DNA'})
         """
-        SeqIO.write([gbRecord], fileName, 'genbank')
+        return gbRecord
 
     @staticmethod
     def findMostGeneOccurrences(genes: List[Gene]) -> Gene:
@@ -752,38 +1031,41 @@ class GeneUtils:
                 - Error is thrown if all the Genes are not the same
         :return: Gene
         """
-        # dictionary: repr(Gene): [<Gene>, occurrences]
-        geneOccurrences = dict()
-        # calculate frequencies of each gene
-        currGene = genes[0]
+        return GeneUtils._mostFrequent(GeneUtils._callOccurrences(genes))
+
+    @staticmethod
+    def _callOccurrences(genes: List[Gene]) -> dict:
+        """
+        Counts the occurrences of each call of a gene
+        :param genes: list of the same Gene - ValueError is raised otherwise
+        :return: dictionary of callKey: [<first Gene with the callKey>, occurrences], in order of first appearance
+        """
+        occurrences = dict()
+        geneKey = genes[0].geneKey
         for gene in genes:
             # check if not the same gene, if so, throw error
-            if gene != currGene:
-                raise ValueError('{} does not match {}'.format(repr(gene), repr(currGene)))
-            currGene = gene
+            if gene.geneKey != geneKey:
+                raise ValueError('{} does not match {}'.format(repr(gene), repr(genes[0])))
 
-            geneStr = repr(gene)
-            if geneStr in geneOccurrences:
-                geneOccurrences[geneStr][1] += 1
+            occurrence = occurrences.get(gene.callKey)
+            if occurrence is None:
+                occurrences[gene.callKey] = [gene, 1]
             else:
-                geneOccurrences[geneStr] = [gene, 1]
-
-        # sort genes according to frequency
-        # maxGenes = List of [<Gene>, frequency]
-        maxGenes = sorted(geneOccurrences.values(), key=lambda x: x[1], reverse=True)
-
-        maxFrequencyGene = maxGenes[0]
-        if len(maxGenes) > 1:
-            # check if more than one gene share the same max frequency
-            for gene in maxGenes[1:]:
-                # if the gene has the same frequency as the maximum, pick the longest one
-                if gene[1] == maxFrequencyGene[1]:
-                    # see if current gene is longer than the current max
-                    if gene[0].length > maxFrequencyGene[0].length:
-                        maxFrequencyGene = gene
-
-        return maxFrequencyGene[0]
-        
+                occurrence[1] += 1
+        return occurrences
+
+    @staticmethod
+    def _mostFrequent(occurrences: dict) -> Gene:
+        """
+        Most frequent call - ties go to the longest, then to the first to appear
+        :param occurrences: dictionary from _callOccurrences
+        """
+        best = None
+        for gene, count in occurrences.values():
+            if best is None or (count, gene.length) > (best[1], best[0].length):
+                best = (gene, count)
+        return best[0]
+
     # (GRyde) Choose genes based on longest
     #         See findMostGeneOccurrences for notes since methods are very similar
     @staticmethod
@@ -793,12 +1075,11 @@ class GeneUtils:
         Shouldn't be possible to have ties for longest
         """
         
-        currGene = genes[0]
+        geneKey = genes[0].geneKey
         for gene in genes:
-            if gene != currGene:
-                raise ValueError('{} does not match {}'.format(repr(gene), repr(currGene)))
-            currGene = gene
-        
+            if gene.geneKey != geneKey:
+                raise ValueError('{} does not match {}'.format(repr(gene), repr(genes[0])))
+
         longestGene = genes[0]
         for gene in genes:
             if gene.length > longestGene.length:
@@ -817,35 +1098,13 @@ class GeneUtils:
         gene is used.
         """
         
-        geneOccurrences = dict()
-        
-        currGene = genes[0]
-        for gene in genes:
-            if gene != currGene:
-                raise ValueError('{} does not match {}'.format(repr(gene), repr(currGene)))
-            currGene = gene
-            
-            geneStr = repr(gene)
-            if geneStr in geneOccurrences:
-                geneOccurrences[geneStr][1] += 1
-            else:
-                geneOccurrences[geneStr] = [gene, 1]
-                
+        occurrences = GeneUtils._callOccurrences(genes)
+
         for gene in genes:
             if gene.identity == program:
-                
                 return gene
-                
-        maxGenes = sorted(geneOccurrences.values(), key=lambda x: x[1], reverse=True)
-        
-        maxFrequencyGene = maxGenes[0]
-        if len(maxGenes) > 1:
-            for gene in maxGenes[1:]:
-                if gene[1] == maxFrequencyGene[1]:
-                    if gene[0].length > maxFrequencyGene[0].length:
-                        maxFrequencyGene = gene
-                        
-        return maxFrequencyGene[0]
+
+        return GeneUtils._mostFrequent(occurrences)
         
 
 
@@ -853,6 +1112,7 @@ class GeneParse:
     """
     Class for parsing GeneMark output files
     All methods are static
+    The line based formats are declared in ToolParsers.FORMATS - their genes are parsed straight into a GeneTable
     """
     
     """ (GRyde) 
@@ -868,24 +1128,9 @@ class GeneParse:
         Parses the output of a glimmer query for gene predictions
         :param glimmer_data: string representing glimmer query output
         :param identity: optional identifier for each gene
-        :return: list of Genes in numerical order
+        :return: GeneTable of the Genes in numerical order
         """
-        # split text into lines - skipping first line
-        data = glimmer_data.splitlines()[1:]
-
-        # Get Gene data
-        genes = []
-        for line in data:
-            if 'html' not in line:
-                data = [x for x in line.split(' ') if x != '']
-                # get gene direction and create Gene
-                if '+' in data[3]:
-                    genes.append(Gene(data[1], data[2], '+', identity=identity, totalLength=totalLength))
-                else:
-                    genes.append(Gene(data[2], data[1], '-', identity=identity, totalLength=totalLength))
-
-        # return list of Genes
-        return genes
+        return ToolParsers.parse(GLIMMER, glimmer_data, identity, totalLength)
 
     @staticmethod
     def parse_genemark(gm_data, identity='', totalLength=0):
@@ -893,37 +1138,9 @@ class GeneParse:
         Parse GeneMark output file for Genes
         :param gm_file: GeneMark output file
         :param identity: optional identifier for each Gene
-        :return: list of Genes in file order
+        :return: GeneTable of the Genes in file order
         """
-        gm_data = gm_data.splitlines()
-
-        # skip until Region of Interests section
-        index = 0
-        for ind, line in enumerate(gm_data):
-            if '   Gene    Strand    LeftEnd    RightEnd       Gene     Class' in line:
-                index = ind
-                break
-
-        # invalid file format
-        if index == len(gm_data) - 1:
-            raise GeneError('Invalid Genemark file format')
-
-        # go to first gene
-        gm_data = gm_data[index + 2:]
-
-        # Get gene data
-        genes = []
-        for line in gm_data:
-            if line != '':
-                data = [x for x in line.strip().split(' ') if x != '']
-                start = data[2]
-                stop = data[3]
-                direction = data[1]
-                genes.append(Gene(start, stop, direction, identity=identity, totalLength=totalLength))
-            else:
-                break
-
-        return genes
+        return ToolParsers.parse(GENEMARK, gm_data, identity, totalLength)
 
     @staticmethod
     def parse_genemarkS(gms_data, identity='', totalLength=0):
@@ -931,37 +1148,9 @@ class GeneParse:
         Parse GeneMarkS file for Gene data
         :param s_file: GeneMarkS file
         :param identity: optional identifier for each Gene
-        :return: list of Genes in file order
+        :return: GeneTable of the Genes in file order
         """
-        gms_data = gms_data.splitlines()
-
-        # begin parse
-        current_line = gms_data[0]
-        # Check if proper GeneMark file
-        try:
-            if 'GeneMark.hmm' not in current_line:
-                raise GeneError("GMS: Not a valid GeneMark GMS file")
-        except GeneError:
-            raise
-
-        # skip through until gene data
-        index = 0
-        for ind, current_line in enumerate(gms_data[1:]):
-            if 'Gene    Strand    LeftEnd    RightEnd       Gene     Class' in current_line:
-                index = ind
-                break
-
-        gms_data = gms_data[index + 3:]
-
-        # array for gene objs
-        genes = []
-        # get gene data
-        for current_line in gms_data:
-            if current_line != '':
-                data = [x for x in current_line.strip().split(' ') if x != '']
-                genes.append(Gene(data[2], data[3], data[1], identity=identity, totalLength=totalLength))
-
-        return genes
+        return ToolParsers.parse(GENEMARKS, gms_data, identity, totalLength)
 
     @staticmethod
     def parse_genemarkHmm(hmm_data, identity='', totalLength=0):
@@ -969,50 +1158,9 @@ class GeneParse:
         Parse GeneMark Hmm file for Gene data
         :param hmm_file:
         :param identity: optional identifier for each Gene
-        :return: list of Genes in file order
+        :return: GeneTable of the Genes in file order
         """
-        hmm_data = hmm_data.splitlines()
-
-        # begin parse
-        current_line = hmm_data[0]
-        # Check if proper GeneMark file
-        try:
-            if 'GeneMark.hmm' not in current_line:
-                raise GeneError("Hmm: Not a valid GeneMark Hmm file")
-        except GeneError:
-            raise
-
-        # skip through until gene data
-        # while ('Gene    Strand    LeftEnd    RightEnd       Gene     Class' not in current_line):
-        #     current_line = file.readline()
-        # current_line = file.readline()  # read blank line
-        index = 0
-        for ind, current_line in enumerate(hmm_data[1:]):
-            if 'Gene    Strand    LeftEnd    RightEnd       Gene     Class' in current_line:
-                index = ind
-                break
-        hmm_data = hmm_data[index + 3:]
-
-        # array for gene objs
-        genes = []
-        # get gene data
-        for current_line in hmm_data:
-            if current_line != '':
-                data = [x for x in current_line.strip().split(' ') if x != '']
-                # check for weird characters with gene sequence ends (Ex: start = '<2')
-                nonNumChars = False
-                for ind, char in enumerate(data[2]):
-                    if not char.isnumeric():
-                        nonNumChars = True
-                    elif char.isnumeric():
-                        if not nonNumChars:
-                            break
-                        else:
-                            data[2] = data[2][ind:]
-
-                genes.append(Gene(data[2], data[3], data[1], identity=identity, totalLength=totalLength))
-
-        return genes
+        return ToolParsers.parse(HMM, hmm_data, identity, totalLength)
 
     @staticmethod
     def parse_genemarkHeuristic(heuristic_data, identity='', totalLength=0):
@@ -1020,36 +1168,9 @@ class GeneParse:
         Parse GeneMark Heuristic file for Gene data
         :param heuristic_file: GeneMark Heuristic output file
         :param identity: optional identifier for each Gene
-        :return: list of Genes in order
+        :return: GeneTable of the Genes in order
         """
-        heuristic_data = heuristic_data.splitlines()
-        # begin parse
-        current_line = heuristic_data[0]
-        # Check if proper GeneMark file
-        try:
-            if 'GeneMark.hmm' not in current_line:
-                raise GeneError("Hmm: Not a valid GeneMark Hmm file")
-        except GeneError:
-            raise
-
-        # skip through until gene data
-        index = 0
-        for ind, current_line in enumerate(heuristic_data[1:]):
-            if 'Gene    Strand    LeftEnd    RightEnd       Gene     Class' in current_line:
-                index = ind
-                break
-
-        heuristic_data = heuristic_data[index + 3:]
-
-        # arary for gene objs
-        genes = []
-        # get gene data
-        for current_line in heuristic_data:
-            if current_line != '':
-                data = [x for x in current_line.strip().split(' ') if x != '']
-                genes.append(Gene(data[2], data[3], data[1], identity=identity, totalLength=totalLength))
-
-        return genes
+        return ToolParsers.parse(HEURISTIC, heuristic_data, identity, totalLength)
 
     @staticmethod
     def parse_genemarkS2(gms2_data, identity='', totalLength=0):
@@ -1057,74 +1178,20 @@ class GeneParse:
         Parse GeneMark S2 file for Gene data
         :param s2_file: GeneMark S2 output file
         :param identity: optional identifier for each Gene
-        :return: list of Genes in file order
+        :return: GeneTable of the Genes in file order
         """
-        gms2_data = gms2_data.splitlines()
-
-        # skip until gene data
-        # curr_line = file.readline()
-        # while ('SequenceID' not in curr_line):
-        #     curr_line = file.readline()
-
-        index = 0
-        for ind, line in enumerate(gms2_data):
-            if 'SequenceID' in line:
-                index = ind
-                break
-        gms2_data = gms2_data[index + 1:]
-        # (GRyde) Print last item in list to see if error-prone data is being put into Gene obj
-        print(gms2_data[-1])
-        # (GRyde)
-
-        # Get gene data
-        genes = []
-        for curr_line in gms2_data:
-            """
-                (GRyde)
-                - Searching for '#' in a line instead of blank works because the output of the GMS2 program seems to have some comment lines at bottom
-                of data dump before reaching just blank lines. This parse method was originally taking those comment strings and trying to use that data to 
-                create Gene objects which were not compatible with strings (Gene can accept str but it inherits from GeneFeature which explicitly requries int
-                data type
-            """
-            if '#' not in curr_line: # (GRyde) Changed
-            # if curr_line != '': (GRyde) This is the original line, use this to replace if catastrophic failure
-                data = [x for x in curr_line.strip().split(' ') if x != '']
-                genes.append(Gene(data[2], data[3], data[1], identity=identity, totalLength=totalLength))
-            # stop at newline after genes
-            else:
-                break
-
-        return genes
+        return ToolParsers.parse(GENEMARKS2, gms2_data, identity, totalLength)
 
     @staticmethod
     def parse_prodigal(prodigal_data, identity='', totalLength=0):
         """
         Parse prodigal output file for Gene information
-        :param prodigal_file: prodigal output file
+        The output is of a single record - see ToolParsers.ProdigalFormat
+        :param prodigal_data: prodigal output - a string or an iterable of lines
         :param identity: optional identifier for Gene
-        :return: list of Genes in file order
-        """
-        prodigal_data = prodigal_data.splitlines()
-
-        # gene info starts on third line
-        genes = []
-        for index, line in enumerate(prodigal_data):
-            if index >= 2:
-                if 'CDS' in line:
-                    gene_str = line.strip().split('CDS')[-1].strip()
-                    direction = '+'
-                    if 'complement' in gene_str:
-                        direction = '-'
-                        # remove 'complement'
-                        gene_str = gene_str[len('complement'):]
-                        # remove ()
-                        gene_str = gene_str[1:-1]
-                    start, end = gene_str.split('..')
-                    # start, end = [int(x) for x in gene_str.split('.') if x.isnumeric()]
-                    # create gene
-                    genes.append(Gene(start, end, direction, identity=identity, totalLength=totalLength))
-
-        return genes
+        :return: GeneTable of the Genes in file order
+        """
+        return ToolParsers.parse(PRODIGAL, prodigal_data, identity, totalLength)
 
     @staticmethod
     def parse_rast(rast_data, identity='', totalLength=0):
@@ -1132,19 +1199,9 @@ class GeneParse:
         Parse the gff3 formatted data for genes
         :param rast_data: gff3 formatted gene annotations
         :param identity: optional identity for genes
-        :return: List[Gene]
+        :return: GeneTable of the Genes
         """
-        # find non comment lines
-        genes = []
-        for line in rast_data.splitlines():
-            if 'CDS' in line:
-                data = line.split('\t')
-                start = data[3]
-                stop = data[4]
-                direction = data[6]
-                genes.append(Gene(start, stop, direction, identity, totalLength))
-
-        return genes
+        return ToolParsers.parse(RAST, rast_data, identity, totalLength)
 
     @staticmethod
     def parse_metagene(metagene_data: str, identity: str = '', totalLength=0):
@@ -1167,182 +1224,244 @@ class GeneParse:
         return Aragorn.aragorn_parse(aragorn_data, totalLength, id=identity)
 
 
-def write_gene(gene, row, ws, indexes):
+# mappings of tool names to appropriate methods
+# [queryMethod, parseMethod]
+TOOL_METHODS = {GENEMARK: [GeneFile.genemark_query,
+                           GeneParse.parse_genemark],
+                HMM: [GeneFile.genemarkhmm_query,
+                      GeneParse.parse_genemarkHmm],
+                HEURISTIC: [GeneFile.genemark_heuristic_query,
+                            GeneParse.parse_genemarkHeuristic],
+                GENEMARKS: [GeneFile.genemarks_query,
+                            GeneParse.parse_genemarkS],
+                GENEMARKS2: [GeneFile.genemarks2_query,
+                             GeneParse.parse_genemarkS2],
+                GLIMMER: [GeneFile.glimmer_query,
+                          GeneParse.parse_glimmer],
+                PRODIGAL: [GeneFile.prodigal_query,
+                           GeneParse.parse_prodigal],
+                RAST: [GeneFile.rastQuery,
+                       GeneParse.parse_rast],
+                METAGENE: [GeneFile.metageneQuery,
+                           GeneParse.parse_metagene],
+                ARAGORN: [GeneFile.aragornQuery,
+                          GeneParse.parse_aragorn]}
+
+
+def queryTool(geneFile: GeneFile, tool: str, queryData, bypassCache: bool = False,
+              contigWorkers: int = CONTIG_WORKERS):
+    """
+    Performs the query of a gene prediction tool and parses the output data
+    The raw output is reused if the tool already finished on the sequence (see storedOutput)
+    The list of Genes - or the exception raised while querying/parsing - is stored in queryData.toolData[tool]
+    The records of a multi-record file are queried separately (see queryContigs), except by WHOLE_FILE_TOOLS
+    A cancelled query (see GeneFile.cancel) stores QueryCancelledError - the journal keeps the submitted job so the
+    query can be resumed
+    A tool whose server stopped answering (see CircuitBreaker) is served by a local executable if there is one
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool to call
+        * See TOOL_NAMES
+    :param queryData: QueryData object
+    :param bypassCache: always query the tool - the stored output is replaced
+    :param contigWorkers: number of records of a multi-record file queried at once
+    """
+    if queriedPerContig(geneFile, tool):
+        queryContigs(geneFile, tool, queryData, bypassCache, contigWorkers)
+        return
+
+    output = None if bypassCache else storedOutput(geneFile, tool)
+    if output is not None:
+        geneFile.query_data[tool] = output
+        parseTool(geneFile, tool, queryData)
+        storeOutput(geneFile, tool, queryData, cache=False)
+        return
+
+    # perform query
+    # if query is unsuccessful, return the error instead
+    try:
+        try:
+            runQuery(geneFile, tool, queryData)
+        except CircuitBreaker.CircuitOpenError:
+            # the server stopped answering - a local executable of the tool serves it instead if there is one
+            if not geneFile.fallBackToLocal(tool):
+                raise
+            runQuery(geneFile, tool, queryData)
+    except QueryCancelledError as e:
+        queryData.toolData[tool] = e
+        return
+    except Exception as e:
+        # requests aborted by the cancellation fail with their own errors
+        if geneFile.cancel is not None and geneFile.cancel.cancelled:
+            queryData.toolData[tool] = QueryCancelledError('Query cancelled')
+            return
+        queryData.toolData[tool] = e
+        geneFile.journalRecord(tool, QueryJournal.FAILED, error=str(e))
+        return
+
+    parseTool(geneFile, tool, queryData)
+    storeOutput(geneFile, tool, queryData)
+
+
+def runQuery(geneFile: GeneFile, tool: str, queryData):
     """
-    Writes the passed gene into its corresponding columns in the Excel worksheet
-    :param gene: Gene object
-    :param row: row to write to
-    :param ws: openpyxl worksheet object
-    :param indexes: dictionary of indexes, organized by gene.identity labels
+    Queries a tool - on its local executable if it has one, else on its web server
+    The raw output is stored in geneFile.query_data[tool]
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool to call
+    :param queryData: QueryData object holding the RAST credentials
     """
-    left = indexes[gene.identity][0][0] + str(row)
-    right = indexes[gene.identity][0][1] + str(row)
-    indexes[gene.identity][1] += 1
+    queryMethod = TOOL_METHODS[tool][0]
+    if geneFile.localBackend(tool) is not None:
+        geneFile.localQuery(tool)
+    elif tool == RAST:
+        queryMethod(geneFile, queryData.rastUser, queryData.rastPass, jobId=queryData.rastJobID)
+    else:
+        queryMethod(geneFile)
 
-    # write data
-    curr_row = ws[left:right][0]
-    curr_row[0].value = indexes[gene.identity][1]
-    curr_row[1].value = gene.direction
-    curr_row[1].alignment = Alignment(horizontal='center')
-    curr_row[2].value = gene.start
-    curr_row[3].value = gene.stop
-    curr_row[4].value = gene.length
+
+def queriedPerContig(geneFile: GeneFile, tool: str) -> bool:
+    """
+    :return: True if the tool is queried on each record of the file on its own (see queryContigs)
+    """
+    return bool(geneFile.contigFiles()) and (tool not in WHOLE_FILE_TOOLS or geneFile.localBackend(tool) is not None)
 
 
-def color_row(ws, row, color):
+def queryContigs(geneFile: GeneFile, tool: str, queryData, bypassCache: bool = False,
+                 workers: int = CONTIG_WORKERS):
     """
-    Colors the row according to passed color
-    Changes text color to white
-    :param ws: worksheet to alter
-    :param row: row number
-    :param color: openpyxl Fill profile
+    Queries a tool on each record of a multi-record file, at most <workers> records at once
+    Each record is queried, cached and journaled as a sequence of its own (see GeneFile.contigFiles)
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool to call
+    :param queryData: QueryData object
+    :param bypassCache: always query the tool - the stored outputs are replaced
+    :param workers: number of records queried at once
     """
-    # Colors which need white font
-    need_white = {PatternFill(fgColor='215967', fill_type='solid'),
-                  PatternFill(fgColor='31869b', fill_type='solid'),
-                  PatternFill(fgColor='92cddc', fill_type='solid')}
+    def queryContig(contigFile):
+        contigData = contigQueryData(queryData, tool)
+        queryTool(contigFile, tool, contigData, bypassCache)
+        return contigData.toolData[tool]
 
-    row = ws['A' + str(row):'AO' + str(row)][0]
-    for cell in row:
-        cell.fill = color
-        if color in need_white:
-            cell.font = Font(color=colors.WHITE)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=tool) as pool:
+        results = list(pool.map(queryContig, geneFile.contigFiles()))
 
+    joinContigs(geneFile, tool, queryData, results)
 
-def excel_write(output_directory, files, sequence):
+
+def contigQueryData(queryData, tool: str):
     """
-    Writes the content of the Gene files to a spreadsheet
-    :param output_directory: directory to output to
-    :param files: list of file names returned by GeneFile.query_all()
-    :param sequence: GeneFile object
+    QueryData receiving the result of a tool on a single record
     """
-    # output to Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Gene Calls'
-
-    # Annotation IDs
-    ids = ['GLIMMER', 'GM', 'HMM', 'GMS', 'GMS2', 'HEURISTIC']
-
-    indexes = dict()
-    indexes['GLIMMER'] = [['A', 'E'], 0]
-    indexes['GM'] = [['G', 'K'], 0]
-    indexes['HMM'] = [['M', 'Q'], 0]
-    indexes['GMS'] = [['S', 'W'], 0]
-    indexes['GMS2'] = [['Y', 'AC'], 0]
-    indexes['HEURISTIC'] = [['AE', 'AI'], 0]
-    indexes['PRODIGAL'] = [['AK', 'AO'], 0]
-    headers_names = ['No.', 'Direction', 'Start', 'Stop', 'Length']
-
-    # Row colors according to # of same genes
-    colors = dict()
-    colors[7] = PatternFill(fgColor='215967', fill_type='solid')
-    colors[6] = PatternFill(fgColor='215967', fill_type='solid')
-    colors[5] = PatternFill(fgColor='31869b', fill_type='solid')
-    colors[4] = PatternFill(fgColor='92cddc', fill_type='solid')
-    colors[3] = PatternFill(fgColor='b7dee8', fill_type='solid')
-    colors[2] = PatternFill(fgColor='daeef3', fill_type='solid')
-    colors[1] = PatternFill(fgColor='ffffff', fill_type='solid')
-
-    # Format Annotation Columns
-    for x in indexes.items():
-        value = x[1]
-        first = ws[value[0][0] + str(1): value[0][1] + str(1)][0]
-        # Gene Program Label
-        for column in first:
-            column.value = x[0]
-            column.font = Font(bold=True)
-            column.alignment = Alignment(horizontal='center')
-
-        # Column Headers
-        second = ws[value[0][0] + str(2): value[0][1] + str(2)][0]
-        for index, column in enumerate(second):
-            column.value = headers_names[index]
-            column.alignment = Alignment(horizontal='center')
-
-    # Format Statistics Columns
-    stat_row = ws['AQ1': 'AS1'][0]
-    stat_headers = ['SUM', 'ALL', 'ONE']
-    for index, cell in enumerate(stat_row):
-        cell.value = stat_headers[index]
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center')
-
-    # get genes
-    genes = []
-    # parse files depending on file type and add genes to genes list
-    for file in files:
-        file_type = os.path.split(file)[1].split('.')[1]
-        if file_type == 'glimmer':
-            genes += GeneParse.parse_glimmer(file, identity='GLIMMER')
-        elif file_type == 'gm':
-            genes += GeneParse.parse_genemark(file, identity='GM')
-        elif file_type == 'gmhmm':
-            genes += GeneParse.parse_genemarkHmm(file, identity='HMM')
-        elif file_type == 'gms':
-            genes += GeneParse.parse_genemarkS(file, identity='GMS')
-        elif file_type == 'gms2':
-            genes += GeneParse.parse_genemarkS2(file, identity='GMS2')
-        elif file_type == 'heuristic':
-            genes += GeneParse.parse_genemarkHeuristic(file, identity='HEURISTIC')
-        elif file_type == 'prodigal':
-            genes += GeneParse.parse_prodigal(file, identity='PRODIGAL')
-
-    total = sorted(genes, key=lambda x: x.start)
-
-    # write to file
-    row = 3
-    count = 0
-    genes_in_row = 1
-    while count < len(total):
-        # get next gene
-        curr_gene = total[count]
-        # print same genes on the same line, different ones on different lines
-        if count != 0:
-            if curr_gene != total[count - 1]:
-                # End of current row of genes
-                # update row color according to number of genes
-                color_row(ws, row, colors[genes_in_row])
-                # update stats of row
-                stat_row = ws['AQ' + str(row): 'AS' + str(row)][0]
-                # SUM
-                stat_row[0].value = genes_in_row
-                stat_row[0].alignment = Alignment(horizontal='center')
-                # ALL
-                if genes_in_row == len(indexes):
-                    stat_row[1].value = 'X'
-                    stat_row[1].alignment = Alignment(horizontal='center')
-                # ONE
-                if genes_in_row == 1:
-                    stat_row[2].value = 'X'
-                    stat_row[2].alignment = Alignment(horizontal='center')
-                # move to next row and reset genes count
-                row += 1
-                genes_in_row = 1
-            else:
-                genes_in_row += 1
-
-        write_gene(curr_gene, row, ws, indexes)
-        count += 1
-
-    # apply color and stats for last row
-    color_row(ws, row, colors[genes_in_row])
-    # update stats of row
-    stat_row = ws['AQ' + str(row): 'AS' + str(row)][0]
-    # SUM
-    stat_row[0].value = genes_in_row
-    stat_row[0].alignment = Alignment(horizontal='center')
-    # ALL
-    if genes_in_row == len(indexes):
-        stat_row[1].value = 'X'
-        stat_row[1].alignment = Alignment(horizontal='center')
-    # ONE
-    if genes_in_row == 1:
-        stat_row[2].value = 'X'
-        stat_row[2].alignment = Alignment(horizontal='center')
-
-    # save file
-    wb.save(output_directory + sequence.name + '.xlsx')
+    contigData = copy.copy(queryData)
+    contigData.toolData = {tool: None}
+    return contigData
+
+
+def joinContigs(geneFile: GeneFile, tool: str, queryData, results: List):
+    """
+    Stores the results of a tool on each record of a multi-record file in queryData.toolData[tool]
+    Calls keep the coordinates of their record (see GeneTable.fromContigs) - the tool fails if a record failed
+    :param geneFile: GeneFile of the whole file
+    :param tool: tool name
+    :param queryData: QueryData object
+    :param results: GeneTable or exception of each record, in the order of geneFile.contigFiles()
+    """
+    contigFiles = geneFile.contigFiles()
+    for contigFile, result in zip(contigFiles, results):
+        if isinstance(result, QueryCancelledError):
+            queryData.toolData[tool] = result
+            return
+        if isinstance(result, Exception):
+            error = GeneFile.GeneFileError('{} (record {})'.format(result, contigFile.contig))
+            queryData.toolData[tool] = error
+            geneFile.journalRecord(tool, QueryJournal.FAILED, error=str(error))
+            return
+
+    queryData.toolData[tool] = GeneTable.GeneTable.fromContigs(
+        results, [contigFile.contig for contigFile in contigFiles],
+        [contigFile.contigLength for contigFile in contigFiles])
+    # the output of each record is in its own journal entry
+    geneFile.journalRecord(tool, QueryJournal.DONE, contigs=len(contigFiles))
+
+    if tool == RAST:
+        queryData.wipeUserCredentials()
+
+
+def storedOutput(geneFile: GeneFile, tool: str):
+    """
+    Raw output of a tool which already finished on the sequence
+    Looks in the journal of the session, then in the query cache
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool name
+    :return: the output, None if the tool has to be queried
+    """
+    # the outputs of a multi-record file are in the entries of its records
+    output = geneFile.journalOutput(tool)
+    if output is not None:
+        return output
+
+    return QueryCache.getCache().get(geneFile.outputKey(tool), tool)
+
+
+def storeOutput(geneFile: GeneFile, tool: str, queryData, cache: bool = True):
+    """
+    Stores the raw output of a tool in the journal and the query cache
+    Only outputs which parse are stored - error pages from a server are not
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool name
+    :param queryData: QueryData object holding the parse result
+    :param cache: False if the output was read from the cache or journal
+    """
+    output = geneFile.query_data[tool]
+    if isinstance(queryData.toolData[tool], Exception):
+        geneFile.journalRecord(tool, QueryJournal.FAILED, error=str(queryData.toolData[tool]))
+        return
+
+    entry = geneFile.journalEntry(tool)
+    if entry is None or entry['state'] != QueryJournal.DONE:
+        geneFile.journalRecord(tool, QueryJournal.DONE, output=output)
+    if cache:
+        QueryCache.getCache().put(geneFile.outputKey(tool), output)
+
+
+def parseTool(geneFile: GeneFile, tool: str, queryData):
+    """
+    Parses the output of a tool stored in geneFile.query_data
+    The list of Genes - or the exception raised while parsing - is stored in queryData.toolData[tool]
+    :param geneFile: GeneFile of the DNA sequence
+    :param tool: tool which was queried
+    :param queryData: QueryData object
+    """
+    # outputs of local executables have their own format
+    backend = geneFile.localBackend(tool)
+    parseMethod = TOOL_METHODS[tool][1] if backend is None else backend.parse
+
+    # records of a multi-record file have their own length
+    totalLength = len(queryData.sequence) if geneFile.contig is None else geneFile.contigLength
+    # output of a multi-record file queried as a whole - the calls of each record are parsed on their own
+    contigFiles = geneFile.contigFiles() if geneFile.contig is None else []
+
+    # (GRyde) Call to parse methods updated with third argument, which is length of gene sequence
+    try:
+        if contigFiles:
+            contigs = [contigFile.contig for contigFile in contigFiles]
+            lengths = [contigFile.contigLength for contigFile in contigFiles]
+            records = ToolParsers.gffRecords(geneFile.query_data[tool], contigs)
+            genes = GeneTable.GeneTable.fromContigs(
+                [parseMethod(lines, identity=tool, totalLength=length) for lines, length in zip(records, lengths)],
+                contigs, lengths)
+        else:
+            genes = parseMethod(geneFile.query_data[tool], identity=tool, totalLength=totalLength)
+    except Exception as e:
+        queryData.toolData[tool] = e
+        return
+
+    # update query object with genes - stored as columns, see GeneTable
+    queryData.toolData[tool] = GeneTable.GeneTable.fromGenes(genes, totalLength=totalLength)
+
+    # wipe RAST user creds
+    if tool == RAST:
+        queryData.wipeUserCredentials()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,66 @@
+from typing import List, Tuple
+from PyQt5.QtGui import *
+
+
+class ColorPalette:
+    """
+    Colors of the gene tables, resolved from the color settings once
+    Rows of the settings are indexed by number of calls - 1, counts past the last row use the last row
+    Immutable - a new palette is loaded when the settings change (see ColorTable.palette)
+    """
+
+    def __init__(self, settings, cellSetting: str, textSettings: List[str], rows: int):
+        """
+        :param settings: QSettings
+        :param cellSetting: setting of the cell colors
+        :param textSettings: settings of the text colors - the 1st to 8th majority start/stop, then the minority
+        :param rows: number of rows of each setting
+        """
+        def settingColor(setting, row):
+            colorSetting = settings.value(setting + str(row))
+            return QColor(*[int(num) for num in colorSetting.split(' ')])
+
+        self._cellColors = tuple(settingColor(cellSetting, row) for row in range(rows))
+        self._textColors = tuple(tuple(settingColor(setting, row) for setting in textSettings) for row in range(rows))
+        self._cellBrushes = tuple(QBrush(color) for color in self._cellColors)
+        self._textBrushes = tuple(tuple(QBrush(color) for color in colors) for colors in self._textColors)
+
+        def rgbString(color):
+            return ''.join(['{:02x}'.format(num) for num in color.getRgb()[:3]])
+
+        self._rgbStrings = tuple((rgbString(cellColor), [rgbString(color) for color in textColors])
+                                 for cellColor, textColors in zip(self._cellColors, self._textColors))
+
+    def _row(self, count: int) -> int:
+        return min(max(count, 1), len(self._cellColors)) - 1
+
+    def colors(self, count: int) -> Tuple[QColor, List[QColor]]:
+        """
+        :param count: number of calls of a table row
+        :return: cell color and text colors of the row
+        """
+        row = self._row(count)
+        return self._cellColors[row], list(self._textColors[row])
+
+    def cellBrush(self, count: int) -> QBrush:
+        """
+        :param count: number of calls of a table row
+        """
+        return self._cellBrushes[self._row(count)]
+
+    def textBrush(self, count: int, rank: int = 0) -> QBrush:
+        """
+        :param count: number of calls of a table row
+        :param rank: rank of the start/stop of a call - 0 for the majority, ranks past the last color use the
+            minority color
+        """
+        brushes = self._textBrushes[self._row(count)]
+        return brushes[min(rank, len(brushes) - 1)]
+
+    def rgbStrings(self, count: int) -> Tuple[str, List[str]]:
+        """
+        :param count: number of calls of a table row
+        :return: cell color and text colors of the row as 'rrggbb' strings (see ExcelExport.RowColors)
+        """
+        cellColor, textColors = self._rgbStrings[self._row(count)]
+        return cellColor, list(textColors)
@@ -0,0 +1,234 @@
+from typing import List, Tuple
+import numpy as np
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from phagecommander.GuiWidgets.ColorPalette import ColorPalette
+from phagecommander.Utilities.Consensus import ConsensusGroups, GroupChange
+
+# columns of each tool - direction, start, stop, length - then a blank separator column
+_TOOL_COLUMNS = 4
+_TOOL_STRIDE = _TOOL_COLUMNS + 1
+
+TABLE_FONT_SIZE = 15
+
+# most runs of inserted / removed rows signalled one by one - the model is reset beyond
+MAX_ROW_SIGNALS = 200
+
+
+class GeneTableModel(QAbstractTableModel):
+    """
+    Model of the gene / tRNA tables of the main window - one row per group of calls (see Consensus.ConsensusGroups)
+    Cell text and colors are computed in data() from the group arrays, so only the rows in view are ever read
+    The calls of one tool can be set while the table is shown (see setTool) - the view is told of the rows which
+    changed rather than reset
+    Columns: TOTAL CALLS, ALL, ONE, CONTIG (multi-record sequences only), then direction, start, stop and length
+    of each tool's call
+    """
+
+    TOTAL_CALLS_COLUMN = 0
+    ALL_COLUMN = 1
+    ONE_COLUMN = 2
+    CONTIG_COLUMN = 3
+
+    def __init__(self, groups: ConsensusGroups, tools: List[str], palette: ColorPalette, parent=None):
+        """
+        :param groups: ConsensusGroups of the calls of the tools
+        :param tools: tools shown, in column order
+        :param palette: colors of the rows
+        """
+        super(GeneTableModel, self).__init__(parent)
+        self.groups = groups
+        self.tools = list(tools)
+        self.palette = palette
+
+        self.font = QFont()
+        self.font.setPointSize(TABLE_FONT_SIZE)
+
+        # group of each row while the view is told of inserted / removed rows - None when the rows are the groups
+        self._shownGroups = None
+        self._load()
+
+    def _load(self):
+        """
+        Reads the headers and the arrays of the groups
+        """
+        groups = self.groups
+        self.contigs = groups.table.contigs
+        self.headers = ['TOTAL CALLS', 'ALL', 'ONE'] + (['CONTIG'] if self.contigs else [])
+        self.firstToolColumn = len(self.headers)
+        for ind, tool in enumerate(self.tools):
+            self.headers.extend([tool.upper()] * _TOOL_COLUMNS)
+            if ind != len(self.tools) - 1:
+                self.headers.append('')
+
+        # call of each tool in each group - the last call of the tool if it has several, -1 if none
+        table = groups.table
+        self._cellCall = groups.toolCalls(self.tools)
+
+        # plain python values of the arrays - data() is called for every visible cell
+        self._counts = groups.counts.tolist()
+        self._mixed = (groups.majorityCalls != groups.counts).tolist()
+        self._firstCalls = groups.bounds[:-1].tolist()
+        self._strands = table.strand.tolist()
+        self._starts = table.start.tolist()
+        self._stops = table.stop.tolist()
+        self._lengths = table.length.tolist()
+        self._altRanks = groups.altRank.tolist()
+        self._contigCodes = table.contig.tolist()
+
+    def setTool(self, tool: str, calls):
+        """
+        Shows the calls of a tool, replacing its previous calls if any (see ConsensusGroups.setTool)
+        :param tool: tool name - one of the tools shown
+        :param calls: GeneTable or list of Genes of the tool
+        """
+        self.applyChange(self.groups.setTool(tool, calls))
+
+    def applyChange(self, change: GroupChange):
+        """
+        Updates the view after the groups changed - only the rows of new, removed or changed groups are signalled,
+        so the view keeps its scroll position
+        :param change: GroupChange returned by the groups
+        """
+        kept = np.zeros(change.previousCount, dtype=bool)
+        kept[change.previous[change.previous >= 0]] = True
+        removedRuns = _runs(np.flatnonzero(~kept))
+        insertedRuns = _runs(np.flatnonzero(change.previous < 0))
+
+        # a new CONTIG column, or too many row signals for the view to handle one by one
+        if self.groups.table.contigs != self.contigs or len(removedRuns) + len(insertedRuns) > MAX_ROW_SIGNALS:
+            self.beginResetModel()
+            self._load()
+            self.endResetModel()
+            return
+
+        # the removed groups leave first, while the rows still show the previous groups - from the last, so the
+        # rows of the earlier runs keep their index
+        self._shownGroups = list(range(change.previousCount))
+        for first, last in reversed(removedRuns):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._shownGroups[first:last + 1]
+            self.endRemoveRows()
+        # then the new groups come in between the kept ones
+        self._load()
+        self._shownGroups = np.flatnonzero(change.previous >= 0).tolist()
+        for first, last in insertedRuns:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self._shownGroups[first:first] = range(first, last + 1)
+            self.endInsertRows()
+        self._shownGroups = None
+
+        changed = np.flatnonzero(change.changed & (change.previous >= 0))
+        if len(changed):
+            self.dataChanged.emit(self.index(int(changed[0]), 0), self.index(int(changed[-1]), len(self.headers) - 1))
+
+    def setPalette(self, palette: ColorPalette):
+        """
+        Recolors the rows - the groups are not read again
+        """
+        self.palette = palette
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, len(self.headers) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._counts) if self._shownGroups is None else len(self._shownGroups)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super(GeneTableModel, self).headerData(section, orientation, role)
+
+    def rowColors(self, row: int) -> Tuple[QColor, List[QColor]]:
+        """
+        Cell color and text colors of a row
+        """
+        return self.palette.colors(self._counts[row])
+
+    def call(self, row: int, column: int):
+        """
+        Call shown in a cell
+        :return: (row of the call in groups.table, offset of the column in the tool's columns), (None, None) if the
+            cell is not a call column or the tool did not call the group
+        """
+        toolIndex, offset = divmod(column - self.firstToolColumn, _TOOL_STRIDE)
+        if column < self.firstToolColumn or offset >= _TOOL_COLUMNS:
+            return None, None
+        call = int(self._cellCall[row, toolIndex])
+        return (call, offset) if call >= 0 else (None, None)
+
+    def text(self, row: int, column: int) -> str:
+        """
+        Text of a cell
+        """
+        count = self._counts[row]
+        if column == self.TOTAL_CALLS_COLUMN:
+            return str(count)
+        if column == self.ALL_COLUMN:
+            return 'X' if count == len(self.tools) else ''
+        if column == self.ONE_COLUMN:
+            return 'X' if count == 1 and count != len(self.tools) else ''
+        if self.contigs and column == self.CONTIG_COLUMN:
+            return self.contigs[self._contigCodes[self._firstCalls[row]]]
+
+        call, offset = self.call(row, column)
+        if call is None:
+            return ''
+        if offset == 0:
+            return '+' if self._strands[call] > 0 else '-'
+        return str((self._starts, self._stops, self._lengths)[offset - 1][call])
+
+    def textColor(self, row: int, column: int) -> QColor:
+        """
+        Text color of a cell
+        """
+        return self.textBrush(row, column).color()
+
+    def textBrush(self, row: int, column: int) -> QBrush:
+        """
+        Text brush of a cell
+        The start (+) / stop (-) of each call of a row whose calls do not all agree is colored by the rank of its
+        number of calls
+        """
+        count = self._counts[row]
+        if self._mixed[row]:
+            call, offset = self.call(row, column)
+            if call is not None and offset == (1 if self._strands[call] > 0 else 2):
+                return self.palette.textBrush(count, self._altRanks[call])
+        return self.palette.textBrush(count)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row() if self._shownGroups is None else self._shownGroups[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            return self.text(row, column)
+        elif role == Qt.BackgroundRole:
+            return self.palette.cellBrush(self._counts[row])
+        elif role == Qt.ForegroundRole:
+            return self.textBrush(row, column)
+        elif role == Qt.FontRole:
+            return self.font
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+
+def _runs(rows: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Runs of consecutive rows
+    :param rows: sorted rows
+    :return: (first, last) row of each run
+    """
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1)
+    firsts = np.r_[rows[0], rows[breaks + 1]]
+    lasts = np.r_[rows[breaks], rows[-1]]
+    return list(zip(firsts.tolist(), lasts.tolist()))
@@ -1,10 +1,8 @@
-import ast
 from pathlib import Path
 from typing import List
 
-from bs4 import BeautifulSoup
 from phagecommander import Gene
-import requests
+from phagecommander.Utilities import HtmlStream, HttpSession
 
 URL = 'http://130.235.244.92/bcgi/aragorn.cgi'
 
@@ -13,16 +11,17 @@ SEQ_TOPOS = {'linear', 'circular'}
 STRAND_TYPE = {'single', 'both'}
 
 
-def aragorn_query(file_path: str, rna_type: str = 'tRNA', use_introns: bool = False, seq_topology: str = 'linear',
-                  strand: str = 'both') -> List['Gene.TRNA']:
+def aragorn_request(file_path: str, rna_type: str = 'tRNA', use_introns: bool = False, seq_topology: str = 'linear',
+                    strand: str = 'both', file_data: bytes = None):
     """
-    Calls Aragorn to analyze TRNA sequences in the DNA sequence
+    Builds the form data and file upload of an Aragorn query
     :param file_path: fasta file path
     :param rna_type: {'tRNA', 'tmRNA', 'both'}
     :param use_introns:
     :param seq_topology: {'linear', 'circular'}
     :param strand: {'single', 'both'}
-    :return: List[TRNA]
+    :param file_data: content of the fasta file - read from file_path if not given
+    :return: (form data, files)
     """
     # check for valid parameters
     if rna_type not in TYPES:
@@ -37,8 +36,9 @@ def aragorn_query(file_path: str, rna_type: str = 'tRNA', use_introns: bool = Fa
         raise TypeError(f'{seq_topology} is not a valid sequence topology {SEQ_TOPOS}')
 
     file_path = Path(file_path)
-    with open(file_path, 'r') as file:
-        file_data = file.read()
+    if file_data is None:
+        with open(file_path, 'rb') as file:
+            file_data = file.read()
 
     file_info = {'upload': (file_path.stem, file_data, 'application/octet-stream')}
 
@@ -52,7 +52,25 @@ def aragorn_query(file_path: str, rna_type: str = 'tRNA', use_introns: bool = Fa
         'submit': 'Submit'
     }
 
-    file_post = requests.post(URL, data=form_data, files=file_info)
+    return form_data, file_info
+
+
+def aragorn_query(file_path: str, rna_type: str = 'tRNA', use_introns: bool = False, seq_topology: str = 'linear',
+                  strand: str = 'both', file_data: bytes = None, cancel=None) -> List['Gene.TRNA']:
+    """
+    Calls Aragorn to analyze TRNA sequences in the DNA sequence
+    :param file_path: fasta file path
+    :param rna_type: {'tRNA', 'tmRNA', 'both'}
+    :param use_introns:
+    :param seq_topology: {'linear', 'circular'}
+    :param strand: {'single', 'both'}
+    :param file_data: content of the fasta file - read from file_path if not given
+    :param cancel: CancelToken aborting the query
+    :return: List[TRNA]
+    """
+    form_data, file_info = aragorn_request(file_path, rna_type, use_introns, seq_topology, strand, file_data)
+
+    file_post = HttpSession.post(URL, data=form_data, files=file_info, cancel=cancel)
     file_post.raise_for_status()
 
     return file_post.content
@@ -60,11 +78,19 @@ def aragorn_query(file_path: str, rna_type: str = 'tRNA', use_introns: bool = Fa
 
 # (GRyde) Updated to include totalLength parameter, original parameter list was aragorn_parse(aragorn_data: str, id=None)
 def aragorn_parse(aragorn_data: str, totalLength, id=None):
-    soup = BeautifulSoup(aragorn_data, 'html.parser')
-    trnas = soup.find('pre')
+    """
+    Parses the tRNAs in the <pre> element of an Aragorn output page
+    :param aragorn_data: output page as str or bytes, or an iterable of chunks
+    :param totalLength: length of the DNA sequence
+    :param id: identity for each tRNA
+    :return: List[TRNA]
+    """
+    text = HtmlStream.preText(aragorn_data)
+    if text is None:
+        raise ValueError('Aragorn output has no results')
 
     genes: List['Gene.TRNA'] = []
-    lines = trnas.text.split('\n')
+    lines = text.split('\n')
     # total found on third line
     result_line = lines[2].split(' ')
     if int(result_line[0]) != 0:
@@ -75,12 +101,14 @@ def aragorn_parse(aragorn_data: str, totalLength, id=None):
                 rna = line[2]
                 seq_type = seq_data[1] + rna
                 # check if complement
-                if seq_data[2][0] == 'c':
+                location = seq_data[2]
+                if location[0] == 'c':
                     direction = '-'
-                    start, stop = ast.literal_eval(seq_data[2][1:])
+                    location = location[1:]
                 else:
                     direction = '+'
-                    start, stop = ast.literal_eval(seq_data[2])
+                # location is [start,stop]
+                start, stop = (int(position) for position in location.strip('[]').split(','))
                 gene = Gene.TRNA(start, stop, direction, seq_type, totalLength, identity=id)
                 genes.append(gene)
 
@@ -0,0 +1,390 @@
+"""
+Asynchronous query engine
+Runs the submits and polls of every tool, for one or many genomes, on a single asyncio event loop.
+Requests are sent through a PooledSession (see HttpSession) from a pool of threads, so connections are kept alive
+per host and follow the timeouts, retries and circuit breakers of the blocking queries. The number of requests in
+flight to each host is bounded, and the waits between polls are spent on the event loop rather than in a thread.
+A query is cancelled with the CancelToken of its GeneFile, as with Gene.queryTool.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+import requests
+from phagecommander import Gene
+from phagecommander.Utilities import Aragorn, CircuitBreaker, HttpSession, MetagenePy, PollScheduler, QueryJournal, \
+    RastPy
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+from phagecommander.Utilities.HttpSession import HostPolicy
+from phagecommander.Utilities.Tools import *
+
+logger = logging.getLogger(__name__)
+
+# maximum number of simultaneous requests to a single host
+DEFAULT_HOST_LIMIT = 4
+
+
+class AsyncHttpClient:
+    """
+    Requests of an asyncio event loop, sent through a PooledSession
+    * Each request runs in a thread of the client - the event loop only waits for its response
+    * The number of requests in flight to each host is bounded - the connections to a host are kept alive up to the
+      limit of the host
+    * Timeouts, retries and circuit breakers are those of the PooledSession
+    * A request given a CancelToken is aborted when the token is cancelled (see HttpSession.PooledSession.request)
+    """
+
+    def __init__(self, hostLimits: Dict[str, int] = None, defaultHostLimit: int = DEFAULT_HOST_LIMIT,
+                 hostPolicies: Dict[str, HostPolicy] = None, defaultPolicy: HostPolicy = None):
+        """
+        :param hostLimits: host name: maximum simultaneous requests
+        :param defaultHostLimit: limit for hosts not in hostLimits
+        :param hostPolicies: dict of scheme://host: HostPolicy - defaults to those of the shared session
+            (see HttpSession.configure)
+        :param defaultPolicy: HostPolicy of the other servers - defaults to that of the shared session
+        """
+        shared = HttpSession.getSession()
+        self.hostLimits = hostLimits if hostLimits is not None else dict()
+        self.defaultHostLimit = defaultHostLimit
+        hostPolicies = hostPolicies if hostPolicies is not None else shared.hostPolicies
+        defaultPolicy = defaultPolicy if defaultPolicy is not None else shared.defaultPolicy
+
+        # enough kept alive connections for the requests in flight to each host
+        poolSizes = {host: max(size, self.hostLimits.get(urlsplit(host).hostname, 0))
+                     for host, size in HttpSession.HOST_POOL_SIZES.items()}
+        defaultPoolSize = max([HttpSession.DEFAULT_POOL_SIZE, defaultHostLimit] + list(self.hostLimits.values()))
+        self.session = HttpSession.PooledSession(poolSizes, defaultPoolSize, timeout=defaultPolicy.timeout,
+                                                 retries=defaultPolicy.retries, backoff=defaultPolicy.backoff,
+                                                 hostPolicies=hostPolicies)
+        # hosts beyond those in hostLimits wait for a free thread
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.hostLimits.values()) + defaultHostLimit,
+                                            thread_name_prefix='request')
+        # host name: asyncio.Semaphore bounding the requests in flight
+        self._slots = dict()
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def request(self, method: str, url: str, cancel: CancelToken = None, **kwargs) -> requests.Response:
+        """
+        Performs a request once the host has a free slot
+        :param method: HTTP method
+        :param url: full URL
+        :param cancel: CancelToken aborting the request - None if the request cannot be cancelled
+        :param kwargs: arguments of requests.request (data, files, headers...)
+        :return: requests.Response
+        Raises QueryCancelledError if the token is cancelled, CircuitOpenError if the server stopped answering
+        """
+        host = urlsplit(url).hostname
+        if host not in self._slots:
+            self._slots[host] = asyncio.Semaphore(self.hostLimits.get(host, self.defaultHostLimit))
+
+        async with self._slots[host]:
+            if cancel is not None:
+                cancel.check()
+            send = functools.partial(self.session.request, method, url, cancel=cancel, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, send)
+
+    async def close(self):
+        """
+        Closes the connections of the client - requests still running are aborted by their CancelToken
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+class AsyncQueryEngine:
+    """
+    Queries the tools for one or many genomes on a single event loop
+    Results are stored the same way as Gene.queryTool - in queryData.toolData[tool]
+    """
+
+    def __init__(self, hostLimits: Dict[str, int] = None, defaultHostLimit: int = DEFAULT_HOST_LIMIT,
+                 hostPolicies: Dict[str, HostPolicy] = None, defaultPolicy: HostPolicy = None,
+                 bypassCache: bool = False):
+        """
+        :param hostLimits: host name: maximum simultaneous requests
+        :param defaultHostLimit: limit for hosts not in hostLimits
+        :param hostPolicies: dict of scheme://host: HostPolicy - defaults to those of the shared session
+        :param defaultPolicy: HostPolicy of the other servers - defaults to that of the shared session
+        :param bypassCache: always query the tools - cached outputs are replaced
+        """
+        self.hostLimits = hostLimits
+        self.defaultHostLimit = defaultHostLimit
+        self.hostPolicies = hostPolicies
+        self.defaultPolicy = defaultPolicy
+        self.bypassCache = bypassCache
+        self.client = None
+
+    def run(self, genomes: Iterable[Tuple['Gene.GeneFile', object]]):
+        """
+        Queries the selected tools of each genome and waits until all are finished
+        :param genomes: iterable of (GeneFile, QueryData)
+            * tools queried are those set to True in QueryData.tools
+        """
+        async def queryAll():
+            async with self:
+                await asyncio.gather(*[self.queryGenome(geneFile, queryData) for geneFile, queryData in genomes])
+
+        asyncio.run(queryAll())
+
+    async def __aenter__(self):
+        self.client = AsyncHttpClient(self.hostLimits, self.defaultHostLimit, self.hostPolicies, self.defaultPolicy)
+        return self
+
+    async def __aexit__(self, excType, exc, tb):
+        await self.client.close()
+        self.client = None
+
+    async def queryGenome(self, geneFile: 'Gene.GeneFile', queryData, tools: List[str] = None):
+        """
+        Queries the tools for a single genome concurrently
+        :param geneFile: GeneFile of the DNA sequence
+        :param queryData: QueryData object
+        :param tools: tools to query - defaults to the tools selected in queryData
+        """
+        if tools is None:
+            tools = [tool for tool, selected in queryData.tools.items() if selected]
+        await asyncio.gather(*[self.queryTool(geneFile, tool, queryData) for tool in tools])
+
+    async def queryTool(self, geneFile: 'Gene.GeneFile', tool: str, queryData):
+        """
+        Asynchronous version of Gene.queryTool
+        :param geneFile: GeneFile of the DNA sequence
+        :param tool: tool to call
+        :param queryData: QueryData object
+        """
+        if Gene.queriedPerContig(geneFile, tool):
+            await self.queryContigs(geneFile, tool, queryData)
+            return
+
+        output = None if self.bypassCache else Gene.storedOutput(geneFile, tool)
+        if output is not None:
+            geneFile.query_data[tool] = output
+            Gene.parseTool(geneFile, tool, queryData)
+            Gene.storeOutput(geneFile, tool, queryData, cache=False)
+            return
+
+        try:
+            try:
+                output = await self._cancellable(geneFile.cancel, self._query(geneFile, tool, queryData))
+            except CircuitBreaker.CircuitOpenError:
+                # the server stopped answering - a local executable of the tool serves it instead if there is one
+                if not geneFile.fallBackToLocal(tool):
+                    raise
+                output = await self._cancellable(geneFile.cancel, self._query(geneFile, tool, queryData))
+        except QueryCancelledError as e:
+            queryData.toolData[tool] = e
+            return
+        except Exception as e:
+            # requests aborted by the cancellation fail with their own errors
+            if geneFile.cancel is not None and geneFile.cancel.cancelled:
+                queryData.toolData[tool] = QueryCancelledError('Query cancelled')
+                return
+            queryData.toolData[tool] = e
+            geneFile.journalRecord(tool, QueryJournal.FAILED, error=str(e))
+            return
+
+        geneFile.query_data[tool] = output
+        Gene.parseTool(geneFile, tool, queryData)
+        Gene.storeOutput(geneFile, tool, queryData)
+
+    @staticmethod
+    async def _cancellable(cancel: CancelToken, coroutine):
+        """
+        Awaits a query - cancelling the token ends it at once, also while it waits between polls
+        Blocking calls made for the query are aborted by the token itself (see GeneFile.cancel)
+        :param cancel: CancelToken of the query - None if the query cannot be cancelled
+        :return: result of the coroutine
+        Raises QueryCancelledError if the token is cancelled
+        """
+        if cancel is None:
+            return await coroutine
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(coroutine)
+        # the token may be cancelled from any thread
+        with cancel.interrupting(lambda: loop.call_soon_threadsafe(task.cancel)):
+            try:
+                return await task
+            except asyncio.CancelledError:
+                if not cancel.cancelled:
+                    raise
+        raise QueryCancelledError('Query cancelled')
+
+    async def _query(self, geneFile: 'Gene.GeneFile', tool: str, queryData):
+        """
+        Asynchronous version of Gene.runQuery
+        :return: raw output of the tool
+        """
+        if geneFile.localBackend(tool) is not None:
+            # local executables wait for a core slot - run off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, geneFile.localQuery, tool)
+            return geneFile.query_data[tool]
+        elif tool in Gene.GeneFile.DNA_MASTER_QUERIES:
+            return await self._dnaMasterQuery(geneFile, tool)
+        elif tool in Gene.GeneFile.GENEMARK_FORM_QUERIES:
+            return await self._genemarkFormQuery(geneFile, tool)
+        elif tool == METAGENE:
+            return await self._metageneQuery(geneFile)
+        elif tool == ARAGORN:
+            return await self._aragornQuery(geneFile)
+        elif tool == PRODIGAL:
+            return await self._prodigalQuery(geneFile)
+        elif tool == RAST:
+            return await self._rastQuery(geneFile, queryData.rastUser, queryData.rastPass, queryData.rastJobID)
+        raise ValueError('Unknown tool: {}'.format(tool))
+
+    async def queryContigs(self, geneFile: 'Gene.GeneFile', tool: str, queryData):
+        """
+        Asynchronous version of Gene.queryContigs - at most Gene.CONTIG_WORKERS records are queried at once
+        :param geneFile: GeneFile of a multi-record file
+        :param tool: tool to call
+        :param queryData: QueryData object
+        """
+        slots = asyncio.Semaphore(Gene.CONTIG_WORKERS)
+
+        async def queryContig(contigFile):
+            async with slots:
+                contigData = Gene.contigQueryData(queryData, tool)
+                await self.queryTool(contigFile, tool, contigData)
+                return contigData.toolData[tool]
+
+        results = await asyncio.gather(*[queryContig(contigFile) for contigFile in geneFile.contigFiles()])
+        Gene.joinContigs(geneFile, tool, queryData, list(results))
+
+    async def _dnaMasterQuery(self, geneFile: 'Gene.GeneFile', tool: str) -> str:
+        url, _, _, serverError = Gene.GeneFile.DNA_MASTER_QUERIES[tool]
+        headers = Gene.GeneFile.DNA_MASTER_HEADERS
+
+        # reattach to a job submitted in an earlier session
+        entry = geneFile.journalEntry(tool)
+        if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'jobKey' in entry:
+            try:
+                return await self._dnaMasterPoll(geneFile, tool, [tuple(field) for field in entry['jobKey']])
+            except Gene.GeneFile.GeneFileError:
+                # job is no longer held by the server - submit again
+                pass
+
+        filePost = await self.client.post(url, data=geneFile.dnaMasterPayload(tool), headers=headers,
+                                          cancel=geneFile.cancel)
+        filePost.raise_for_status()
+        payload = Gene.GeneFile.dnaMasterJobKey(tool, filePost.text)
+        geneFile.journalRecord(tool, QueryJournal.SUBMITTED, jobKey=payload)
+
+        return await self._dnaMasterPoll(geneFile, tool, payload)
+
+    async def _dnaMasterPoll(self, geneFile: 'Gene.GeneFile', tool: str, payload) -> str:
+        url, _, _, serverError = Gene.GeneFile.DNA_MASTER_QUERIES[tool]
+        headers = Gene.GeneFile.DNA_MASTER_HEADERS
+
+        async def checkOutput():
+            returnPost = await self.client.post(url, data=payload, headers=headers, cancel=geneFile.cancel)
+            returnPost.raise_for_status()
+            # HTTP response code 202 is returned while the job is running
+            if returnPost.status_code != 200:
+                geneFile.journalUpdate(tool, lastPoll=time.time())
+                return PollScheduler.NOT_READY
+            return returnPost.content.decode('utf-8')
+
+        # poll until the output is ready
+        try:
+            return await PollScheduler.poll(checkOutput, Gene.GeneFile.POLL_POLICIES[tool], tool)
+        except requests.exceptions.HTTPError:
+            raise Gene.GeneFile.GeneFileError(serverError)
+
+    async def _genemarkFormQuery(self, geneFile: 'Gene.GeneFile', tool: str) -> str:
+        # retrieve the output of a submission from an earlier session if it still exists
+        entry = geneFile.journalEntry(tool)
+        if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'outputUrl' in entry:
+            getFile = await self.client.get(entry['outputUrl'], cancel=geneFile.cancel)
+            if getFile.status_code == 200:
+                return getFile.content.decode('utf-8')
+
+        url = Gene.GeneFile.GENEMARK_FORM_QUERIES[tool][0]
+        postRequest = await self.client.post(url, files=geneFile.file_info, data=geneFile.genemarkFormData(tool),
+                                             cancel=geneFile.cancel)
+        postRequest.raise_for_status()
+        outputUrl = Gene.GeneFile.genemarkFileLocation(tool, postRequest.text)
+        geneFile.journalRecord(tool, QueryJournal.SUBMITTED, outputUrl=outputUrl)
+
+        getFile = await self.client.get(outputUrl, cancel=geneFile.cancel)
+        getFile.raise_for_status()
+        return getFile.content.decode('utf-8')
+
+    async def _metageneQuery(self, geneFile: 'Gene.GeneFile') -> str:
+        metaGene = MetagenePy.Metagene(geneFile.file_path, geneFile.file_name, fileData=geneFile.sequence.data)
+        postReq = await self.client.post(MetagenePy.METAGENE_URL, files=metaGene.requestFiles(), cancel=geneFile.cancel)
+        postReq.raise_for_status()
+        return postReq.text
+
+    async def _aragornQuery(self, geneFile: 'Gene.GeneFile') -> bytes:
+        formData, fileInfo = Aragorn.aragorn_request(geneFile.file_path, file_data=geneFile.sequence.data)
+        filePost = await self.client.post(Aragorn.URL, data=formData, files=fileInfo, cancel=geneFile.cancel)
+        filePost.raise_for_status()
+        return filePost.content
+
+    async def _prodigalQuery(self, geneFile: 'Gene.GeneFile') -> str:
+        # the prodigal processes run in the shared ProdigalPool - wait for them off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, geneFile.prodigal_query)
+        return geneFile.query_data[PRODIGAL]
+
+    async def _rastQuery(self, geneFile: 'Gene.GeneFile', username: str, password: str, jobId: int = None) -> str:
+        # RAST calls are short yaml RPCs made through RastPy in the default executor
+        # the long waits between status checks are spent on the event loop, not in a thread
+        loop = asyncio.get_running_loop()
+
+        cancel = geneFile.cancel
+
+        def connect():
+            """
+            :return: (Rast, whether the job was submitted by this query - see GeneFile.rastQuery)
+            """
+            # same job selection as GeneFile.rastQuery
+            if jobId is not None:
+                return RastPy.Rast(username, password, jobId=jobId, cancel=cancel), False
+
+            entry = geneFile.journalEntry(RAST)
+            if entry is not None and entry['state'] == QueryJournal.SUBMITTED and 'jobId' in entry:
+                try:
+                    return RastPy.Rast(username, password, jobId=entry['jobId'], cancel=cancel), True
+                except RastPy.RastInvalidJobError:
+                    # job was deleted from the server - submit again
+                    pass
+
+            newJob = RastPy.Rast(username, password, cancel=cancel)
+            newJob.submit(geneFile.file_path, geneFile.file_name, fastaContent=geneFile.sequence.text)
+            geneFile.journalRecord(RAST, QueryJournal.SUBMITTED, jobId=newJob.jobId)
+            return newJob, True
+
+        rastJob, ownJob = await loop.run_in_executor(None, connect)
+
+        async def checkComplete():
+            if await loop.run_in_executor(None, rastJob.checkIfComplete):
+                return True
+            geneFile.journalUpdate(RAST, lastPoll=time.time())
+            return PollScheduler.NOT_READY
+
+        # check periodically for job completion
+        try:
+            if not await loop.run_in_executor(None, rastJob.checkIfComplete):
+                await PollScheduler.poll(checkComplete, Gene.GeneFile.POLL_POLICIES[RAST], RAST)
+        except (asyncio.CancelledError, QueryCancelledError):
+            if ownJob and cancel is not None and cancel.cancelled and cancel.deleteJobs:
+                try:
+                    await loop.run_in_executor(None, rastJob.deleteJob)
+                    geneFile.journalRecord(RAST, QueryJournal.FAILED,
+                                           error='RAST job {} deleted'.format(rastJob.jobId))
+                except Exception as e:
+                    logger.error('RAST: could not delete job %s: %s', rastJob.jobId, e)
+            raise
+
+        return await loop.run_in_executor(None, rastJob.retrieveData)
@@ -0,0 +1,136 @@
+"""
+Cooperative cancellation of tool queries
+A CancelToken is shared by every part of a query - poll loops stop waiting on it, Prodigal and local executables
+are terminated, and the sockets of requests in flight are shut down (see HttpSession) - so a cancelled query frees
+its threads, processes and connections right away instead of when the server or process finally answers
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import threading
+from concurrent.futures import CancelledError, Future
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+class CancelToken:
+    """
+    Class for representing the cancellation of a query
+    Blocking operations register a callback which interrupts them - the callbacks run when the token is cancelled
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        # jobs submitted to servers are deleted rather than kept for a later resume
+        self.deleteJobs = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, deleteJobs: bool = False):
+        """
+        Cancels the query - the registered callbacks run in the calling thread
+        :param deleteJobs: delete the jobs submitted to servers (RAST) - otherwise they are kept so the query can be
+            resumed
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.deleteJobs = deleteJobs
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception('Cancel callback failed')
+
+    def check(self):
+        """
+        Raises QueryCancelledError if the query was cancelled
+        """
+        if self._event.is_set():
+            raise QueryCancelledError('Query cancelled')
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits until the query is cancelled or the timeout passes
+        :return: True if the query was cancelled
+        """
+        return self._event.wait(timeout)
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Adds a callback run on cancellation - it runs right away if the query is already cancelled
+        :param callback: function interrupting a blocking operation
+        :return: function removing the callback
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @contextmanager
+    def interrupting(self, callback: Callable[[], None]):
+        """
+        Runs callback if the query is cancelled while in the block
+        """
+        unregister = self.register(callback)
+        try:
+            yield
+        finally:
+            unregister()
+
+
+# arguments of subprocess.Popen starting a process which can be terminated along with its children (see terminate)
+PROCESS_GROUP = dict(start_new_session=True) if os.name == 'posix' else dict()
+
+
+def terminate(proc: subprocess.Popen):
+    """
+    Terminates a process started with PROCESS_GROUP - wrapper scripts (gms2.pl) are terminated with the processes
+    they started, which would otherwise keep running and hold the output pipes open
+    """
+    if os.name != 'posix':
+        proc.terminate()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except OSError:
+        pass
+
+
+def result(future: Future, token: CancelToken = None):
+    """
+    Result of a future - the future is cancelled, and QueryCancelledError raised, if the query is cancelled
+    :param future: concurrent.futures.Future
+    :param token: CancelToken of the query - None to wait on the future alone
+    """
+    if token is None:
+        return future.result()
+    with token.interrupting(future.cancel):
+        try:
+            return future.result()
+        except CancelledError:
+            token.check()
+            raise
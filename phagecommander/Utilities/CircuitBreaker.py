@@ -0,0 +1,153 @@
+"""
+Circuit breakers for the tool servers
+Each server (scheme://host) has a breaker counting its consecutive failed requests - connection errors, timeouts
+and server errors. After FAILURE_THRESHOLD failures in a row the breaker opens and requests to the server fail at
+once with CircuitOpenError instead of each waiting out its own timeouts and retries. Once RESET_TIMEOUT has passed
+a single trial request is let through - the breaker closes again if it succeeds
+"""
+
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+# consecutive failed requests opening a breaker
+FAILURE_THRESHOLD = 3
+# seconds an open breaker fails requests before letting a trial request through
+RESET_TIMEOUT = 60
+
+# breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Class for representing the health of a server
+    """
+
+    def __init__(self, server: str, failureThreshold: int = FAILURE_THRESHOLD, resetTimeout: float = RESET_TIMEOUT):
+        """
+        :param server: scheme://host of the server - used in errors
+        :param failureThreshold: consecutive failed requests opening the breaker
+        :param resetTimeout: seconds the breaker stays open before a trial request
+        """
+        self.server = server
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._openedAt = None
+        self._trialRunning = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._openedAt is None:
+                return CLOSED
+            if self._trialRunning or time.monotonic() - self._openedAt >= self.resetTimeout:
+                return HALF_OPEN
+            return OPEN
+
+    def before(self):
+        """
+        Called before a request to the server
+        Raises CircuitOpenError if the breaker is open - or half-open with its trial request already running
+        """
+        with self._lock:
+            if self._openedAt is None:
+                return
+            remaining = self.resetTimeout - (time.monotonic() - self._openedAt)
+            if remaining <= 0 and not self._trialRunning:
+                self._trialRunning = True
+                return
+            raise CircuitOpenError('{} is not responding - {} failed requests, next try in {:.0f} s'.format(
+                self.server, self._failures, max(0.0, remaining)))
+
+    def success(self):
+        """
+        Called after a request the server answered
+        """
+        with self._lock:
+            self._failures = 0
+            self._openedAt = None
+            self._trialRunning = False
+
+    def failure(self):
+        """
+        Called after a request the server did not answer, or answered with a server error
+        """
+        with self._lock:
+            self._failures += 1
+            # a failed trial opens the breaker for another period
+            if self._trialRunning or self._failures >= self.failureThreshold:
+                self._openedAt = time.monotonic()
+            self._trialRunning = False
+
+    def release(self):
+        """
+        Called after a request which ended without an answer or a failure of the server (cancelled)
+        """
+        with self._lock:
+            self._trialRunning = False
+
+
+def serverOf(url: str) -> str:
+    """
+    :return: scheme://host of a URL - the key of its breaker
+    """
+    parts = urlsplit(url)
+    return '{}://{}'.format(parts.scheme.lower(), parts.netloc.lower())
+
+
+_breakers: Dict[str, CircuitBreaker] = dict()
+_failureThreshold = FAILURE_THRESHOLD
+_resetTimeout = RESET_TIMEOUT
+_breakersLock = threading.Lock()
+
+
+def getBreaker(url: str) -> CircuitBreaker:
+    """
+    Returns the breaker of the server of a URL - shared by all tool queries, created on first use
+    :param url: URL of a request, or scheme://host of a server
+    """
+    server = serverOf(url)
+    with _breakersLock:
+        if server not in _breakers:
+            _breakers[server] = CircuitBreaker(server, _failureThreshold, _resetTimeout)
+        return _breakers[server]
+
+
+def configure(failureThreshold: int = FAILURE_THRESHOLD, resetTimeout: float = RESET_TIMEOUT):
+    """
+    Replaces the breakers with ones using the given settings
+    :param failureThreshold: consecutive failed requests opening a breaker
+    :param resetTimeout: seconds an open breaker fails requests before a trial request
+    """
+    global _failureThreshold, _resetTimeout
+    with _breakersLock:
+        _failureThreshold = failureThreshold
+        _resetTimeout = resetTimeout
+        _breakers.clear()
+
+
+if __name__ == '__main__':
+    # a dead server opening its breaker, failing fast, then closing after a successful trial
+    breaker = CircuitBreaker('http://example.org', failureThreshold=3, resetTimeout=0.2)
+    for _ in range(3):
+        breaker.before()
+        breaker.failure()
+    try:
+        breaker.before()
+    except CircuitOpenError as e:
+        print(e)
+    time.sleep(0.25)
+    breaker.before()
+    print('trial request: {}'.format(breaker.state))
+    breaker.success()
+    print('after a successful trial: {}'.format(breaker.state))
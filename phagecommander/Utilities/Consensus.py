@@ -0,0 +1,455 @@
+"""
+Consensus of the calls of several tools
+Calls are grouped by their record and strand aware position - the stop of forward genes and the start of reverse
+genes - and the group sizes, majority starts and tool membership are computed as array operations on a GeneTable
+Used by the gene tables of the main window and by the Genbank / Excel exports
+"""
+
+from typing import Callable, Iterable, List, NamedTuple
+import numpy as np
+from phagecommander.Utilities.GeneTable import GeneTable, FORWARD, TRNA
+
+
+class GroupChange(NamedTuple):
+    """
+    Groups of a ConsensusGroups after the calls of one tool changed (see ConsensusGroups.setTool)
+    """
+    # group before the change of each group - -1 for new groups
+    previous: np.ndarray
+    # True for the groups whose calls changed - new groups included
+    changed: np.ndarray
+    # number of groups before the change
+    previousCount: int
+
+
+class ConsensusGroups:
+    """
+    Class for representing the calls of several tools grouped into genes
+    Attributes (arrays over the calls, in group order):
+        table - GeneTable of the calls sorted by group
+        group - group of each call
+        altEnd - end of each call which may differ within a group (start of forward genes, stop of reverse genes)
+        altRank - rank of the call's altEnd in its group: the majority altEnds first, then the others, each in
+                  order of first appearance
+        altCount - number of calls of the group with the same altEnd - the same start, stop and strand
+    Attributes (arrays over the groups):
+        bounds - first call of each group, followed by the number of calls
+        counts - number of calls
+        majorityCalls - number of calls sharing the most common altEnd
+        isTrna - True if the first call of the group is a tRNA
+    tools - order of the tools within each group
+    """
+
+    def __init__(self, genes: Iterable, tools: List[str] = None):
+        """
+        :param genes: GeneTable, list of GeneTables or of Genes
+        :param tools: order of the calls of the tools within each group - the order of the calls given if None
+            * the calls of one tool can then be added, replaced or removed without regrouping the others
+              (see setTool / removeTool)
+        """
+        if isinstance(genes, GeneTable):
+            table = genes
+        elif isinstance(genes, list) and all(isinstance(item, GeneTable) for item in genes):
+            table = GeneTable.concatenate(genes)
+        else:
+            table = GeneTable.fromGenes(genes)
+        self.tools = list(tools) if tools is not None else list(table.identities)
+
+        # sort by contig, position then strand - stable, so calls of a group keep the order of the tools
+        key = table.comparison
+        if tools is None:
+            order = np.lexsort((table.strand, key, table.contig))
+        else:
+            order = np.lexsort((self._toolRank(table), table.strand, key, table.contig))
+        self.table = table.take(order)
+        self._group()
+        self.majorityCalls, self.altRank, self.altCount = _rankAltEnds(self.group, self.altEnd)
+
+    def _group(self):
+        """
+        Splits the sorted calls into groups - a call starts a new group when its contig, position or strand
+        differs from the previous call
+        """
+        key = self.table.comparison
+        strand = self.table.strand
+        contig = self.table.contig
+        n = len(self.table)
+
+        newGroup = np.ones(n, dtype=bool)
+        if n:
+            newGroup[1:] = (key[1:] != key[:-1]) | (strand[1:] != strand[:-1]) | (contig[1:] != contig[:-1])
+        starts = np.flatnonzero(newGroup)
+        self.bounds = np.append(starts, n)
+        self.counts = np.diff(self.bounds)
+        self.group = np.cumsum(newGroup) - 1
+        self.isTrna = self.table.kind[starts] == TRNA if n else np.zeros(0, dtype=bool)
+        self.altEnd = np.where(strand == FORWARD, self.table.start, self.table.stop)
+
+    def _toolRank(self, table: GeneTable) -> np.ndarray:
+        """
+        Position of the tool of each call of a table in tools - calls of other tools come last
+        """
+        ranks = np.array([self.tools.index(identity) if identity in self.tools else len(self.tools)
+                          for identity in table.identities], dtype=np.int64)
+        return ranks[table.identity] if len(ranks) else np.zeros(len(table), dtype=np.int64)
+
+    def setTool(self, tool: str, calls) -> GroupChange:
+        """
+        Adds the calls of a tool, replacing its previous calls if any
+        Only the groups gaining or losing calls are recounted - the other groups keep their counts and ranks
+        :param tool: tool name - added after the other tools if it is not in tools
+        :param calls: GeneTable or list of Genes of the tool
+        :return: GroupChange of the groups
+        """
+        if tool not in self.tools:
+            self.tools.append(tool)
+        # copy labelled with the tool - the table given is not changed
+        calls = GeneTable.fromGenes(calls).take(slice(None))
+        calls.identity = np.zeros(len(calls), dtype=np.int16)
+        calls.identities = [tool]
+        return self._replace(tool, calls)
+
+    def removeTool(self, tool: str) -> GroupChange:
+        """
+        Removes the calls of a tool
+        :param tool: tool name
+        :return: GroupChange of the groups
+        """
+        change = self._replace(tool, GeneTable.fromGenes([]))
+        if tool in self.tools:
+            self.tools.remove(tool)
+        return change
+
+    def _replace(self, tool: str, calls: GeneTable) -> GroupChange:
+        """
+        Replaces the calls of a tool by calls and regroups - the new calls are merged into the sorted calls
+        """
+        n = len(self.table)
+        previousCount = len(self)
+        joined = GeneTable.concatenate([self.table, calls])
+        if tool in joined.identities:
+            removed = joined.identity[:n] == joined.identities.index(tool)
+        else:
+            removed = np.zeros(n, dtype=bool)
+        kept = np.flatnonzero(~removed)
+        added = np.arange(n, len(joined))
+
+        # calls sorted as __init__ sorts them - by contig, position, strand then tool
+        rank = self._toolRank(joined)
+        score = _packKeys((joined.contig, joined.comparison, joined.strand, rank), len(joined))
+        keptScore = score[kept] if score is not None else None
+        if keptScore is None or np.any(keptScore[1:] < keptScore[:-1]):
+            # keys too wide to pack, or calls not in tool order within their groups - sorted again
+            rows = np.concatenate((kept, added))
+            order = rows[np.lexsort((rank[rows], joined.strand[rows], joined.comparison[rows], joined.contig[rows]))]
+        else:
+            # the kept calls are sorted - the new calls are inserted at their place
+            added = added[np.argsort(score[added], kind='stable')]
+            isAdded = np.zeros(len(kept) + len(added), dtype=bool)
+            isAdded[np.searchsorted(keptScore, score[added], side='right') + np.arange(len(added))] = True
+            order = np.empty(len(isAdded), dtype=np.int64)
+            order[isAdded] = added
+            order[~isAdded] = kept
+
+        previousGroup = self.group
+        previousMajority = self.majorityCalls
+        previousRank = self.altRank
+        previousAltCount = self.altCount
+        self.table = joined.take(order)
+        self._group()
+
+        # group of each kept call before the update
+        isKept = order < n
+        keptFrom = order[isKept]
+        previous = np.full(len(self), -1, dtype=np.int64)
+        previous[self.group[isKept]] = previousGroup[keptFrom]
+
+        # groups with a new call, or which lost a call
+        changed = np.zeros(len(self), dtype=bool)
+        changed[self.group[~isKept]] = True
+        # one more entry, read by the new groups (previous -1)
+        lostCall = np.zeros(previousCount + 1, dtype=bool)
+        lostCall[previousGroup[removed]] = True
+        changed |= lostCall[previous]
+
+        # unchanged groups keep their counts and ranks - the changed groups are ranked again
+        self.altRank = np.empty(len(self.table), dtype=np.int64)
+        self.altCount = np.empty(len(self.table), dtype=np.int64)
+        self.altRank[isKept] = previousRank[keptFrom]
+        self.altCount[isKept] = previousAltCount[keptFrom]
+        self.majorityCalls = np.empty(len(self), dtype=previousMajority.dtype)
+        self.majorityCalls[~changed] = previousMajority[previous[~changed]]
+
+        rows = np.flatnonzero(changed[self.group])
+        if len(rows):
+            rowGroup = self.group[rows]
+            localGroup = np.cumsum(np.r_[True, rowGroup[1:] != rowGroup[:-1]]) - 1
+            majority, altRank, altCount = _rankAltEnds(localGroup, self.altEnd[rows])
+            self.majorityCalls[changed] = majority
+            self.altRank[rows] = altRank
+            self.altCount[rows] = altCount
+
+        return GroupChange(previous, changed, previousCount)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield list(self.calls(index))
+
+    def calls(self, index: int) -> GeneTable:
+        """
+        :param index: group
+        :return: GeneTable of the calls of the group
+        """
+        return self.table[self.bounds[index]:self.bounds[index + 1]]
+
+    def toolCounts(self, tools: List[str]) -> np.ndarray:
+        """
+        Number of calls of each tool in each group
+        :param tools: tools - in column order
+        :return: array of groups x tools
+        """
+        counts = np.zeros((len(self), len(tools)), dtype=np.int32)
+        columns = np.array([tools.index(identity) if identity in tools else -1
+                            for identity in self.table.identities], dtype=np.int64)
+        if len(columns):
+            toolColumn = columns[self.table.identity]
+            known = toolColumn >= 0
+            np.add.at(counts, (self.group[known], toolColumn[known]), 1)
+        return counts
+
+    def toolCalls(self, tools: List[str]) -> np.ndarray:
+        """
+        Call of each tool in each group - the last call of the tool if it has several
+        :param tools: tools - in column order
+        :return: array of groups x tools of rows of table, -1 if the tool did not call the group
+        """
+        calls = np.full((len(self), len(tools)), -1, dtype=np.int64)
+        columns = np.array([tools.index(identity) if identity in tools else -1
+                            for identity in self.table.identities], dtype=np.int64)
+        if len(self.table):
+            toolColumn = columns[self.table.identity]
+            known = np.flatnonzero(toolColumn >= 0)
+            np.maximum.at(calls, (self.group[known], toolColumn[known]), known)
+        return calls
+
+    def select(self, comparisonFunc: Callable[[int], bool], exportRNA: bool = True) -> np.ndarray:
+        """
+        Groups kept by an export filter (see GeneUtils.filterGenes)
+        :param comparisonFunc: function of the number of calls of a group, True to keep the group
+        :param exportRNA: True to keep tRNA groups whatever their number of calls, False to drop them
+        :return: boolean mask over the groups
+        """
+        # the function is only evaluated once per distinct group size
+        sizes = np.unique(self.counts)
+        keptSizes = [size for size in sizes if comparisonFunc(int(size))]
+        mask = np.isin(self.counts, keptSizes)
+        if exportRNA:
+            return mask | self.isTrna
+        return mask & ~self.isTrna
+
+    def mostOccurrences(self, groups: np.ndarray = None) -> GeneTable:
+        """
+        Most frequent call of each group - ties are broken by the longest call
+        (see GeneUtils.findMostGeneOccurrences)
+        :param groups: boolean mask of the groups to consider, all if None
+        :return: GeneTable of one call per group
+        """
+        rows = self._best(self.altCount, self.table.length, groups=groups)
+        return self.table.take(rows)
+
+    def longest(self, groups: np.ndarray = None) -> GeneTable:
+        """
+        Longest call of each group (see GeneUtils.findLongestGene)
+        :param groups: boolean mask of the groups to consider, all if None
+        :return: GeneTable of one call per group
+        """
+        rows = self._best(self.table.length, groups=groups)
+        return self.table.take(rows)
+
+    def specificProgram(self, program: str, groups: np.ndarray = None) -> GeneTable:
+        """
+        Call of a tool in each group - the most frequent call if the tool did not call the group
+        (see GeneUtils.useSpecificProgram)
+        :param program: tool name
+        :param groups: boolean mask of the groups to consider, all if None
+        :return: GeneTable of one call per group
+        """
+        if program in self.table.identities:
+            isProgram = (self.table.identity == self.table.identities.index(program)).astype(np.int64)
+        else:
+            isProgram = np.zeros(len(self.table), dtype=np.int64)
+        # calls of the tool win, the first of them if several - otherwise the most frequent, then the longest
+        isOther = 1 - isProgram
+        rows = self._best(isProgram, self.altCount * isOther, self.table.length * isOther, groups=groups)
+        return self.table.take(rows)
+
+    def _best(self, *keys, groups=None) -> np.ndarray:
+        """
+        Row of each group with the highest keys - ties go to the first call of the group
+        The keys are packed into one score, so the rows are found in a single pass over the groups
+        :param keys: arrays over the calls, compared in order
+        :param groups: boolean mask of the groups to consider, all if None
+        :return: array of rows
+        """
+        firsts = self.bounds[:-1]
+        score = _packKeys(keys, len(self.table))
+        if not len(self):
+            rows = firsts
+        elif score is None:
+            # keys too wide to pack - sorted instead, lexsort sorts by its last key first and ascending
+            position = np.arange(len(self.table))
+            order = np.lexsort((position,) + tuple(-key for key in reversed(keys)) + (self.group,))
+            rows = order[firsts]
+        else:
+            # calls are in group order - the first call reaching the best score of its group
+            candidates = np.flatnonzero(score == np.maximum.reduceat(score, firsts)[self.group])
+            candidateGroups = self.group[candidates]
+            rows = candidates[np.r_[True, candidateGroups[1:] != candidateGroups[:-1]]]
+        return rows if groups is None else rows[groups]
+
+
+def _rankAltEnds(group: np.ndarray, altEnd: np.ndarray):
+    """
+    Counts the altEnds of each group and ranks them the way the table colors them
+    :param group: group of each call - sorted, numbered from 0
+    :param altEnd: altEnd of each call
+    :return: (majorityCalls of each group, altRank, altCount of each call)
+    """
+    n = len(group)
+    position = np.arange(n)
+    # (group, altEnd) pairs - sorted by group, altEnd, then order of appearance
+    pairOrder = np.lexsort((position, altEnd, group))
+    pairGroup = group[pairOrder]
+    pairAltEnd = altEnd[pairOrder]
+    newPair = np.ones(n, dtype=bool)
+    if n:
+        newPair[1:] = (pairGroup[1:] != pairGroup[:-1]) | (pairAltEnd[1:] != pairAltEnd[:-1])
+    pairStarts = np.flatnonzero(newPair)
+    pairCounts = np.diff(np.append(pairStarts, n))
+    pairFirst = pairOrder[pairStarts]
+    pairOfGroup = pairGroup[pairStarts]
+
+    # pairs of a group are contiguous - most common altEnd of each group
+    groupPairStarts = np.flatnonzero(np.r_[True, pairOfGroup[1:] != pairOfGroup[:-1]]) if n else pairStarts
+    majorityCalls = np.maximum.reduceat(pairCounts, groupPairStarts) if n else np.zeros(0, dtype=int)
+    isMajority = pairCounts == majorityCalls[pairOfGroup]
+
+    # majority altEnds first, then the rest, each by first appearance
+    rankOrder = np.lexsort((pairFirst, ~isMajority, pairOfGroup))
+    pairRank = np.empty(len(pairStarts), dtype=np.int64)
+    pairRank[rankOrder] = np.arange(len(pairStarts)) - groupPairStarts[pairOfGroup[rankOrder]]
+
+    altRank = np.empty(n, dtype=np.int64)
+    altRank[pairOrder] = pairRank[np.cumsum(newPair) - 1]
+    altCount = np.empty(n, dtype=np.int64)
+    altCount[pairOrder] = pairCounts[np.cumsum(newPair) - 1]
+    return majorityCalls, altRank, altCount
+
+
+def _packKeys(keys, n: int):
+    """
+    Single score ordered as the keys are, compared in order
+    :param keys: integer arrays over the calls
+    :param n: number of calls
+    :return: int64 array, None if the ranges of the keys do not fit in 63 bits
+    """
+    score = np.zeros(n, dtype=np.int64)
+    span = 1
+    for key in keys:
+        key = np.asarray(key, dtype=np.int64)
+        if not n:
+            continue
+        low = int(key.min())
+        width = int(key.max()) - low + 1
+        span *= width
+        if span >= 2 ** 62:
+            return None
+        score = score * width + (key - low)
+    return score
+
+
+def groupGenes(genes: Iterable) -> List[List]:
+    """
+    Groups the Genes which represent the same gene (same stop for +, same start for -)
+    :param genes: GeneTable, list of GeneTables or of Genes
+    :return: List[List[Gene]] in order of stops/starts
+    """
+    return list(ConsensusGroups(genes))
+
+
+if __name__ == '__main__':
+    # benchmark - grouping and consensus of a million calls against the previous pure Python grouping
+    import random
+    import time
+    from phagecommander import Gene
+
+    random.seed(0)
+    N_CALLS = 1000000
+    TOOLS = ['glimmer', 'genemark', 'heuristic', 'genemarks', 'genemarks2', 'prodigal', 'rast', 'metagene', 'hmm']
+
+    builder = GeneTable.Builder()
+    position = 0
+    while len(builder._columns[0]) < N_CALLS:
+        position += random.randrange(100, 1500)
+        direction = random.choice('+-')
+        for tool in random.sample(TOOLS, random.randrange(1, len(TOOLS) + 1)):
+            otherEnd = position - random.choice((300, 300, 330, 360)) if direction == '+' else \
+                position + random.choice((300, 300, 330, 360))
+            if direction == '+':
+                builder.add(otherEnd, position, direction, position - otherEnd + 1, tool)
+            else:
+                builder.add(position, otherEnd, direction, otherEnd - position + 1, tool)
+    table = builder.build()
+
+    startTime = time.perf_counter()
+    groups = ConsensusGroups(table)
+    groupTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    selected = groups.select(lambda x: x >= 3)
+    consensus = groups.mostOccurrences(selected)
+    toolCounts = groups.toolCounts(TOOLS)
+    consensusTime = time.perf_counter() - startTime
+    print('{} calls, {} groups: grouping {:.3f} s, selection + consensus + tool counts {:.3f} s'.format(
+        len(table), len(groups), groupTime, consensusTime))
+
+    # one tool queried again - its calls replaced in the groups of all tools, against grouping everything again
+    # then a tool with few calls added, as a tRNA tool would be
+    tables = [table.take(table.identity == table.identities.index(tool)) for tool in TOOLS]
+    sparse = table.take(slice(0, len(table), 1000))
+    groups = ConsensusGroups(tables, tools=TOOLS)
+    for tool, calls in (('rast', tables[TOOLS.index('rast')]), ('aragorn', sparse)):
+        startTime = time.perf_counter()
+        change = groups.setTool(tool, calls)
+        updateTime = time.perf_counter() - startTime
+        if tool == 'aragorn':
+            tables.append(groups.table.take(groups.table.identity == groups.table.identities.index(tool)))
+        startTime = time.perf_counter()
+        rebuilt = ConsensusGroups(tables, tools=groups.tools)
+        rebuildTime = time.perf_counter() - startTime
+        print('{} calls of {} set: {} groups changed, {:.3f} s - grouping again {:.3f} s'.format(
+            len(calls), tool, int(change.changed.sum()), updateTime, rebuildTime))
+
+    # a sample against the pure Python grouping and consensus
+    sample = table.take(slice(0, 20000)).toGenes()
+    startTime = time.perf_counter()
+    expectedGroups = []
+    for gene in Gene.GeneUtils.sortGenes(sample):
+        if expectedGroups and gene.geneKey == expectedGroups[-1][-1].geneKey:
+            expectedGroups[-1].append(gene)
+        else:
+            expectedGroups.append([gene])
+    expected = [Gene.GeneUtils.findMostGeneOccurrences(geneSet) for geneSet in expectedGroups]
+    longest = [Gene.GeneUtils.findLongestGene(geneSet) for geneSet in expectedGroups]
+    specific = [Gene.GeneUtils.useSpecificProgram(geneSet, 'rast') for geneSet in expectedGroups]
+    pythonTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    sampleGroups = ConsensusGroups(sample)
+    results = (sampleGroups.mostOccurrences(), sampleGroups.longest(), sampleGroups.specificProgram('rast'))
+    vectorTime = time.perf_counter() - startTime
+    print('{} calls: pure Python {:.3f} s, vectorized {:.3f} s'.format(
+        len(sample), pythonTime, vectorTime))
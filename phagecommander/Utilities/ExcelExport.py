@@ -0,0 +1,141 @@
+"""
+Export of the consensus tables to Excel spreadsheets
+Rows are built from the arrays of a ConsensusGroups and streamed to disk with openpyxl's write-only mode, so the
+workbook is never held in memory, and each distinct cell style is built once and shared by all of its cells
+Same layout as the tables of the main window: TOTAL CALLS, ALL, ONE, CONTIG (multi-record sequences only), then
+direction, start, stop and length of each tool's call
+"""
+
+from typing import Callable, List, Tuple
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from phagecommander.Utilities.Consensus import ConsensusGroups
+from phagecommander.Utilities.GeneTable import FORWARD
+
+# columns of each tool - direction, start, stop, length - then a blank separator column
+TOOL_COLUMNS = 4
+TOOL_STRIDE = TOOL_COLUMNS + 1
+
+# function of the number of calls of a row -> (cell color, text colors by rank - see ColorPalette) as 'rrggbb'
+RowColors = Callable[[int], Tuple[str, List[str]]]
+
+
+def workbook() -> Workbook:
+    """
+    :return: write-only Workbook - sheets are added with writeSheet
+    """
+    return Workbook(write_only=True)
+
+
+def save(wb: Workbook, fileName: str):
+    """
+    Writes the workbook to file - a workbook without sheets gets an empty one
+    :param wb: Workbook from workbook()
+    :param fileName: name of the file to write to
+    """
+    if not wb.worksheets:
+        wb.create_sheet('Sheet')
+    wb.save(fileName)
+
+
+def headers(groups: ConsensusGroups, tools: List[str]) -> List[str]:
+    """
+    Column headers of the table of a set of calls
+    :param groups: ConsensusGroups of the calls
+    :param tools: tools shown, in column order
+    """
+    names = ['TOTAL CALLS', 'ALL', 'ONE'] + (['CONTIG'] if groups.table.contigs else [])
+    for ind, tool in enumerate(tools):
+        names.extend([tool.upper()] * TOOL_COLUMNS)
+        if ind != len(tools) - 1:
+            names.append('')
+    return names
+
+
+class _Styles:
+    """
+    Cells of a write-only sheet - each combination of fill, text color and weight is added to the workbook once as a
+    NamedStyle, which its cells then refer to by name
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._names = dict()
+
+    def cell(self, value, fill: str = None, color: str = None, bold: bool = False) -> WriteOnlyCell:
+        key = (fill, color, bold)
+        name = self._names.get(key)
+        if name is None:
+            name = 'Phage Commander {} {} {}'.format(fill or 'none', color or 'auto', 'bold' if bold else 'regular')
+            if name not in self.ws.parent.named_styles:
+                style = NamedStyle(name, alignment=Alignment(horizontal='center'))
+                if fill is not None:
+                    style.fill = PatternFill(fgColor=fill, fill_type='solid')
+                if color is not None or bold:
+                    style.font = Font(color=color, bold=bold)
+                self.ws.parent.add_named_style(style)
+            self._names[key] = name
+        cell = WriteOnlyCell(self.ws, value)
+        cell.style = name
+        return cell
+
+
+def writeSheet(wb: Workbook, label: str, groups: ConsensusGroups, tools: List[str], colors: RowColors = None):
+    """
+    Adds the table of a set of calls to the workbook as a new sheet
+    :param wb: Workbook from workbook()
+    :param label: name of the sheet
+    :param groups: ConsensusGroups of the calls
+    :param tools: tools shown, in column order
+    :param colors: colors of the rows - the cells are not colored if None
+    """
+    ws = wb.create_sheet(label)
+    styles = _Styles(ws)
+    ws.append([styles.cell(name, bold=True) for name in headers(groups, tools)])
+
+    # plain python values of the arrays
+    table = groups.table
+    contigs = table.contigs
+    firstToolColumn = 3 + (1 if contigs else 0)
+    toolCalls = groups.toolCalls(tools).tolist()
+    counts = groups.counts.tolist()
+    mixed = (groups.majorityCalls != groups.counts).tolist()
+    firstCalls = groups.bounds[:-1].tolist()
+    forward = (table.strand == FORWARD).tolist()
+    starts = table.start.tolist()
+    stops = table.stop.tolist()
+    lengths = table.length.tolist()
+    altRanks = groups.altRank.tolist()
+    contigCodes = table.contig.tolist()
+
+    emptyCall = (None,) * TOOL_COLUMNS
+    rowColors = dict()
+    for row, count in enumerate(counts):
+        values = [count, 'X' if count == len(tools) else None, 'X' if count == 1 and count != len(tools) else None]
+        if contigs:
+            values.append(contigs[contigCodes[firstCalls[row]]])
+        for toolIndex, call in enumerate(toolCalls[row]):
+            if toolIndex:
+                values.append(None)
+            if call < 0:
+                values.extend(emptyCall)
+            else:
+                values.extend(('+' if forward[call] else '-', starts[call], stops[call], lengths[call]))
+
+        if colors is None:
+            ws.append(values)
+            continue
+
+        if count not in rowColors:
+            rowColors[count] = colors(count)
+        cellColor, textColors = rowColors[count]
+        # the start (+) / stop (-) of each call of a row whose calls do not all agree is colored by its rank
+        ranks = dict()
+        if mixed[row]:
+            for toolIndex, call in enumerate(toolCalls[row]):
+                if call >= 0:
+                    column = firstToolColumn + toolIndex * TOOL_STRIDE + (1 if forward[call] else 2)
+                    ranks[column] = min(altRanks[call], len(textColors) - 1)
+        ws.append([styles.cell(value, cellColor, textColors[ranks.get(column, 0)])
+                   for column, value in enumerate(values)])
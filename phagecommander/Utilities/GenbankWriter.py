@@ -0,0 +1,242 @@
+"""
+Streaming writer of GenBank files
+Records are written straight from the columns of a GeneTable and the sequence - no Seq, SeqFeature or SeqRecord is
+built - and the output is the same, byte for byte, as SeqIO.write of the record built by GeneUtils.genbankRecord
+The sequence is lowercased block by block, so no lowercase copy of the whole genome is made
+"""
+
+from typing import Iterable, TextIO, Tuple
+import numpy as np
+from phagecommander.Utilities import GeneTable
+
+MAX_WIDTH = 80
+QUALIFIER_INDENT = 21
+QUALIFIER_INDENT_STR = ' ' * QUALIFIER_INDENT
+LETTERS_PER_LINE = 60
+SEQUENCE_INDENT = 9
+# bases lowercased at once when writing the ORIGIN block
+SEQUENCE_BLOCK = LETTERS_PER_LINE * 1000
+
+# header lines of a record without annotations, after the LOCUS line
+_HEADER = ('DEFINITION  .\n'
+           'ACCESSION   <unknown id>\n'
+           'VERSION     <unknown id>\n'
+           'KEYWORDS    .\n'
+           'SOURCE      .\n'
+           '  ORGANISM  .\n'
+           '            .\n'
+           'FEATURES             Location/Qualifiers\n')
+
+# feature key lines - the key padded to the qualifier column
+_GENE_KEY = '     gene'.ljust(QUALIFIER_INDENT)
+_CDS_KEY = '     CDS'.ljust(QUALIFIER_INDENT)
+_TRNA_KEY = '     TRNA'.ljust(QUALIFIER_INDENT)
+
+
+class GenbankWriter:
+    """
+    Class for writing genes as GenBank records to an open text file
+    """
+
+    def __init__(self, handle: TextIO):
+        """
+        :param handle: file opened for writing in text mode
+        """
+        self.handle = handle
+
+    def writeRecord(self, name: str, sequence, genes):
+        """
+        Writes one GenBank record
+        :param name: locus name of the record - without whitespace
+        :param sequence: DNA sequence - str or Bio.Seq.Seq, of any case
+        :param genes: GeneTable or list of Genes / TRNAs
+        """
+        write = self.handle.write
+        length = len(sequence)
+        write(locusLine(name, length))
+        write(_HEADER)
+
+        table = GeneTable.GeneTable.fromGenes(genes)
+        # genes in order of their stop (+) / start (-), as GeneUtils.sortGenes
+        comparison = np.where(table.strand == GeneTable.FORWARD, table.stop, table.start)
+        order = np.argsort(comparison, kind='stable')
+
+        starts = table.start[order].tolist()
+        stops = table.stop[order].tolist()
+        strands = table.strand[order].tolist()
+        kinds = table.kind[order].tolist()
+        trnaTypes = table.trnaType[order].tolist()
+        for ind, (start, stop, strand, kind, trnaType) in enumerate(zip(starts, stops, strands, kinds, trnaTypes),
+                                                                    1):
+            location = _wrapLocation(featureLocation(start, stop, strand, length))
+            qualifier = '{}/gene={}\n'.format(QUALIFIER_INDENT_STR, ind)
+            write(_GENE_KEY + location + '\n' + qualifier)
+            if kind == GeneTable.TRNA:
+                note = table.trnaTypes[trnaType]
+                write(_TRNA_KEY + location + '\n' + qualifier)
+                write(_qualifier('note', note))
+                write(_qualifier('product', note.split('(')[0]))
+            else:
+                write(_CDS_KEY + location + '\n' + qualifier)
+
+        self.writeSequence(sequence)
+        write('//\n')
+
+    def writeSequence(self, sequence):
+        """
+        Writes the ORIGIN block of a record
+        :param sequence: DNA sequence - str or Bio.Seq.Seq
+        """
+        write = self.handle.write
+        write('ORIGIN\n')
+        length = len(sequence)
+        for blockStart in range(0, length, SEQUENCE_BLOCK):
+            block = str(sequence[blockStart:blockStart + SEQUENCE_BLOCK]).lower()
+            lines = []
+            for lineStart in range(0, len(block), LETTERS_PER_LINE):
+                line = block[lineStart:lineStart + LETTERS_PER_LINE]
+                lines.append(' '.join([str(blockStart + lineStart + 1).rjust(SEQUENCE_INDENT)] +
+                                      [line[word:word + 10] for word in range(0, len(line), 10)]))
+            write('\n'.join(lines) + '\n')
+
+
+def writeGenbank(fileName: str, records: Iterable[Tuple[str, object, object]]):
+    """
+    Writes GenBank records to a file - a multi-record GenBank file if several records are given
+    :param fileName: name of the file to write to
+    :param records: (locus name, sequence, genes) of each record, see GenbankWriter.writeRecord
+        * may be a generator - each record is written as it is produced
+    """
+    with open(fileName, 'w') as handle:
+        writer = GenbankWriter(handle)
+        for name, sequence, genes in records:
+            writer.writeRecord(name, sequence, genes)
+
+
+def locusLine(name: str, length: int) -> str:
+    """
+    LOCUS line of a DNA record
+    :param name: locus name
+    :param length: length of the sequence
+    """
+    if not name or len(name.split()) > 1:
+        raise ValueError('Invalid whitespace in {!r} for LOCUS line'.format(name))
+    length = str(length)
+    # names too long for the 80 column header push the length to the right
+    if len(name) > 16 and len(length) > 11 - (len(name) - 16):
+        nameLength = name + ' ' + length
+    else:
+        nameLength = name + length.rjust(28)[len(name):]
+    return 'LOCUS       {} bp    {} {} UNK 01-JAN-1980\n'.format(nameLength, 'DNA'.ljust(7), ' ' * 8)
+
+
+def featureLocation(start: int, stop: int, strand: int, length: int) -> str:
+    """
+    Location of a feature - calls wrapping around the genome end (start > stop) are written as a join
+    :param start: 1-based start
+    :param stop: 1-based stop
+    :param strand: GeneTable.FORWARD / REVERSE
+    :param length: length of the sequence
+    """
+    if start > stop:
+        parts = [_span(start - 1, length, length), _span(0, stop, length)]
+        if strand == GeneTable.REVERSE:
+            return 'complement(join({}))'.format(','.join(reversed(parts)))
+        return 'join({})'.format(','.join(parts))
+
+    location = _span(start - 1, stop, length)
+    return 'complement({})'.format(location) if strand == GeneTable.REVERSE else location
+
+
+def _span(begin: int, end: int, length: int) -> str:
+    """
+    Location of a 0-based, end exclusive span
+    """
+    if begin == end:
+        # point between two bases
+        return '{}^1'.format(length) if end == length else '{}^{}'.format(end, end + 1)
+    if begin + 1 == end:
+        return str(end)
+    return '{}..{}'.format(begin + 1, end)
+
+
+def _wrapLocation(location: str) -> str:
+    """
+    Splits a long location at its commas
+    """
+    width = MAX_WIDTH - QUALIFIER_INDENT
+    lines = []
+    while len(location) > width:
+        index = location[:width].rfind(',')
+        if index == -1:
+            break
+        lines.append(location[:index + 1])
+        location = location[index + 1:]
+    lines.append(location)
+    return ('\n' + QUALIFIER_INDENT_STR).join(lines)
+
+
+def _qualifier(key: str, value: str) -> str:
+    """
+    Quoted qualifier lines - long values are wrapped at spaces when possible
+    """
+    line = '{}/{}="{}"'.format(QUALIFIER_INDENT_STR, key, value.replace('"', '""'))
+    if len(line) <= MAX_WIDTH:
+        return line + '\n'
+
+    lines = []
+    while line.lstrip():
+        if len(line) <= MAX_WIDTH:
+            lines.append(line)
+            break
+        index = MAX_WIDTH
+        for space in range(min(len(line) - 1, MAX_WIDTH), QUALIFIER_INDENT + 1, -1):
+            if line[space] == ' ':
+                index = space
+                break
+        lines.append(line[:index])
+        line = QUALIFIER_INDENT_STR + line[index:].lstrip()
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    # benchmark - time of SeqIO.write of the Biopython record and of the streaming writer
+    # (see tests/test_genbankwriter.py for the check of the output against SeqIO.write)
+    import io
+    import random
+    import time
+    from Bio import SeqIO
+    from phagecommander import Gene
+
+    random.seed(0)
+
+    def randomGenes(length, count):
+        genes = []
+        for _ in range(count):
+            start = random.randrange(1, length + 1)
+            # mostly regular calls, some wrapping around the genome end and some single base calls
+            stop = random.choice([min(length, start + random.randrange(0, 3000)),
+                                  random.randrange(1, start) if start > 1 else start,
+                                  start])
+            direction = random.choice('+-')
+            if random.random() < 0.1:
+                trnaType = random.choice(['tRNA-Met(cat)', 'tRNA-Pseudo(tta)', 'tRNA-"Sec"(tca)',
+                                          'tRNA-' + ' '.join(['very long type'] * 8) + '(nnn)'])
+                genes.append(Gene.TRNA(start, stop, direction, trnaType, length))
+            else:
+                genes.append(Gene.Gene(start, stop, direction, 'tool', length))
+        return genes
+
+    # batch sized genome
+    sequence = ''.join(random.choice('ACGT') for _ in range(5000000))
+    genes = randomGenes(len(sequence), 5000)
+    table = GeneTable.GeneTable.fromGenes(genes)
+
+    startTime = time.perf_counter()
+    SeqIO.write([Gene.GeneUtils.genbankRecord(sequence.lower(), table, 'genome')], io.StringIO(), 'genbank')
+    biopythonTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    GenbankWriter(io.StringIO()).writeRecord('genome', sequence, table)
+    streamTime = time.perf_counter() - startTime
+    print('5 Mb genome, 5000 genes: Biopython {:.3f} s, streaming {:.3f} s'.format(biopythonTime, streamTime))
@@ -0,0 +1,335 @@
+"""
+Columnar storage of the genes called by a tool
+A call is a row of typed numpy columns instead of a Gene object with its own __dict__ - about 20 bytes per call
+instead of several hundred - so metagenomes with hundreds of thousands of calls per tool fit in memory
+Rows are read through light Gene / TRNA views, so code using gene.start, gene.identity, isinstance(gene, TRNA)...
+works unchanged
+Calls of a multi-record fasta file keep the coordinates of their own record - the contig column tells the record
+"""
+
+from typing import Iterable, List
+import numpy as np
+from phagecommander import Gene
+from phagecommander.Utilities.IntervalIndex import IntervalIndex
+
+# row kinds
+GENE = 0
+TRNA = 1
+
+# strand column values
+FORWARD = 1
+REVERSE = -1
+
+_STRANDS = {'+': FORWARD, '-': REVERSE}
+
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+class GeneTable:
+    """
+    Class for representing a list of Genes / TRNAs as columns
+    Columns:
+        start, stop, length - int32, int64 only for positions past 2**31
+        strand - int8, FORWARD / REVERSE
+        kind - int8, GENE / TRNA
+        identity - int16, index into identities (tool of the call)
+        trnaType - int16, index into trnaTypes, -1 for genes
+        contig - int32, index into contigs, -1 for calls on a single record sequence
+    Behaves as an immutable sequence of Gene / TRNA views
+    """
+
+    def __init__(self, start, stop, strand, length, kind, identity, trnaType, identities: List = None,
+                 trnaTypes: List[str] = None, totalLength: int = 0, contig=None, contigs: List[str] = None,
+                 contigLengths: List[int] = None):
+        """
+        Use fromGenes or a Builder to create a table
+        :param totalLength: length of the DNA sequence - 0 if unknown
+        :param contig: contig column - all -1 if not given
+        :param contigs: ids of the records of a multi-record sequence
+        :param contigLengths: length of each record, in the order of contigs
+        """
+        self.start = _positions(start)
+        self.stop = _positions(stop)
+        self.strand = np.asarray(strand, dtype=np.int8)
+        self.length = _positions(length)
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.identity = np.asarray(identity, dtype=np.int16)
+        self.trnaType = np.asarray(trnaType, dtype=np.int16)
+        self.identities = list(identities) if identities is not None else []
+        self.trnaTypes = list(trnaTypes) if trnaTypes is not None else []
+        self.totalLength = totalLength
+        self.contig = np.asarray(contig if contig is not None else np.full(len(self.start), -1), dtype=np.int32)
+        self.contigs = list(contigs) if contigs is not None else []
+        self.contigLengths = list(contigLengths) if contigLengths is not None else []
+        # IntervalIndex - built on first use
+        self._intervalIndex = None
+        # tables of each contig - built on first use
+        self._contigTables = dict()
+
+    @classmethod
+    def fromGenes(cls, genes: Iterable['Gene.GeneFeature'], totalLength: int = 0) -> 'GeneTable':
+        """
+        Creates a table of Gene / TRNA objects
+        :param genes: Genes and TRNAs
+        :param totalLength: length of the DNA sequence
+        """
+        if isinstance(genes, GeneTable):
+            return genes
+
+        builder = cls.Builder()
+        for gene in genes:
+            if isinstance(gene, Gene.TRNA):
+                builder.add(gene.start, gene.stop, gene.direction, gene.length, gene.identity, trnaType=gene.type)
+            else:
+                builder.add(gene.start, gene.stop, gene.direction, gene.length, gene.identity)
+        return builder.build(totalLength)
+
+    @classmethod
+    def fromContigs(cls, tables: List['GeneTable'], contigs: List[str], contigLengths: List[int]) -> 'GeneTable':
+        """
+        Joins the tables of the records of a multi-record sequence - each table is the calls of one record
+        :param tables: GeneTables, one per record
+        :param contigs: ids of the records
+        :param contigLengths: length of each record
+        """
+        tables = [cls.fromGenes(table) for table in tables]
+        joined = cls.concatenate(tables)
+        # the record list is set once on the joined table - not on each table, which is quadratic in the records
+        joined.contig = np.repeat(np.arange(len(tables), dtype=np.int32), [len(table) for table in tables])
+        joined.contigs = list(contigs)
+        joined.contigLengths = list(contigLengths)
+        joined.totalLength = 0
+        return joined
+
+    @classmethod
+    def concatenate(cls, tables: Iterable['GeneTable']) -> 'GeneTable':
+        """
+        Joins tables in order - identities and tRNA types are merged
+        :param tables: GeneTables
+        """
+        tables = [cls.fromGenes(table) for table in tables]
+        identities = []
+        trnaTypes = []
+        contigs = []
+        identityCodes = []
+        trnaTypeCodes = []
+        contigCodes = []
+        lengths = dict()
+        for table in tables:
+            identityCodes.append(_remap(table.identity, table.identities, identities))
+            trnaTypeCodes.append(_remap(table.trnaType, table.trnaTypes, trnaTypes))
+            contigCodes.append(_remap(table.contig, table.contigs, contigs))
+            lengths.update(zip(table.contigs, table.contigLengths))
+
+        def join(column, dtype):
+            arrays = [getattr(table, column) for table in tables]
+            return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+        return cls(join('start', np.int32), join('stop', np.int32), join('strand', np.int8),
+                   join('length', np.int32), join('kind', np.int8),
+                   np.concatenate(identityCodes) if identityCodes else [],
+                   np.concatenate(trnaTypeCodes) if trnaTypeCodes else [],
+                   identities, trnaTypes, max((table.totalLength for table in tables), default=0),
+                   np.concatenate(contigCodes) if contigCodes else [], contigs,
+                   [lengths[contig] for contig in contigs])
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or isinstance(index, np.ndarray):
+            return self.take(index)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('GeneTable index out of range')
+        if self.kind[index] == TRNA:
+            return Gene.TRNAView(self, index)
+        return Gene.GeneView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return 'GeneTable({} rows)'.format(len(self))
+
+    def take(self, rows) -> 'GeneTable':
+        """
+        Table of a selection of rows
+        :param rows: slice, boolean mask or array of row indices
+        """
+        return GeneTable(self.start[rows], self.stop[rows], self.strand[rows], self.length[rows], self.kind[rows],
+                         self.identity[rows], self.trnaType[rows], self.identities, self.trnaTypes, self.totalLength,
+                         self.contig[rows], self.contigs, self.contigLengths)
+
+    def contigTable(self, contig) -> 'GeneTable':
+        """
+        Calls of one record of a multi-record sequence, as a table of a single record sequence
+        :param contig: id or index of the record
+        """
+        index = self.contigs.index(contig) if isinstance(contig, str) else contig
+        if index not in self._contigTables:
+            rows = self.contig == index
+            self._contigTables[index] = GeneTable(self.start[rows], self.stop[rows], self.strand[rows],
+                                                  self.length[rows], self.kind[rows], self.identity[rows],
+                                                  self.trnaType[rows], self.identities, self.trnaTypes,
+                                                  self.contigLengths[index])
+        return self._contigTables[index]
+
+    def intervalIndex(self) -> IntervalIndex:
+        """
+        Index of the rows for overlap, neighbour and region queries - built once per table
+        """
+        if self._intervalIndex is None:
+            self._intervalIndex = IntervalIndex.fromTable(self, self.totalLength)
+        return self._intervalIndex
+
+    def region(self, start: int, stop: int, contained: bool = False, contig=None) -> 'GeneTable':
+        """
+        Rows in a region of the sequence
+        :param start: first position of the region
+        :param stop: last position of the region - smaller than start for a region wrapping around the sequence end
+        :param contained: True for only the rows lying entirely in the region, False for all overlapping rows
+        :param contig: id or index of the record of the region - needed for multi-record sequences
+        """
+        if contig is not None:
+            return self.contigTable(contig).region(start, stop, contained)
+        if self.contigs:
+            raise ValueError('the region of a multi-record sequence needs a contig')
+        index = self.intervalIndex()
+        return self.take(index.within(start, stop) if contained else index.overlapping(start, stop))
+
+    def __getstate__(self):
+        # the index is rebuilt when needed
+        state = dict(self.__dict__)
+        state['_intervalIndex'] = None
+        state['_contigTables'] = dict()
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('totalLength', 0)
+        state.setdefault('_intervalIndex', None)
+        state.setdefault('_contigTables', dict())
+        state.setdefault('contig', np.full(len(state['start']), -1, dtype=np.int32))
+        state.setdefault('contigs', [])
+        state.setdefault('contigLengths', [])
+        self.__dict__.update(state)
+
+    @property
+    def comparison(self) -> np.ndarray:
+        """
+        Position which identifies a gene - the stop of forward genes and the start of reverse genes
+        (see GeneUtils.getGeneComparison)
+        """
+        return np.where(self.strand == FORWARD, self.stop, self.start)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the columns in bytes
+        """
+        return sum(column.nbytes for column in (self.start, self.stop, self.strand, self.length, self.kind,
+                                                self.identity, self.trnaType, self.contig))
+
+    def toGenes(self) -> List['Gene.GeneFeature']:
+        """
+        :return: list of standalone Gene / TRNA objects
+        """
+        return [view.toGene() for view in self]
+
+    class Builder:
+        """
+        Collects rows as a tool output is parsed
+        """
+
+        def __init__(self):
+            self._columns = ([], [], [], [], [], [], [])
+            self._identities = dict()
+            self._trnaTypes = dict()
+
+        def add(self, start: int, stop: int, direction: str, length: int, identity=None, trnaType: str = None):
+            """
+            Adds a Gene row, or a TRNA row if trnaType is given
+            """
+            strand = _STRANDS.get(direction)
+            if strand is None:
+                raise TypeError(f'Invalid direction {direction}')
+            identityCode = self._identities.setdefault(identity, len(self._identities))
+            if trnaType is None:
+                kind, trnaTypeCode = GENE, -1
+            else:
+                kind, trnaTypeCode = TRNA, self._trnaTypes.setdefault(trnaType, len(self._trnaTypes))
+
+            for column, value in zip(self._columns, (start, stop, strand, length, kind, identityCode, trnaTypeCode)):
+                column.append(value)
+
+        def build(self, totalLength: int = 0) -> 'GeneTable':
+            """
+            :param totalLength: length of the DNA sequence
+            """
+            return GeneTable(*self._columns, identities=list(self._identities), trnaTypes=list(self._trnaTypes),
+                             totalLength=totalLength)
+
+
+def _positions(values) -> np.ndarray:
+    """
+    Position column - int32 unless a position does not fit
+    """
+    if isinstance(values, np.ndarray) and values.dtype in (np.int32, np.int64):
+        return values
+    column = np.asarray(values, dtype=np.int64)
+    if column.size and (column.max() > _INT32_MAX or column.min() < -_INT32_MAX):
+        return column
+    return column.astype(np.int32)
+
+
+def _remap(codes: np.ndarray, values: list, merged: list) -> np.ndarray:
+    """
+    Maps the codes of a column from its own value list to a merged value list
+    Values missing from the merged list are appended to it - code -1 (no value) is kept
+    """
+    if not values:
+        return codes.copy()
+    for value in values:
+        if value not in merged:
+            merged.append(value)
+    mapping = np.array([merged.index(value) for value in values], dtype=codes.dtype)
+    return np.where(codes >= 0, mapping[np.maximum(codes, 0)], codes)
+
+
+if __name__ == '__main__':
+    # benchmark - memory and construction time of Gene objects against a GeneTable for a metagenome
+    # sized output of ten tools
+    import random
+    import time
+    import tracemalloc
+
+    random.seed(0)
+    N_CALLS = 100000
+    TOOLS = ['tool{}'.format(i) for i in range(10)]
+
+    rows = []
+    for tool in TOOLS:
+        for _ in range(N_CALLS // len(TOOLS)):
+            start = random.randrange(1, 50000000)
+            rows.append((str(start), str(start + random.randrange(90, 3000)), random.choice('+-'), tool))
+
+    tracemalloc.start()
+    startTime = time.perf_counter()
+    genes = [Gene.Gene(start, stop, direction, identity, 50000000) for start, stop, direction, identity in rows]
+    geneTime = time.perf_counter() - startTime
+    geneMemory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    startTime = time.perf_counter()
+    table = GeneTable.fromGenes(genes)
+    tableTime = time.perf_counter() - startTime
+
+
+    print('{} calls'.format(len(genes)))
+    print('Gene objects: {:6.1f} MB, {:.0f} bytes/call, {:.2f} s to create'.format(
+        geneMemory / 2 ** 20, geneMemory / len(genes), geneTime))
+    print('GeneTable:    {:6.1f} MB, {:.0f} bytes/call, {:.2f} s to convert'.format(
+        table.nbytes / 2 ** 20, table.nbytes / len(table), tableTime))
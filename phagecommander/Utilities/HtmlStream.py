@@ -0,0 +1,222 @@
+"""
+Single pass extraction of the payload of tool output pages
+The pages are tokenized as they are fed - no document tree is built - so parse time and memory only depend on the
+size of the payload, not on the size of the page
+"""
+
+import codecs
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List, Union
+
+# size of the pieces a complete page is fed in
+CHUNK_SIZE = 64 * 1024
+
+
+def _chunks(data: Union[str, bytes, Iterable]) -> Iterator[str]:
+    """
+    Splits page content into decoded chunks
+    :param data: page as str or bytes, or an iterable of str/bytes chunks (e.g. Response.iter_content)
+    """
+    if isinstance(data, (str, bytes)):
+        chunks = (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+    else:
+        chunks = data
+
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+
+class PreTextParser(HTMLParser):
+    """
+    Collects the text of the first <pre> element of a page
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # depth of nested <pre> elements - text is kept while inside the first one
+        self._depth = 0
+        self._parts = []
+        self.found = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'pre' and not self.done:
+            self._depth += 1
+            self.found = True
+
+    def handle_endtag(self, tag):
+        if tag == 'pre' and self._depth:
+            self._depth -= 1
+            if not self._depth:
+                self.done = True
+
+    def handle_data(self, data):
+        if self._depth:
+            self._parts.append(data)
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+
+class TableRowParser(HTMLParser):
+    """
+    Collects the cell text of each <tr> element of a page
+    Completed rows are taken with popRows as the page is fed
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._rows = []
+        # cells of the open row, None outside a row
+        self._row = None
+        # text of the open cell, None outside a cell
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._closeRow()
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._closeCell()
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self._closeCell()
+        elif tag in ('tr', 'table'):
+            self._closeRow()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def close(self):
+        super().close()
+        self._closeRow()
+
+    def popRows(self) -> List[List[str]]:
+        """
+        :return: rows completed since the last call - each a list of cell text
+        """
+        rows = self._rows
+        self._rows = []
+        return rows
+
+    def _closeCell(self):
+        if self._cell is not None:
+            self._row.append(''.join(self._cell))
+            self._cell = None
+
+    def _closeRow(self):
+        if self._row is not None:
+            self._closeCell()
+            self._rows.append(self._row)
+            self._row = None
+
+
+def preText(data: Union[str, bytes, Iterable]) -> str:
+    """
+    Text of the first <pre> element of a page - feeding stops once the element is closed
+    :param data: page as str or bytes, or an iterable of chunks
+    :return: text of the element, None if the page has no <pre> element
+    """
+    parser = PreTextParser()
+    for chunk in _chunks(data):
+        parser.feed(chunk)
+        if parser.done:
+            break
+    else:
+        parser.close()
+    return parser.text if parser.found else None
+
+
+def tableRows(data: Union[str, bytes, Iterable]) -> Iterator[List[str]]:
+    """
+    Cell text of each table row of a page, yielded as the page is fed
+    :param data: page as str or bytes, or an iterable of chunks
+    """
+    parser = TableRowParser()
+    for chunk in _chunks(data):
+        parser.feed(chunk)
+        yield from parser.popRows()
+    parser.close()
+    yield from parser.popRows()
+
+
+if __name__ == '__main__':
+    # benchmark - the streaming Aragorn and Metagene parsers against the BeautifulSoup parsers they replaced, on
+    # synthetic output pages of a large genome (see tests/test_htmlstream.py for the regression check)
+    import ast
+    import random
+    import time
+    from bs4 import BeautifulSoup
+    from phagecommander import Gene
+    from phagecommander.Utilities import Aragorn, MetagenePy
+
+    def soupAragorn(aragorn_data, totalLength, id=None):
+        soup = BeautifulSoup(aragorn_data, 'html.parser')
+        lines = soup.find('pre').text.split('\n')
+        genes = []
+        if int(lines[2].split(' ')[0]) != 0:
+            for line in lines[3:]:
+                if 'tRNA' in line:
+                    line = line.split('\t')
+                    seq_data = line[0].split()
+                    direction = '-' if seq_data[2][0] == 'c' else '+'
+                    start, stop = ast.literal_eval(seq_data[2].lstrip('c'))
+                    genes.append(Gene.TRNA(start, stop, direction, seq_data[1] + line[2], totalLength, identity=id))
+        return genes
+
+    def soupMetagene(metageneData, identity='', totalLength=0):
+        soup = BeautifulSoup(metageneData, 'html.parser')
+        genes = []
+        for line in soup.find_all('tr'):
+            cells = line.find_all('td')
+            genes.append(Gene.Gene(cells[1].text, cells[2].text, cells[3].text, identity=identity,
+                                   totalLength=totalLength))
+        return genes
+
+    random.seed(0)
+    GENOME_LENGTH = 5000000
+    N_GENES = 5000
+
+    trnaLines = []
+    for i in range(400):
+        start = random.randrange(1, GENOME_LENGTH - 100)
+        location = '[{},{}]'.format(start, start + 75)
+        if random.random() < 0.5:
+            location = 'c' + location
+        trnaLines.append('{:<4}tRNA-Leu   {:<24}\t35\t(taa)'.format(i + 1, location))
+    aragornPage = ('<html><head><title>ARAGORN</title></head><body><h3>Results</h3><pre>\n'
+                   'sequence\n{} genes found\n{}\n</pre><p>ARAGORN &copy; Laslett</p></body></html>'
+                   ).format(len(trnaLines), '\n'.join(trnaLines))
+
+    rows = []
+    for i in range(N_GENES):
+        start = random.randrange(1, GENOME_LENGTH - 3000)
+        rows.append('<tr><td>gene_{}</td><td>{}</td><td>{}</td><td>{}</td><td>0</td><td>11</td>'
+                    '<td>{:.1f}</td><td>b</td></tr>'.format(i, start, start + random.randrange(90, 3000),
+                                                          random.choice('+-'), random.random() * 100))
+    metagenePage = '<html><body><table>{}</table></body></html>'.format('\n'.join(rows))
+
+    for name, page, streaming, soup in (
+            ('Aragorn', aragornPage, lambda: Aragorn.aragorn_parse(aragornPage, GENOME_LENGTH),
+             lambda: soupAragorn(aragornPage, GENOME_LENGTH)),
+            ('Metagene', metagenePage, lambda: MetagenePy.Metagene.parse(metagenePage, '', GENOME_LENGTH),
+             lambda: soupMetagene(metagenePage, '', GENOME_LENGTH))):
+        times = []
+        for parse in (soup, streaming):
+            startTime = time.perf_counter()
+            for _ in range(5):
+                parse()
+            times.append((time.perf_counter() - startTime) / 5)
+        print('{:<9} {:>7} KB: BeautifulSoup {:7.1f} ms, streaming {:7.1f} ms ({:.1f}x)'.format(
+            name, len(page) // 1024, times[0] * 1000, times[1] * 1000, times[0] / times[1]))
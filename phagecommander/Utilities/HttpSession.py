@@ -0,0 +1,332 @@
+"""
+Shared HTTP session for the tool queries
+Every backend sends its requests through one requests.Session so connections to a server are kept alive and
+reused across submissions and polls instead of opening a new TCP/TLS connection for every request
+A request given a CancelToken (cancel=...) is aborted when the token is cancelled - the socket of the request is
+shut down and the retry backoff stops waiting, so the calling thread returns with QueryCancelledError
+Each server has its own timeouts and retries (see HOST_POLICIES) and a circuit breaker (see CircuitBreaker) - the
+requests to a server which stopped answering fail at once with CircuitOpenError
+"""
+
+import socket
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, NamedTuple, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from phagecommander.Utilities import CircuitBreaker
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+
+# number of connections kept alive per host
+DEFAULT_POOL_SIZE = 10
+# Key - scheme://host of a tool server
+# Value - number of connections kept alive to the host
+HOST_POOL_SIZES = {
+    'http://exon.gatech.edu': 8,
+    'http://18.220.233.194': 8,
+    'http://metagene.nig.ac.jp': 4,
+    'http://130.235.244.92': 4,
+    'https://pubseed.theseed.org': 2,
+    'https://rast.nmpdr.org': 2,
+}
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (15, 300)
+# retries of failed connections and gateway errors
+DEFAULT_RETRIES = 3
+# retries wait backoff * 2 ^ (retry - 1) seconds
+DEFAULT_BACKOFF = 0.5
+# server responses that are retried
+RETRY_STATUSES = (502, 503, 504)
+
+
+class HostPolicy(NamedTuple):
+    """
+    Timeouts and retries of the requests to a server
+    """
+    # (connect, read) timeout in seconds
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT
+    # retries of failed connections and gateway errors
+    retries: int = DEFAULT_RETRIES
+    # retries wait backoff * 2 ^ (retry - 1) seconds
+    backoff: float = DEFAULT_BACKOFF
+
+
+# Key - scheme://host of a tool server
+# Value - HostPolicy of the server - other servers use the timeout, retries and backoff of the session
+HOST_POLICIES = {
+    # DNA Master server (Glimmer / GeneMark) - submissions and polls are answered right away, the job runs after
+    'http://18.220.233.194': HostPolicy(timeout=(10, 60)),
+    # Aragorn and Metagene CGIs - the answer is the output of the run
+    'http://130.235.244.92': HostPolicy(timeout=(10, 300)),
+    'http://metagene.nig.ac.jp': HostPolicy(timeout=(10, 300)),
+}
+
+# CancelToken of the request made by each thread, and the functions unregistering its connections from the token
+_requestState = threading.local()
+
+
+def _requestToken() -> CancelToken:
+    return getattr(_requestState, 'token', None)
+
+
+class _CancellableConnectionMixin:
+    """
+    Connection registering its socket with the token of the request using it - cancelling the token shuts the
+    socket down, which ends a blocked send or read at once
+    A connection being established is bounded by the connect timeout instead
+    """
+
+    def connect(self):
+        token = _requestToken()
+        if token is not None:
+            token.check()
+        super().connect()
+        if token is not None:
+            _requestState.unregister.append(token.register(self._interrupt))
+
+    def request(self, *args, **kwargs):
+        # kept alive connections are reused without connecting again
+        token = _requestToken()
+        if token is not None and self.sock is not None:
+            _requestState.unregister.append(token.register(self._interrupt))
+        return super().request(*args, **kwargs)
+
+    def _interrupt(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _CancellableHTTPConnection(_CancellableConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CancellableHTTPSConnection(_CancellableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CancellableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CancellableHTTPConnection
+
+
+class _CancellableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CancellableHTTPSConnection
+
+
+class _CancellableRetry(Retry):
+    """
+    Retry whose backoff ends as soon as the request's token is cancelled
+    """
+
+    def sleep(self, response=None):
+        token = _requestToken()
+        if token is None:
+            return super().sleep(response)
+
+        seconds = None
+        if response is not None and self.respect_retry_after_header:
+            seconds = self.get_retry_after(response)
+        if seconds is None:
+            seconds = self.get_backoff_time()
+        token.wait(seconds)
+        token.check()
+
+
+class _CancellableAdapter(HTTPAdapter):
+    """
+    Adapter whose connections can be interrupted (see _CancellableConnectionMixin)
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _CancellableHTTPConnectionPool,
+                                                   'https': _CancellableHTTPSConnectionPool}
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = {'http': _CancellableHTTPConnectionPool,
+                                          'https': _CancellableHTTPSConnectionPool}
+        return manager
+
+
+class PooledSession(requests.Session):
+    """
+    Session with a connection pool per host, a default timeout and retry with backoff
+    Cookies are not stored so requests stay independent of each other, as with requests.post
+    """
+
+    def __init__(self, poolSizes: Dict[str, int] = None, defaultPoolSize: int = DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 hostPolicies: Dict[str, HostPolicy] = None):
+        """
+        :param poolSizes: dict of scheme://host: number of connections kept alive - defaults to HOST_POOL_SIZES
+        :param defaultPoolSize: number of connections kept alive to any other host
+        :param timeout: timeout of a request in seconds - a number or a (connect, read) tuple
+        :param retries: number of times a failed connection or gateway error is retried
+        :param backoff: backoff factor between retries in seconds
+        :param hostPolicies: dict of scheme://host: HostPolicy - defaults to HOST_POLICIES
+        """
+        super().__init__()
+        self.timeout = timeout
+        self.hostPolicies = HOST_POLICIES if hostPolicies is None else hostPolicies
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        # policy of the servers not in hostPolicies
+        self.defaultPolicy = HostPolicy(timeout, retries, backoff)
+        self.mount('http://', _CancellableAdapter(pool_connections=defaultPoolSize, pool_maxsize=defaultPoolSize,
+                                                  max_retries=self._retry(self.defaultPolicy)))
+        self.mount('https://', _CancellableAdapter(pool_connections=defaultPoolSize, pool_maxsize=defaultPoolSize,
+                                                   max_retries=self._retry(self.defaultPolicy)))
+        poolSizes = HOST_POOL_SIZES if poolSizes is None else poolSizes
+        for host in set(poolSizes) | set(self.hostPolicies):
+            size = poolSizes.get(host, defaultPoolSize)
+            retry = self._retry(self.hostPolicies.get(host, self.defaultPolicy))
+            self.mount(host, _CancellableAdapter(pool_connections=1, pool_maxsize=size, max_retries=retry))
+
+    @staticmethod
+    def _retry(policy: HostPolicy) -> Retry:
+        # connection errors are always safe to retry as the request never reached the server
+        # gateway errors are only retried for idempotent methods so a job is never submitted twice
+        # read errors are not retried for the same reason
+        return _CancellableRetry(total=policy.retries, connect=policy.retries, read=0, status=policy.retries,
+                                 backoff_factor=policy.backoff, status_forcelist=RETRY_STATUSES,
+                                 raise_on_status=False)
+
+    def request(self, method, url, cancel: CancelToken = None, **kwargs):
+        """
+        :param cancel: CancelToken aborting the request - None if the request cannot be cancelled
+        Raises QueryCancelledError if the token is cancelled before or while the request is made, CircuitOpenError
+        if the server stopped answering (see CircuitBreaker)
+        """
+        server = CircuitBreaker.serverOf(url)
+        policy = self.hostPolicies.get(server)
+        kwargs.setdefault('timeout', self.timeout if policy is None else policy.timeout)
+
+        breaker = CircuitBreaker.getBreaker(server)
+        breaker.before()
+        try:
+            response = self._request(method, url, cancel, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            breaker.failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+        if response.status_code >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+        return response
+
+    def _request(self, method, url, cancel: CancelToken, **kwargs):
+        if cancel is None:
+            return super().request(method, url, **kwargs)
+
+        cancel.check()
+        _requestState.token = cancel
+        _requestState.unregister = []
+        try:
+            return super().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            if cancel.cancelled:
+                raise QueryCancelledError('Query cancelled') from e
+            raise
+        finally:
+            for unregister in _requestState.unregister:
+                unregister()
+            _requestState.token = None
+            _requestState.unregister = []
+
+
+_session = None
+_sessionLock = threading.Lock()
+
+
+def getSession() -> PooledSession:
+    """
+    Returns the session shared by all tool queries - created on first use
+    """
+    global _session
+    with _sessionLock:
+        if _session is None:
+            _session = PooledSession()
+        return _session
+
+
+def configure(**kwargs) -> PooledSession:
+    """
+    Replaces the shared session with one using the given settings
+    :param kwargs: arguments of PooledSession
+    :return: the new session
+    """
+    global _session
+    with _sessionLock:
+        if _session is not None:
+            _session.close()
+        _session = PooledSession(**kwargs)
+        return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """
+    GET request through the shared session
+    """
+    return getSession().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """
+    POST request through the shared session
+    """
+    return getSession().post(url, **kwargs)
+
+
+if __name__ == '__main__':
+    # benchmark - connections opened and time taken for a run of polls against a local server
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    POLLS = 200
+
+    class PollHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body are written separately - avoid waiting on delayed ACKs
+        disable_nagle_algorithm = True
+        connections = 0
+
+        def setup(self):
+            super().setup()
+            PollHandler.connections += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            body = b'not ready'
+            self.send_response(202)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PollHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/poll'.format(server.server_address[1])
+
+    for name, poster in (('requests.post', requests.post), ('shared session', post)):
+        PollHandler.connections = 0
+        startTime = time.perf_counter()
+        for _ in range(POLLS):
+            poster(url, data={'key': 'job'}).raise_for_status()
+        elapsed = time.perf_counter() - startTime
+        print('{:>15}: {} polls, {} connections, {:.2f} ms/poll'.format(name, POLLS, PollHandler.connections,
+                                                                       elapsed / POLLS * 1000))
+
+    server.shutdown()
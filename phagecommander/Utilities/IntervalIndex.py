@@ -0,0 +1,215 @@
+"""
+Index of the intervals of gene calls for spatial queries
+Calls which wrap around the end of a circular genome (start > stop) are split into two segments, so every query
+is a binary search over sorted segment endpoints instead of a scan of every call
+Coordinates are 1-based and inclusive, as in Gene
+"""
+
+from typing import Optional
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    Class for representing the intervals of a set of calls
+    Overlap queries use the segments sorted by start with the running maximum of their stops: the candidates of a
+    query are found with two binary searches - O(log n + k), k being bounded by the calls spanning the query
+    """
+
+    def __init__(self, start, stop, totalLength: int = 0):
+        """
+        :param start: array of call starts
+        :param stop: array of call stops - smaller than the start for calls wrapping around the genome end
+        :param totalLength: length of the genome - needed for wrapped calls and circular queries
+        """
+        start = np.asarray(start, dtype=np.int64)
+        stop = np.asarray(stop, dtype=np.int64)
+        wrapped = start > stop
+        if totalLength <= 0:
+            totalLength = int(max(start.max(initial=0), stop.max(initial=0)))
+        self.totalLength = totalLength
+        self.start = start
+        self.stop = stop
+        self.length = np.where(wrapped, totalLength - start + stop + 1, stop - start + 1)
+
+        # wrapped calls are split into [start, totalLength] and [1, stop]
+        wrappedRows = np.flatnonzero(wrapped)
+        segmentStart = np.concatenate((start, np.ones(len(wrappedRows), dtype=np.int64)))
+        segmentStop = np.concatenate((np.where(wrapped, totalLength, stop), stop[wrappedRows]))
+        segmentRow = np.concatenate((np.arange(len(start)), wrappedRows))
+
+        order = np.lexsort((segmentStop, segmentStart))
+        self._segmentStart = segmentStart[order]
+        self._segmentStop = segmentStop[order]
+        self._segmentRow = segmentRow[order]
+        # non decreasing - the first segment which can reach a position is found by binary search
+        self._maxStop = np.maximum.accumulate(self._segmentStop) if len(order) else self._segmentStop
+
+        # calls by start and by stop for neighbour queries
+        self._byStart = np.argsort(start, kind='stable')
+        self._sortedStart = start[self._byStart]
+        self._byStop = np.argsort(stop, kind='stable')
+        self._sortedStop = stop[self._byStop]
+
+    @classmethod
+    def fromTable(cls, table, totalLength: int = 0) -> 'IntervalIndex':
+        """
+        :param table: GeneTable
+        :param totalLength: length of the genome
+        """
+        return cls(table.start, table.stop, totalLength)
+
+    def __len__(self):
+        return len(self.start)
+
+    def overlapping(self, start: int, stop: int = None) -> np.ndarray:
+        """
+        Calls overlapping a region
+        :param start: first position of the region
+        :param stop: last position of the region - smaller than start for a region wrapping around the genome
+            end, start if not given
+        :return: sorted array of rows
+        """
+        if stop is None:
+            stop = start
+        if start > stop:
+            rows = np.concatenate((self._overlapping(start, self.totalLength), self._overlapping(1, stop)))
+        else:
+            rows = self._overlapping(start, stop)
+        return np.unique(rows)
+
+    def _overlapping(self, start: int, stop: int) -> np.ndarray:
+        first = np.searchsorted(self._maxStop, start, side='left')
+        last = np.searchsorted(self._segmentStart, stop, side='right')
+        if first >= last:
+            return np.empty(0, dtype=np.int64)
+        candidates = slice(first, last)
+        return self._segmentRow[candidates][self._segmentStop[candidates] >= start]
+
+    def within(self, start: int, stop: int) -> np.ndarray:
+        """
+        Calls lying entirely in a region
+        :param start: first position of the region
+        :param stop: last position of the region - smaller than start for a region wrapping around the genome end
+        :return: sorted array of rows
+        """
+        rows = self.overlapping(start, stop)
+        regionLength = stop - start + 1 if start <= stop else self.totalLength - start + stop + 1
+        # offset of each call from the region start, going around the genome if needed
+        offset = (self.start[rows] - start) % self.totalLength if self.totalLength else self.start[rows] - start
+        return rows[(offset >= 0) & (offset + self.length[rows] <= regionLength)]
+
+    def next(self, position: int, circular: bool = True) -> Optional[int]:
+        """
+        First call starting after a position
+        :param position: genome position
+        :param circular: wrap around to the first call of the genome if no call starts after the position
+        :return: row, None if there is none
+        """
+        index = np.searchsorted(self._sortedStart, position, side='right')
+        if index == len(self._sortedStart):
+            if not circular or index == 0:
+                return None
+            index = 0
+        return int(self._byStart[index])
+
+    def previous(self, position: int, circular: bool = True) -> Optional[int]:
+        """
+        Last call ending before a position
+        :param position: genome position
+        :param circular: wrap around to the last call of the genome if no call ends before the position
+        :return: row, None if there is none
+        """
+        index = np.searchsorted(self._sortedStop, position, side='left') - 1
+        if index < 0:
+            if not circular or len(self._sortedStop) == 0:
+                return None
+            index = len(self._sortedStop) - 1
+        return int(self._byStop[index])
+
+    def nearest(self, position: int) -> Optional[int]:
+        """
+        Call closest to a position - a call containing the position is at distance 0
+        :param position: genome position
+        :return: row, None if the index is empty
+        """
+        if len(self) == 0:
+            return None
+        containing = self.overlapping(position)
+        if len(containing):
+            return int(containing[0])
+
+        candidates = [row for row in (self.next(position), self.previous(position)) if row is not None]
+        return min(candidates, key=lambda row: self.distance(row, position))
+
+    def distance(self, row: int, position: int) -> int:
+        """
+        Distance from a position to a call, going around the genome if shorter
+        """
+        start = int(self.start[row])
+        stop = int(self.stop[row])
+        distances = [abs(start - position), abs(stop - position)]
+        if self.totalLength:
+            distances += [self.totalLength - distance for distance in distances]
+        return min(distances)
+
+    def overlapFlags(self) -> np.ndarray:
+        """
+        Calls overlapping at least one other call
+        :return: boolean array over the rows
+        """
+        n = len(self._segmentStart)
+        flags = np.zeros(len(self), dtype=bool)
+        if n < 2:
+            return flags
+        # a segment overlaps an earlier one if it starts before the furthest stop so far,
+        # and a later one if the next segment starts before it stops
+        overlapsPrevious = np.zeros(n, dtype=bool)
+        overlapsPrevious[1:] = self._segmentStart[1:] <= self._maxStop[:-1]
+        overlapsNext = np.zeros(n, dtype=bool)
+        overlapsNext[:-1] = self._segmentStop[:-1] >= self._segmentStart[1:]
+        flags[self._segmentRow[overlapsPrevious | overlapsNext]] = True
+        return flags
+
+
+if __name__ == '__main__':
+    # benchmark - region queries on a metagenome sized set of calls against scanning the calls
+    import random
+    import time
+
+    random.seed(0)
+    GENOME_LENGTH = 50000000
+    N_CALLS = 500000
+    N_QUERIES = 10000
+
+    starts = np.array([random.randrange(1, GENOME_LENGTH) for _ in range(N_CALLS)])
+    lengths = np.array([random.randrange(90, 3000) for _ in range(N_CALLS)])
+    stops = (starts + lengths - 1 - 1) % GENOME_LENGTH + 1
+
+    startTime = time.perf_counter()
+    index = IntervalIndex(starts, stops, GENOME_LENGTH)
+    buildTime = time.perf_counter() - startTime
+
+    queries = [(position, (position + random.randrange(0, 5000) - 1) % GENOME_LENGTH + 1)
+               for position in (random.randrange(1, GENOME_LENGTH) for _ in range(N_QUERIES))]
+    startTime = time.perf_counter()
+    results = [index.overlapping(start, stop) for start, stop in queries]
+    queryTime = time.perf_counter() - startTime
+
+    # scan of every call - as needed without an index
+    def scan(start, stop):
+        def segments(a, b):
+            return [(a, b)] if a <= b else [(a, GENOME_LENGTH), (1, b)]
+        hits = np.zeros(N_CALLS, dtype=bool)
+        wrapped = starts > stops
+        for regionStart, regionStop in segments(start, stop):
+            hits |= ~wrapped & (starts <= regionStop) & (stops >= regionStart)
+            hits |= wrapped & ((starts <= regionStop) | (stops >= regionStart))
+        return np.flatnonzero(hits)
+
+    startTime = time.perf_counter()
+    expected = [scan(start, stop) for start, stop in queries[:200]]
+    scanTime = (time.perf_counter() - startTime) / 200 * N_QUERIES
+
+    print('{} calls: index built in {:.3f} s'.format(N_CALLS, buildTime))
+    print('{} overlap queries: index {:.3f} s, scanning (numpy) {:.3f} s'.format(N_QUERIES, queryTime, scanTime))
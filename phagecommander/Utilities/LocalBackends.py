@@ -0,0 +1,283 @@
+"""
+Locally installed executables which can serve a tool in place of its web server
+Each backend runs its executable on the fasta file in a temporary directory and parses the executable's own
+output format - local runs share a pool of core slots so they never oversubscribe the machine
+Cancelling a run terminates its running command, or stops it waiting for a slot
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import List, NamedTuple, Optional
+from phagecommander import Gene
+from phagecommander.Utilities import Cancellation
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+from phagecommander.Utilities.Tools import *
+
+# number of local runs at once
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# seconds between checks of the cancel token while waiting for a slot
+SLOT_WAIT = 0.1
+
+# query backends
+WEB = 'web'
+LOCAL = 'local'
+
+
+class LocalBackendError(Exception):
+    pass
+
+
+class Command(NamedTuple):
+    """
+    A command of a local run
+    stdin and stdout are optional file paths the command reads from / writes to
+    """
+    args: List[str]
+    stdin: Optional[str] = None
+    stdout: Optional[str] = None
+
+
+class LocalBackend:
+    """
+    Class for representing a locally installed tool
+    Subclasses give the commands to run and the parser of the output
+    """
+    # name of the executable the path setting points to
+    binaryName = ''
+    # parameters of the run - part of the query cache key
+    parameters = dict()
+
+    def commands(self, binary: str, fastaPath: str, workDir: str) -> List[Command]:
+        """
+        Commands to run in order - the stdout of the last command is the output unless outputFile is given
+        :param binary: path of the executable
+        :param fastaPath: path of the fasta file
+        :param workDir: temporary directory for intermediate files - the working directory of the commands
+        :return: list of Commands
+        """
+        raise NotImplementedError
+
+    def outputFile(self, workDir: str):
+        """
+        :return: path of the file holding the output, None if the output is the stdout of the last command
+        """
+        return None
+
+    def parse(self, output: str, identity: str = '', totalLength=0) -> list:
+        """
+        Parses the output of the executable
+        :return: list of Genes / TRNAs
+        """
+        raise NotImplementedError
+
+    def run(self, binary: str, sequenceFile, cancel: CancelToken = None) -> str:
+        """
+        Runs the executable on a sequence - waits for a free core slot first
+        :param binary: path of the executable
+        :param sequenceFile: SequenceFile of the DNA sequence
+        :param cancel: CancelToken of the query - None if the run cannot be cancelled
+        :return: output of the executable
+        Raises LocalBackendError if a command fails, QueryCancelledError if the run is cancelled
+        """
+        slots = getSlots()
+        while not slots.acquire(timeout=SLOT_WAIT):
+            if cancel is not None:
+                cancel.check()
+        try:
+            with tempfile.TemporaryDirectory(prefix='phagecom_') as workDir:
+                fastaPath = os.path.join(workDir, 'sequence.fasta')
+                with open(fastaPath, 'wb') as file:
+                    file.write(sequenceFile.data)
+
+                stdout = b''
+                for command in self.commands(binary, fastaPath, workDir):
+                    stdout = self._runCommand(command, workDir, cancel)
+
+                outputFile = self.outputFile(workDir)
+                if outputFile is not None:
+                    with open(outputFile, 'rb') as file:
+                        stdout = file.read()
+
+                return stdout.decode('utf-8', errors='replace')
+        finally:
+            slots.release()
+
+    @staticmethod
+    def _runCommand(command: Command, workDir: str, cancel: CancelToken = None) -> bytes:
+        """
+        Runs a command without a shell
+        :param cancel: CancelToken terminating the command - None if the command cannot be cancelled
+        :return: stdout of the command - empty if redirected to a file
+        """
+        if cancel is not None:
+            cancel.check()
+        stdin = open(command.stdin, 'rb') if command.stdin is not None else subprocess.DEVNULL
+        stdout = open(command.stdout, 'wb') if command.stdout is not None else subprocess.PIPE
+        try:
+            proc = subprocess.Popen(command.args, cwd=workDir, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE,
+                                    **Cancellation.PROCESS_GROUP)
+            unregister = cancel.register(lambda: Cancellation.terminate(proc)) if cancel is not None else lambda: None
+            try:
+                output, error = proc.communicate()
+            finally:
+                unregister()
+        except OSError as e:
+            raise LocalBackendError('{}: {}'.format(command.args[0], e))
+        finally:
+            if command.stdin is not None:
+                stdin.close()
+            if command.stdout is not None:
+                stdout.close()
+
+        if cancel is not None and cancel.cancelled:
+            raise QueryCancelledError('{} cancelled'.format(os.path.basename(command.args[0])))
+        if proc.returncode != 0:
+            raise LocalBackendError('{} exited with code {}: {}'.format(
+                os.path.basename(command.args[0]), proc.returncode, error.decode('utf-8', errors='replace').strip()))
+        return output or b''
+
+
+class GlimmerBackend(LocalBackend):
+    """
+    Glimmer3 trained on the sequence's own long ORFs - as done by the g3-from-scratch script
+    The long-orfs, extract and build-icm executables are taken from the directory of glimmer3
+    """
+    binaryName = 'glimmer3'
+    # linear topology as queried on the DNA Master server
+    parameters = {'linear': True, 'max_overlap': 50, 'gene_len': 110, 'threshold': 30}
+
+    def commands(self, binary, fastaPath, workDir):
+        binDir = os.path.dirname(binary)
+        trainPath = os.path.join(workDir, 'run.train')
+        return [Command([os.path.join(binDir, 'long-orfs'), '-n', '-t', '1.15', fastaPath, 'run.longorfs']),
+                Command([os.path.join(binDir, 'extract'), '-t', fastaPath, 'run.longorfs'], stdout=trainPath),
+                Command([os.path.join(binDir, 'build-icm'), '-r', 'run.icm'], stdin=trainPath),
+                Command([binary, '-l', '-o', '50', '-g', '110', '-t', '30', fastaPath, 'run.icm', 'run'])]
+
+    def outputFile(self, workDir):
+        return os.path.join(workDir, 'run.predict')
+
+    def parse(self, output, identity='', totalLength=0):
+        # .predict files have a header line per sequence followed by the DNA Master output format
+        lines = [line for line in output.splitlines() if line.strip() and not line.startswith('>')]
+        return Gene.GeneParse.parse_glimmer('\n'.join(['>'] + lines), identity=identity, totalLength=totalLength)
+
+
+class GeneMarkS2Backend(LocalBackend):
+    """
+    GeneMarkS-2 perl script
+    """
+    binaryName = 'gms2.pl'
+    # same parameters as the web query
+    parameters = {'genome_type': 'auto', 'gcode': 11, 'format': 'lst'}
+
+    def commands(self, binary, fastaPath, workDir):
+        return [Command([binary, '--seq', fastaPath, '--genome-type', 'auto', '--gcode', '11', '--format', 'lst',
+                         '--output', os.path.join(workDir, 'gms2.lst')])]
+
+    def outputFile(self, workDir):
+        return os.path.join(workDir, 'gms2.lst')
+
+    def parse(self, output, identity='', totalLength=0):
+        return Gene.GeneParse.parse_genemarkS2(output, identity=identity, totalLength=totalLength)
+
+
+class AragornBackend(LocalBackend):
+    """
+    Aragorn in batch output mode
+    """
+    binaryName = 'aragorn'
+    # same parameters as the web query: tRNA only, no introns, linear, both strands
+    parameters = {'rna_type': 'tRNA', 'use_introns': False, 'seq_topology': 'linear', 'strand': 'both'}
+
+    def commands(self, binary, fastaPath, workDir):
+        return [Command([binary, '-t', '-l', '-w', fastaPath])]
+
+    def parse(self, output, identity='', totalLength=0):
+        """
+        Batch mode output: a '>' header and a count line per sequence, then one line per tRNA
+            1   tRNA-Leu               c[12345,12429]      35      (taa)
+        """
+        trnas = []
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) < 3 or line.startswith('>') or 'tRNA' not in fields[1]:
+                continue
+            location = fields[2]
+            direction = '-' if location.startswith('c') else '+'
+            start, stop = location.lstrip('c').strip('[]').split(',')
+            rna = fields[-1]
+            trnas.append(Gene.TRNA(int(start), int(stop), direction, fields[1] + rna, totalLength,
+                                   identity=identity))
+        return trnas
+
+
+class MetageneBackend(LocalBackend):
+    """
+    MetaGeneAnnotator
+    """
+    binaryName = 'mga'
+    parameters = {'species': 'multiple'}
+
+    def commands(self, binary, fastaPath, workDir):
+        return [Command([binary, fastaPath, '-m'])]
+
+    def parse(self, output, identity='', totalLength=0):
+        """
+        Tab separated lines after '#' comment lines per sequence
+            gene_1  100  300  +  0  11  25.3  b  ...
+        """
+        START = 1
+        STOP = 2
+        DIRECTION = 3
+
+        genes = []
+        for line in output.splitlines():
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.split('\t')
+            genes.append(Gene.Gene(fields[START], fields[STOP], fields[DIRECTION], identity=identity,
+                                   totalLength=totalLength))
+        return genes
+
+
+# Key - tool (from TOOL_NAMES)
+# Value - LocalBackend able to serve the tool
+BACKENDS = {GLIMMER: GlimmerBackend(),
+            GENEMARKS2: GeneMarkS2Backend(),
+            ARAGORN: AragornBackend(),
+            METAGENE: MetageneBackend()}
+
+
+def findBinary(tool: str) -> str:
+    """
+    Looks for the executable of a tool on the PATH
+    :param tool: tool name
+    :return: path of the executable, None if not found
+    """
+    if tool not in BACKENDS:
+        return None
+    return shutil.which(BACKENDS[tool].binaryName)
+
+
+_slots = threading.BoundedSemaphore(DEFAULT_WORKERS)
+
+
+def getSlots() -> threading.BoundedSemaphore:
+    """
+    Returns the core slots shared by all local runs
+    """
+    return _slots
+
+
+def configure(workers: int):
+    """
+    Sets the number of local runs at once
+    :param workers: number of core slots
+    """
+    global _slots
+    _slots = threading.BoundedSemaphore(workers)
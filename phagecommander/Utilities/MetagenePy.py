@@ -1,6 +1,5 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+from phagecommander.Utilities import HtmlStream, HttpSession
 from phagecommander import Gene
 
 METAGENE_URL = 'http://metagene.nig.ac.jp/cgi-bin/mga.cgi'
@@ -8,17 +7,36 @@ METAGENE_URL = 'http://metagene.nig.ac.jp/cgi-bin/mga.cgi'
 
 class Metagene:
 
-    def __init__(self, file: str, sequenceName: str = None):
+    def __init__(self, file: str, sequenceName: str = None, fileData: bytes = None, cancel=None):
+        """
+        :param file: fasta file path
+        :param sequenceName: name of the sequence
+        :param fileData: content of the fasta file - read from file if not given
+        :param cancel: CancelToken aborting the query
+        """
         # check if file exists
         if not os.path.exists(file):
             raise FileExistsError('\"{}\" does not exist.'.format(file))
 
         self.file = file
         self.sequenceName = sequenceName
+        self.fileData = fileData
+        self.cancel = cancel
+
+    def requestFiles(self):
+        """
+        File upload of a Metagene query
+        :return: dict of files for the POST request
+        """
+        if self.fileData is None:
+            with open(self.file, 'rb') as file:
+                self.fileData = file.read()
+
+        return {'File': (self.sequenceName, self.fileData, 'application/octet-stream')}
 
     def query(self):
-        files = {'File': (self.sequenceName, open(self.file), 'application/octet-stream')}
-        postReq = requests.post(METAGENE_URL, files=files)
+        files = self.requestFiles()
+        postReq = HttpSession.post(METAGENE_URL, files=files, cancel=self.cancel)
         postReq.raise_for_status()
         return postReq.text
 
@@ -26,7 +44,7 @@ class Metagene:
     def parse(metageneData: str, identity: str = '', totalLength=0):
         """
         Parse Metagene output data for Genes
-        :param metageneData: metagene output file content
+        :param metageneData: metagene output page as str or bytes, or an iterable of chunks
         :param identity: identity for each gene
         :return: List[Gene]
         """
@@ -35,17 +53,15 @@ class Metagene:
         STOP = 2
         DIRECTION = 3
 
-        # parse html
-        soup = BeautifulSoup(metageneData, 'html.parser')
-        # find all genes
-        geneLines = soup.find_all('tr')
+        # cells of each table row, read as the page is tokenized
         genes = []
-        for line in geneLines:
-            # split line content
-            geneLine = line.find_all('td')
-            start = geneLine[START].text
-            stop = geneLine[STOP].text
-            direction = geneLine[DIRECTION].text
+        for geneLine in HtmlStream.tableRows(metageneData):
+            # skip header or incomplete rows
+            if len(geneLine) <= DIRECTION:
+                continue
+            start = geneLine[START]
+            stop = geneLine[STOP]
+            direction = geneLine[DIRECTION]
             # create gene
             genes.append(Gene.Gene(start, stop, direction, identity=identity, totalLength=totalLength))
 
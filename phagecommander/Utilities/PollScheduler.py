@@ -0,0 +1,248 @@
+"""
+Scheduler for polling long running server jobs
+Every outstanding job is kept in one timer heap serviced by a single thread - a job only occupies a worker while
+its status is being checked, not while it waits for the next check
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+# returned by a check while the job is still running
+NOT_READY = object()
+
+# number of checks that can run at once
+DEFAULT_WORKERS = 8
+
+
+class PollTimeoutError(Exception):
+    pass
+
+
+class PollPolicy:
+    """
+    Class for representing the intervals between checks of a job
+    Checks start fast and back off exponentially, with random jitter so jobs submitted together do not
+    poll the server in lockstep
+    """
+
+    def __init__(self, initialDelay: float, maxDelay: float, factor: float = 2.0, jitter: float = 0.1,
+                 deadline: float = None):
+        """
+        :param initialDelay: seconds before the first check
+        :param maxDelay: maximum seconds between checks
+        :param factor: growth of the interval after each check
+        :param jitter: fraction of the interval randomly added or removed
+        :param deadline: seconds after which the job is abandoned - None for no deadline
+        """
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait before a check
+        :param attempt: number of checks already made
+        """
+        # exponent is capped - the delay has long since reached maxDelay
+        delay = min(self.maxDelay, self.initialDelay * self.factor ** min(attempt, 64))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class _PollJob:
+    def __init__(self, check: Callable, policy: PollPolicy, name: str):
+        self.check = check
+        self.policy = policy
+        self.name = name
+        self.attempt = 0
+        self.deadline = None if policy.deadline is None else time.monotonic() + policy.deadline
+        self.future = Future()
+
+    def finish(self, result=None, exception: Exception = None):
+        # a cancelled future cannot be completed
+        if self.future.cancelled():
+            return
+        if exception is not None:
+            self.future.set_exception(exception)
+        else:
+            self.future.set_result(result)
+
+    def nextDelay(self):
+        """
+        Seconds until the next check - None if the deadline has passed
+        """
+        delay = self.policy.delay(self.attempt)
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            delay = min(delay, remaining)
+        return delay
+
+
+class PollScheduler:
+    """
+    Class for polling many jobs from one timer thread
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        """
+        :param workers: number of checks that can run at once
+        """
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='PollWorker')
+        self._thread = threading.Thread(target=self._run, name='PollScheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, check: Callable, policy: PollPolicy, name: str = 'job') -> Future:
+        """
+        Polls a job until its check returns a result
+        :param check: callable returning NOT_READY while the job is running, otherwise the result of the job
+            exceptions raised by the check end the polling and are set on the future
+        :param policy: intervals and deadline of the checks
+        :param name: name of the job used in errors
+        :return: Future of the result - cancel the future to stop polling
+            PollTimeoutError is set on the future if the deadline passes
+        """
+        job = _PollJob(check, policy, name)
+        delay = job.nextDelay()
+        if delay is None:
+            job.finish(exception=PollTimeoutError('{}: no result after {} s'.format(name, policy.deadline)))
+        else:
+            self._schedule(job, delay)
+        return job.future
+
+    def close(self):
+        """
+        Stops the scheduler - outstanding jobs are cancelled
+        """
+        with self._condition:
+            self._closed = True
+            jobs = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._condition.notify()
+        for job in jobs:
+            job.future.cancel()
+        self._workers.shutdown(wait=False)
+
+    def _schedule(self, job: _PollJob, delay: float):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), job))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        job = heapq.heappop(self._heap)[2]
+                        break
+                    self._condition.wait(wait)
+
+            # cancelled jobs are dropped when they come due
+            if not job.future.cancelled():
+                self._workers.submit(self._check, job)
+
+    def _check(self, job: _PollJob):
+        if job.future.cancelled():
+            return
+
+        try:
+            result = job.check()
+        except Exception as e:
+            job.finish(exception=e)
+            return
+
+        if result is not NOT_READY:
+            job.finish(result)
+            return
+
+        job.attempt += 1
+        delay = job.nextDelay()
+        if delay is None:
+            job.finish(exception=PollTimeoutError('{}: no result after {} s'.format(job.name, job.policy.deadline)))
+        else:
+            self._schedule(job, delay)
+
+
+async def poll(check: Callable[[], Awaitable], policy: PollPolicy, name: str = 'job'):
+    """
+    Polls a job on the running event loop - the loop's timers take the place of the scheduler thread
+    :param check: coroutine function returning NOT_READY while the job is running, otherwise the result of the job
+    :param policy: intervals and deadline of the checks
+    :param name: name of the job used in errors
+    :return: result of the job
+    Raises PollTimeoutError if the deadline passes, cancel the task to stop polling
+    """
+    job = _PollJob(check, policy, name)
+    while True:
+        delay = job.nextDelay()
+        if delay is None:
+            raise PollTimeoutError('{}: no result after {} s'.format(name, policy.deadline))
+        await asyncio.sleep(delay)
+
+        result = await check()
+        if result is not NOT_READY:
+            return result
+        job.attempt += 1
+
+
+_scheduler = None
+_schedulerLock = threading.Lock()
+
+
+def getScheduler() -> PollScheduler:
+    """
+    Returns the scheduler shared by all tool queries - created on first use
+    """
+    global _scheduler
+    with _schedulerLock:
+        if _scheduler is None:
+            _scheduler = PollScheduler()
+        return _scheduler
+
+
+if __name__ == '__main__':
+    # benchmark - many jobs polled by one scheduler thread
+    JOBS = 200
+
+    def makeJob(duration):
+        endTime = time.monotonic() + duration
+        return lambda: duration if time.monotonic() >= endTime else NOT_READY
+
+    policy = PollPolicy(initialDelay=0.05, maxDelay=1, factor=1.5)
+    scheduler = PollScheduler()
+    threadsBefore = threading.active_count()
+    startTime = time.perf_counter()
+    futures = [scheduler.submit(makeJob(random.uniform(0.1, 3)), policy) for _ in range(JOBS)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - startTime
+    print('{} jobs finished in {:.2f} s using {} threads'.format(JOBS, elapsed,
+                                                                threading.active_count() - threadsBefore + 1))
+
+    # deadline and cancellation
+    timedOut = scheduler.submit(lambda: NOT_READY, PollPolicy(0.05, 0.1, deadline=0.3), 'never ready')
+    try:
+        timedOut.result()
+    except PollTimeoutError as e:
+        print(e)
+    cancelled = scheduler.submit(lambda: NOT_READY, policy)
+    print('cancelled: {}'.format(cancelled.cancel()))
+    scheduler.close()
@@ -0,0 +1,130 @@
+"""
+Local Prodigal runs spread over the available cores
+Each fasta record is piped to its own Prodigal process - no shell is involved - and the outputs are merged in
+record order
+Cancelling a run terminates its processes and drops its records which have not started
+"""
+
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from phagecommander.Utilities import Cancellation
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+
+# number of Prodigal processes run at once
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+class ProdigalError(Exception):
+    pass
+
+
+class ProdigalPool:
+    """
+    Class for running Prodigal processes with bounded concurrency
+    The pool's threads only wait on the Prodigal processes, the gene calling itself runs in the processes
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        """
+        :param workers: number of Prodigal processes run at once
+        """
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Prodigal')
+
+    def run(self, prodigalLocation: str, records: List[bytes], mode: str = 'meta', cancel: CancelToken = None) -> str:
+        """
+        Calls Prodigal on each record and merges the outputs
+        :param prodigalLocation: path of the Prodigal binary
+        :param records: fasta records, each including its header line
+        :param mode: Prodigal procedure - 'meta' or 'single'
+        :param cancel: CancelToken of the query - None if the run cannot be cancelled
+        :return: Prodigal output of all records in record order - a DEFINITION block per record, with locations
+            relative to the record
+        Raises ProdigalError if a process fails, QueryCancelledError if the run is cancelled
+        """
+        futures = [self._executor.submit(self.runRecord, prodigalLocation, record, mode, cancel) for record in records]
+        try:
+            return ''.join(Cancellation.result(future, cancel) for future in futures)
+        finally:
+            # records still waiting for a process are not run if another record failed
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def runRecord(prodigalLocation: str, record: bytes, mode: str = 'meta', cancel: CancelToken = None) -> str:
+        """
+        Calls Prodigal on a single record passed through stdin
+        :param prodigalLocation: path of the Prodigal binary
+        :param record: fasta record including its header line
+        :param mode: Prodigal procedure - 'meta' or 'single'
+        :param cancel: CancelToken terminating the process - None if the run cannot be cancelled
+        :return: Prodigal output - read whole once the process exits, it is stored as is (see GeneFile.query_data)
+        """
+        if cancel is not None:
+            cancel.check()
+        proc = subprocess.Popen([prodigalLocation, '-p', mode], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, **Cancellation.PROCESS_GROUP)
+        unregister = cancel.register(lambda: Cancellation.terminate(proc)) if cancel is not None else lambda: None
+
+        # the record is written while stdout and stderr are read - a full pipe on either side can never block
+        # the process exiting early closes stdin - its exit code is reported below
+        stdout, stderr = proc.communicate(record)
+        unregister()
+
+        # check for error
+        if cancel is not None and cancel.cancelled:
+            raise QueryCancelledError('Prodigal cancelled')
+        if proc.returncode != 0:
+            raise ProdigalError('Prodigal exited with code {}: {}'.format(
+                proc.returncode, stderr.decode('utf-8', errors='replace').strip()))
+
+        return stdout.decode('utf-8')
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+
+def getPool() -> ProdigalPool:
+    """
+    Returns the pool shared by all Prodigal queries - created on first use
+    Sharing the pool keeps the number of Prodigal processes at the core count however many genomes are queried
+    """
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ProdigalPool()
+        return _pool
+
+
+def configure(workers: int) -> ProdigalPool:
+    """
+    Replaces the shared pool with one of the given size
+    :param workers: number of Prodigal processes run at once
+    :return: the new pool
+    """
+    global _pool
+    with _poolLock:
+        _pool = ProdigalPool(workers)
+        return _pool
+
+
+if __name__ == '__main__':
+    # benchmark - a multi-record file run serially and through the pool
+    # usage: python ProdigalPool.py <prodigal binary> <fasta file>
+    import sys
+    import time
+    from phagecommander.Utilities.SequenceFile import SequenceFile
+
+    prodigal, fastaFile = sys.argv[1:3]
+    records = [record for _, record in SequenceFile(fastaFile).records()]
+
+    for workers in (1, DEFAULT_WORKERS):
+        pool = ProdigalPool(workers)
+        startTime = time.perf_counter()
+        output = pool.run(prodigal, records)
+        elapsed = time.perf_counter() - startTime
+        print('{:>2} workers: {} records in {:.2f} s'.format(workers, len(records), elapsed))
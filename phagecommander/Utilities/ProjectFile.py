@@ -0,0 +1,474 @@
+"""
+.gq project files
+A versioned binary container with separate chunks for the DNA sequence (2-bit packed) and the call columns of each
+tool, and a table of contents holding the metadata. Opening a project only reads the table of contents and the
+sequence - the calls of a tool are read when the tool is first accessed, or memory-mapped
+Files written by older versions (pickled QueryData) are still opened, through an unpickler restricted to the
+classes a project can contain
+
+Layout:
+    header - MAGIC, version (uint16), flags (uint16), reserved (uint32), table of contents offset and size (uint64)
+    chunks - raw arrays, each aligned to 8 bytes
+    table of contents - UTF-8 JSON: {'chunks': {name: [offset, size]}, 'meta': {...}}
+"""
+
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from typing import Dict
+import numpy as np
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from phagecommander.Utilities.GeneTable import GeneTable
+from phagecommander.Utilities.QueryData import QueryData
+
+# \r\n and \x1a catch files mangled by text mode transfers
+MAGIC = b'GQ\x89\r\n\x1a\n\x00'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHHIQQ')
+_ALIGNMENT = 8
+_COLUMNS = ('start', 'stop', 'strand', 'length', 'kind', 'identity', 'trnaType', 'contig')
+
+# 2-bit codes of the bases
+_BASES = b'ACGT'
+_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _base in enumerate(_BASES):
+    _CODES[_base] = _code
+_IS_BASE = np.zeros(256, dtype=bool)
+_IS_BASE[list(_BASES)] = True
+
+
+class ProjectFileError(Exception):
+    pass
+
+
+class StoredError(Exception):
+    """
+    Error of a tool as stored in a project - only its type name and message are kept
+    """
+
+    def __init__(self, message: str, errorType: str = 'Exception'):
+        super().__init__(message)
+        self.errorType = errorType
+
+
+def save(queryData: QueryData, path: str):
+    """
+    Writes a project - the file is replaced only once it is complete
+    RAST credentials are never written
+    :param queryData: QueryData of the project
+    :param path: path of the .gq file
+    """
+    chunks = []
+    meta = {'species': queryData.species,
+            'fileName': queryData.fileName,
+            'tools': queryData.tools,
+            'rastJobID': queryData.rastJobID,
+            'sequence': None,
+            'contigs': [],
+            'toolData': dict()}
+
+    if isinstance(queryData.sequence, SeqRecord):
+        packed, sequenceMeta = _packSequence(queryData.sequence)
+        chunks.append(('sequence', packed))
+        meta['sequence'] = sequenceMeta
+    # records after the first of multi-record files
+    for index, record in enumerate(queryData.contigs[1:], 1):
+        packed, sequenceMeta = _packSequence(record)
+        chunks.append(('contigs/{}'.format(index), packed))
+        meta['contigs'].append(sequenceMeta)
+
+    for tool, genes in queryData.toolData.items():
+        if genes is None:
+            meta['toolData'][tool] = None
+        elif isinstance(genes, Exception):
+            errorType = genes.errorType if isinstance(genes, StoredError) else type(genes).__name__
+            meta['toolData'][tool] = {'error': str(genes), 'errorType': errorType}
+        else:
+            table = GeneTable.fromGenes(genes)
+            columns = dict()
+            for column in _COLUMNS:
+                array = np.ascontiguousarray(getattr(table, column))
+                chunks.append(('calls/{}/{}'.format(tool, column), array))
+                columns[column] = array.dtype.str
+            meta['toolData'][tool] = {'rows': len(table), 'columns': columns, 'identities': table.identities,
+                                      'trnaTypes': table.trnaTypes, 'totalLength': table.totalLength,
+                                      'contigs': table.contigs, 'contigLengths': table.contigLengths}
+
+    tmpPath = path + '.part'
+    try:
+        with open(tmpPath, 'wb') as file:
+            file.write(b'\0' * _HEADER.size)
+            offsets = dict()
+            for name, data in chunks:
+                _pad(file)
+                offsets[name] = [file.tell(), data.nbytes]
+                file.write(memoryview(data).cast('B'))
+            _pad(file)
+            tocOffset = file.tell()
+            toc = json.dumps({'chunks': offsets, 'meta': meta}).encode('utf-8')
+            file.write(toc)
+            file.seek(0)
+            file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, tocOffset, len(toc)))
+        os.replace(tmpPath, path)
+    except BaseException:
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+        raise
+
+
+def load(path: str, memoryMap: bool = False) -> QueryData:
+    """
+    Opens a project
+    The calls of each tool are read on first access
+    :param path: path of the .gq file
+    :param memoryMap: True to map the call columns into memory instead of reading them - the file must then not be
+        replaced while the project is open
+    :return: QueryData of the project
+    Raises ProjectFileError if the file is not a project or is from a newer version
+    """
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+    if magic != MAGIC:
+        return _loadLegacy(path)
+
+    reader = ProjectReader(path, memoryMap)
+    meta = reader.meta
+
+    queryData = QueryData()
+    queryData.species = meta['species']
+    queryData.fileName = meta['fileName']
+    queryData.tools = meta['tools']
+    queryData.rastJobID = meta['rastJobID']
+    queryData.rastUser = None
+    queryData.rastPass = None
+    if meta['sequence'] is not None:
+        queryData.sequence = _unpackSequence(reader.chunk('sequence'), meta['sequence'])
+        queryData.contigs = [queryData.sequence]
+    for index, sequenceMeta in enumerate(meta.get('contigs', []), 1):
+        queryData.contigs.append(_unpackSequence(reader.chunk('contigs/{}'.format(index)), sequenceMeta))
+    queryData.toolData = LazyToolData(reader)
+    return queryData
+
+
+class ProjectReader:
+    """
+    Class for reading the chunks of a project
+    """
+
+    def __init__(self, path: str, memoryMap: bool = False):
+        """
+        Reads the header and table of contents
+        :param path: path of the .gq file
+        :param memoryMap: True to map chunks into memory instead of reading them
+        """
+        self.path = path
+        self._map = None
+        with open(path, 'rb') as file:
+            header = file.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ProjectFileError('{} is truncated'.format(path))
+            magic, version, _, _, tocOffset, tocSize = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ProjectFileError('{} is not a .gq project'.format(path))
+            if version > VERSION:
+                raise ProjectFileError('{} was written by a newer version of Phage Commander (format {})'.format(
+                    path, version))
+            file.seek(tocOffset)
+            try:
+                toc = json.loads(file.read(tocSize).decode('utf-8'))
+            except ValueError:
+                raise ProjectFileError('{} is corrupted'.format(path))
+            if memoryMap:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.version = version
+        self.chunks = toc['chunks']
+        self.meta = toc['meta']
+
+    def chunk(self, name: str) -> memoryview:
+        """
+        :param name: chunk name
+        :return: content of the chunk - a view of the mapped file if memory-mapped
+        """
+        offset, size = self.chunks[name]
+        if self._map is not None:
+            return memoryview(self._map)[offset:offset + size]
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            return memoryview(file.read(size))
+
+    def table(self, tool: str) -> GeneTable:
+        """
+        :param tool: tool name
+        :return: GeneTable of the tool's calls
+        """
+        info = self.meta['toolData'][tool]
+        # projects written before multi-record support have no contig column
+        columns = {column: np.frombuffer(self.chunk('calls/{}/{}'.format(tool, column)),
+                                         dtype=np.dtype(info['columns'][column]))
+                   for column in _COLUMNS if column in info['columns']}
+        return GeneTable(*[columns[column] for column in _COLUMNS[:-1]], identities=info['identities'],
+                         trnaTypes=info['trnaTypes'], totalLength=info['totalLength'], contig=columns.get('contig'),
+                         contigs=info.get('contigs'), contigLengths=info.get('contigLengths'))
+
+    def toolData(self, tool: str):
+        """
+        :param tool: tool name
+        :return: GeneTable of the tool, StoredError if the tool failed, None if it did not finish
+        """
+        info = self.meta['toolData'][tool]
+        if info is None:
+            return None
+        if 'error' in info:
+            return StoredError(info['error'], info['errorType'])
+        return self.table(tool)
+
+
+class LazyToolData(dict):
+    """
+    QueryData.toolData of an opened project - the calls of a tool are read on first access
+    """
+
+    def __init__(self, reader: ProjectReader):
+        super().__init__()
+        self._reader = reader
+        self._pending = set(reader.meta['toolData'])
+        for tool in reader.meta['toolData']:
+            super().__setitem__(tool, None)
+
+    def _load(self, tool):
+        if tool in self._pending:
+            self._pending.discard(tool)
+            super().__setitem__(tool, self._reader.toolData(tool))
+
+    def __getitem__(self, tool):
+        self._load(tool)
+        return super().__getitem__(tool)
+
+    def __setitem__(self, tool, value):
+        self._pending.discard(tool)
+        super().__setitem__(tool, value)
+
+    def __delitem__(self, tool):
+        self._pending.discard(tool)
+        super().__delitem__(tool)
+
+    def __iter__(self):
+        # not inherited, so dict(toolData) and {**toolData} go through __getitem__
+        return super().__iter__()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def get(self, tool, default=None):
+        return self[tool] if tool in self else default
+
+    def values(self):
+        return [self[tool] for tool in self]
+
+    def items(self):
+        return [(tool, self[tool]) for tool in self]
+
+    def copy(self):
+        return dict(self.items())
+
+    def __reduce__(self):
+        return dict, (self.items(),)
+
+
+def _pad(file):
+    padding = -file.tell() % _ALIGNMENT
+    if padding:
+        file.write(b'\0' * padding)
+
+
+def _runs(mask: np.ndarray):
+    """
+    :return: (starts, lengths) of the runs of True in a boolean array
+    """
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+def _packSequence(record: SeqRecord):
+    """
+    Packs a sequence to 2 bits per base
+    Characters other than ACGT (N, IUPAC codes...) and lowercase runs are kept in the metadata
+    :return: (packed array, metadata)
+    """
+    data = np.frombuffer(bytes(record.seq), dtype=np.uint8)
+    upper = np.frombuffer(bytes(record.seq).upper(), dtype=np.uint8)
+
+    codes = _CODES[upper]
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    padded = padded.reshape(-1, 4)
+    packed = (padded[:, 0] << 6) | (padded[:, 1] << 4) | (padded[:, 2] << 2) | padded[:, 3]
+
+    otherStarts, otherLengths = _runs(~_IS_BASE[upper])
+    lowerStarts, lowerLengths = _runs(data != upper)
+    meta = {'id': record.id, 'name': record.name, 'description': record.description, 'length': len(data),
+            'other': [[int(start), upper[start:start + length].tobytes().decode('latin-1')]
+                      for start, length in zip(otherStarts, otherLengths)],
+            'lowercase': [[int(start), int(length)] for start, length in zip(lowerStarts, lowerLengths)]}
+    return packed.astype(np.uint8), meta
+
+
+def _unpackSequence(packed: memoryview, meta: dict) -> SeqRecord:
+    """
+    Unpacks a sequence written by _packSequence
+    """
+    packed = np.frombuffer(packed, dtype=np.uint8)
+    codes = np.stack(((packed >> 6) & 3, (packed >> 4) & 3, (packed >> 2) & 3, packed & 3), axis=1).ravel()
+    letters = np.frombuffer(_BASES, dtype=np.uint8)[codes[:meta['length']]]
+
+    for start, text in meta['other']:
+        letters[start:start + len(text)] = np.frombuffer(text.encode('latin-1'), dtype=np.uint8)
+    for start, length in meta['lowercase']:
+        letters[start:start + length] |= 0x20
+
+    return SeqRecord(Seq(letters.tobytes().decode('latin-1')), id=meta['id'], name=meta['name'],
+                     description=meta['description'])
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler for .gq files written by older versions
+    Only the classes a QueryData can hold are created - anything else in the file is refused
+    """
+    _ALLOWED = {('builtins', name) for name in ('set', 'frozenset', 'list', 'dict', 'tuple', 'str', 'int', 'float',
+                                                'bytes', 'bytearray', 'complex', 'bool', 'slice')} | \
+               {('copyreg', '_reconstructor'), ('collections', 'OrderedDict'),
+                ('numpy', 'ndarray'), ('numpy', 'dtype'),
+                ('numpy.core.multiarray', '_reconstruct'), ('numpy._core.multiarray', '_reconstruct'),
+                ('numpy.core.multiarray', 'scalar'), ('numpy._core.multiarray', 'scalar'),
+                ('phagecommander.Utilities.QueryData', 'QueryData'),
+                ('phagecommander.Gene', 'Gene'), ('phagecommander.Gene', 'TRNA'),
+                ('phagecommander.Gene', '_restoreFeature'),
+                ('Bio.Seq', 'Seq'), ('Bio.Seq', 'MutableSeq'),
+                ('Bio.SeqRecord', 'SeqRecord'), ('Bio.SeqRecord', '_RestrictedDict'),
+                ('Bio.SeqFeature', 'SeqFeature'), ('Bio.SeqFeature', 'Reference')} | \
+               {('Bio.SeqFeature', name) for name in ('SimpleLocation', 'FeatureLocation', 'CompoundLocation',
+                                                      'ExactPosition', 'BeforePosition', 'AfterPosition',
+                                                      'WithinPosition', 'BetweenPosition', 'OneOfPosition',
+                                                      'UnknownPosition', 'UncertainPosition')}
+    # errors of the tools stored in place of their calls
+    _ERRORS = {('builtins', name) for name in ('Exception', 'ValueError', 'TypeError', 'KeyError', 'IndexError',
+                                               'RuntimeError', 'OSError', 'FileNotFoundError', 'FileExistsError',
+                                               'PermissionError', 'ConnectionError', 'TimeoutError')} | \
+               {('phagecommander.Gene', 'Error'), ('phagecommander.Gene', 'GeneError'),
+                ('phagecommander.Gene', 'GeneFile.GeneFileError'),
+                ('phagecommander.Utilities.RastPy', 'RastException'),
+                ('phagecommander.Utilities.RastPy', 'RastInvalidJobError'),
+                ('phagecommander.Utilities.RastPy', 'RastInvalidCredentialError'),
+                ('phagecommander.Utilities.Cancellation', 'QueryCancelledError'),
+                ('phagecommander.Utilities.PollScheduler', 'PollTimeoutError'),
+                ('phagecommander.Utilities.ProdigalPool', 'ProdigalError'),
+                ('phagecommander.Utilities.LocalBackends', 'LocalBackendError'),
+                ('phagecommander.Utilities.CircuitBreaker', 'CircuitOpenError'),
+                ('requests.exceptions', 'ConnectionError'), ('requests.exceptions', 'Timeout'),
+                ('requests.exceptions', 'ReadTimeout'), ('requests.exceptions', 'ConnectTimeout'),
+                ('requests.exceptions', 'HTTPError')}
+    # QueryData was defined in phagecom before it moved to Utilities
+    _RENAMED = {('phagecommander.phagecom', 'QueryData'): ('phagecommander.Utilities.QueryData', 'QueryData')}
+
+    def find_class(self, module, name):
+        module, name = self._RENAMED.get((module, name), (module, name))
+        # the nested GeneFileError is the only dotted name listed - others could reach any attribute of a class
+        if (module, name) in self._ALLOWED or (module, name) in self._ERRORS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError('{}.{} is not allowed in a .gq file'.format(module, name))
+
+
+def _loadLegacy(path: str) -> QueryData:
+    """
+    Opens a .gq file written by an older version (pickled QueryData)
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    try:
+        queryData = _RestrictedUnpickler(io.BytesIO(data)).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError) as e:
+        raise ProjectFileError('{} is not a .gq project: {}'.format(path, e))
+
+    if not isinstance(queryData, QueryData):
+        raise ProjectFileError('{} is not a .gq project'.format(path))
+
+    # store calls as columns, as done for new queries
+    toolData: Dict = queryData.toolData
+    for tool, genes in toolData.items():
+        if genes is not None and not isinstance(genes, Exception):
+            toolData[tool] = GeneTable.fromGenes(genes, totalLength=len(queryData.sequence))
+    return queryData
+
+
+if __name__ == '__main__':
+    # benchmark - saving and opening a project of a large genome against the pickled QueryData of older versions
+    # usage: python -m phagecommander.Utilities.ProjectFile
+    import random
+    import time
+    from phagecommander import Gene
+
+    random.seed(0)
+    GENOME_LENGTH = 10000000
+    N_CALLS = 50000
+
+    sequence = ''.join(random.choice('ACGT') for _ in range(GENOME_LENGTH))
+    sequence = sequence[:1000] + 'NNNNNRY' + sequence[1007:5000] + sequence[5000:6000].lower() + sequence[6000:]
+    queryData = QueryData()
+    queryData.fileName = 'genome.fasta'
+    queryData.species = 'Escherichia_coli_K_12_substr__MG1655'
+    queryData.sequence = SeqRecord(Seq(sequence), id='genome', name='genome', description='genome test')
+    for tool in ('glimmer', 'genemark', 'prodigal', 'metagene', 'genemarks2'):
+        genes = []
+        for _ in range(N_CALLS // 5):
+            start = random.randrange(1, GENOME_LENGTH - 3000)
+            genes.append(Gene.Gene(str(start), str(start + random.randrange(90, 3000)), random.choice('+-'), tool,
+                                   GENOME_LENGTH))
+        queryData.toolData[tool] = GeneTable.fromGenes(genes, GENOME_LENGTH)
+    queryData.toolData['rast'] = ValueError('RAST job failed')
+    queryData.toolData['aragorn'] = None
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        legacyPath = os.path.join(tmpDir, 'legacy.gq')
+        legacy = QueryData()
+        legacy.__dict__.update(queryData.__dict__)
+        legacy.toolData = {tool: genes.toGenes() if isinstance(genes, GeneTable) else genes
+                           for tool, genes in queryData.toolData.items()}
+        with open(legacyPath, 'wb') as file:
+            pickle.dump(legacy, file)
+        startTime = time.perf_counter()
+        with open(legacyPath, 'rb') as file:
+            pickle.load(file)
+        legacyTime = time.perf_counter() - startTime
+
+        path = os.path.join(tmpDir, 'project.gq')
+        startTime = time.perf_counter()
+        save(queryData, path)
+        saveTime = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        opened = load(path)
+        openTime = time.perf_counter() - startTime
+        # calls are read on first access of each tool - then every call as a Gene view, as the pickled projects give
+        startTime = time.perf_counter()
+        for tool in opened.toolData:
+            calls = opened.toolData[tool]
+            if isinstance(calls, GeneTable):
+                list(calls)
+        callsTime = time.perf_counter() - startTime
+
+        print('{} bp, {} calls'.format(GENOME_LENGTH, N_CALLS))
+        print('pickle:  {:8.0f} KB, open {:.3f} s'.format(os.path.getsize(legacyPath) / 1024, legacyTime))
+        print('.gq v{}:  {:8.0f} KB, save {:.3f} s, open {:.3f} s, read all calls as Genes {:.3f} s'.format(
+            VERSION, os.path.getsize(path) / 1024, saveTime, openTime, callsTime))
@@ -0,0 +1,235 @@
+"""
+Disk cache of raw tool outputs
+An output is stored under a hash of the normalized DNA sequence, the tool and the tool's parameters, so a
+rerun on the same sequence - from any file - is read from disk instead of queried again
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Union
+from phagecommander.Utilities.Tools import *
+
+logger = logging.getLogger(__name__)
+
+# location of the cache - can be set with the PHAGECOM_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.phagecommander', 'cache')
+# total size of the cached outputs before the least recently used are evicted
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+# seconds a cached output is valid
+DEFAULT_TTL = 30 * 24 * 60 * 60
+# Key - tool (from TOOL_NAMES)
+# Value - seconds an output of the tool is valid, None for no expiry
+# the web servers are updated from time to time, local prodigal output only changes with its parameters
+TOOL_TTLS = {PRODIGAL: None}
+# eviction removes outputs until the cache is below this fraction of its size
+_EVICTION_TARGET = 0.9
+_ENTRY_EXTENSION = '.out'
+
+
+class QueryCache:
+    """
+    Class for representing the cache of raw tool outputs
+    Each output is a file named by its key - reading an output updates the file's modification time,
+    which gives the order of eviction
+    """
+
+    def __init__(self, cacheDir: str = None, maxSize: int = DEFAULT_MAX_SIZE, ttls: Dict[str, int] = None):
+        """
+        :param cacheDir: directory of the cache - created if it does not exist
+        :param maxSize: total size in bytes of the cached outputs
+        :param ttls: dict of tool: seconds an output is valid - defaults to TOOL_TTLS
+        """
+        if cacheDir is None:
+            cacheDir = os.environ.get('PHAGECOM_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+        self.ttls = TOOL_TTLS if ttls is None else ttls
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sequenceDigest: str, tool: str, parameters: dict) -> str:
+        """
+        Key of a tool output
+        :param sequenceDigest: hash of the normalized sequence (see SequenceFile.digest)
+        :param tool: tool name
+        :param parameters: dict of the tool's parameters
+        :return: hex digest
+        """
+        hasher = hashlib.sha256()
+        hasher.update(sequenceDigest.encode('utf-8'))
+        hasher.update(b'\0' + tool.encode('utf-8') + b'\0')
+        hasher.update(json.dumps(parameters, sort_keys=True, default=str).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def get(self, key: str, tool: str) -> Optional[Union[str, bytes]]:
+        """
+        Reads a cached output
+        :param key: key of the output
+        :param tool: tool name - used for the TTL of the output
+        :return: the output, None if it is not cached or has expired
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                header = file.readline()
+                data = file.read()
+            kind, created = header.split()
+        except (OSError, ValueError):
+            return None
+
+        ttl = self.ttls.get(tool, DEFAULT_TTL)
+        if ttl is not None and time.time() - float(created) > ttl:
+            self._remove(path)
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data.decode('utf-8') if kind == b'str' else data
+
+    def put(self, key: str, output: Union[str, bytes]):
+        """
+        Stores an output - the least recently used outputs are evicted if the cache is full
+        Errors writing to the cache are logged but not raised, the cache is only an optimization
+        :param key: key of the output
+        :param output: raw output of the tool
+        """
+        if isinstance(output, str):
+            kind, data = b'str', output.encode('utf-8')
+        else:
+            kind, data = b'bytes', bytes(output)
+        header = kind + b' ' + repr(time.time()).encode('utf-8') + b'\n'
+
+        path = self._path(key)
+        with self._lock:
+            # an output stored again replaces the old one - only the difference is added to the size
+            try:
+                oldSize = os.path.getsize(path)
+            except OSError:
+                oldSize = 0
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # write to a temporary file first so readers never see a partial output
+                fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(header)
+                    file.write(data)
+                os.replace(tmpPath, path)
+            except OSError as e:
+                logger.warning('Unable to write to query cache: %s', e)
+                return
+
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(header) + len(data) - oldSize
+            if self._size > self.maxSize:
+                self._evict()
+
+    def clear(self):
+        """
+        Removes every cached output
+        """
+        with self._lock:
+            for path, _, _ in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    def _path(self, key: str) -> str:
+        # outputs are spread over subdirectories to keep directory listings short
+        return os.path.join(self.cacheDir, key[:2], key + _ENTRY_EXTENSION)
+
+    def _entries(self):
+        """
+        :return: list of (path, size, modification time) of the cached outputs
+        """
+        entries = []
+        try:
+            subDirs = os.scandir(self.cacheDir)
+        except OSError:
+            return entries
+
+        with subDirs:
+            for subDir in subDirs:
+                if not subDir.is_dir():
+                    continue
+                with os.scandir(subDir.path) as files:
+                    for file in files:
+                        if file.name.endswith(_ENTRY_EXTENSION):
+                            stat = file.stat()
+                            entries.append((file.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        self._size = sum(size for _, size, _ in entries)
+        target = self.maxSize * _EVICTION_TARGET
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if self._size <= target:
+                break
+            self._remove(path)
+            self._size -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_cache = None
+_cacheLock = threading.Lock()
+
+
+def getCache() -> QueryCache:
+    """
+    Returns the cache shared by all tool queries - created on first use
+    """
+    global _cache
+    with _cacheLock:
+        if _cache is None:
+            _cache = QueryCache()
+        return _cache
+
+
+def configure(**kwargs) -> QueryCache:
+    """
+    Replaces the shared cache with one using the given settings
+    :param kwargs: arguments of QueryCache
+    :return: the new cache
+    """
+    global _cache
+    with _cacheLock:
+        _cache = QueryCache(**kwargs)
+        return _cache
+
+
+if __name__ == '__main__':
+    # benchmark - lookups of cached outputs and eviction of a full cache
+    OUTPUT = 'orf00001      100      300  +1     5.0\n' * 2000
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        cache = QueryCache(tmpDir, maxSize=len(OUTPUT) * 50)
+        keys = [QueryCache.key('{:064x}'.format(i), GLIMMER, {'gencode': 11}) for i in range(100)]
+
+        startTime = time.perf_counter()
+        for key in keys:
+            cache.put(key, OUTPUT)
+        elapsed = time.perf_counter() - startTime
+        print('put: {:.3f} ms/output'.format(elapsed / len(keys) * 1000))
+
+        startTime = time.perf_counter()
+        hits = [cache.get(key, GLIMMER) for key in keys]
+        elapsed = time.perf_counter() - startTime
+        print('get: {:.3f} ms/output'.format(elapsed / len(keys) * 1000))
+        print('{} of {} outputs kept after eviction'.format(sum(hit is not None for hit in hits), len(keys)))
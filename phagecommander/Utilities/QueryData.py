@@ -1,3 +1,52 @@
+from Bio import SeqIO
+from phagecommander.Utilities.Tools import TOOL_NAMES
 
 
+class QueryData:
+    """
+    Class for representing tool/species selections
+    """
 
+    def __init__(self):
+        # tools to call
+        self.tools = {key: True for key in TOOL_NAMES}
+        # species of the DNA sequence
+        self.species = ''
+        # path of the DNA file
+        self.fileName = ''
+        # tool data
+        # Key - tool (from TOOL_NAMES)
+        # Value - List of Genes
+        self.toolData = dict()
+        # sequence - SeqRecord of the first record of the file
+        self.sequence = ''
+        # SeqRecord of each record of the file - calls of multi-record files are on their own record
+        # (see GeneTable.contig)
+        self.contigs = []
+        # RAST related information
+        self.rastUser = ''
+        self.rastPass = ''
+        self.rastJobID = None
+        # query every tool even if its output is stored (see Gene.queryTool)
+        self.bypassCache = False
+
+    def __setstate__(self, state):
+        # projects saved before multi-record support
+        state.setdefault('contigs', [state['sequence']] if state.get('sequence') else [])
+        state.setdefault('bypassCache', False)
+        self.__dict__.update(state)
+
+    def loadSequence(self):
+        """
+        Reads the records of the fasta file
+        """
+        self.contigs = list(SeqIO.parse(self.fileName, 'fasta'))
+        self.sequence = self.contigs[0] if self.contigs else ''
+
+    def wipeUserCredentials(self):
+        """
+        Deletes any data relating to a RAST query
+        """
+        self.rastJobID = None
+        self.rastUser = None
+        self.rastPass = None
@@ -0,0 +1,238 @@
+"""
+Journal of the progress of a query session
+Each tool's state is written to disk as it changes, so a session which is closed or fails partway can be resumed:
+finished tools are not queried again and submitted server jobs are reattached to instead of resubmitted
+The journal only holds small state records - the outputs of finished tools are files of their own next to it, so
+recording a poll never rewrites the outputs
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# location of the journals - can be set with the PHAGECOM_SESSION_DIR environment variable
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.phagecommander', 'sessions')
+
+# tool states
+# job sent to the server - the entry holds what is needed to reattach to it (job key, output URL, RAST job ID)
+SUBMITTED = 'submitted'
+# output received and parsed - the raw output is stored next to the journal (see output)
+DONE = 'done'
+# query or parse failed - the tool is queried again on resume
+FAILED = 'failed'
+
+_JOURNAL_VERSION = 2
+_OUTPUT_EXTENSION = '.out'
+
+
+class QueryJournal:
+    """
+    Class for representing the journal of the tool queries of one session (sequence, species and tools)
+    Entries are dicts with 'state', 'key' (the output key of the tool's sequence and parameters, see
+    GeneFile.outputKey), 'updated' and state specific fields
+    The outputs of DONE entries are stored in the directory <journal name>.outputs, one file per output key
+    Credentials are never written to the journal
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the journal if the file exists
+        :param path: path of the journal file
+        """
+        self.path = path
+        self.outputDir = os.path.splitext(path)[0] + '.outputs'
+        self._lock = threading.Lock()
+        # fasta file, species and tools of the session
+        self._session = dict()
+        self._tools = dict()
+
+        try:
+            with open(path, 'r') as file:
+                content = json.load(file)
+            if content.get('version') == _JOURNAL_VERSION:
+                self._session = content['session']
+                self._tools = content['tools']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @classmethod
+    def forSession(cls, sequenceDigest: str, species: str, tools: List[str], journalDir: str = None) -> 'QueryJournal':
+        """
+        Journal of a session - the same sequence queried for the same species and tools always maps to the same
+        journal, sessions with another species or other tools have journals of their own
+        :param sequenceDigest: hash of the normalized sequence (see SequenceFile.digest)
+        :param species: species of the sequence
+        :param tools: tools queried
+        :param journalDir: directory of the journals
+        """
+        if journalDir is None:
+            journalDir = os.environ.get('PHAGECOM_SESSION_DIR', DEFAULT_JOURNAL_DIR)
+        sessionDigest = hashlib.sha256('\0'.join([species] + sorted(tools)).encode('utf-8')).hexdigest()
+        return cls(os.path.join(journalDir, '{}_{}.json'.format(sequenceDigest, sessionDigest[:16])))
+
+    @classmethod
+    def interrupted(cls, journalDir: str = None) -> List['QueryJournal']:
+        """
+        Journals of sessions which stopped before all their tools finished
+        Sessions whose fasta file no longer exists are skipped
+        :param journalDir: directory of the journals
+        """
+        if journalDir is None:
+            journalDir = os.environ.get('PHAGECOM_SESSION_DIR', DEFAULT_JOURNAL_DIR)
+
+        journals = []
+        try:
+            fileNames = sorted(os.listdir(journalDir))
+        except OSError:
+            return journals
+
+        for fileName in fileNames:
+            if not fileName.endswith('.json'):
+                continue
+            journal = cls(os.path.join(journalDir, fileName))
+            if os.path.isfile(journal.session.get('fileName', '')) and journal.unfinished():
+                journals.append(journal)
+        return journals
+
+    @property
+    def session(self) -> dict:
+        """
+        dict of 'fileName', 'species' and 'tools' of the session
+        """
+        with self._lock:
+            return dict(self._session)
+
+    def setSession(self, fileName: str, species: str, tools: List[str]):
+        """
+        Records what the session queries and writes the journal to disk
+        :param fileName: path of the fasta file
+        :param species: species of the sequence
+        :param tools: tools queried
+        """
+        with self._lock:
+            self._session = {'fileName': os.path.abspath(fileName), 'species': species, 'tools': list(tools)}
+            self._write()
+
+    def entry(self, tool: str, key: str) -> Optional[dict]:
+        """
+        State of a tool
+        :param tool: tool name
+        :param key: output key of the tool - entries recorded with other parameters are ignored
+        :return: copy of the entry, None if the tool has no entry
+        """
+        with self._lock:
+            entry = self._tools.get(tool)
+            if entry is None or entry.get('key') != key:
+                return None
+            return dict(entry)
+
+    def output(self, tool: str, key: str) -> Optional[Union[str, bytes]]:
+        """
+        Raw output of a DONE tool
+        :param tool: tool name
+        :param key: output key of the tool
+        :return: the output, None if the tool is not DONE or its output is missing
+        """
+        entry = self.entry(tool, key)
+        if entry is None or entry['state'] != DONE or 'outputBytes' not in entry:
+            return None
+        try:
+            with open(self._outputPath(key), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        return data if entry['outputBytes'] else data.decode('utf-8')
+
+    def record(self, tool: str, key: str, state: str, output: Union[str, bytes] = None, **fields):
+        """
+        Replaces the state of a tool and writes the journal to disk
+        :param tool: tool name
+        :param key: output key of the tool
+        :param state: SUBMITTED, DONE or FAILED
+        :param output: raw output of a DONE tool - stored outside the journal (see output)
+        :param fields: state specific fields - must be JSON serializable
+        """
+        entry = dict(fields)
+        entry.update({'state': state, 'key': key, 'updated': time.time()})
+        if output is not None:
+            if not self._writeOutput(key, output):
+                return
+            entry['outputBytes'] = isinstance(output, bytes)
+        with self._lock:
+            self._tools[tool] = entry
+            self._write()
+
+    def update(self, tool: str, key: str, **fields):
+        """
+        Updates fields of a tool's entry and writes the journal to disk
+        :param tool: tool name
+        :param key: output key of the tool - ignored if the entry has a different key
+        :param fields: fields to set
+        """
+        with self._lock:
+            entry = self._tools.get(tool)
+            if entry is None or entry.get('key') != key:
+                return
+            entry.update(fields)
+            entry['updated'] = time.time()
+            self._write()
+
+    def unfinished(self) -> List[str]:
+        """
+        :return: tools of the session which are not DONE
+        """
+        with self._lock:
+            tools = self._session.get('tools', list(self._tools))
+            return [tool for tool in tools if tool not in self._tools or self._tools[tool]['state'] != DONE]
+
+    def remove(self):
+        """
+        Deletes the journal - called once every tool of the session has finished
+        """
+        with self._lock:
+            self._session = dict()
+            self._tools = dict()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            shutil.rmtree(self.outputDir, ignore_errors=True)
+
+    def _outputPath(self, key: str) -> str:
+        return os.path.join(self.outputDir, key + _OUTPUT_EXTENSION)
+
+    def _writeOutput(self, key: str, output: Union[str, bytes]) -> bool:
+        """
+        Writes the output of a tool - outputs are only ever written once, when the tool is done
+        :return: False if the output could not be written
+        """
+        data = output.encode('utf-8') if isinstance(output, str) else bytes(output)
+        try:
+            os.makedirs(self.outputDir, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.outputDir)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmpPath, self._outputPath(key))
+        except OSError as e:
+            logger.warning('Unable to write query journal output: %s', e)
+            return False
+        return True
+
+    def _write(self):
+        # written to a temporary file first so a crash never leaves a partial journal
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as file:
+                json.dump({'version': _JOURNAL_VERSION, 'session': self._session, 'tools': self._tools}, file)
+            os.replace(tmpPath, self.path)
+        except OSError as e:
+            logger.warning('Unable to write query journal: %s', e)
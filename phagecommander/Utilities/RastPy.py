@@ -1,6 +1,6 @@
 import os
 import time
-import requests
+from phagecommander.Utilities import HttpSession
 from bs4 import BeautifulSoup
 from ruamel import yaml
 
@@ -25,14 +25,16 @@ class Rast:
     Class for representing queries to RAST annotation servers
     """
 
-    def __init__(self, username: str, password: str, jobId: int = None):
+    def __init__(self, username: str, password: str, jobId: int = None, cancel=None):
         """
         Exception raised for bad authentication
         :param username:
         :param password:
+        :param cancel: CancelToken aborting the requests of the job - deleteJob is never cancelled
         """
         self.username = username
         self.password = password
+        self.cancel = cancel
         self.file = None
         self.jobId = jobId
         self.status = None
@@ -55,7 +57,7 @@ class Rast:
                 'login': self.username,
                 'password': self.password,
                 'action': 'perform_login'}
-        checkReq = requests.post(_LOGIN_URL, data=args)
+        checkReq = HttpSession.post(_LOGIN_URL, data=args, cancel=self.cancel)
         checkReq.raise_for_status()
 
         # check for status of login - can be derived from <title> tag
@@ -66,22 +68,24 @@ class Rast:
         else:
             return False
 
-    def submit(self, filePath: str, sequenceName: str):
+    def submit(self, filePath: str, sequenceName: str, fastaContent: str = None):
         """
         Submits a file for annotation
         :param filePath: name of a fasta file
         :param sequenceName: name of the sequence
+        :param fastaContent: content of the fasta file - read from filePath if not given
         Raises RastException if not successful
         """
         _SUBMIT_FUNCTION = 'submit_RAST_job'
 
-        # check if file exists
-        if not os.path.exists(filePath):
-            raise FileNotFoundError('\"{}\" does not exist'.format(filePath))
+        if fastaContent is None:
+            # check if file exists
+            if not os.path.exists(filePath):
+                raise FileNotFoundError('\"{}\" does not exist'.format(filePath))
 
-        # attempt to submit file
-        with open(filePath) as file:
-            fastaContent = file.read()
+            # attempt to submit file
+            with open(filePath) as file:
+                fastaContent = file.read()
 
         # submit args
         args = yaml.dump({'-determineFamily': 0,
@@ -94,10 +98,8 @@ class Rast:
                           '-organismName': sequenceName,
                           '-taxonomyID': ''}, Dumper=yaml.RoundTripDumper)
         # create file content in yaml format
-        file = '-file: |-\n'
-        for line in fastaContent.splitlines():
-            # two spaces indentation for inline string
-            file += '  {}\n'.format(line)
+        # two spaces indentation for inline string
+        file = '-file: |-\n' + ''.join('  {}\n'.format(line) for line in fastaContent.splitlines())
         args += file
 
         payload = {'function': _SUBMIT_FUNCTION,
@@ -105,7 +107,7 @@ class Rast:
                    'username': self.username,
                    'password': self.password}
 
-        submitReq = requests.post(RAST_URL, data=payload)
+        submitReq = HttpSession.post(RAST_URL, data=payload, cancel=self.cancel)
         submitReq.raise_for_status()
 
         submitResponse = yaml.safe_load(submitReq.text)
@@ -138,7 +140,7 @@ class Rast:
                    'password': self.password,
                    'args': args}
 
-        statusReq = requests.post(RAST_URL, data=payload)
+        statusReq = HttpSession.post(RAST_URL, data=payload, cancel=self.cancel)
         statusReq.raise_for_status()
         statusContent = yaml.safe_load(statusReq.text)
         jobStatus = statusContent[self.jobId][_SUCCESS_FIELD]
@@ -165,7 +167,7 @@ class Rast:
                    'password': self.password,
                    'args': args}
 
-        retrieveReq = requests.post(RAST_URL, data=payload)
+        retrieveReq = HttpSession.post(RAST_URL, data=payload, cancel=self.cancel)
         retrieveReq.raise_for_status()
 
         return retrieveReq.text
@@ -184,7 +186,7 @@ class Rast:
                    'password': self.password,
                    'args': '---\n-job:\n  - {}\n'.format(self.jobId)}
 
-        deleteReq = requests.post(RAST_URL, data=payload)
+        deleteReq = HttpSession.post(RAST_URL, data=payload)
         deleteReq.raise_for_status()
 
         deleteContent = yaml.safe_load(deleteReq.text)
@@ -0,0 +1,115 @@
+import hashlib
+import os
+from typing import List, Tuple
+
+
+class SequenceFile:
+    """
+    Class for representing the content of a fasta file
+    The file is read from disk once with a single buffered read and the bytes are shared by every tool query
+    """
+
+    def __init__(self, path: str, data: bytes = None):
+        """
+        Loads the file into memory
+        :param path: path of the fasta file
+        :param data: content to use instead of the content of the file - e.g. a single record of the file
+        """
+        if data is None and not os.path.exists(path):
+            raise FileNotFoundError('\"{}\" does not exist'.format(path))
+
+        self.path = path
+        # base file name without extension
+        self.name = str(os.path.basename(path).split('.')[0])
+
+        if data is None:
+            # read the whole file in one call - the size is known so no intermediate copies are made
+            with open(path, 'rb') as file:
+                data = file.read()
+        self._data = data
+
+        self._text = None
+        self._digest = None
+
+    @property
+    def data(self) -> bytes:
+        """
+        Raw content of the file
+        """
+        return self._data
+
+    @property
+    def text(self) -> str:
+        """
+        Content of the file decoded as text - decoded once on first use
+        """
+        if self._text is None:
+            self._text = self._data.decode('utf-8')
+        return self._text
+
+    def records(self) -> List[Tuple[str, bytes]]:
+        """
+        Splits the file into its fasta records
+        :return: List of (header line, raw record bytes including the header)
+        """
+        records = []
+        data = self._data
+        start = data.find(b'>')
+        while start != -1:
+            end = data.find(b'\n>', start)
+            end = len(data) if end == -1 else end + 1
+            headerEnd = data.find(b'\n', start, end)
+            headerEnd = end if headerEnd == -1 else headerEnd
+            records.append((data[start + 1:headerEnd].strip().decode('utf-8'), data[start:end]))
+            start = data.find(b'>', end) if end < len(data) else -1
+
+        return records
+
+    def sequenceLength(self) -> int:
+        """
+        Number of bases of the records - headers and whitespace are not counted
+        """
+        length = 0
+        for _, record in self.records():
+            headerEnd = record.find(b'\n')
+            if headerEnd != -1:
+                length += len(record[headerEnd + 1:].translate(None, b' \t\r\n'))
+        return length
+
+    def digest(self) -> str:
+        """
+        SHA-256 of the normalized sequences - headers, whitespace and letter case do not change the digest
+        Computed once on first use
+        :return: hex digest
+        """
+        if self._digest is None:
+            hasher = hashlib.sha256()
+            for _, record in self.records():
+                headerEnd = record.find(b'\n')
+                body = b'' if headerEnd == -1 else record[headerEnd + 1:]
+                hasher.update(b'>')
+                hasher.update(body.translate(None, b' \t\r\n').upper())
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    def __len__(self):
+        return len(self._data)
+
+
+if __name__ == '__main__':
+    # benchmark - load time should grow linearly with the file size
+    import tempfile
+    import time
+
+    LINE = b'ACGTTGCAACGTTGCAACGTTGCAACGTTGCAACGTTGCAACGTTGCAACGTTGCAACGTTGCA\n'
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for sizeMb in (1, 5, 10, 25, 50):
+            fileName = os.path.join(tmpDir, 'bench_{}.fasta'.format(sizeMb))
+            with open(fileName, 'wb') as file:
+                file.write(b'>bench\n')
+                file.write(LINE * (sizeMb * 1024 * 1024 // len(LINE)))
+
+            startTime = time.perf_counter()
+            seqFile = SequenceFile(fileName)
+            elapsed = time.perf_counter() - startTime
+            print('{:>3} MB: {:.4f} s ({:.0f} MB/s)'.format(sizeMb, elapsed, len(seqFile) / elapsed / 1024 / 1024))
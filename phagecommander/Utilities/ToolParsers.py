@@ -0,0 +1,252 @@
+"""
+Parsers of the line based outputs of the gene prediction tools
+Each output format is declared once (see FORMATS) - a single scanner reads the gene lines of any format with
+str.split() and yields their (start, stop, direction) fields, which go straight into the columns of a GeneTable
+without creating Gene objects
+"""
+
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from phagecommander import Gene
+from phagecommander.Utilities.GeneTable import GeneTable
+from phagecommander.Utilities.Tools import *
+
+# (start, stop, direction) fields of a gene line
+Row = Tuple[str, str, str]
+
+
+class LineFormat(NamedTuple):
+    """
+    Declaration of an output format with one gene per line
+    """
+    # fields of the start, stop and direction - fields are split on whitespace, or on separator if given
+    columns: Tuple[int, int, int]
+    separator: Optional[str] = None
+    # text the first line must contain
+    signature: Optional[str] = None
+    # the gene lines follow the first line containing the marker
+    marker: Optional[str] = None
+    # lines skipped before the first gene line - after the marker line if there is one
+    skip: int = 0
+    # gene lines end at the first blank line - blank lines are skipped otherwise
+    endAtBlank: bool = False
+    # gene lines end at the first line containing this text
+    endMarker: Optional[str] = None
+    # only lines containing this text are gene lines
+    match: Optional[str] = None
+    # lines containing this text are skipped
+    ignore: Optional[str] = None
+    # the direction field is a signed reading frame (+1, -2...) and reverse genes give their stop first (Glimmer)
+    framed: bool = False
+    # message of the GeneError raised if the signature or marker is missing
+    error: str = 'Invalid file format'
+
+    def rows(self, lines: Iterable[str]) -> Iterator[Row]:
+        """
+        Gene lines of an output
+        :param lines: lines of the output
+        :return: generator of (start, stop, direction) fields
+        """
+        lines = iter(lines)
+        if self.signature is not None and self.signature not in next(lines, ''):
+            raise Gene.GeneError(self.error)
+        if self.marker is not None:
+            for line in lines:
+                if self.marker in line:
+                    break
+            else:
+                raise Gene.GeneError(self.error)
+        for _ in range(self.skip):
+            next(lines, None)
+
+        startField, stopField, directionField = self.columns
+        for line in lines:
+            if self.endMarker is not None and self.endMarker in line:
+                break
+            if self.match is not None and self.match not in line:
+                continue
+            if self.ignore is not None and self.ignore in line:
+                continue
+            fields = line.split(self.separator)
+            if not fields or (self.separator is not None and not line.strip()):
+                if self.endAtBlank:
+                    break
+                continue
+
+            start, stop, direction = fields[startField], fields[stopField], fields[directionField]
+            if self.framed:
+                direction = '+' if '+' in direction else '-'
+                if direction == '-':
+                    start, stop = stop, start
+            yield start, stop, direction
+
+
+class ProdigalFormat:
+    """
+    Prodigal Genbank output - CDS locations of a single record
+    Multi-record files are queried one record at a time (see Gene.queryContigs), so locations are never offset
+    """
+
+    def rows(self, lines: Iterable[str]) -> Iterator[Row]:
+        """
+        :param lines: lines of the output
+        :return: generator of (start, stop, direction) fields
+        """
+        for line in lines:
+            if 'CDS' in line:
+                location = line.strip().split('CDS')[-1].strip()
+                direction = '+'
+                if location.startswith('complement'):
+                    direction = '-'
+                    location = location[len('complement') + 1:-1]
+                start, stop = location.split('..')
+                yield start, stop, direction
+
+
+# GeneMark.hmm family - gene lines under the column header, the first line names the program
+#     1        +          <2         1234        1233       1
+_GENEMARK_HEADER = 'Gene    Strand    LeftEnd    RightEnd       Gene     Class'
+_GENEMARK_HMM = dict(columns=(2, 3, 1), signature='GeneMark.hmm', marker=_GENEMARK_HEADER, skip=1)
+
+# Key - tool (from TOOL_NAMES)
+# Value - format of the tool's output
+FORMATS = {GENEMARK: LineFormat(columns=(2, 3, 1), marker='   ' + _GENEMARK_HEADER, skip=1, endAtBlank=True,
+                                error='Invalid Genemark file format'),
+           GENEMARKS: LineFormat(error='GMS: Not a valid GeneMark GMS file', **_GENEMARK_HMM),
+           HMM: LineFormat(error='Hmm: Not a valid GeneMark Hmm file', **_GENEMARK_HMM),
+           HEURISTIC: LineFormat(error='Hmm: Not a valid GeneMark Hmm file', **_GENEMARK_HMM),
+           # GeneMarkS-2 lst - gene lines after the SequenceID line, up to the trailing comments
+           GENEMARKS2: LineFormat(columns=(2, 3, 1), marker='SequenceID', endMarker='#',
+                                  error='GMS2: Not a valid GeneMarkS-2 file'),
+           # DNA Master format - a header line, then orf, start, stop, signed frame and score
+           GLIMMER: LineFormat(columns=(1, 2, 3), skip=1, ignore='html', framed=True),
+           PRODIGAL: ProdigalFormat(),
+           # gff3 - CDS lines, tab separated
+           RAST: LineFormat(columns=(3, 4, 6), separator='\t', match='CDS')}
+
+
+def position(value: str) -> int:
+    """
+    Position of a start/stop field - partial genes are marked with <, >, &lt; or &gt; (ex: '<2')
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return int(value.split(';')[-1].lstrip('<>'))
+
+
+def table(rows: Iterable[Row], identity='', totalLength: int = 0) -> GeneTable:
+    """
+    GeneTable of the gene lines of an output
+    :param rows: (start, stop, direction) fields
+    :param identity: identifier of the genes
+    :param totalLength: length of the DNA sequence - needed for genes wrapping around its end
+    """
+    builder = GeneTable.Builder()
+    add = builder.add
+    for start, stop, direction in rows:
+        start = position(start)
+        stop = position(stop)
+        length = stop - start + 1
+        # genes that wrap around back to their start
+        if length < 0:
+            length = totalLength + stop - start + 1
+        add(start, stop, direction, length, identity)
+    return builder.build(totalLength)
+
+
+def parse(tool: str, output: Union[str, Iterable[str]], identity='', totalLength: int = 0) -> GeneTable:
+    """
+    Parses the output of a tool
+    :param tool: tool of the output (see FORMATS)
+    :param output: output - a string or an iterable of lines
+    :param identity: identifier of the genes
+    :param totalLength: length of the DNA sequence
+    :return: GeneTable of the genes in file order
+    """
+    lines = output.splitlines() if isinstance(output, str) else output
+    return table(FORMATS[tool].rows(lines), identity, totalLength)
+
+
+def gffRecords(output: Union[str, Iterable[str]], contigs: List[str]) -> List[List[str]]:
+    """
+    Splits a gff3 output on the record of each line (seqid field) - for outputs of a multi-record file
+    :param output: output - a string or an iterable of lines
+    :param contigs: ids of the records of the file
+    :return: lines of each record, in the order of contigs
+    """
+    lines = output.splitlines() if isinstance(output, str) else output
+    records = {contig: [] for contig in contigs}
+    for line in lines:
+        # sequences may follow the annotations
+        if line.startswith('##FASTA'):
+            break
+        if not line.strip() or line.startswith('#'):
+            continue
+        seqid = line.split('\t', 1)[0]
+        if seqid not in records:
+            raise Gene.GeneError('Unknown record {} in gff3 output'.format(seqid))
+        records[seqid].append(line)
+    return [records[contig] for contig in contigs]
+
+
+if __name__ == '__main__':
+    # benchmark - the output of each format parsed into a GeneTable, against creating a Gene per line first
+    # recorded outputs can be given as arguments: tool=path
+    import random
+    import sys
+    import time
+
+    random.seed(0)
+    GENOME_LENGTH = 50000000
+
+    genes = []
+    left = 1
+    while True:
+        left += random.randrange(0, 50)
+        right = left + random.randrange(90, 3000)
+        if right > GENOME_LENGTH:
+            break
+        genes.append((left, right, random.choice('+-')))
+        left = right - random.randrange(0, 40)
+
+    def genemarkLines(first):
+        return [first, 'Sequence file name: genome.fna', '', 'Predicted genes', '   ' + _GENEMARK_HEADER,
+                '    #                                         Length'] + \
+               ['{:>5}        {}        {:>7}      {:>7}        {:>5}       1'.format(ind, direction, left, right,
+                                                                                 right - left + 1)
+                for ind, (left, right, direction) in enumerate(genes, 1)]
+
+    outputs = {GENEMARK: '\n'.join(genemarkLines('GeneMark 2.5p') + ['']),
+               GENEMARKS: '\n'.join(genemarkLines('GeneMark.hmm PROKARYOTIC (Version 3.25)')),
+               GENEMARKS2: '\n'.join(['# GeneMark.hmm-2 LST format', 'SequenceID: genome'] +
+                                     ['{:>6}   {}   {:>7}   {:>7}   {:>5}  native  ATG  0'.format(
+                                         ind, direction, left, right, right - left + 1)
+                                      for ind, (left, right, direction) in enumerate(genes, 1)] + ['# end']),
+               GLIMMER: '\n'.join(['>genome'] + ['orf{:05d}  {:>8} {:>8}  {}1   5.00'.format(
+                   ind, *((left, right) if direction == '+' else (right, left)), direction)
+                   for ind, (left, right, direction) in enumerate(genes, 1)]),
+               PRODIGAL: '\n'.join(['DEFINITION  seqnum=1;seqlen={};seqhdr="genome"'.format(GENOME_LENGTH)] +
+                                   ['     CDS             ' + ('{}..{}' if direction == '+' else
+                                                               'complement({}..{})').format(left, right)
+                                    for left, right, direction in genes]),
+               RAST: '\n'.join(['##gff-version 3'] + ['genome\tFIG\tCDS\t{}\t{}\t.\t{}\t0\tID=fig|{}'.format(
+                   left, right, direction, ind) for ind, (left, right, direction) in enumerate(genes, 1)])}
+    for argument in sys.argv[1:]:
+        tool, path = argument.split('=', 1)
+        with open(path) as file:
+            outputs[tool] = file.read()
+
+    print('{:<10} {:>8} {:>12} {:>12}'.format('format', 'genes', 'GeneTable', 'Gene objects'))
+    for tool, output in outputs.items():
+        startTime = time.perf_counter()
+        parsed = parse(tool, output, tool, GENOME_LENGTH)
+        tableTime = time.perf_counter() - startTime
+
+        # same scan, with a Gene per line as the parsers used to build
+        startTime = time.perf_counter()
+        objects = GeneTable.fromGenes([Gene.Gene(start, stop, direction, tool, GENOME_LENGTH)
+                                       for start, stop, direction in FORMATS[tool].rows(output.splitlines())],
+                                      GENOME_LENGTH)
+        objectTime = time.perf_counter() - startTime
+
+        print('{:<10} {:>8} {:>10.3f} s {:>10.3f} s'.format(tool, len(parsed), tableTime, objectTime))
@@ -0,0 +1,510 @@
+"""
+Phage Commander batch mode
+Annotates a directory (or glob) of fasta files without the GUI and writes the
+.gq, Genbank and Excel outputs of every genome to an output directory
+
+Usage:
+    phagecom-batch <fasta dir | glob> [...] -o <output dir> [options]
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List
+from phagecommander import Gene
+from urllib.parse import urlsplit
+from phagecommander.Utilities import Aragorn, CircuitBreaker, Consensus, ExcelExport, HttpSession, LocalBackends, \
+    MetagenePy, ProdigalPool, ProjectFile, RastPy
+from phagecommander.Utilities.GeneTable import GeneTable
+from phagecommander.Utilities.QueryData import QueryData
+from phagecommander.Utilities.QueryJournal import QueryJournal
+from phagecommander.Utilities.AsyncQuery import AsyncQueryEngine
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+from phagecommander.Utilities.Tools import *
+
+FASTA_EXTENSIONS = ('.fasta', '.fa', '.fna', '.fas')
+
+# maximum number of simultaneous queries to each tool
+# the remote servers are shared resources - keep well below what they will tolerate
+SERVICE_LIMITS = {RAST: 1,
+                  GLIMMER: 2,
+                  GENEMARK: 2,
+                  HMM: 2,
+                  HEURISTIC: 2,
+                  GENEMARKS: 2,
+                  GENEMARKS2: 2,
+                  METAGENE: 2,
+                  ARAGORN: 2,
+                  PRODIGAL: os.cpu_count() or 1}
+
+# web servers of each tool - in async mode the limits of the tools of a server are added up into the limit of its
+# host (see BatchRunner.hostLimits)
+TOOL_SERVERS = {RAST: [RastPy.RAST_URL, RastPy.RAST_USER_URL],
+                GLIMMER: [Gene.GLIMMER_DOMAIN],
+                GENEMARK: [Gene.GM_DOMAIN],
+                HMM: [Gene.GM_HMM_DOMAIN, Gene.FILE_DOMAIN],
+                HEURISTIC: [Gene.HEURISTIC_DOMAIN, Gene.FILE_DOMAIN],
+                GENEMARKS: [Gene.GMS_DOMAIN, Gene.FILE_DOMAIN],
+                GENEMARKS2: [Gene.GMS2_DOMAIN, Gene.FILE_DOMAIN],
+                METAGENE: [MetagenePy.METAGENE_URL],
+                ARAGORN: [Aragorn.URL],
+                PRODIGAL: []}
+
+# tools queried when none are given on the command line
+# RAST requires credentials and is only added when they are given
+DEFAULT_TOOLS = [tool for tool in TOOL_NAMES if tool != RAST]
+
+# directory within the output directory holding the journals of unfinished genomes
+JOURNAL_DIR = '.journal'
+
+
+class BatchError(Exception):
+    pass
+
+
+def findFastaFiles(inputs: List[str]) -> List[str]:
+    """
+    Expands directories and glob patterns into a list of fasta files
+    :param inputs: directories, glob patterns or file paths
+    :return: sorted list of unique fasta file paths
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in os.listdir(item):
+                path = os.path.join(item, name)
+                if os.path.isfile(path) and name.lower().endswith(FASTA_EXTENSIONS):
+                    files.add(path)
+        else:
+            for path in glob.glob(item):
+                if os.path.isfile(path):
+                    files.add(path)
+
+    return sorted(files)
+
+
+class BatchRunner:
+    """
+    Runs the selected tools for many genomes
+    Each tool has its own bounded worker pool (see SERVICE_LIMITS) so the number of requests in flight to a
+    single server never exceeds its limit, no matter how many genomes are being processed
+    With useAsync, all queries instead run on a single event loop (see AsyncQueryEngine) which bounds the
+    requests in flight to each host - the limit of a host is the sum of the limits of its tools (see hostLimits)
+    """
+
+    def __init__(self, tools: List[str], outputDir: str, species: str, prodigalLocation: str = None,
+                 rastUser: str = None, rastPass: str = None, genomeWorkers: int = 4, minCalls: int = 1,
+                 serviceLimits: Dict[str, int] = None, useAsync: bool = False, bypassCache: bool = False,
+                 localBinaries: Dict[str, str] = None, fallbackBinaries: Dict[str, str] = None):
+        """
+        :param tools: tools to query for each genome (see TOOL_NAMES)
+        :param outputDir: directory to write the outputs to
+        :param species: species for GeneMark Hmm (see Gene.SPECIES)
+        :param prodigalLocation: path to the Prodigal binary
+        :param rastUser: RAST username
+        :param rastPass: RAST password
+        :param genomeWorkers: number of genomes processed at once
+        :param minCalls: minimum number of calls for a gene to be exported to Genbank
+        :param serviceLimits: overrides of SERVICE_LIMITS
+        :param useAsync: query with the asynchronous engine instead of thread pools
+        :param bypassCache: query every tool even if its output is cached
+        :param localBinaries: dict of tool: path of a local executable serving the tool instead of its web server
+        :param fallbackBinaries: dict of tool: path of a local executable serving the tool once its web server stops
+            answering (see Gene.GeneFile.fallBackToLocal)
+        """
+        if species not in Gene.SPECIES:
+            raise BatchError('{} is not a compatible species type - See species.txt'.format(species))
+        if PRODIGAL in tools and prodigalLocation is None:
+            raise BatchError('Prodigal requires the location of the Prodigal binary (--prodigal)')
+        if RAST in tools and (rastUser is None or rastPass is None):
+            raise BatchError('RAST requires a username and password (--rast-user/--rast-pass)')
+        localBinaries = dict() if localBinaries is None else localBinaries
+        fallbackBinaries = dict() if fallbackBinaries is None else fallbackBinaries
+        for tool, path in list(localBinaries.items()) + list(fallbackBinaries.items()):
+            if tool not in LocalBackends.BACKENDS:
+                raise BatchError('{} has no local backend - local tools: {}'.format(
+                    tool, ', '.join(LocalBackends.BACKENDS)))
+            if not os.path.isfile(path):
+                raise BatchError('{} executable "{}" does not exist'.format(tool, path))
+
+        self.tools = tools
+        self.outputDir = outputDir
+        self.species = species
+        self.prodigalLocation = prodigalLocation
+        self.rastUser = rastUser
+        self.rastPass = rastPass
+        self.genomeWorkers = genomeWorkers
+        self.minCalls = minCalls
+        self.useAsync = useAsync
+        self.bypassCache = bypassCache
+        self.localBinaries = localBinaries
+        self.fallbackBinaries = fallbackBinaries
+
+        self.serviceLimits = dict(SERVICE_LIMITS)
+        # local runs are bounded by the core slots of LocalBackends, not by a server
+        self.serviceLimits.update({tool: LocalBackends.DEFAULT_WORKERS for tool in localBinaries})
+        if serviceLimits is not None:
+            self.serviceLimits.update(serviceLimits)
+        # pool of each tool - created by run, only when querying with threads
+        self._toolPools = dict()
+
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._startTime = None
+        # stops the queries of every genome (see cancel)
+        self._cancel = CancelToken()
+
+    def cancel(self):
+        """
+        Stops the batch - queries in flight are aborted and the genomes not yet finished are not written
+        Submitted jobs are kept in the journals so a rerun resumes them
+        """
+        self._cancel.cancel()
+
+    def run(self, fastaFiles: List[str]) -> Dict[str, QueryData]:
+        """
+        Annotates each fasta file and writes its outputs
+        :param fastaFiles: list of fasta file paths
+        :return: dictionary of fasta file: QueryData
+        """
+        os.makedirs(self.outputDir, exist_ok=True)
+        self._startTime = time.monotonic()
+        self._completed = 0
+        self._total = len(fastaFiles)
+
+        results = dict()
+        if self.useAsync:
+            asyncio.run(self._runAsync(fastaFiles, results))
+            return results
+
+        self._toolPools = {tool: ThreadPoolExecutor(max_workers=self.serviceLimits[tool], thread_name_prefix=tool)
+                           for tool in self.tools}
+        try:
+            with ThreadPoolExecutor(max_workers=self.genomeWorkers, thread_name_prefix='genome') as genomePool:
+                futures = {genomePool.submit(self.annotate, fastaFile): fastaFile for fastaFile in fastaFiles}
+                try:
+                    for future in futures:
+                        fastaFile = futures[future]
+                        try:
+                            results[fastaFile] = future.result()
+                        except QueryCancelledError:
+                            pass
+                        except Exception as e:
+                            print('{}: {}'.format(fastaFile, e), file=sys.stderr)
+                except KeyboardInterrupt:
+                    # the pools wait for their threads - which return as soon as their queries are aborted
+                    self.cancel()
+                    raise
+        finally:
+            for pool in self._toolPools.values():
+                pool.shutdown()
+            self._toolPools = dict()
+
+        return results
+
+    def hostLimits(self) -> Dict[str, int]:
+        """
+        Maximum simultaneous requests to each host in async mode - the sum of the limits of the tools it serves
+        Tools served by a local executable send no requests
+        :return: dict of host name: limit
+        """
+        limits = dict()
+        for tool in self.tools:
+            if tool in self.localBinaries:
+                continue
+            for host in {urlsplit(url).hostname for url in TOOL_SERVERS[tool]}:
+                limits[host] = limits.get(host, 0) + self.serviceLimits[tool]
+        return limits
+
+    async def _runAsync(self, fastaFiles: List[str], results: Dict[str, QueryData]):
+        """
+        Annotates each fasta file on the event loop
+        :param fastaFiles: list of fasta file paths
+        :param results: dictionary of fasta file: QueryData to fill
+        """
+        loop = asyncio.get_running_loop()
+        genomeSlots = asyncio.Semaphore(self.genomeWorkers)
+
+        async with AsyncQueryEngine(hostLimits=self.hostLimits(), bypassCache=self.bypassCache) as engine:
+            async def annotate(fastaFile):
+                async with genomeSlots:
+                    try:
+                        self._cancel.check()
+                        geneFile, queryData = self._prepare(fastaFile)
+                        await engine.queryGenome(geneFile, queryData, self.tools)
+                        # partial results of a cancelled batch are not written
+                        self._cancel.check()
+                        # writing the outputs is blocking
+                        await loop.run_in_executor(None, self._finish, geneFile, queryData)
+                        results[fastaFile] = queryData
+                    except QueryCancelledError:
+                        pass
+                    except Exception as e:
+                        print('{}: {}'.format(fastaFile, e), file=sys.stderr)
+
+            try:
+                await asyncio.gather(*[annotate(fastaFile) for fastaFile in fastaFiles])
+            except asyncio.CancelledError:
+                # interrupted - abort the requests, processes and polls still running in other threads
+                self.cancel()
+                raise
+
+    def annotate(self, fastaFile: str) -> QueryData:
+        """
+        Queries every tool for a single genome, then writes the .gq, Genbank and Excel outputs
+        :param fastaFile: path of the fasta file
+        :return: QueryData of the genome
+        Raises QueryCancelledError if the batch is cancelled
+        """
+        self._cancel.check()
+        geneFile, queryData = self._prepare(fastaFile)
+
+        # each query waits for a free slot in the pool of its tool
+        # the records of multi-record files are queried one after the other so the pool limits still hold
+        futures = [self._toolPools[tool].submit(Gene.queryTool, geneFile, tool, queryData, self.bypassCache, 1)
+                   for tool in self.tools]
+        wait(futures)
+
+        # partial results of a cancelled batch are not written
+        self._cancel.check()
+        self._finish(geneFile, queryData)
+
+        return queryData
+
+    def _prepare(self, fastaFile: str):
+        """
+        Loads a genome
+        :param fastaFile: path of the fasta file
+        :return: (GeneFile, QueryData)
+        """
+        queryData = QueryData()
+        queryData.fileName = fastaFile
+        queryData.species = self.species
+        queryData.tools = {tool: tool in self.tools for tool in TOOL_NAMES}
+        queryData.toolData = {tool: None for tool in self.tools}
+        queryData.rastUser = self.rastUser
+        queryData.rastPass = self.rastPass
+
+        queryData.loadSequence()
+
+        geneFile = Gene.GeneFile(fastaFile, self.species, self.prodigalLocation, self.localBinaries,
+                                 self.fallbackBinaries)
+
+        # journals are kept with the outputs - rerunning an interrupted batch resumes each genome
+        geneFile.journal = QueryJournal.forSession(geneFile.sequence.digest(), self.species, self.tools,
+                                                   os.path.join(self.outputDir, JOURNAL_DIR))
+        geneFile.journal.setSession(fastaFile, self.species, self.tools)
+        geneFile.cancel = self._cancel
+
+        return geneFile, queryData
+
+    def _finish(self, geneFile: 'Gene.GeneFile', queryData: QueryData):
+        """
+        Writes the outputs of a queried genome and reports progress
+        """
+        self.writeOutputs(queryData, geneFile.file_name)
+        if not geneFile.journal.unfinished():
+            geneFile.journal.remove()
+        self._reportProgress(geneFile.file_name, queryData)
+
+    def writeOutputs(self, queryData: QueryData, name: str):
+        """
+        Writes the .gq, Genbank and Excel files of a genome to the output directory
+        :param queryData: QueryData with the tool results
+        :param name: base name of the output files
+        """
+        basePath = os.path.join(self.outputDir, name)
+
+        # tool results without errors
+        toolGenes = {tool: genes for tool, genes in queryData.toolData.items() if not isinstance(genes, Exception)}
+
+        exportGenbank(queryData.contigs, toolGenes, basePath + '.gb', self.minCalls)
+        exportExcel(toolGenes, basePath + '.xlsx')
+
+        # .gq - same as GeneMain.saveAs
+        # never store RAST credentials in output files
+        queryData.rastUser = None
+        queryData.rastPass = None
+        queryData.fileName = basePath + '.gq'
+        ProjectFile.save(queryData, queryData.fileName)
+
+    def _reportProgress(self, name: str, queryData: QueryData):
+        """
+        Prints the status of a finished genome along with the overall throughput
+        """
+        errors = [tool for tool, genes in queryData.toolData.items() if isinstance(genes, Exception)]
+        with self._lock:
+            self._completed += 1
+            elapsedMinutes = (time.monotonic() - self._startTime) / 60
+            rate = self._completed / elapsedMinutes if elapsedMinutes > 0 else 0.0
+            status = '[{}/{}] {}: {} tools'.format(self._completed, self._total, name, len(queryData.toolData))
+            if errors:
+                status += ', errors: {}'.format(', '.join(
+                    '{} ({})'.format(tool.upper(), queryData.toolData[tool]) for tool in errors))
+            print('{} - {:.2f} genomes/min'.format(status, rate))
+
+
+def exportGenbank(sequence, toolGenes: dict, fileName: str, minCalls: int = 1):
+    """
+    Writes the majority rule consensus of the tool calls to a Genbank file
+    :param sequence: SeqRecord of the DNA sequence, or list of the SeqRecords of a multi-record sequence
+        * each record is written as its own Genbank record
+    :param toolGenes: dictionary of tool: List[Gene]
+    :param fileName: name of the file to write to
+    :param minCalls: minimum number of tools that must call a gene for it to be exported
+        * tRNAs are always exported
+    """
+    groups = Consensus.ConsensusGroups([GeneTable.fromGenes(genes) for genes in toolGenes.values()])
+    genesToExport = groups.mostOccurrences(groups.select(lambda x: x >= minCalls, True))
+
+    if isinstance(sequence, list) and len(sequence) > 1:
+        Gene.GeneUtils.contigsGenbankToFile(sequence, genesToExport, fileName)
+    else:
+        sequence = sequence[0] if isinstance(sequence, list) else sequence
+        Gene.GeneUtils.genbankToFile(sequence.seq, genesToExport, fileName)
+
+
+def exportExcel(toolGenes: dict, fileName: str):
+    """
+    Writes the gene and tRNA tables to an Excel spreadsheet
+    Same layout as the tables of the main window - rows are streamed to the file (see ExcelExport)
+    :param toolGenes: dictionary of tool: List[Gene]
+    :param fileName: name of the file to write to
+    """
+    wb = ExcelExport.workbook()
+    for toolList, label in ((GENE_TOOLS, 'Genes'), (TRNA_TOOLS, 'TRNA')):
+        usedTools = [tool for tool in toolGenes if tool in toolList]
+        if len(usedTools) == 0:
+            continue
+
+        groups = Consensus.ConsensusGroups([GeneTable.fromGenes(toolGenes[tool]) for tool in usedTools])
+        ExcelExport.writeSheet(wb, label, groups, usedTools)
+
+    ExcelExport.save(wb, fileName)
+
+
+def configureSession(connectTimeout: float = None, readTimeout: float = None, retries: int = None):
+    """
+    Overrides the timeouts and retries of every server (see HttpSession.HOST_POLICIES)
+    :param connectTimeout: seconds to wait for a connection - None to keep the setting of each server
+    :param readTimeout: seconds to wait for an answer - None to keep the setting of each server
+    :param retries: retries of failed connections and gateway errors - None to keep the setting of each server
+    """
+    def override(policy: HttpSession.HostPolicy) -> HttpSession.HostPolicy:
+        connect, read = policy.timeout
+        return policy._replace(timeout=(connect if connectTimeout is None else connectTimeout,
+                                        read if readTimeout is None else readTimeout),
+                               retries=policy.retries if retries is None else retries)
+
+    default = override(HttpSession.HostPolicy())
+    HttpSession.configure(timeout=default.timeout, retries=default.retries,
+                          hostPolicies={host: override(policy) for host, policy in HttpSession.HOST_POLICIES.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='phagecom-batch',
+                                     description='Annotate a directory of fasta files with Phage Commander')
+    parser.add_argument('inputs', nargs='+', help='fasta files, directories or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='output directory')
+    parser.add_argument('-t', '--tools', nargs='+', choices=TOOL_NAMES, default=None,
+                        help='tools to query (default: all except RAST, RAST is added if credentials are given)')
+    parser.add_argument('-s', '--species', default=Gene.SPECIES[0], help='host species for host-trained GeneMark')
+    parser.add_argument('--prodigal', default=None, help='path to the Prodigal binary')
+    parser.add_argument('--prodigal-workers', type=int, default=ProdigalPool.DEFAULT_WORKERS,
+                        help='number of Prodigal processes run at once (default: number of cores)')
+    parser.add_argument('--local', action='append', default=[], metavar='TOOL=PATH',
+                        help='serve a tool with a local executable instead of its web server, '
+                             'tools: {} (can be repeated)'.format(', '.join(LocalBackends.BACKENDS)))
+    parser.add_argument('--local-workers', type=int, default=LocalBackends.DEFAULT_WORKERS,
+                        help='number of local executables run at once (default: number of cores)')
+    parser.add_argument('--fallback', action='append', default=[], metavar='TOOL=PATH',
+                        help='serve a tool with a local executable once its web server stops answering '
+                             '(default: the executable on the PATH, if any) (can be repeated)')
+    parser.add_argument('--service-limit', action='append', default=[], metavar='TOOL=N',
+                        help='maximum simultaneous queries to a tool (default: set per tool) (can be repeated)')
+    parser.add_argument('--connect-timeout', type=float, default=None,
+                        help='seconds to wait for a connection to a server (default: set per server)')
+    parser.add_argument('--read-timeout', type=float, default=None,
+                        help='seconds to wait for a server to answer (default: set per server)')
+    parser.add_argument('--retries', type=int, default=None,
+                        help='retries of failed connections and gateway errors (default: {})'.format(
+                            HttpSession.DEFAULT_RETRIES))
+    parser.add_argument('--breaker-failures', type=int, default=CircuitBreaker.FAILURE_THRESHOLD,
+                        help='consecutive failed requests after which a server is skipped (default: %(default)s)')
+    parser.add_argument('--breaker-reset', type=float, default=CircuitBreaker.RESET_TIMEOUT,
+                        help='seconds a failing server is skipped before it is tried again (default: %(default)s)')
+    parser.add_argument('--rast-user', default=None, help='RAST username')
+    parser.add_argument('--rast-pass', default=os.environ.get('PHAGECOM_RAST_PASS'),
+                        help='RAST password (default: $PHAGECOM_RAST_PASS)')
+    parser.add_argument('-j', '--genomes', type=int, default=4, help='number of genomes processed at once')
+    parser.add_argument('--min-calls', type=int, default=1,
+                        help='minimum number of tools calling a gene for it to be exported to Genbank')
+    parser.add_argument('--async', dest='useAsync', action='store_true',
+                        help='run all queries on a single event loop (allows many more genomes in flight)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='query every tool again instead of reading cached outputs')
+    args = parser.parse_args(argv)
+
+    tools = args.tools
+    if tools is None:
+        tools = list(DEFAULT_TOOLS)
+        if args.rast_user is not None:
+            tools.insert(0, RAST)
+        if args.prodigal is None:
+            tools.remove(PRODIGAL)
+
+    ProdigalPool.configure(args.prodigal_workers)
+    LocalBackends.configure(args.local_workers)
+    CircuitBreaker.configure(args.breaker_failures, args.breaker_reset)
+    if (args.connect_timeout, args.read_timeout, args.retries) != (None, None, None):
+        configureSession(args.connect_timeout, args.read_timeout, args.retries)
+
+    localBinaries = dict()
+    fallbackBinaries = dict()
+    for option, binaries, values in (('--local', localBinaries, args.local),
+                                     ('--fallback', fallbackBinaries, args.fallback)):
+        for value in values:
+            tool, separator, path = value.partition('=')
+            if not separator:
+                parser.error('{} expects TOOL=PATH, got "{}"'.format(option, value))
+            binaries[tool] = path
+
+    serviceLimits = dict()
+    for value in args.service_limit:
+        tool, separator, limit = value.partition('=')
+        if tool not in TOOL_NAMES or not separator or not limit.isdigit() or int(limit) < 1:
+            parser.error('--service-limit expects TOOL=N with N >= 1, got "{}"'.format(value))
+        serviceLimits[tool] = int(limit)
+
+    fastaFiles = findFastaFiles(args.inputs)
+    if len(fastaFiles) == 0:
+        parser.error('no fasta files found')
+
+    try:
+        runner = BatchRunner(tools, args.output, args.species, prodigalLocation=args.prodigal,
+                             rastUser=args.rast_user, rastPass=args.rast_pass, genomeWorkers=args.genomes,
+                             minCalls=args.min_calls, serviceLimits=serviceLimits, useAsync=args.useAsync,
+                             bypassCache=args.refresh,
+                             localBinaries=localBinaries, fallbackBinaries=fallbackBinaries)
+    except BatchError as e:
+        parser.error(str(e))
+
+    startTime = time.monotonic()
+    try:
+        results = runner.run(fastaFiles)
+    except KeyboardInterrupt:
+        print('Cancelled - rerun the batch to resume the unfinished genomes', file=sys.stderr)
+        return 130
+    elapsedMinutes = (time.monotonic() - startTime) / 60
+    print('Annotated {} of {} genomes in {:.1f} min'.format(len(results), len(fastaFiles), elapsedMinutes))
+
+    return 0 if len(results) == len(fastaFiles) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
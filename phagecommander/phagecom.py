@@ -1,16 +1,18 @@
 import os
-import pickle
 import pathlib
+import time
 from typing import List
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from Bio import SeqIO
 from phagecommander import Gene
 import phagecommander.GuiWidgets
-from phagecommander.Utilities import ThreadData, ProdigalRelease, Aragorn
+from phagecommander.Utilities import ThreadData, ProdigalRelease, Aragorn, QueryJournal, LocalBackends, Consensus, \
+    ProjectFile, ExcelExport
+from phagecommander.Utilities.Cancellation import CancelToken
+from phagecommander.Utilities.GeneTable import GeneTable
+from phagecommander.Utilities.QueryData import QueryData
 from phagecommander.Utilities.Tools import *
 import platform # (GRyde) Needed to disable Glimmer box for Windows
 
@@ -18,58 +20,7 @@ APP_NAME = 'Phage Commander'
 
 # mappings of tool names to appropriate methods
 # [queryMethod, parseMethod]
-TOOL_METHODS = {GENEMARK: [Gene.GeneFile.genemark_query,
-                           Gene.GeneParse.parse_genemark],
-                HMM: [Gene.GeneFile.genemarkhmm_query,
-                      Gene.GeneParse.parse_genemarkHmm],
-                HEURISTIC: [Gene.GeneFile.genemark_heuristic_query,
-                            Gene.GeneParse.parse_genemarkHeuristic],
-                GENEMARKS: [Gene.GeneFile.genemarks_query,
-                            Gene.GeneParse.parse_genemarkS],
-                GENEMARKS2: [Gene.GeneFile.genemarks2_query,
-                             Gene.GeneParse.parse_genemarkS2],
-                GLIMMER: [Gene.GeneFile.glimmer_query,
-                          Gene.GeneParse.parse_glimmer],
-                PRODIGAL: [Gene.GeneFile.prodigal_query,
-                           Gene.GeneParse.parse_prodigal],
-                RAST: [Gene.GeneFile.rastQuery,
-                       Gene.GeneParse.parse_rast],
-                METAGENE: [Gene.GeneFile.metageneQuery,
-                           Gene.GeneParse.parse_metagene],
-                ARAGORN: [Gene.GeneFile.aragornQuery,
-                          Gene.GeneParse.parse_aragorn]}
-
-
-class QueryData:
-    """
-    Class for representing tool/species selections
-    """
-
-    def __init__(self):
-        # tools to call
-        self.tools = {key: True for key in TOOL_NAMES}
-        # species of the DNA sequence
-        self.species = ''
-        # path of the DNA file
-        self.fileName = ''
-        # tool data
-        # Key - tool (from TOOL_NAMES)
-        # Value - List of Genes
-        self.toolData = dict()
-        # sequence
-        self.sequence = ''
-        # RAST related information
-        self.rastUser = ''
-        self.rastPass = ''
-        self.rastJobID = None
-
-    def wipeUserCredentials(self):
-        """
-        Deletes any data relating to a RAST query
-        """
-        self.rastJobID = None
-        self.rastUser = None
-        self.rastPass = None
+TOOL_METHODS = Gene.TOOL_METHODS
 
 
 class ColorTable(QWidget):
@@ -85,6 +36,18 @@ class ColorTable(QWidget):
     MAJORITY_TEXT_EIGHTH_SETTING = 'TABLE/majority_text_eighth_color/'
     # (GRyde) ************************************************************************** end
     MINORITY_TEXT_SETTING = 'TABLE/minority_text_color/' # Need to change minority references to Ninth color
+    # text colors of the 1st to 8th majority start/stop, then of the minority
+    TEXT_SETTINGS = [MAJORITY_TEXT_SETTING,
+                     MAJORITY_TEXT_SECOND_SETTING,
+                     MAJORITY_TEXT_THIRD_SETTING,
+                     MAJORITY_TEXT_FOURTH_SETTING,
+                     MAJORITY_TEXT_FIFTH_SETTING,
+                     MAJORITY_TEXT_SIXTH_SETTING,
+                     MAJORITY_TEXT_SEVENTH_SETTING,
+                     MAJORITY_TEXT_EIGHTH_SETTING,
+                     MINORITY_TEXT_SETTING]
+    # ColorPalette of the settings - loaded on first use, dropped when a color setting changes
+    _palette = None
     _TABLE_COLUMN_HEADERS = [
         'Cell Color',
         'Majority Text',
@@ -489,6 +452,7 @@ class ColorTable(QWidget):
             # (GRyde) ****************************************************************** end
             if column == self._MINORITY_TEXT_COLUMN:
                 self.settings.setValue(self.MINORITY_TEXT_SETTING + str(row), colorStr)
+            ColorTable.invalidatePalette()
 
     def changeCellColor(self, row, column):
         """
@@ -526,6 +490,7 @@ class ColorTable(QWidget):
             minorityItem.setBackground(color)
             colorStr = ' '.join([str(x) for x in color.getRgb()[:3]])
             self.settings.setValue(self.CELL_COLOR_SETTING + str(row), colorStr)
+            ColorTable.invalidatePalette()
 
     def resetToDefaultAll(self):
         """
@@ -625,6 +590,25 @@ class ColorTable(QWidget):
                 minorityItem.setBackground(cellColor)
                 cellColorStr = ' '.join([str(x) for x in cellColor.getRgb()[:3]])
                 self.settings.setValue(self.CELL_COLOR_SETTING + str(row), cellColorStr)
+            ColorTable.invalidatePalette()
+
+    @classmethod
+    def palette(cls, settings) -> 'phagecommander.GuiWidgets.ColorPalette':
+        """
+        Colors of the gene tables - the settings are only read again after a color setting changed
+        :param settings: QSettings
+        """
+        if cls._palette is None:
+            cls._palette = phagecommander.GuiWidgets.ColorPalette(settings, cls.CELL_COLOR_SETTING, cls.TEXT_SETTINGS,
+                                                                  len(GENE_TOOLS))
+        return cls._palette
+
+    @classmethod
+    def invalidatePalette(cls):
+        """
+        Drops the loaded palette - called when a color setting changes
+        """
+        cls._palette = None
 
     @staticmethod
     def checkDefaultSettings(settings):
@@ -672,6 +656,7 @@ class ColorTable(QWidget):
         Sets the settings related to cell colors to default values
         :param settings: QSettings object
         """
+        ColorTable.invalidatePalette()
         for i in range(len(GENE_TOOLS)):
             # CELL COLORS
             defaultColorStr = ' '.join(str(color) for color in ColorTable._DEFAULT_CELL_COLORS[i])
@@ -718,6 +703,67 @@ class ColorTable(QWidget):
             settings.setValue(ColorTable.MINORITY_TEXT_SETTING + str(i), defaultColorStr)
 
 
+class LocalToolsTab(QWidget):
+    """
+    Widget for setting the locally installed executables which serve tools instead of their web servers
+    """
+    # setting of each tool's executable - empty to query the web server
+    _LOCAL_BINARY_SETTING = 'LOCAL_TOOLS/{}'
+    _TOOL_LABELS = {GLIMMER: 'Glimmer (glimmer3)',
+                    GENEMARKS2: 'GeneMark S2 (gms2.pl)',
+                    METAGENE: 'Metagene (mga)',
+                    ARAGORN: 'Aragorn (aragorn)'}
+
+    def __init__(self, settings, parent=None):
+        """
+        :param settings: QSettings
+        """
+        super(LocalToolsTab, self).__init__(parent)
+        self.settings = settings
+
+        layout = QGridLayout()
+        self.pathEdits = dict()
+        for row, tool in enumerate(LocalBackends.BACKENDS):
+            pathEdit = QLineEdit(self.settings.value(self._LOCAL_BINARY_SETTING.format(tool)) or '')
+            pathEdit.setPlaceholderText('Web server')
+            pathEdit.editingFinished.connect(lambda tool=tool: self.saveBinary(tool))
+            browseButton = QPushButton('Browse...')
+            browseButton.clicked.connect(lambda checked, tool=tool: self.browseBinary(tool))
+            self.pathEdits[tool] = pathEdit
+
+            layout.addWidget(QLabel(self._TOOL_LABELS.get(tool, tool)), row, 0)
+            layout.addWidget(pathEdit, row, 1)
+            layout.addWidget(browseButton, row, 2)
+        layout.setRowStretch(len(LocalBackends.BACKENDS), 1)
+        self.setLayout(layout)
+
+    def browseBinary(self, tool):
+        """
+        Opens a file dialog to choose the executable of a tool
+        """
+        fileName = QFileDialog.getOpenFileName(self, 'Select {} executable'.format(self._TOOL_LABELS[tool]))[0]
+        if fileName:
+            self.pathEdits[tool].setText(fileName)
+            self.saveBinary(tool)
+
+    def saveBinary(self, tool):
+        self.settings.setValue(self._LOCAL_BINARY_SETTING.format(tool), self.pathEdits[tool].text().strip())
+
+    @staticmethod
+    def localBinaries(settings):
+        """
+        Executables set for the tools
+        :param settings: QSettings
+        :return: dict of tool: path, only tools with an existing executable
+        """
+        binaries = dict()
+        for tool in LocalBackends.BACKENDS:
+            path = settings.value(LocalToolsTab._LOCAL_BINARY_SETTING.format(tool))
+            if path and os.path.isfile(path):
+                binaries[tool] = path
+        return binaries
+
+
 class SettingsDialog(QDialog):
     """
     Dialog for Settings
@@ -734,6 +780,7 @@ class SettingsDialog(QDialog):
 
         # UI Initializations
         self.initTableTab()
+        self.initLocalToolsTab()
 
         # Layout
         layout.addWidget(self.tabWidget)
@@ -747,6 +794,10 @@ class SettingsDialog(QDialog):
         self.tableTab = ColorTable(self.settings)
         self.tabWidget.addTab(self.tableTab, 'Table')
 
+    def initLocalToolsTab(self):
+        self.localToolsTab = LocalToolsTab(self.settings)
+        self.tabWidget.addTab(self.localToolsTab, 'Local Tools')
+
 
 class NewFileDialog(QDialog):
     """
@@ -827,6 +878,9 @@ class NewFileDialog(QDialog):
         aragornLabel.setFont(labelFont)
         aragornBox = QCheckBox('Aragorn (for tRNA)')
         
+        # outputs of earlier queries are reused unless the tools are queried again
+        self.refreshBox = QCheckBox('Query again (ignore stored outputs)')
+
         # checkbox font
         checkBoxFont = QFont()
         checkBoxFont.setPointSize(12)
@@ -937,6 +991,7 @@ class NewFileDialog(QDialog):
         mainLayout.addLayout(checkBoxLayout)
         mainLayout.addLayout(speciesLayout)
         mainLayout.addWidget(aragornBox)
+        mainLayout.addWidget(self.refreshBox)
         mainLayout.addWidget(fileLabel)
         mainLayout.addLayout(dnaFileLayout)
         mainLayout.addLayout(buttonLayout)
@@ -973,6 +1028,7 @@ class NewFileDialog(QDialog):
 
         # update species
         self.queryData.species = self.speciesComboBox.currentText()
+        self.queryData.bypassCache = self.refreshBox.isChecked()
 
         # check if dna file was given
         if self.fileEdit.text() == '':
@@ -1052,8 +1108,8 @@ class NewFileDialog(QDialog):
 
 class QueryThread(QThread):
     """
-    Thread for making performing the call to a gene prediction tool and parsing the data
-    Returns the list of Genes via reference
+    Thread for querying a gene prediction tool and parsing its output
+    The result is stored in queryData.toolData and reported by QueryManager once the thread finishes
     """
 
     def __init__(self, geneFile, tool, queryData, settings):
@@ -1070,61 +1126,34 @@ class QueryThread(QThread):
         self.queryData = queryData
         self.geneFile = geneFile
         self.settings = settings
+        # seconds the query took
+        self.elapsed = 0.0
 
     def run(self):
         """
-        Performs the query of the gene prediction tool and parses the output data
-        :return: a list of Genes is returned through self.geneData
-        """
-        queryMethod = TOOL_METHODS[self.tool][0]
-        parseMethod = TOOL_METHODS[self.tool][1]
-
-        # perform query
-        # if query is unsuccessful, return the error instead
-        try:
-            if self.tool == RAST:
-                username = self.queryData.rastUser
-                password = self.queryData.rastPass
-                jobID = self.queryData.rastJobID
-                queryMethod(self.geneFile, username, password, jobId=jobID)
-            else:
-                queryMethod(self.geneFile)
-        except Exception as e:
-            self.queryData.toolData[self.tool] = e
-            return
-            
-        # (GRyde) Call to parse methods updated with third argument, which is length of gene sequence
-        try:
-            genes = parseMethod(self.geneFile.query_data[self.tool], identity=self.tool, totalLength=len(self.queryData.sequence))
-        except Exception as e:
-            self.queryData.toolData[self.tool] = e
-            return
-            
-
-        """
-            (GRyde) Original code
-        # perform parsing of data
-        try:
-            genes = parseMethod(self.geneFile.query_data[self.tool], identity=self.tool)
-        except Exception as e:
-            self.queryData.toolData[self.tool] = e
-            return
+        Queries the tool with Gene.queryTool - its GeneTable, or the exception raised by the query, is stored in
+        queryData.toolData[tool] and QueryManager emits it through resultSig / errorSig when the thread finishes
         """
-
-        # update query object with genes
-        self.queryData.toolData[self.tool] = genes
-
-        # wipe RAST user creds
-        if self.tool == RAST:
-            self.queryData.wipeUserCredentials()
+        startTime = time.perf_counter()
+        Gene.queryTool(self.geneFile, self.tool, self.queryData, self.queryData.bypassCache)
+        self.elapsed = time.perf_counter() - startTime
 
 
 class QueryManager(QThread):
     """
     Thread for managing gene prediction tool calls
     """
+    # milliseconds abort waits for the query threads to stop
+    ABORT_WAIT = 1000
+    # query threads still running after an abort (deleting a server job) - kept until they finish
+    _stoppingThreads = set()
     # signal emitted each time a querying thread returns
     progressSig = pyqtSignal()
+    # signals emitted as each tool returns - the tool, its Genes or error, and the seconds its query took
+    resultSig = pyqtSignal(str, object, float)
+    errorSig = pyqtSignal(str, str, float)
+    # signal emitted once every query thread has stopped - after an abort too, once the threads it left running stop
+    stoppedSig = pyqtSignal()
 
     def __init__(self, queryData, settings):
         """
@@ -1139,13 +1168,27 @@ class QueryManager(QThread):
 
         # create GeneFile
         self.geneFile = Gene.GeneFile(self.queryData.fileName, self.queryData.species,
-                                      self.settings.value(GeneMain._PRODIGAL_BINARY_LOCATION_SETTING))
+                                      self.settings.value(GeneMain._PRODIGAL_BINARY_LOCATION_SETTING),
+                                      LocalToolsTab.localBinaries(self.settings))
+
+        # record the progress of each tool so an interrupted query can be resumed
+        # tools which finished in an earlier session are not queried again
+        tools = [tool for tool in self.queryData.tools if self.queryData.tools[tool] is True]
+        self.journal = QueryJournal.QueryJournal.forSession(self.geneFile.sequence.digest(), self.queryData.species,
+                                                            tools)
+        self.journal.setSession(self.queryData.fileName, self.queryData.species, tools)
+        self.geneFile.journal = self.journal
+
+        # stops every query of the session on abort
+        self.cancel = CancelToken()
+        self.geneFile.cancel = self.cancel
+        self.aborted = False
 
         # load sequence
         # with open(self.queryData.fileName) as seqFile:
         #     self.queryData.sequence = seqFile.read().split('\n')[1].lower()
-        for seq_rec in SeqIO.parse(self.queryData.fileName, 'fasta'):
-            self.queryData.sequence = seq_rec
+        # every record is kept - the records of multi-record files are queried separately (see Gene.queryContigs)
+        self.queryData.loadSequence()
 
         # THREAD ALLOCATIONS -----------------------------------------------------------------------
         self.threads = []
@@ -1153,7 +1196,10 @@ class QueryManager(QThread):
             if self.queryData.tools[tool] is True:
                 self.threads.append(QueryThread(self.geneFile, tool, self.queryData, self.settings))
 
+        # query threads which have not stopped yet
+        self._running = len(self.threads)
         for thread in self.threads:
+            thread.finished.connect(self.threadStopped)
             thread.finished.connect(self.queryReturn)
 
         for thread in self.threads:
@@ -1161,19 +1207,68 @@ class QueryManager(QThread):
 
     @pyqtSlot()
     def queryReturn(self):
+        # threads stopped by an abort are not reported
+        if self.aborted:
+            return
+
         # emit progressSig to update progressBar
         self.progressSig.emit()
 
+        thread = self.sender()
+        result = self.queryData.toolData[thread.tool]
+        if result is None or isinstance(result, Exception):
+            self.errorSig.emit(thread.tool, str(result), thread.elapsed)
+        else:
+            self.resultSig.emit(thread.tool, result, thread.elapsed)
+
         # keep waiting until all calls have returned
         for tool in self.queryData.toolData:
             if self.queryData.toolData[tool] is None:
                 return
 
+        # every tool finished - nothing left to resume
+        if not self.journal.unfinished():
+            self.journal.remove()
+
         self.exit()
 
-    def abort(self):
+    @pyqtSlot()
+    def threadStopped(self):
+        self._running -= 1
+        if self._running == 0:
+            self.stoppedSig.emit()
+
+    def stopped(self) -> bool:
+        """
+        :return: True if every query thread has stopped - no tool writes to the QueryData anymore
+        """
+        return self._running == 0
+
+    def abort(self, deleteJobs: bool = False):
+        """
+        Cancels the queries of the tools which have not returned and stops the manager
+        Waits up to ABORT_WAIT ms for the query threads to stop
+        :param deleteJobs: delete the jobs submitted to servers - otherwise they are kept so the query can be resumed
+        """
+        self.aborted = True
+        self.cancel.cancel(deleteJobs)
+
+        deadline = time.monotonic() + QueryManager.ABORT_WAIT / 1000
+        for thread in self.threads:
+            thread.wait(max(0, int((deadline - time.monotonic()) * 1000)))
+            if thread.isRunning():
+                QueryManager._stoppingThreads.add(thread)
+                thread.finished.connect(lambda thread=thread: QueryManager._stoppingThreads.discard(thread))
+
         self.exit()
 
+    def submittedJobs(self) -> bool:
+        """
+        :return: True if a tool still running has a job on a server which can be deleted (RAST)
+        """
+        return self.queryData.tools.get(RAST) is True and self.queryData.rastJobID is None and \
+            self.queryData.toolData.get(RAST) is None
+
 
 class QueryDialog(QDialog):
     """
@@ -1191,15 +1286,26 @@ class QueryDialog(QDialog):
         self.thread = QueryManager(queryData, self.settings)
         self.thread.finished.connect(self.queryStop)
         self.thread.progressSig.connect(self.updateProgress)
+        self.thread.resultSig.connect(self.toolResult)
+        self.thread.errorSig.connect(self.toolError)
+
+        # status of each tool - with the time its query took once it returns
+        toolLayout = QGridLayout()
+        self.toolLabels = dict()
+        for row, tool in enumerate(tool for tool in self.queryData.tools if self.queryData.tools[tool] is True):
+            self.toolLabels[tool] = QLabel('Querying...')
+            toolLayout.addWidget(QLabel(tool.upper()), row, 0)
+            toolLayout.addWidget(self.toolLabels[tool], row, 1)
 
         self.progressBar = QProgressBar()
         # set progress max to the amount of tools to be queried
         self.progressBar.setMaximum(list(self.queryData.tools.values()).count(True))
 
         self.cancelButton = QPushButton('Cancel')
-        self.cancelButton.clicked.connect(self.thread.abort)
+        self.cancelButton.clicked.connect(self.cancelQuery)
 
         # WIDGET LAYOUT ----------------------------------------------------------------------------
+        mainLayout.addLayout(toolLayout)
         mainLayout.addWidget(self.progressBar)
         mainLayout.addWidget(self.cancelButton)
         self.setLayout(mainLayout)
@@ -1211,6 +1317,24 @@ class QueryDialog(QDialog):
         self.progressBar.setValue(0)
         self.thread.start()
 
+    @pyqtSlot()
+    def cancelQuery(self):
+        """
+        Cancels the query - the user chooses whether a submitted RAST job is deleted or kept for resuming
+        """
+        deleteJobs = False
+        if self.thread.submittedJobs():
+            answer = QMessageBox.question(self, 'Cancel Query',
+                                          'Delete the RAST job from the server?\n'
+                                          'Keep it to resume the query later.',
+                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No)
+            if answer == QMessageBox.Cancel:
+                return
+            deleteJobs = answer == QMessageBox.Yes
+
+        self.cancelButton.setEnabled(False)
+        self.thread.abort(deleteJobs)
+
     @pyqtSlot()
     def updateProgress(self):
         """
@@ -1218,6 +1342,20 @@ class QueryDialog(QDialog):
         """
         self.progressBar.setValue(self.progressBar.value() + 1)
 
+    @pyqtSlot(str, object, float)
+    def toolResult(self, tool, genes, seconds):
+        """
+        Shows the number of calls of a tool which returned
+        """
+        self.toolLabels[tool].setText('{} calls in {:.1f} s'.format(len(genes), seconds))
+
+    @pyqtSlot(str, str, float)
+    def toolError(self, tool, error, seconds):
+        """
+        Shows the error of a tool which failed
+        """
+        self.toolLabels[tool].setText('Failed after {:.1f} s: {}'.format(seconds, error))
+
     @pyqtSlot()
     def queryStop(self):
         """
@@ -1272,37 +1410,34 @@ class exportGenbankDialog(phagecommander.GuiWidgets.exportDialog):
         Called when user presses export
         """
 
-        # put all Genes in one list
-        filteredGenes = []
-        for geneSet in self.queryData.toolData.values():
-            filteredGenes.extend(geneSet)
+        # group the Genes of all tools
+        groups = Consensus.ConsensusGroups([GeneTable.fromGenes(geneSet) for geneSet in self.queryData.toolData.values()
+                                            if geneSet is not None and not isinstance(geneSet, Exception)])
 
         # filter based on user selection
-        filteredGenes = Gene.GeneUtils.filterGenes(filteredGenes, self.getFilterFunction(), self.exportTRNA)
-        # filtered genes is now List[List[Gene]]
-        
-        genesToExport = []
+        selected = groups.select(self.getFilterFunction(), self.exportTRNA)
+
         # (GRyde) Adding methods for exporting based on longest gene or specific program
-        
+        genesToExport = []
         if self.codonCurrentSelection == self._MOST_OCCURRENCES_TEXT:
             # find the most frequent Gene in each set of Genes
-            for geneSet in filteredGenes:
-                genesToExport.append(Gene.GeneUtils.findMostGeneOccurrences(geneSet))
-                
+            genesToExport = groups.mostOccurrences(selected)
+
         elif self.codonCurrentSelection == self._LONGEST_TEXT:
             # find the longest Gene in each set of Genes
-            for geneSet in filteredGenes:
-                genesToExport.append(Gene.GeneUtils.findLongestGene(geneSet))
-                
+            genesToExport = groups.longest(selected)
+
         elif self.codonCurrentSelection == self._SPECIFIC_PROGRAM_TEXT:
             # find the gene called by a specific program (if not called by program, use most or longest in tie)
-            programFilter = self.getSpecificProgram()
-            for geneSet in filteredGenes:
-                genesToExport.append(Gene.GeneUtils.useSpecificProgram(geneSet, programFilter))
+            genesToExport = groups.specificProgram(self.getSpecificProgram(), selected)
 
         # output to file
         try:
-            Gene.GeneUtils.genbankToFile(str(self.queryData.sequence.seq).lower(), genesToExport, self.saveFileName)
+            # records of multi-record files are written as separate Genbank records
+            if len(self.queryData.contigs) > 1:
+                Gene.GeneUtils.contigsGenbankToFile(self.queryData.contigs, genesToExport, self.saveFileName)
+            else:
+                Gene.GeneUtils.genbankToFile(self.queryData.sequence.seq, genesToExport, self.saveFileName)
         except PermissionError as e:
             QMessageBox.warning(self,
                                 'Permission Denied',
@@ -1361,8 +1496,8 @@ class GeneMain(QMainWindow):
         self.tab = QTabWidget()
 
         # tables
-        self.geneTable = QTableWidget()
-        self.trnaTable = QTableWidget()
+        self.geneTable = QTableView()
+        self.trnaTable = QTableView()
 
         # status bar
         self.status = self.statusBar()
@@ -1418,6 +1553,12 @@ class GeneMain(QMainWindow):
         self.dirty = False
         # if saving is enabled
         self.saveEnabled = False
+        # if tools are being queried (see queryFile)
+        self.querying = False
+        self.queryDialog = None
+        # QueryManager of the last query - kept until its threads stop (see enableActions)
+        self.queryManager = None
+        self.shownBeforeQuery = None
 
         self.genes = []
 
@@ -1432,6 +1573,9 @@ class GeneMain(QMainWindow):
         # check for Prodigal binary
         self.checkProdigal()
 
+        # offer to resume a query which was interrupted
+        self.resumeInterruptedQuery()
+
     # ACTION METHODS -------------------------------------------------------------------------------
     @pyqtSlot()
     def fileNew(self):
@@ -1448,30 +1592,123 @@ class GeneMain(QMainWindow):
         dialog = NewFileDialog(tmpQueryData, self.settings, self.settings.value(self._PRODIGAL_BINARY_LOCATION_SETTING))
         # if user initiates a query
         if dialog.exec_():
-            # query tools
-            self.queryData = tmpQueryData
-            queryDialog = QueryDialog(self.queryData, self.settings)
-
-            # query to tools is successful
-            if queryDialog.exec_():
-                # update open variable
-                self.fileOpened = True
-                self.dirty = True
-                self.saveEnabled = False
-                # enable / disable actions
-                self.enableActions()
-                # update window title with temporary file name
-                self.setWindowTitle('{} - {}'.format(APP_NAME, 'untitled*'))
-                # display gene data
-                self.updateTable()
-            # query was canceled by user - back to main window
-            else:
-                pass
+            self.queryFile(tmpQueryData)
 
         # user does not initiate query - back to main window
         else:
             pass
 
+    def queryFile(self, queryData):
+        """
+        Queries the selected tools and displays the results
+        :param queryData: QueryData with the file, species and tools to query
+        """
+        # what is shown now - back on screen if the query is canceled before any tool returns
+        self.shownBeforeQuery = (self.queryData, self.fileOpened, self.saveEnabled, self.windowTitle(),
+                                 [(self.tab.widget(index), self.tab.tabText(index))
+                                  for index in range(self.tab.count())],
+                                 [(table, table.model()) for table in (self.geneTable, self.trnaTable)])
+
+        # query tools
+        self.queryData = queryData
+        self.queryDialog = QueryDialog(self.queryData, self.settings, self)
+
+        # the tables fill in as each tool returns (see showToolCalls) - the dialog is not modal, so the first
+        # results can be inspected while the slower tools run
+        self.updateTable()
+        self.queryManager = self.queryDialog.thread
+        self.queryManager.resultSig.connect(self.showToolCalls)
+        self.queryManager.stoppedSig.connect(self.enableActions)
+        self.queryDialog.finished.connect(self.queryFinished)
+        self.querying = True
+        self.enableActions()
+        self.queryDialog.show()
+
+    @pyqtSlot(str, object, float)
+    def showToolCalls(self, tool: str, genes, seconds: float = 0.0):
+        """
+        Adds the calls of a tool to its table - the table is updated in place, see GeneTableModel.setTool
+        :param tool: tool which returned
+        :param genes: Genes / GeneTable of the tool
+        :param seconds: time the query of the tool took
+        """
+        table = self.geneTable if tool in GENE_TOOLS else self.trnaTable
+        model = table.model()
+        if isinstance(model, phagecommander.GuiWidgets.GeneTableModel) and tool in model.tools:
+            model.setTool(tool, GeneTable.fromGenes(genes))
+        self.status.showMessage('{}: {} calls in {:.1f} s'.format(tool.upper(), len(genes), seconds))
+
+        # partial results are part of the file - exported once every tool has stopped (see enableActions)
+        if not self.fileOpened:
+            self.fileOpened = True
+            self.dirty = True
+            self.saveEnabled = False
+            self.setWindowTitle('{} - {}'.format(APP_NAME, 'untitled*'))
+            self.enableActions()
+
+    @pyqtSlot(int)
+    def queryFinished(self, result: int):
+        """
+        Called when the query dialog closes - all tools returned, some failed, or the user canceled
+        :param result: QDialog.Accepted if every tool returned calls
+        """
+        self.queryDialog.deleteLater()
+        self.queryDialog = None
+        self.querying = False
+        shownBefore = self.shownBeforeQuery
+        self.shownBeforeQuery = None
+
+        returned = [tool for tool, genes in self.queryData.toolData.items()
+                    if genes is not None and not isinstance(genes, Exception)]
+        if result != QDialog.Accepted and not returned:
+            # nothing to show - back to what was shown before
+            self.queryData, self.fileOpened, self.saveEnabled, title, tabs, models = shownBefore
+            self.setWindowTitle(title)
+            self.tab.clear()
+            for widget, label in tabs:
+                self.tab.addTab(widget, label)
+            for table, model in models:
+                table.setModel(model)
+        elif result != QDialog.Accepted:
+            # the calls of the tools which returned are shown - the errors of the others are kept in toolData
+            self.updateTable()
+        # exports stay disabled until the threads left running by an abort stop (see QueryManager.stoppedSig)
+        self.enableActions()
+
+    def resumeInterruptedQuery(self):
+        """
+        Checks for queries which stopped before all tools finished and offers to resume them
+        Finished tools are read from the session journal, submitted jobs are reattached to
+        """
+        for journal in QueryJournal.QueryJournal.interrupted():
+            session = journal.session
+            answer = QMessageBox.question(self, 'Resume Query',
+                                          'The query of "{}" was interrupted.\n'
+                                          'Unfinished tools: {}\n\nResume it?'.format(
+                                              session['fileName'],
+                                              ', '.join(tool.upper() for tool in journal.unfinished())),
+                                          QMessageBox.Yes | QMessageBox.No)
+            # discard the session
+            if answer != QMessageBox.Yes:
+                journal.remove()
+                continue
+
+            queryData = QueryData()
+            queryData.fileName = session['fileName']
+            queryData.species = session['species']
+            queryData.tools = {tool: tool in session['tools'] for tool in TOOL_NAMES}
+            queryData.toolData = {tool: None for tool in session['tools']}
+
+            # RAST credentials are never stored - prompt for them again
+            if queryData.tools[RAST]:
+                credDialog = phagecommander.GuiWidgets.RastJobDialog(queryData)
+                if not credDialog.exec_():
+                    continue
+
+            # only one file can be open at a time
+            self.queryFile(queryData)
+            return
+
     def openFile(self):
         """
         Open a query data file
@@ -1493,31 +1730,28 @@ class GeneMain(QMainWindow):
         if openFileName[0] != '':
             # try to open file
             try:
-                with open(openFileName[0], 'rb') as openFile:
-                    tempQueryData = pickle.load(openFile)
-                    # check if file is QueryData object
-                    if not isinstance(tempQueryData, QueryData):
-                        # show error message
-                        QMessageBox.Warning(self, "Invalid File",
-                                            "File: {} was not .gq formatted file".format(
-                                                openFileName[0]))
-                        return
-                    # assign new data
-                    self.queryData = tempQueryData
-                    self.fileOpened = True
-                    self.saveEnabled = True
-                    self.enableActions()
-                    # save location
-                    self.settings.setValue(self._LAST_OPEN_FILE_LOCATION_SETTING, os.path.split(openFileName[0])[0])
-                    # change window titles
-                    self.setWindowTitle('{} - {}'.format(APP_NAME, openFileName[0]))
-                    # update table
-                    self.updateTable()
+                # the calls of each tool are read when its table is shown
+                tempQueryData = ProjectFile.load(openFileName[0])
+                # assign new data
+                self.queryData = tempQueryData
+                self.fileOpened = True
+                self.saveEnabled = True
+                self.enableActions()
+                # save location
+                self.settings.setValue(self._LAST_OPEN_FILE_LOCATION_SETTING, os.path.split(openFileName[0])[0])
+                # change window titles
+                self.setWindowTitle('{} - {}'.format(APP_NAME, openFileName[0]))
+                # update table
+                self.updateTable()
 
             # opening file was unsuccessful
             except FileNotFoundError:
                 QMessageBox.warning(self, 'File Does not Exist',
                                     'File: {} does not exist.'.format(openFileName[0]))
+            except ProjectFile.ProjectFileError as e:
+                # show error message
+                QMessageBox.warning(self, 'Invalid File',
+                                    'File: {} was not .gq formatted file\n{}'.format(openFileName[0], e))
             except Exception as e:
                 QMessageBox.warning(self, 'Error Opening File',
                                     str(e))
@@ -1530,8 +1764,7 @@ class GeneMain(QMainWindow):
         :return True/False if save was successful
         """
         # save file
-        with open(self.queryData.fileName, 'wb') as saveFile:
-            pickle.dump(self.queryData, saveFile)
+        ProjectFile.save(self.queryData, self.queryData.fileName)
         # update status bar
         self.status.showMessage('Changes saved to: {}'.format(self.queryData.fileName, 5000))
         return True
@@ -1552,9 +1785,8 @@ class GeneMain(QMainWindow):
 
         # check if user didn't provide file
         if saveFileName[0] != '':
-            with open(saveFileName[0], 'wb') as saveFile:
-                self.queryData.fileName = saveFileName[0]
-                pickle.dump(self.queryData, saveFile)
+            self.queryData.fileName = saveFileName[0]
+            ProjectFile.save(self.queryData, saveFileName[0])
             self.status.showMessage('File saved to: {}'.format(saveFileName[0]), 5000)
             # update file name
             # update window title
@@ -1571,9 +1803,14 @@ class GeneMain(QMainWindow):
 
     @pyqtSlot()
     def settings(self):
+        palette = ColorTable.palette(self.settings)
         preferencesDialog = SettingsDialog()
         preferencesDialog.exec_()
-        self.updateTable()
+        # tables are only recolored if a color changed
+        if ColorTable.palette(self.settings) is not palette:
+            for table in (self.geneTable, self.trnaTable):
+                if isinstance(table.model(), phagecommander.GuiWidgets.GeneTableModel):
+                    table.model().setPalette(ColorTable.palette(self.settings))
 
     @pyqtSlot()
     def exportExcel(self):
@@ -1602,62 +1839,33 @@ class GeneMain(QMainWindow):
                 elif key in TRNA_TOOLS:
                     TRNA_USED = True
 
-            wb = Workbook()
+            # rows are streamed to the file as they are written (see ExcelExport)
+            wb = ExcelExport.workbook()
             if GENES_USED:
                 self._exportTableToExcel(self.geneTable, 'Genes', wb)
             if TRNA_USED:
                 self._exportTableToExcel(self.trnaTable, 'TRNA', wb)
 
-            wb.save(filename=excelFileName[0])
+            ExcelExport.save(wb, excelFileName[0])
 
-            print(excelFileName[0])
             excelLocation = str(pathlib.Path(excelFileName[0]).parent)
             self.settings.setValue(self._LAST_EXCEL_SAVE_LOCATION_SETTING, excelLocation)
 
             self.status.showMessage('Exported Excel file to: {}'.format(excelFileName[0]), 5000)
 
-    def _exportTableToExcel(self, table: QTableWidget, label: str, wb: Workbook):
+    def _exportTableToExcel(self, table: QTableView, label: str, wb: Workbook):
         """
         Adds the given table to the Excel Workbook as a new sheet
-        :param table: QTableWidget
+        :param table: QTableView showing a GeneTableModel
         :param label: Name of the new sheet
-        :param wb: Excel Workbook
+        :param wb: write-only Excel Workbook (see ExcelExport.workbook)
         """
+        model = table.model()
+        if model is None:
+            return
 
-        # check if adding to existing workbook
-        # if not, rename first sheet
-        if wb.sheetnames[0] == 'Sheet':
-            ws = wb['Sheet']
-            ws.title = label
-        else:
-            ws = wb.create_sheet(label)
-
-        # add content to spreadsheet
-        # add headers
-        currentRow = 1
-        for column in range(table.columnCount()):
-            headerValue = table.horizontalHeaderItem(column).text()
-            cell = ws.cell(row=currentRow, column=column + 1, value=headerValue)
-            cell.alignment = Alignment(horizontal='center')
-            cell.font = Font(bold=True)
-
-        # add content
-        for row in range(table.rowCount()):
-            for column in range(table.columnCount()):
-                currCell = table.item(row, column)
-                cellValue = currCell.text() if currCell is not None else ''
-                if currCell is not None:
-                    cellColor = currCell.background().color().getRgb()
-                    cellRgbString = ''.join(['{:02x}'.format(num) for num in cellColor[:3]])
-                    fontColor = currCell.foreground().color().getRgb()
-                    fontRgbString = ''.join(['{:02x}'.format(num) for num in fontColor[:3]])
-
-                # convert an integer string to an integer for spreadsheet functionality
-                cellValue = int(cellValue) if cellValue.isdecimal() else cellValue
-                cell = ws.cell(row=row + 2, column=column + 1, value=cellValue)
-                cell.alignment = Alignment(horizontal='center')
-                cell.fill = PatternFill(fgColor=cellRgbString, fill_type='solid')
-                cell.font = Font(color=fontRgbString)
+        # written from the groups of the model, with the colors of the table
+        ExcelExport.writeSheet(wb, label, model.groups, model.tools, model.palette.rgbStrings)
 
     @pyqtSlot()
     def exportGenbank(self):
@@ -1671,7 +1879,10 @@ class GeneMain(QMainWindow):
     # WINDOW METHODS -------------------------------------------------------------------------------
 
     def closeEvent(self, event):
-        if self.okToContinue():
+        if self.querying:
+            QMessageBox.information(self, 'Query Running', 'Tools are still being queried - cancel the query first.')
+            event.ignore()
+        elif self.okToContinue():
             # exit
             pass
         else:
@@ -1725,375 +1936,29 @@ class GeneMain(QMainWindow):
                 self._update_table(self.trnaTable, TRNA_TOOLS, 1, self._TRNA_TAB_LABEL)
                 TRNA_COMPLETE = True
 
-    def _update_table(self, table: QTableWidget, toolList: List[str], index: int, label: str):
+    def _update_table(self, table: QTableView, toolList: List[str], index: int, label: str):
 
         self.tab.removeTab(index)
 
-        # remove any existing cells
-        table.setRowCount(0)
-        table.setColumnCount(0)
-
         # table options
-        table.setSelectionMode(QTableWidget.NoSelection)
-
-        # sort genes
-        genes = []
-        usedGeneTools = []
-        for tool in self.queryData.toolData:
-            if tool in toolList:
-                usedGeneTools.append(tool)
-                genes += self.queryData.toolData[tool]
-
-        # calculate columns for tools
-        toolNumber = len(usedGeneTools)
-        toolColumns = toolNumber * 4 + toolNumber - 1
-        # add 3 columns for statistics
-        totalColumns = toolColumns + 3
-        table.setColumnCount(totalColumns)
-
-        # generate headers
-        headerIndexes = dict()
-        TOTAL_CALLS_COLUMN = 0
-        ALL_COLUMN = 1
-        ONE_COLUMN = 2
-        currIndex = 3
-        headers = ['TOTAL CALLS', 'ALL', 'ONE']
-        for ind, tool in enumerate(usedGeneTools):
-            headerIndexes[tool] = currIndex
-            for i in range(4):
-                currIndex += 1
-                headers.append(tool.upper())
-            if ind != toolNumber - 1:
-                headers.append('')
-                currIndex += 1
-
-        # set headers
-        table.setHorizontalHeaderLabels(headers)
-
-        # nothing to display - exit
-        if len(genes) == 0:
-            # create an empty table
-            self.tab.insertTab(index, table, label)
-            return
+        table.setSelectionMode(QAbstractItemView.NoSelection)
 
-        genes = Gene.GeneUtils.sortGenes(genes)
-
-        # reset genes
-        self.genes = []
-
-        # populate table
-        # insert first gene
-        currentRow = 0
-        table.insertRow(currentRow)
-        previousGene = genes[0]
-        currentGeneCount = 1
-        currentGeneSet = [genes[0]]
-        currentGenes = dict()
-        geneIndex = headerIndexes[previousGene.identity]
-        # direction
-        directionItem = QTableWidgetItem(previousGene.direction)
-        directionItem.setTextAlignment(Qt.AlignCenter)
-        table.setItem(currentRow, geneIndex, directionItem)
-        # start
-        startItem = QTableWidgetItem(str(previousGene.start))
-        startItem.setTextAlignment(Qt.AlignCenter)
-        table.setItem(currentRow, geneIndex + 1, startItem)
-        # stop
-        stopItem = QTableWidgetItem(str(previousGene.stop))
-        stopItem.setTextAlignment(Qt.AlignCenter)
-        table.setItem(currentRow, geneIndex + 2, stopItem)
-        # length
-        lengthItem = QTableWidgetItem(str(previousGene.length))
-        lengthItem.setTextAlignment(Qt.AlignCenter)
-        table.setItem(currentRow, geneIndex + 3, lengthItem)
-
-        if previousGene.direction == '+':
-            comparingNum = previousGene.start
-        else:
-            comparingNum = previousGene.stop
-        # insert comparing num into dict
-        if comparingNum not in currentGenes.keys():
-            currentGenes[comparingNum] = 1
-        else:
-            currentGenes[comparingNum] += 1
+        # tools shown in the table
+        usedGeneTools = [tool for tool in self.queryData.toolData if tool in toolList]
 
-        # insert rest of genes
-        for gene in genes[1:]:
-            geneIndex = headerIndexes[gene.identity]
+        # group the calls of all tools - one row per group (see Consensus.ConsensusGroups)
+        # tools still being queried have no calls yet - they are added as they return (see showToolCalls)
+        groups = Consensus.ConsensusGroups([GeneTable.fromGenes(self.queryData.toolData[tool])
+                                            for tool in usedGeneTools
+                                            if self.queryData.toolData[tool] is not None and
+                                            not isinstance(self.queryData.toolData[tool], Exception)],
+                                           tools=usedGeneTools)
+        self.genes = groups
 
-            # same gene - add to current row
-            if gene == previousGene:
-                currentGeneCount += 1
-                currentGeneSet.append(gene)
-            # different gene - create new row
-            else:
-                # record TOTAL_CALLS, ALL and ONE for previous gene
-                totalItem = QTableWidgetItem(str(currentGeneCount))
-                totalItem.setTextAlignment(Qt.AlignCenter)
-                table.setItem(currentRow, TOTAL_CALLS_COLUMN, totalItem)
-                if currentGeneCount == toolNumber:
-                    allItem = QTableWidgetItem(str('X'))
-                    allItem.setTextAlignment(Qt.AlignCenter)
-                    table.setItem(currentRow, ALL_COLUMN, allItem)
-                elif currentGeneCount == 1:
-                    oneItem = QTableWidgetItem(str('X'))
-                    oneItem.setTextAlignment(Qt.AlignCenter)
-                    table.setItem(currentRow, ONE_COLUMN, oneItem)
-
-                # color row
-                colorSetting = self.settings.value(ColorTable.CELL_COLOR_SETTING + str(currentGeneCount - 1))
-                colorNums = [int(num) for num in colorSetting.split(' ')]
-                color = QColor(*colorNums)
-                # color text
-                textColorSetting = self.settings.value(ColorTable.MAJORITY_TEXT_SETTING + str(currentGeneCount - 1))
-                textNums = [int(num) for num in textColorSetting.split(' ')]
-                textColor = QColor(*textNums)
-                # (GRyde) ******************************************************************** 
-                # Establish 2nd/3rd/4th majority text settings
-                # 2nd
-                textColorSecondSetting = self.settings.value(ColorTable.MAJORITY_TEXT_SECOND_SETTING + str(currentGeneCount - 1))
-                textNumsSecond = [int(num) for num in textColorSecondSetting.split(' ')]
-                textColorSecond = QColor(*textNumsSecond)
-                # 3rd
-                textColorThirdSetting = self.settings.value(ColorTable.MAJORITY_TEXT_THIRD_SETTING + str(currentGeneCount - 1))
-                textNumsThird = [int(num) for num in textColorThirdSetting.split(' ')]
-                textColorThird = QColor(*textNumsThird)
-                # 4th
-                textColorFourthSetting = self.settings.value(ColorTable.MAJORITY_TEXT_FOURTH_SETTING + str(currentGeneCount - 1))
-                textNumsFourth = [int(num) for num in textColorFourthSetting.split(' ')]
-                textColorFourth = QColor(*textNumsFourth)
-                # 5th
-                textColorFifthSetting = self.settings.value(ColorTable.MAJORITY_TEXT_FIFTH_SETTING + str(currentGeneCount - 1))
-                textNumsFifth = [int(num) for num in textColorFifthSetting.split(' ')]
-                textColorFifth = QColor(*textNumsFifth)
-                # 6th
-                textColorSixthSetting = self.settings.value(ColorTable.MAJORITY_TEXT_SIXTH_SETTING + str(currentGeneCount - 1))
-                textNumsSixth = [int(num) for num in textColorSixthSetting.split(' ')]
-                textColorSixth = QColor(*textNumsSixth)
-                # 7th
-                textColorSeventhSetting = self.settings.value(ColorTable.MAJORITY_TEXT_SEVENTH_SETTING + str(currentGeneCount - 1))
-                textNumsSeventh = [int(num) for num in textColorSeventhSetting.split(' ')]
-                textColorSeventh = QColor(*textNumsSeventh)
-                # 8th
-                textColorEighthSetting = self.settings.value(ColorTable.MAJORITY_TEXT_EIGHTH_SETTING + str(currentGeneCount - 1))
-                textNumsEighth = [int(num) for num in textColorEighthSetting.split(' ')]
-                textColorEighth = QColor(*textNumsEighth)
-                # Original start
-                # Establish minority text settings
-                minTextColorSetting = self.settings.value(ColorTable.MINORITY_TEXT_SETTING + str(currentGeneCount - 1))
-                minTextNums = [int(num) for num in minTextColorSetting.split(' ')]
-                minTextColor = QColor(*minTextNums)
-                # Original end
-                # (GRyde) ******************************************************************** end
-                # TODO: Figure out minority rule
-                # (GRyde) ******************************************************************** start
-                
-                #Establish if majority case should be compared against start or stop
-                if currentGeneSet[0].direction == '+':
-                    compareStart = True
-                else:
-                    compareStart = False
-                    
-                majorityNum = []
-                majorityCalls = 0
-                
-                uniqueNum = []
-                
-                # Determine start/stop with greatest amount of calls for current gene
-                for number in currentGenes.keys():
-                    if currentGenes[number] > majorityCalls:
-                        majorityCalls = currentGenes[number]
-                        
-                # Compare calls to each comparingNum vs highest amount for current gene
-                for number in currentGenes.keys():
-                    if currentGenes[number] == majorityCalls:
-                        majorityNum.append(number)
-                        
-                # Including minTextColor just for testing, remove once other 5 colors added        
-                textColors = [
-                    textColor,
-                    textColorSecond,
-                    textColorThird,
-                    textColorFourth,
-                    textColorFifth,
-                    textColorSixth,
-                    textColorSeventh,
-                    textColorEighth,
-                    minTextColor
-                ]        
-                textList = []
-                
-                # If all start/stop comparison numbers match, no need to set up different colors
-                if not (majorityCalls == currentGeneCount):
-                    
-                    for number in majorityNum:
-                        uniqueNum.append(number)
-                        
-                    for number in currentGenes.keys():
-                        if not (number in uniqueNum):
-                            uniqueNum.append(number)
-                            
-                    for currentGene in currentGeneSet:
-                        if compareStart:
-                            colorIndex = uniqueNum.index(currentGene.start)
-                            textList.append([currentGene, textColors[colorIndex]])
-                        else:
-                            colorIndex = uniqueNum.index(currentGene.stop)
-                            textList.append([currentGene, textColors[colorIndex]])
-                
-                # Ver. 2 start
-                # if not (majorityCalls == currentGeneCount):
-                    # for currentGene in currentGeneSet:
-                        # matchFound = False
-                        # for number in majorityNum:
-                            # if compareStart:
-                                # if currentGene.start == number:
-                                    # colorIndex = majorityNum.index(number)
-                                    # textList.append([currentGene, textColors[colorIndex]])
-                                    # matchFound = True
-                                    # break
-                            # else:
-                                # if currentGene.stop == number:
-                                    # colorIndex = majorityNum.index(number)
-                                    # textList.append([currentGene, textColors[colorIndex]])
-                                    # matchFound = True
-                                    # break
-                        # if not matchFound:
-                            # textList.append([currentGene, minTextColor])
-                # Ver. 2 end
-                
-                # Original start
-                # If single comparing number received all tool calls, ignore as there is no minority
-                # Otherwise, compare start/stop of each gene in currentGeneSet vs majority numbers
-                # if not (majorityCalls == currentGeneCount):
-                    # for minGene in currentGeneSet:
-                        # isMinority = True
-                        # for number in majorityNum:
-                            # if compareStart:
-                                # if minGene.start == number:
-                                    # isMinority = False
-                            # else:
-                                # if minGene.stop == number:
-                                    # isMinority = False
-                        # minTextList.append([isMinority, minGene])
-                # Original end
-                                     
-                # (GRyde) ******************************************************************** end
-                for column in range(totalColumns):
-                    item = table.item(currentRow, column)
-                    # insert blank item if none is present
-                    if item is None:
-                        item = QTableWidgetItem('')
-                        table.setItem(currentRow, column, item)
-                    item.setBackground(color)
-                    item.setForeground(textColor)
-                    
-                # (GRyde) ******************************************************************** start
-                for currentGene, geneColor in textList:
-                    geneColIndex = headerIndexes[currentGene.identity]
-                    if compareStart:
-                        item = table.item(currentRow, geneColIndex + 1)
-                        item.setForeground(geneColor)
-                    else:
-                        item = table.item(currentRow, geneColIndex + 2)
-                        item.setForeground(geneColor)
-                # Original start
-                # Set minority text for appropriate items
-                # for minCheck, minGene in minTextList:
-                    # if minCheck:
-                        # minGeneIndex = headerIndexes[minGene.identity]
-                        # if compareStart:
-                            # item = table.item(currentRow, minGeneIndex + 1)
-                            # item.setForeground(minTextColor)
-                        # else:
-                            # item = table.item(currentRow, minGeneIndex + 2)
-                            # item.setForeground(minTextColor)
-                # Original end
-                # (GRyde) ******************************************************************** end
-
-                # record new gene
-                currentGeneCount = 1
-                currentGenes = dict()
-                currentRow += 1
-                table.insertRow(currentRow)
-
-                # add full set to genes
-                self.genes.append(currentGeneSet)
-                currentGeneSet = [gene]
-
-            # add gene to table
-            # direction
-            directionItem = QTableWidgetItem(gene.direction)
-            directionItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, geneIndex, directionItem)
-            # start
-            startItem = QTableWidgetItem(str(gene.start))
-            startItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, geneIndex + 1, startItem)
-            # stop
-            stopItem = QTableWidgetItem(str(gene.stop))
-            stopItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, geneIndex + 2, stopItem)
-            # length
-            lengthItem = QTableWidgetItem(str(gene.length))
-            lengthItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, geneIndex + 3, lengthItem)
-
-            if gene.direction == '+':
-                comparingNum = gene.start
-            else:
-                comparingNum = gene.stop
-                # insert comparing num into dict
-            if comparingNum not in currentGenes.keys():
-                currentGenes[comparingNum] = 1
-            else:
-                currentGenes[comparingNum] += 1
-
-            # set gene to compare next against
-            previousGene = gene
-
-        # record TOTAL_CALLS, ALL and ONE for last gene
-        totalItem = QTableWidgetItem(str(currentGeneCount))
-        totalItem.setTextAlignment(Qt.AlignCenter)
-        table.setItem(currentRow, TOTAL_CALLS_COLUMN, totalItem)
-        if currentGeneCount == toolNumber:
-            allItem = QTableWidgetItem(str('X'))
-            allItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, ALL_COLUMN, allItem)
-        elif currentGeneCount == 1:
-            oneItem = QTableWidgetItem(str('X'))
-            oneItem.setTextAlignment(Qt.AlignCenter)
-            table.setItem(currentRow, ONE_COLUMN, oneItem)
-
-        # append last set of genes
-        self.genes.append(currentGeneSet)
-
-        # color last row
-        colorSetting = self.settings.value(ColorTable.CELL_COLOR_SETTING + str(currentGeneCount - 1))
-        colorNums = [int(num) for num in colorSetting.split(' ')]
-        color = QColor(*colorNums)
-        # color text
-        textColorSetting = self.settings.value(ColorTable.MAJORITY_TEXT_SETTING + str(currentGeneCount - 1))
-        textNums = [int(num) for num in textColorSetting.split(' ')]
-        textColor = QColor(*textNums)
-        # TODO: Figure out minority rule
-        for column in range(totalColumns):
-            item = table.item(currentRow, column)
-            # insert blank item if blank cell
-            if item is None:
-                item = QTableWidgetItem('')
-                table.setItem(currentRow, column, item)
-            item.setBackground(color)
-            item.setForeground(textColor)
-            
-        # table font
-        tableFont = QFont()
-        tableFont.setPointSize(15)
-        
-        for row in range(currentRow + 1):
-            for column in range(totalColumns):
-                item = table.item(row, column)
-                item.setFont(tableFont)
+        # cells are read from the groups as they are shown (see GeneTableModel)
+        # colors come from the palette loaded once from the settings (see ColorTable.palette)
+        table.setModel(phagecommander.GuiWidgets.GeneTableModel(groups, usedGeneTools,
+                                                                ColorTable.palette(self.settings), table))
 
         # show tab
         # self.tab.addTab(table, self._GENE_TAB_LABEL)
@@ -2104,8 +1969,11 @@ class GeneMain(QMainWindow):
         Enables / Disables GUI actions
         :return:
         """
+        # the file is complete once every query thread stopped - threads left running by an abort still write to it
+        queryStopped = self.queryManager is None or self.queryManager.stopped()
+
         # file open actions
-        if self.fileOpened:
+        if self.fileOpened and queryStopped:
             self.saveAsAction.setEnabled(True)
             self.exportExcelAction.setEnabled(True)
             self.exportGenbankAction.setEnabled(True)
@@ -2114,11 +1982,18 @@ class GeneMain(QMainWindow):
             self.exportExcelAction.setEnabled(False)
             self.exportGenbankAction.setEnabled(False)
 
-        if self.saveEnabled:
+        if self.saveEnabled and queryStopped:
             self.saveAction.setEnabled(True)
         else:
             self.saveAction.setEnabled(False)
 
+        # no other file can be opened, and the file is not saved, while its tools are queried
+        self.newFileAction.setEnabled(not self.querying)
+        self.openFileAction.setEnabled(not self.querying)
+        if self.querying:
+            self.saveAsAction.setEnabled(False)
+            self.saveAction.setEnabled(False)
+
     def checkProdigal(self):
 
         prodigalPath = self.settings.value(self._PRODIGAL_BINARY_LOCATION_SETTING)
@@ -23,8 +23,10 @@ setuptools.setup(
                       'openpyxl',
                       'pyqt5',
                       'biopython',
+                      'numpy',
                       'ruamel.yaml'],
-    entry_points={'gui_scripts': 'phagecom = phagecommander.phagecom:main'},
+    entry_points={'gui_scripts': 'phagecom = phagecommander.phagecom:main',
+                  'console_scripts': 'phagecom-batch = phagecommander.phagebatch:main'},
     classifiers=["Programming Language :: Python :: 3",
                  "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
                  "Operating System :: Microsoft :: Windows",
@@ -0,0 +1,93 @@
+"""
+Shared fixtures - local stub HTTP servers, and caches, journals and circuit breakers isolated per test
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from phagecommander.Utilities import CircuitBreaker, QueryCache
+
+
+class StubServer:
+    """
+    Local HTTP/1.1 server answering every request with a handler function
+    The handler is called with (method, path, body) and returns (status, body) or (status, body, headers)
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        # (method, path, body) of each request
+        self.requests = []
+        # number of TCP connections accepted
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def answer(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests.append((self.command, self.path, body))
+                reply = stub.handler(self.command, self.path, body)
+                status, content = reply[:2]
+                headers = reply[2] if len(reply) > 2 else dict()
+                content = content.encode('utf-8') if isinstance(content, str) else content
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = answer
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = 'http://127.0.0.1:{}'.format(self._server.server_port)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stubServer():
+    """
+    Factory of StubServers - the servers are shut down after the test
+    """
+    servers = []
+
+    def start(handler):
+        server = StubServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(autouse=True)
+def isolatedState(tmp_path, monkeypatch):
+    """
+    Query cache and journals in the test's directory, and fresh circuit breakers
+    """
+    monkeypatch.setenv('PHAGECOM_SESSION_DIR', str(tmp_path / 'sessions'))
+    monkeypatch.setenv('PHAGECOM_CACHE_DIR', str(tmp_path / 'cache'))
+    QueryCache.configure(cacheDir=str(tmp_path / 'cache'))
+    CircuitBreaker.configure()
+    yield
+    CircuitBreaker.configure()
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from phagecommander import Gene, phagebatch
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+from phagecommander.Utilities.PollScheduler import PollPolicy
+from phagecommander.Utilities import Aragorn, MetagenePy
+from phagecommander.Utilities.AsyncQuery import AsyncHttpClient, AsyncQueryEngine
+from phagecommander.Utilities.HttpSession import HostPolicy
+from phagecommander.Utilities.QueryData import QueryData
+from phagecommander.Utilities.Tools import *
+
+ARAGORN_PAGE = ('<html><body><pre>\nsequence\n2 genes found\n'
+                '1   tRNA-Leu   [120,195]               \t35\t(taa)\n'
+                '2   tRNA-Ser   c[400,480]              \t35\t(tga)\n</pre></body></html>')
+METAGENE_PAGE = ('<html><body><table>'
+                 '<tr><td>gene_1</td><td>10</td><td>300</td><td>+</td><td>0</td><td>11</td><td>5.0</td><td>b</td></tr>'
+                 '<tr><td>gene_2</td><td>500</td><td>900</td><td>-</td><td>0</td><td>11</td><td>5.0</td><td>b</td></tr>'
+                 '</table></body></html>')
+
+
+def fastPolicy(retries=0):
+    return HostPolicy(timeout=(2, 2), retries=retries, backoff=0)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_connections_are_reused(stubServer):
+    server = stubServer(lambda method, path, body: (200, 'ok'))
+
+    async def requests():
+        client = AsyncHttpClient(defaultPolicy=fastPolicy())
+        responses = [await client.get(server.url + '/poll') for _ in range(10)]
+        await client.close()
+        return client, responses
+
+    client, responses = run(requests())
+    assert [response.text for response in responses] == ['ok'] * 10
+    assert server.connections == 1
+
+
+def test_requests_in_flight_are_bounded_per_host(stubServer):
+    lock = threading.Lock()
+    inFlight = [0, 0]
+
+    def slow(method, path, body):
+        with lock:
+            inFlight[0] += 1
+            inFlight[1] = max(inFlight)
+        time.sleep(0.1)
+        with lock:
+            inFlight[0] -= 1
+        return 200, 'ok'
+
+    server = stubServer(slow)
+
+    async def requests():
+        client = AsyncHttpClient(hostLimits={'127.0.0.1': 2}, defaultPolicy=fastPolicy())
+        await asyncio.gather(*[client.get(server.url) for _ in range(8)])
+        await client.close()
+
+    run(requests())
+    assert len(server.requests) == 8
+    assert inFlight[1] == 2
+
+
+def test_redirected_post_becomes_get(stubServer):
+    def handler(method, path, body):
+        if path == '/submit':
+            return 302, '', {'Location': '/result'}
+        return 200, method
+
+    server = stubServer(handler)
+
+    async def request():
+        client = AsyncHttpClient(defaultPolicy=fastPolicy())
+        response = await client.post(server.url + '/submit', data={'sequence': 'ACGT'})
+        await client.close()
+        return response
+
+    response = run(request())
+    assert response.text == 'GET'
+    assert [(method, path) for method, path, _ in server.requests] == [('POST', '/submit'), ('GET', '/result')]
+
+
+def test_gateway_errors_are_retried_for_polls_only(stubServer):
+    server = stubServer(lambda method, path, body: (503, 'busy') if len(server.requests) < 3 else (200, 'done'))
+
+    async def request(method):
+        client = AsyncHttpClient(hostPolicies={server.url: fastPolicy(retries=3)})
+        response = await client.request(method, server.url)
+        await client.close()
+        return response
+
+    assert run(request('GET')).text == 'done'
+    assert len(server.requests) == 3
+
+    # a submission is never sent twice
+    server.requests.clear()
+    assert run(request('POST')).status_code == 503
+    assert len(server.requests) == 1
+
+
+def genome(tmp_path, tools, name='genome'):
+    """
+    (GeneFile, QueryData) of a small genome querying the given tools
+    """
+    path = tmp_path / '{}.fasta'.format(name)
+    path.write_text('>{}\n{}\n'.format(name, 'ACGT' * 250))
+    queryData = QueryData()
+    queryData.fileName = str(path)
+    queryData.tools = {tool: tool in tools for tool in TOOL_NAMES}
+    queryData.toolData = {tool: None for tool in tools}
+    queryData.loadSequence()
+    return Gene.GeneFile(str(path), Gene.SPECIES[0]), queryData
+
+
+def cancelAfter(seconds):
+    cancel = CancelToken()
+    threading.Timer(seconds, cancel.cancel).start()
+    return cancel
+
+
+def test_cancel_aborts_requests_in_flight(stubServer, tmp_path, monkeypatch):
+    def slow(method, path, body):
+        time.sleep(2)
+        return 200, ARAGORN_PAGE
+
+    monkeypatch.setattr(Aragorn, 'URL', stubServer(slow).url + '/aragorn')
+    geneFile, queryData = genome(tmp_path, [ARAGORN])
+    geneFile.cancel = cancelAfter(0.2)
+
+    startTime = time.monotonic()
+    AsyncQueryEngine(defaultPolicy=fastPolicy()).run([(geneFile, queryData)])
+    assert isinstance(queryData.toolData[ARAGORN], QueryCancelledError)
+    assert time.monotonic() - startTime < 1
+
+
+def test_cancel_stops_polling(stubServer, tmp_path, monkeypatch):
+    server = stubServer(lambda method, path, body: (200, 'job_key=1') if not body.startswith(b'job_key') else
+                        (202, 'running'))
+    monkeypatch.setitem(Gene.GeneFile.DNA_MASTER_QUERIES, GLIMMER,
+                        (server.url,) + Gene.GeneFile.DNA_MASTER_QUERIES[GLIMMER][1:])
+    monkeypatch.setitem(Gene.GeneFile.POLL_POLICIES, GLIMMER, PollPolicy(initialDelay=30, maxDelay=30))
+    geneFile, queryData = genome(tmp_path, [GLIMMER])
+    geneFile.cancel = cancelAfter(0.2)
+
+    startTime = time.monotonic()
+    AsyncQueryEngine(defaultPolicy=fastPolicy()).run([(geneFile, queryData)])
+    assert isinstance(queryData.toolData[GLIMMER], QueryCancelledError)
+    assert time.monotonic() - startTime < 1
+    # submitted, then cancelled while waiting for the first poll
+    assert len(server.requests) == 1
+
+
+def test_engine_queries_many_genomes(stubServer, tmp_path, monkeypatch):
+    def handler(method, path, body):
+        return 200, ARAGORN_PAGE if path.startswith('/aragorn') else METAGENE_PAGE
+
+    server = stubServer(handler)
+    monkeypatch.setattr(Aragorn, 'URL', server.url + '/aragorn')
+    monkeypatch.setattr(MetagenePy, 'METAGENE_URL', server.url + '/metagene')
+
+    genomes = [genome(tmp_path, [ARAGORN, METAGENE], 'genome{}'.format(index)) for index in range(5)]
+
+    engine = AsyncQueryEngine(defaultPolicy=fastPolicy())
+    engine.run(genomes)
+
+    for _, queryData in genomes:
+        assert [(gene.start, gene.stop, gene.direction) for gene in queryData.toolData[METAGENE]] == \
+            [(10, 300, '+'), (500, 900, '-')]
+        assert [(trna.start, trna.stop, trna.direction) for trna in queryData.toolData[ARAGORN]] == \
+            [(120, 195, '+'), (400, 480, '-')]
+    # one submission per tool per genome, all on kept-alive connections
+    assert len(server.requests) == 10
+    assert server.connections <= 4
+
+
+def test_batch_limits_hosts_by_service_limits(tmp_path):
+    runner = phagebatch.BatchRunner([GLIMMER, GENEMARK, HMM, GENEMARKS, ARAGORN], str(tmp_path), Gene.SPECIES[0],
+                                    serviceLimits={ARAGORN: 5}, useAsync=True)
+    assert runner.hostLimits() == {'18.220.233.194': 4, 'exon.gatech.edu': 4, '130.235.244.92': 5}
+    # the async engine has no tool pools
+    runner.run([])
+    assert runner._toolPools == dict()
+
+
+
+def test_batch_cancel_stops_async_runs(stubServer, tmp_path, monkeypatch):
+    def slow(method, path, body):
+        time.sleep(2)
+        return 200, ARAGORN_PAGE
+
+    monkeypatch.setattr(Aragorn, 'URL', stubServer(slow).url + '/aragorn')
+    fastaFiles = [str(genome(tmp_path, [ARAGORN], 'genome{}'.format(index))[0].file_path) for index in range(3)]
+    runner = phagebatch.BatchRunner([ARAGORN], str(tmp_path / 'out'), Gene.SPECIES[0], useAsync=True)
+    threading.Timer(0.2, runner.cancel).start()
+
+    startTime = time.monotonic()
+    assert runner.run(fastaFiles) == dict()
+    assert time.monotonic() - startTime < 1
+    # nothing is written for the cancelled genomes
+    assert not list((tmp_path / 'out').glob('*.gb'))
@@ -0,0 +1,20 @@
+import logging
+import pytest
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+
+
+def test_failing_callback_is_logged_and_the_others_run(caplog):
+    token = CancelToken()
+    called = []
+
+    def failing():
+        raise OSError('socket already closed')
+
+    token.register(failing)
+    token.register(lambda: called.append(True))
+    with caplog.at_level(logging.ERROR, logger='phagecommander.Utilities.Cancellation'):
+        token.cancel()
+    assert called == [True]
+    assert 'Cancel callback failed' in caplog.text and 'socket already closed' in caplog.text
+    with pytest.raises(QueryCancelledError):
+        token.check()
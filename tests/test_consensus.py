@@ -0,0 +1,74 @@
+import random
+import numpy as np
+import pytest
+from phagecommander import Gene
+from phagecommander.Utilities import GeneTable
+from phagecommander.Utilities.Consensus import ConsensusGroups
+
+TOOLS = ['glimmer', 'genemark', 'heuristic', 'genemarks', 'genemarks2', 'prodigal', 'rast', 'metagene', 'hmm']
+GROUP_FIELDS = ('bounds', 'majorityCalls', 'altRank', 'altCount')
+
+
+@pytest.fixture(scope='module')
+def table():
+    """
+    Calls of every tool around shared stops, with alternative starts
+    """
+    random.seed(0)
+    builder = GeneTable.GeneTable.Builder()
+    position = 0
+    for _ in range(3000):
+        position += random.randrange(100, 1500)
+        direction = random.choice('+-')
+        for tool in random.sample(TOOLS, random.randrange(1, len(TOOLS) + 1)):
+            otherEnd = position - random.choice((300, 300, 330, 360)) if direction == '+' else \
+                position + random.choice((300, 300, 330, 360))
+            if direction == '+':
+                builder.add(otherEnd, position, direction, position - otherEnd + 1, tool)
+            else:
+                builder.add(position, otherEnd, direction, otherEnd - position + 1, tool)
+    return builder.build()
+
+
+def key(genes):
+    return [(repr(gene), gene.identity) for gene in genes]
+
+
+def test_groups_match_pure_python_consensus(table):
+    sample = table.toGenes()
+    expectedGroups = []
+    for gene in Gene.GeneUtils.sortGenes(sample):
+        if expectedGroups and gene.geneKey == expectedGroups[-1][-1].geneKey:
+            expectedGroups[-1].append(gene)
+        else:
+            expectedGroups.append([gene])
+
+    groups = ConsensusGroups(sample)
+    assert [[repr(gene) for gene in geneSet] for geneSet in groups] == \
+        [[repr(gene) for gene in geneSet] for geneSet in expectedGroups]
+    assert key(groups.mostOccurrences()) == \
+        key(Gene.GeneUtils.findMostGeneOccurrences(geneSet) for geneSet in expectedGroups)
+    assert key(groups.longest()) == key(Gene.GeneUtils.findLongestGene(geneSet) for geneSet in expectedGroups)
+    assert key(groups.specificProgram('rast')) == \
+        key(Gene.GeneUtils.useSpecificProgram(geneSet, 'rast') for geneSet in expectedGroups)
+
+
+def test_setting_a_tool_matches_grouping_again(table):
+    tables = [table.take(table.identity == table.identities.index(tool)) for tool in TOOLS]
+    groups = ConsensusGroups(tables, tools=TOOLS)
+    # a tool queried again, then a tool with few calls added, as a tRNA tool would be
+    for tool, calls in (('rast', tables[TOOLS.index('rast')]), ('aragorn', table.take(slice(0, len(table), 100)))):
+        groups.setTool(tool, calls)
+        if tool == 'aragorn':
+            tables.append(groups.table.take(groups.table.identity == groups.table.identities.index(tool)))
+        rebuilt = ConsensusGroups(tables, tools=groups.tools)
+        assert all(np.array_equal(getattr(groups, name), getattr(rebuilt, name)) for name in GROUP_FIELDS), tool
+
+
+def test_removing_a_tool_matches_grouping_again(table):
+    tables = [table.take(table.identity == table.identities.index(tool)) for tool in TOOLS]
+    groups = ConsensusGroups(tables, tools=TOOLS)
+    groups.removeTool('prodigal')
+    rebuilt = ConsensusGroups([calls for tool, calls in zip(TOOLS, tables) if tool != 'prodigal'],
+                              tools=groups.tools)
+    assert all(np.array_equal(getattr(groups, name), getattr(rebuilt, name)) for name in GROUP_FIELDS)
@@ -0,0 +1,47 @@
+from openpyxl import load_workbook
+from phagecommander.Utilities import ExcelExport
+from phagecommander.Utilities.Consensus import ConsensusGroups
+from phagecommander.Utilities.GeneTable import GeneTable
+
+TOOLS = ['glimmer', 'prodigal']
+FILLS = {1: 'ffffff', 2: 'daeef3'}
+
+
+def rowColors(count):
+    return FILLS[count], ['000000', 'ff0000']
+
+
+def test_sheet_layout_and_styles(tmp_path):
+    builder = GeneTable.Builder()
+    # one gene called by both tools with different starts, one by glimmer only
+    builder.add(100, 400, '+', 301, 'glimmer')
+    builder.add(130, 400, '+', 271, 'prodigal')
+    builder.add(600, 900, '+', 301, 'glimmer')
+    groups = ConsensusGroups(builder.build())
+
+    wb = ExcelExport.workbook()
+    ExcelExport.writeSheet(wb, 'All', groups, TOOLS, rowColors)
+    ExcelExport.writeSheet(wb, 'Plain', groups, TOOLS)
+    path = str(tmp_path / 'calls.xlsx')
+    ExcelExport.save(wb, path)
+
+    sheet = load_workbook(path)['All']
+    rows = [[cell.value for cell in row] for row in sheet.iter_rows()]
+    assert rows[0] == ['TOTAL CALLS', 'ALL', 'ONE', 'GLIMMER', 'GLIMMER', 'GLIMMER', 'GLIMMER', None,
+                       'PRODIGAL', 'PRODIGAL', 'PRODIGAL', 'PRODIGAL']
+    assert rows[1] == [2, 'X', None, '+', 100, 400, 301, None, '+', 130, 400, 271]
+    assert rows[2] == [1, None, 'X', '+', 600, 900, 301, None, None, None, None, None]
+
+    assert all(cell.font.b for cell in sheet[1])
+    assert all(cell.alignment.horizontal == 'center' for row in sheet.iter_rows() for cell in row)
+    assert {cell.fill.fgColor.rgb for cell in sheet[2]} == {'00' + FILLS[2]}
+    assert {cell.fill.fgColor.rgb for cell in sheet[3]} == {'00' + FILLS[1]}
+    # the starts of a row whose calls differ are colored by rank
+    assert [cell.font.color.rgb for cell in sheet[2]][4:10:5] == ['00000000', '00ff0000']
+    assert load_workbook(path)['Plain']['A2'].fill.fill_type is None
+
+
+def test_empty_workbook(tmp_path):
+    path = str(tmp_path / 'empty.xlsx')
+    ExcelExport.save(ExcelExport.workbook(), path)
+    assert load_workbook(path).sheetnames == ['Sheet']
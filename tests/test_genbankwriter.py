@@ -0,0 +1,85 @@
+import io
+import random
+import pytest
+from Bio import SeqIO
+from phagecommander import Gene
+from phagecommander.Utilities import GenbankWriter, GeneTable
+
+
+def randomGenes(length, count):
+    genes = []
+    for _ in range(count):
+        start = random.randrange(1, length + 1)
+        # mostly regular calls, some wrapping around the genome end and some single base calls
+        stop = random.choice([min(length, start + random.randrange(0, 3000)),
+                              random.randrange(1, start) if start > 1 else start,
+                              start])
+        direction = random.choice('+-')
+        if random.random() < 0.1:
+            trnaType = random.choice(['tRNA-Met(cat)', 'tRNA-Pseudo(tta)', 'tRNA-"Sec"(tca)',
+                                      'tRNA-' + ' '.join(['very long type'] * 8) + '(nnn)'])
+            genes.append(Gene.TRNA(start, stop, direction, trnaType, length))
+        else:
+            genes.append(Gene.Gene(start, stop, direction, 'tool', length))
+    return genes
+
+
+@pytest.fixture(scope='module')
+def records():
+    """
+    (name, sequence, genes) of records with short, long and empty sequences and locus names of every length
+    """
+    random.seed(0)
+    records = []
+    for name, length, count in [('phage', 180, 40), ('a' * 16, 5000, 200), ('long_locus_name_xxxx', 12345678, 30),
+                                ('b' * 40, 1000, 10), ('empty', 0, 0), ('genome', 200000, 3000)]:
+        sequence = ''.join(random.choice('ACGTacgtn') for _ in range(min(length, 500000)))
+        if length > len(sequence):
+            sequence = sequence * (length // max(len(sequence), 1) + 1)
+            sequence = sequence[:length]
+        records.append((name, sequence, randomGenes(length, count) if length else []))
+    return records
+
+
+def biopython(records):
+    expected = io.StringIO()
+    SeqIO.write([Gene.GeneUtils.genbankRecord(sequence.lower(), genes, name) for name, sequence, genes in records],
+                expected, 'genbank')
+    return expected.getvalue()
+
+
+def test_records_match_biopython(records):
+    for name, sequence, genes in records:
+        streamed = io.StringIO()
+        GenbankWriter.GenbankWriter(streamed).writeRecord(name, sequence, GeneTable.GeneTable.fromGenes(genes))
+        assert streamed.getvalue() == biopython([(name, sequence, genes)]), name
+
+
+def test_multi_record_file_matches_biopython(records, tmp_path):
+    path = tmp_path / 'multi.gb'
+    GenbankWriter.writeGenbank(str(path), iter(records))
+    assert path.read_text() == biopython(records)
+    assert [record.name for record in SeqIO.parse(str(path), 'genbank')] == [name for name, _, _ in records]
+
+
+def test_gene_list_and_table_give_the_same_output(records):
+    name, sequence, genes = records[1]
+    fromList = io.StringIO()
+    GenbankWriter.GenbankWriter(fromList).writeRecord(name, sequence, genes)
+    fromTable = io.StringIO()
+    GenbankWriter.GenbankWriter(fromTable).writeRecord(name, sequence, GeneTable.GeneTable.fromGenes(genes))
+    assert fromList.getvalue() == fromTable.getvalue()
+
+
+def test_genbank_to_file_replaces_whitespace_of_the_locus_name(records, tmp_path):
+    _, sequence, genes = records[0]
+    path = tmp_path / 'my phage.gb'
+    Gene.GeneUtils.genbankToFile(sequence, genes, str(path))
+    assert path.read_text() == biopython([('my_phage', sequence, genes)])
+
+
+def test_locus_name_with_whitespace_is_rejected():
+    with pytest.raises(ValueError):
+        GenbankWriter.locusLine('my phage', 100)
+    with pytest.raises(ValueError):
+        GenbankWriter.locusLine('', 100)
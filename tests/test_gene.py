@@ -0,0 +1,14 @@
+from phagecommander import Gene
+
+
+def test_calls_differing_only_in_start_are_the_same_gene():
+    first = Gene.Gene('100', '400', '+')
+    second = Gene.Gene('130', '400', '+')
+    assert first.geneKey == second.geneKey
+    assert first != second
+    assert len({first, second, Gene.Gene('100', '400', '+')}) == 2
+    # - strand genes share their start
+    assert Gene.Gene('500', '900', '-').geneKey == Gene.Gene('500', '870', '-').geneKey
+    assert Gene.Gene('100', '400', '+').geneKey != Gene.Gene('100', '400', '-').geneKey
+    assert Gene.Gene('100', '400', '+').__eq__('100..400') is NotImplemented
+
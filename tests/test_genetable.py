@@ -0,0 +1,36 @@
+import pickle
+import random
+import pytest
+from phagecommander import Gene
+from phagecommander.Utilities.GeneTable import GeneTable
+
+LENGTH = 50000000
+
+
+@pytest.fixture(scope='module')
+def genes():
+    random.seed(0)
+    genes = []
+    for tool in ['tool{}'.format(i) for i in range(10)]:
+        for _ in range(1000):
+            start = random.randrange(1, LENGTH)
+            genes.append(Gene.Gene(str(start), str(start + random.randrange(90, 3000)), random.choice('+-'), tool,
+                                   LENGTH))
+    # positions past the int32 range and tRNAs
+    genes.append(Gene.Gene(str(2 ** 31 + 10), str(2 ** 31 + 500), '+', 'tool0', 2 ** 32))
+    genes.append(Gene.TRNA(100, 175, '-', 'tRNA-Leu(taa)', LENGTH, identity='aragorn'))
+    return genes
+
+
+def test_views_match_genes(genes):
+    table = GeneTable.fromGenes(genes)
+    assert len(table) == len(genes)
+    assert [repr(gene) for gene in table] == [repr(gene) for gene in genes]
+    assert all(view == gene and view.identity == gene.identity for view, gene in zip(table, genes))
+    assert isinstance(table[-1], Gene.TRNA) and table[-1].type == genes[-1].type
+
+
+def test_to_genes_and_pickle_round_trip(genes):
+    table = GeneTable.fromGenes(genes)
+    assert [repr(gene) for gene in table.toGenes()] == [repr(gene) for gene in genes]
+    assert [repr(gene) for gene in pickle.loads(pickle.dumps(table))] == [repr(gene) for gene in genes]
@@ -0,0 +1,115 @@
+import ast
+import random
+import pytest
+from bs4 import BeautifulSoup
+from phagecommander import Gene
+from phagecommander.Utilities import Aragorn, HtmlStream, MetagenePy
+
+GENOME_LENGTH = 5000000
+
+
+def soupAragorn(aragorn_data, totalLength, id=None):
+    """
+    BeautifulSoup parser of Aragorn pages replaced by the streaming parser
+    """
+    soup = BeautifulSoup(aragorn_data, 'html.parser')
+    lines = soup.find('pre').text.split('\n')
+    genes = []
+    if int(lines[2].split(' ')[0]) != 0:
+        for line in lines[3:]:
+            if 'tRNA' in line:
+                line = line.split('\t')
+                seq_data = line[0].split()
+                direction = '-' if seq_data[2][0] == 'c' else '+'
+                start, stop = ast.literal_eval(seq_data[2].lstrip('c'))
+                genes.append(Gene.TRNA(start, stop, direction, seq_data[1] + line[2], totalLength, identity=id))
+    return genes
+
+
+def soupMetagene(metageneData, identity='', totalLength=0):
+    """
+    BeautifulSoup parser of Metagene pages replaced by the streaming parser
+    """
+    soup = BeautifulSoup(metageneData, 'html.parser')
+    genes = []
+    for line in soup.find_all('tr'):
+        cells = line.find_all('td')
+        genes.append(Gene.Gene(cells[1].text, cells[2].text, cells[3].text, identity=identity,
+                               totalLength=totalLength))
+    return genes
+
+
+def key(genes):
+    return [(gene.start, gene.stop, gene.direction, gene.identity) for gene in genes]
+
+
+@pytest.fixture(scope='module')
+def aragornPage():
+    random.seed(0)
+    trnaLines = []
+    for i in range(400):
+        start = random.randrange(1, GENOME_LENGTH - 100)
+        location = '[{},{}]'.format(start, start + 75)
+        if random.random() < 0.5:
+            location = 'c' + location
+        trnaLines.append('{:<4}tRNA-Leu   {:<24}\t35\t(taa)'.format(i + 1, location))
+    return ('<html><head><title>ARAGORN</title></head><body><h3>Results</h3><pre>\n'
+            'sequence\n{} genes found\n{}\n</pre><p>ARAGORN &copy; Laslett</p></body></html>'
+            ).format(len(trnaLines), '\n'.join(trnaLines))
+
+
+@pytest.fixture(scope='module')
+def metagenePage():
+    random.seed(1)
+    rows = []
+    for i in range(5000):
+        start = random.randrange(1, GENOME_LENGTH - 3000)
+        rows.append('<tr><td>gene_{}</td><td>{}</td><td>{}</td><td>{}</td><td>0</td><td>11</td>'
+                    '<td>{:.1f}</td><td>b</td></tr>'.format(i, start, start + random.randrange(90, 3000),
+                                                          random.choice('+-'), random.random() * 100))
+    return '<html><body><table>{}</table></body></html>'.format('\n'.join(rows))
+
+
+@pytest.mark.parametrize('encode', [False, True])
+def test_aragorn_matches_beautifulsoup(aragornPage, encode):
+    page = aragornPage.encode('utf-8') if encode else aragornPage
+    trnas = Aragorn.aragorn_parse(page, GENOME_LENGTH, 'aragorn')
+    assert len(trnas) == 400
+    assert key(trnas) == key(soupAragorn(aragornPage, GENOME_LENGTH, 'aragorn'))
+
+
+@pytest.mark.parametrize('encode', [False, True])
+def test_metagene_matches_beautifulsoup(metagenePage, encode):
+    page = metagenePage.encode('utf-8') if encode else metagenePage
+    genes = MetagenePy.Metagene.parse(page, 'metagene', GENOME_LENGTH)
+    assert len(genes) == 5000
+    assert key(genes) == key(soupMetagene(metagenePage, 'metagene', GENOME_LENGTH))
+
+
+def test_pages_split_across_chunks(aragornPage, metagenePage, monkeypatch):
+    # tags, entities and rows cut at chunk boundaries
+    monkeypatch.setattr(HtmlStream, 'CHUNK_SIZE', 7)
+    assert key(Aragorn.aragorn_parse(aragornPage.encode('utf-8'), GENOME_LENGTH)) == \
+        key(soupAragorn(aragornPage, GENOME_LENGTH))
+    assert key(MetagenePy.Metagene.parse(metagenePage, '', GENOME_LENGTH)) == \
+        key(soupMetagene(metagenePage, '', GENOME_LENGTH))
+
+
+def test_multibyte_characters_split_across_chunks():
+    page = '<pre>café &amp; naïve</pre>'.encode('utf-8')
+    chunks = [page[i:i + 1] for i in range(len(page))]
+    assert HtmlStream.preText(chunks) == 'café & naïve'
+
+
+def test_pre_text():
+    assert HtmlStream.preText('<p>no results</p>') is None
+    assert HtmlStream.preText('<pre>first</pre><pre>second</pre>') == 'first'
+    # feeding stops at the end of the first element - the rest of the stream is never read
+    chunks = iter(['<pre>done</pre>', '<p>'])
+    assert HtmlStream.preText(chunks) == 'done'
+    assert next(chunks) == '<p>'
+
+
+def test_table_rows():
+    page = '<table><tr><th>a</th><th>b</th></tr><tr><td>1<td>2<tr><td>3</td></table><td>outside</td>'
+    assert list(HtmlStream.tableRows(page)) == [['a', 'b'], ['1', '2'], ['3']]
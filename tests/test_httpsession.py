@@ -0,0 +1,68 @@
+import time
+import pytest
+import requests
+from phagecommander.Utilities import HttpSession
+from phagecommander.Utilities.HttpSession import HostPolicy, PooledSession
+
+POLLS = 50
+
+
+def notReady(method, path, body):
+    return 202, 'not ready'
+
+
+def test_polls_reuse_one_connection(stubServer):
+    server = stubServer(notReady)
+    session = PooledSession(hostPolicies=dict())
+    for _ in range(POLLS):
+        assert session.post(server.url + '/poll', data={'key': 'job'}).status_code == 202
+    assert server.connections == 1
+    assert len(server.requests) == POLLS
+
+
+def test_module_level_requests_open_a_connection_per_poll(stubServer):
+    # what the shared session replaces - a new connection for every request
+    server = stubServer(notReady)
+    for _ in range(POLLS):
+        requests.post(server.url + '/poll', data={'key': 'job'})
+    assert server.connections == POLLS
+
+
+def test_shared_session_is_configurable(stubServer):
+    server = stubServer(notReady)
+    try:
+        session = HttpSession.configure(timeout=(1, 2), retries=0)
+        assert HttpSession.getSession() is session
+        assert session.defaultPolicy == HostPolicy(timeout=(1, 2), retries=0)
+        for _ in range(10):
+            HttpSession.post(server.url, data={'key': 'job'})
+        assert server.connections == 1
+    finally:
+        HttpSession.configure()
+
+
+def test_gateway_errors_are_retried_for_polls_only(stubServer):
+    server = stubServer(lambda method, path, body: (503, 'busy') if len(server.requests) < 3 else (200, 'done'))
+    session = PooledSession(hostPolicies={server.url: HostPolicy(timeout=(2, 2), retries=3, backoff=0)})
+
+    assert session.get(server.url).text == 'done'
+    assert len(server.requests) == 3
+
+    # a submission is never sent twice
+    server.requests.clear()
+    assert session.post(server.url).status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_host_policy_sets_the_timeout(stubServer):
+    def slow(method, path, body):
+        time.sleep(1)
+        return 200, 'late'
+
+    server = stubServer(slow)
+    session = PooledSession(hostPolicies={server.url: HostPolicy(timeout=(1, 0.2), retries=0)})
+    startTime = time.monotonic()
+    # read errors are never retried - urllib3 reports the timeout as exhausted retries
+    with pytest.raises(requests.exceptions.ConnectionError, match='Read timed out'):
+        session.get(server.url)
+    assert time.monotonic() - startTime < 0.9
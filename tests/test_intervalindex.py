@@ -0,0 +1,74 @@
+import random
+import numpy as np
+import pytest
+from phagecommander.Utilities.IntervalIndex import IntervalIndex
+
+GENOME_LENGTH = 100000
+
+
+def segments(start, stop):
+    return [(start, stop)] if start <= stop else [(start, GENOME_LENGTH), (1, stop)]
+
+
+def positions(start, stop):
+    return {position for a, b in segments(start, stop) for position in range(a, b + 1)}
+
+
+@pytest.fixture(scope='module')
+def calls():
+    """
+    starts and stops of calls, some wrapping around the genome end
+    """
+    random.seed(0)
+    starts = np.array([random.randrange(1, GENOME_LENGTH) for _ in range(2000)])
+    lengths = np.array([random.randrange(1, 3000) for _ in range(2000)])
+    return starts, (starts + lengths - 1 - 1) % GENOME_LENGTH + 1
+
+
+@pytest.fixture(scope='module')
+def queries():
+    random.seed(1)
+    queries = [(position, (position + random.randrange(0, 5000) - 1) % GENOME_LENGTH + 1)
+               for position in (random.randrange(1, GENOME_LENGTH) for _ in range(200))]
+    # single positions and regions at the genome ends
+    return queries + [(1, 1), (GENOME_LENGTH, GENOME_LENGTH), (GENOME_LENGTH - 10, 10), (1, GENOME_LENGTH)]
+
+
+def scan(starts, stops, start, stop):
+    # scan of every call - as needed without an index
+    hits = np.zeros(len(starts), dtype=bool)
+    wrapped = starts > stops
+    for regionStart, regionStop in segments(start, stop):
+        hits |= ~wrapped & (starts <= regionStop) & (stops >= regionStart)
+        hits |= wrapped & ((starts <= regionStop) | (stops >= regionStart))
+    return np.flatnonzero(hits)
+
+
+def test_overlapping_matches_a_scan(calls, queries):
+    starts, stops = calls
+    index = IntervalIndex(starts, stops, GENOME_LENGTH)
+    for start, stop in queries:
+        assert np.array_equal(index.overlapping(start, stop), scan(starts, stops, start, stop)), (start, stop)
+
+
+def test_within(calls, queries):
+    starts, stops = calls
+    index = IntervalIndex(starts, stops, GENOME_LENGTH)
+    for start, stop in queries[:50]:
+        region = positions(start, stop)
+        expected = [row for row in scan(starts, stops, start, stop)
+                    if positions(starts[row], stops[row]) <= region]
+        assert list(index.within(start, stop)) == expected, (start, stop)
+
+
+def test_neighbours():
+    # calls at 100..200, 500..600 and one wrapping around the end 990..20
+    index = IntervalIndex([100, 500, 990], [200, 600, 20], 1000)
+    assert index.next(300) == 1
+    assert index.next(995) == 0 and index.next(995, circular=False) is None
+    assert index.previous(450) == 0
+    assert index.previous(10) == 1 and index.previous(10, circular=False) is None
+    assert index.nearest(150) == 0 and index.nearest(420) == 1 and index.nearest(5) == 2
+    assert list(index.overlapFlags()) == [False, False, False]
+    assert list(IntervalIndex([100, 150], [200, 300], 1000).overlapFlags()) == [True, True]
+    assert IntervalIndex([], [], 1000).nearest(5) is None
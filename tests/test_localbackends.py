@@ -0,0 +1,198 @@
+import logging
+import os
+import stat
+import threading
+import pytest
+from phagecommander import Gene
+from phagecommander.Utilities import LocalBackends
+from phagecommander.Utilities.Cancellation import CancelToken, QueryCancelledError
+from phagecommander.Utilities.LocalBackends import LocalBackendError
+from phagecommander.Utilities.QueryData import QueryData
+from phagecommander.Utilities.SequenceFile import SequenceFile
+from phagecommander.Utilities.Tools import *
+
+SEQUENCE = '>genome\n{}\n'.format('ACGT' * 250)
+
+GLIMMER_PREDICT = '>genome\norf00001      100      300  +1     5.00\norf00002      900      500  -2     4.10\n'
+GMS2_LST = ('# GeneMark.hmm-2 LST format\nSequenceID: genome\n'
+            '     1   +       100       300     201  native  ATG  0\n'
+            '     2   -       500       900     401  native  ATG  0\n# end\n')
+ARAGORN_OUTPUT = ('>genome\n2 genes found\n'
+                  '1   tRNA-Leu               [120,195]      35      (taa)\n'
+                  '2   tRNA-Ser               c[400,480]     35      (tga)\n')
+MGA_OUTPUT = ('# genome\n# gc = 0.5, rbs = -1\n'
+              'gene_1\t100\t300\t+\t0\t11\t25.3\tb\n'
+              'gene_2\t500\t900\t-\t0\t11\t20.1\tb\n')
+
+
+def executable(directory, name, script):
+    """
+    Writes a shell script standing in for a local executable
+    :return: absolute path of the script
+    """
+    path = directory / name
+    path.write_text('#!/bin/sh\n' + script)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def printing(directory, name, output):
+    """
+    Executable printing an output and recording its arguments in <name>.args
+    """
+    (directory / (name + '.out')).write_text(output)
+    return executable(directory, name, 'echo "$@" > "{0}.args"\ncat "{0}.out"\n'.format(directory / name))
+
+
+def calls(genes):
+    return [(gene.start, gene.stop, gene.direction) for gene in genes]
+
+
+@pytest.fixture
+def sequence(tmp_path):
+    path = tmp_path / 'genome.fasta'
+    path.write_text(SEQUENCE)
+    return SequenceFile(str(path))
+
+
+def test_glimmer_runs_the_training_pipeline(tmp_path, sequence):
+    binDir = tmp_path / 'glimmer'
+    binDir.mkdir()
+    # each stage writes what the next one reads - the run fails if a stage is skipped or out of order
+    executable(binDir, 'long-orfs', 'echo orfs > "$5"\n')
+    executable(binDir, 'extract', 'cat "$3"\n')
+    executable(binDir, 'build-icm', 'read line && [ "$line" = orfs ] && echo icm > "$2"\n')
+    (binDir / 'run.predict').write_text(GLIMMER_PREDICT)
+    glimmer = executable(binDir, 'glimmer3', 'grep -q icm "$9" && cp "{}" "${{10}}.predict"\n'.format(
+        binDir / 'run.predict'))
+
+    backend = LocalBackends.BACKENDS[GLIMMER]
+    output = backend.run(glimmer, sequence)
+    assert output == GLIMMER_PREDICT
+    assert calls(backend.parse(output, GLIMMER, 1000)) == [(100, 300, '+'), (500, 900, '-')]
+
+
+def test_genemarks2_reads_its_output_file(tmp_path, sequence):
+    gms2 = executable(tmp_path, 'gms2.pl', 'cat > /dev/null\nprintf "{}" > "${{10}}"\n'.format(GMS2_LST))
+
+    backend = LocalBackends.BACKENDS[GENEMARKS2]
+    output = backend.run(gms2, sequence)
+    assert calls(backend.parse(output, GENEMARKS2, 1000)) == [(100, 300, '+'), (500, 900, '-')]
+
+
+def test_aragorn_and_metagene_parse_their_stdout(tmp_path, sequence):
+    aragorn = printing(tmp_path, 'aragorn', ARAGORN_OUTPUT)
+    mga = printing(tmp_path, 'mga', MGA_OUTPUT)
+
+    trnas = LocalBackends.BACKENDS[ARAGORN].parse(LocalBackends.BACKENDS[ARAGORN].run(aragorn, sequence), ARAGORN,
+                                                  1000)
+    assert calls(trnas) == [(120, 195, '+'), (400, 480, '-')]
+    assert [trna.type for trna in trnas] == ['tRNA-Leu(taa)', 'tRNA-Ser(tga)']
+    assert (tmp_path / 'aragorn.args').read_text().split()[:3] == ['-t', '-l', '-w']
+
+    genes = LocalBackends.BACKENDS[METAGENE].parse(LocalBackends.BACKENDS[METAGENE].run(mga, sequence), METAGENE,
+                                                   1000)
+    assert calls(genes) == [(100, 300, '+'), (500, 900, '-')]
+    # the sequence is written to a temporary directory which is removed after the run
+    fastaPath = (tmp_path / 'mga.args').read_text().split()[0]
+    assert os.path.basename(fastaPath) == 'sequence.fasta'
+    assert not os.path.exists(os.path.dirname(fastaPath))
+
+
+def test_failing_executable_raises(tmp_path, sequence):
+    failing = executable(tmp_path, 'aragorn', 'echo "bad input" >&2\nexit 2\n')
+    with pytest.raises(LocalBackendError, match='aragorn exited with code 2: bad input'):
+        LocalBackends.BACKENDS[ARAGORN].run(failing, sequence)
+
+    with pytest.raises(LocalBackendError, match='missing'):
+        LocalBackends.BACKENDS[ARAGORN].run(str(tmp_path / 'missing'), sequence)
+
+
+def test_runs_share_the_core_slots(tmp_path, sequence):
+    # the script records a run overlapping another one
+    slow = executable(tmp_path, 'mga', 'if [ -e "{0}/running" ]; then echo overlap >> "{0}/log"; fi\n'
+                                       'touch "{0}/running"\nsleep 0.2\nrm "{0}/running"\n'.format(tmp_path))
+    LocalBackends.configure(1)
+    try:
+        threads = [threading.Thread(target=LocalBackends.BACKENDS[METAGENE].run, args=(slow, sequence))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        LocalBackends.configure(LocalBackends.DEFAULT_WORKERS)
+    assert not (tmp_path / 'log').exists()
+
+
+def test_cancel_stops_waiting_for_a_slot(tmp_path, sequence):
+    mga = printing(tmp_path, 'mga', MGA_OUTPUT)
+    LocalBackends.configure(1)
+    slots = LocalBackends.getSlots()
+    slots.acquire()
+    try:
+        cancel = CancelToken()
+        cancel.cancel()
+        with pytest.raises(QueryCancelledError):
+            LocalBackends.BACKENDS[METAGENE].run(mga, sequence, cancel)
+        assert not (tmp_path / 'mga.args').exists()
+    finally:
+        slots.release()
+        LocalBackends.configure(LocalBackends.DEFAULT_WORKERS)
+
+
+def test_find_binary_searches_the_path(tmp_path, monkeypatch):
+    aragorn = executable(tmp_path, 'aragorn', 'exit 0\n')
+    monkeypatch.setenv('PATH', str(tmp_path))
+    assert LocalBackends.findBinary(ARAGORN) == aragorn
+    assert LocalBackends.findBinary(METAGENE) is None
+    # tools without a local backend are never looked up
+    assert LocalBackends.findBinary(GENEMARK) is None
+
+
+def test_gene_file_queries_the_local_binary(tmp_path):
+    path = tmp_path / 'genome.fasta'
+    path.write_text(SEQUENCE)
+    mga = printing(tmp_path, 'mga', MGA_OUTPUT)
+    geneFile = Gene.GeneFile(str(path), Gene.SPECIES[0], localBinaries={METAGENE: mga, GENEMARK: mga})
+    assert geneFile.localBackend(GENEMARK) is None
+    assert geneFile.queryParameters(METAGENE)['backend'] == LocalBackends.LOCAL
+
+    queryData = QueryData()
+    queryData.fileName = str(path)
+    queryData.toolData = {METAGENE: None}
+    queryData.loadSequence()
+    Gene.queryTool(geneFile, METAGENE, queryData)
+    assert calls(queryData.toolData[METAGENE]) == [(100, 300, '+'), (500, 900, '-')]
+
+
+def test_local_failure_is_reported_with_the_tool_result(tmp_path):
+    path = tmp_path / 'genome.fasta'
+    path.write_text(SEQUENCE)
+    mga = executable(tmp_path, 'mga', 'echo "bad input" >&2\nexit 2\n')
+    geneFile = Gene.GeneFile(str(path), Gene.SPECIES[0], localBinaries={METAGENE: mga})
+
+    queryData = QueryData()
+    queryData.fileName = str(path)
+    queryData.toolData = {METAGENE: None}
+    queryData.loadSequence()
+    Gene.queryTool(geneFile, METAGENE, queryData)
+    assert isinstance(queryData.toolData[METAGENE], Gene.GeneFile.GeneFileError)
+    assert 'exited with code 2: bad input' in str(queryData.toolData[METAGENE])
+
+
+def test_fall_back_to_local(tmp_path, caplog):
+    path = tmp_path / 'genome.fasta'
+    path.write_text(SEQUENCE)
+    aragorn = printing(tmp_path, 'aragorn', ARAGORN_OUTPUT)
+    geneFile = Gene.GeneFile(str(path), Gene.SPECIES[0], fallbackBinaries={ARAGORN: aragorn})
+    assert geneFile.localBackend(ARAGORN) is None
+
+    with caplog.at_level(logging.WARNING, logger='phagecommander.Gene'):
+        assert geneFile.fallBackToLocal(ARAGORN)
+    assert 'server not answering - using ' + aragorn in caplog.text
+    assert geneFile.localBinaries == {ARAGORN: aragorn}
+    # already served locally
+    assert not geneFile.fallBackToLocal(ARAGORN)
+    # no local backend
+    assert not geneFile.fallBackToLocal(GENEMARK)
@@ -0,0 +1,71 @@
+import stat
+import pytest
+from phagecommander import Gene
+from phagecommander.Utilities import ProdigalPool
+from phagecommander.Utilities.ProdigalPool import ProdigalError
+from phagecommander.Utilities.QueryData import QueryData
+from phagecommander.Utilities.Tools import *
+
+# prints a call on each strand of the record read from stdin, located by the record's number (first header word)
+PRODIGAL_SCRIPT = '''#!/bin/sh
+header=$(head -n 1)
+n=${header#>contig}
+echo "DEFINITION  seqnum=1;seqlen=1000;seqhdr=\\"contig$n\\""
+echo "FEATURES             Location/Qualifiers"
+echo "     CDS             ${n}01..${n}90"
+echo "     CDS             complement(<5..${n}50)"
+'''
+
+
+def executable(directory, name, script):
+    path = directory / name
+    path.write_text(script)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def test_records_are_run_in_order(tmp_path):
+    prodigal = executable(tmp_path, 'prodigal', PRODIGAL_SCRIPT)
+    records = [b'>contig1\nACGT\n', b'>contig2\nACGT\n', b'>contig3\nACGT\n']
+    output = ProdigalPool.ProdigalPool(2).run(prodigal, records)
+    assert [line.split('"')[1] for line in output.splitlines() if line.startswith('DEFINITION')] == \
+        ['contig1', 'contig2', 'contig3']
+
+
+def test_noisy_failure_does_not_block(tmp_path):
+    # more stderr than a pipe holds, before any stdout
+    noisy = executable(tmp_path, 'prodigal', '#!/bin/sh\nhead -c 1000000 /dev/zero | tr "\\0" x >&2\nexit 3\n')
+    with pytest.raises(ProdigalError, match='exited with code 3'):
+        ProdigalPool.ProdigalPool.runRecord(noisy, b'>contig1\n' + b'ACGT' * 100000 + b'\n')
+
+
+def test_records_of_a_multi_record_file_keep_their_own_coordinates(tmp_path):
+    prodigal = executable(tmp_path, 'prodigal', PRODIGAL_SCRIPT)
+    path = tmp_path / 'genome.fasta'
+    path.write_text('>contig1\n{0}\n>contig2\n{0}\n'.format('ACGT' * 250))
+    geneFile = Gene.GeneFile(str(path), Gene.SPECIES[0], prodigalLocation=prodigal)
+    queryData = QueryData()
+    queryData.fileName = str(path)
+    queryData.toolData = {PRODIGAL: None}
+    queryData.loadSequence()
+
+    Gene.queryTool(geneFile, PRODIGAL, queryData)
+    genes = queryData.toolData[PRODIGAL]
+    assert [(genes.contigs[contig], gene.start, gene.stop, gene.direction)
+            for contig, gene in zip(genes.contig, genes)] == \
+        [('contig1', 101, 190, '+'), ('contig1', 5, 150, '-'), ('contig2', 201, 290, '+'), ('contig2', 5, 250, '-')]
+
+
+def test_failure_is_reported_with_the_tool_result(tmp_path):
+    prodigal = executable(tmp_path, 'prodigal', '#!/bin/sh\necho "bad sequence" >&2\nexit 3\n')
+    path = tmp_path / 'genome.fasta'
+    path.write_text('>contig1\n{}\n'.format('ACGT' * 250))
+    geneFile = Gene.GeneFile(str(path), Gene.SPECIES[0], prodigalLocation=prodigal)
+    queryData = QueryData()
+    queryData.fileName = str(path)
+    queryData.toolData = {PRODIGAL: None}
+    queryData.loadSequence()
+
+    Gene.queryTool(geneFile, PRODIGAL, queryData)
+    assert str(queryData.toolData[PRODIGAL]).startswith('Prodigal: ')
+    assert 'exited with code 3' in str(queryData.toolData[PRODIGAL])
@@ -0,0 +1,110 @@
+import os
+import pickle
+import random
+import pytest
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from phagecommander import Gene
+from phagecommander.Utilities import ProjectFile
+from phagecommander.Utilities.GeneTable import GeneTable
+from phagecommander.Utilities.QueryData import QueryData
+
+GENOME_LENGTH = 20000
+
+
+@pytest.fixture
+def queryData():
+    random.seed(0)
+    sequence = ''.join(random.choice('ACGT') for _ in range(GENOME_LENGTH))
+    # ambiguous bases and lowercase runs are kept
+    sequence = sequence[:1000] + 'NNNNNRY' + sequence[1007:5000] + sequence[5000:6000].lower() + sequence[6000:]
+    queryData = QueryData()
+    queryData.fileName = 'genome.fasta'
+    queryData.species = 'Escherichia_coli_K_12_substr__MG1655'
+    queryData.sequence = SeqRecord(Seq(sequence), id='genome', name='genome', description='genome test')
+    queryData.contigs = [queryData.sequence]
+    for tool in ('glimmer', 'genemark', 'prodigal'):
+        genes = []
+        for _ in range(500):
+            start = random.randrange(1, GENOME_LENGTH - 3000)
+            genes.append(Gene.Gene(str(start), str(start + random.randrange(90, 3000)), random.choice('+-'), tool,
+                                   GENOME_LENGTH))
+        queryData.toolData[tool] = GeneTable.fromGenes(genes, GENOME_LENGTH)
+    queryData.toolData['rast'] = ValueError('RAST job failed')
+    queryData.toolData['aragorn'] = None
+    queryData.rastUser = 'user'
+    queryData.rastPass = 'secret'
+    return queryData
+
+
+def assertSameProject(opened, queryData):
+    assert str(opened.sequence.seq) == str(queryData.sequence.seq)
+    assert opened.sequence.description == queryData.sequence.description
+    assert list(opened.toolData) == list(queryData.toolData)
+    for tool in queryData.toolData:
+        original = queryData.toolData[tool]
+        if isinstance(original, (GeneTable, list)):
+            assert [repr(gene) for gene in opened.toolData[tool]] == [repr(gene) for gene in original], tool
+        else:
+            assert str(opened.toolData[tool]) == str(original), tool
+
+
+@pytest.mark.parametrize('memoryMap', [False, True])
+def test_save_and_load(queryData, tmp_path, memoryMap):
+    path = str(tmp_path / 'project.gq')
+    ProjectFile.save(queryData, path)
+    opened = ProjectFile.load(path, memoryMap)
+    assertSameProject(opened, queryData)
+    assert isinstance(opened.toolData['rast'], ProjectFile.StoredError)
+    assert opened.rastPass is None and opened.rastUser is None
+    assert b'secret' not in open(path, 'rb').read()
+
+
+def test_calls_are_read_on_first_access(queryData, tmp_path):
+    path = str(tmp_path / 'project.gq')
+    ProjectFile.save(queryData, path)
+    opened = ProjectFile.load(path)
+    assert dict.__getitem__(opened.toolData, 'glimmer') is None
+    assert len(opened.toolData['glimmer']) == 500
+    assert isinstance(dict.__getitem__(opened.toolData, 'glimmer'), GeneTable)
+
+
+def test_legacy_projects_are_converted(queryData, tmp_path):
+    path = str(tmp_path / 'legacy.gq')
+    queryData.toolData = {tool: genes.toGenes() if isinstance(genes, GeneTable) else genes
+                          for tool, genes in queryData.toolData.items()}
+    with open(path, 'wb') as file:
+        pickle.dump(queryData, file)
+    opened = ProjectFile.load(path)
+    assert isinstance(opened.toolData['glimmer'], GeneTable)
+    assertSameProject(opened, queryData)
+
+
+class Payload:
+    def __reduce__(self):
+        return os.system, ('true',)
+
+
+def test_legacy_projects_only_hold_allowed_classes(tmp_path):
+    path = str(tmp_path / 'legacy.gq')
+    queryData = QueryData()
+    queryData.toolData = {'glimmer': Payload()}
+    with open(path, 'wb') as file:
+        pickle.dump(queryData, file)
+    with pytest.raises(ProjectFile.ProjectFileError, match='not allowed'):
+        ProjectFile.load(path)
+
+
+def test_newer_and_truncated_files_are_refused(queryData, tmp_path):
+    path = str(tmp_path / 'project.gq')
+    ProjectFile.save(queryData, path)
+    with open(path, 'rb') as file:
+        data = file.read()
+    newer = bytearray(data)
+    newer[len(ProjectFile.MAGIC):len(ProjectFile.MAGIC) + 2] = (ProjectFile.VERSION + 1).to_bytes(2, 'little')
+    (tmp_path / 'newer.gq').write_bytes(bytes(newer))
+    with pytest.raises(ProjectFile.ProjectFileError, match='newer version'):
+        ProjectFile.load(str(tmp_path / 'newer.gq'))
+    (tmp_path / 'truncated.gq').write_bytes(data[:len(ProjectFile.MAGIC) + 4])
+    with pytest.raises(ProjectFile.ProjectFileError):
+        ProjectFile.load(str(tmp_path / 'truncated.gq'))
@@ -0,0 +1,44 @@
+import logging
+from phagecommander.Utilities import QueryCache
+from phagecommander.Utilities.Tools import *
+
+
+def cachedSize(cache):
+    return sum(size for _, size, _ in cache._entries())
+
+
+def test_outputs_stored_again_are_counted_once(tmp_path):
+    cache = QueryCache.QueryCache(str(tmp_path), maxSize=10000)
+    keys = [QueryCache.QueryCache.key('{:064x}'.format(i), GLIMMER, dict()) for i in range(3)]
+    for key in keys:
+        cache.put(key, 'x' * 1000)
+    # refreshed outputs replace the stored ones
+    for _ in range(20):
+        cache.put(keys[0], 'y' * 1000)
+    cache.put(keys[1], b'z' * 500)
+    assert cache._size == cachedSize(cache)
+    # nothing is evicted while the cache holds less than its size
+    assert all(cache.get(key, GLIMMER) is not None for key in keys)
+    assert cache.get(keys[0], GLIMMER) == 'y' * 1000
+    assert cache.get(keys[1], GLIMMER) == b'z' * 500
+
+
+def test_least_recently_used_outputs_are_evicted(tmp_path):
+    cache = QueryCache.QueryCache(str(tmp_path), maxSize=5000)
+    keys = [QueryCache.QueryCache.key('{:064x}'.format(i), GLIMMER, dict()) for i in range(10)]
+    for key in keys:
+        cache.put(key, 'x' * 1000)
+    assert cachedSize(cache) <= 5000 * 0.9
+    assert cache._size == cachedSize(cache)
+    assert cache.get(keys[-1], GLIMMER) is not None
+
+
+def test_write_errors_are_logged(tmp_path, caplog):
+    # the cache directory is a file - nothing can be written under it
+    (tmp_path / 'cache').write_text('')
+    cache = QueryCache.QueryCache(str(tmp_path / 'cache'))
+    key = QueryCache.QueryCache.key('0' * 64, GLIMMER, dict())
+    with caplog.at_level(logging.WARNING, logger='phagecommander.Utilities.QueryCache'):
+        cache.put(key, 'output')
+    assert 'Unable to write to query cache' in caplog.text
+    assert cache.get(key, GLIMMER) is None
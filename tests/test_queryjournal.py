@@ -0,0 +1,61 @@
+import logging
+import os
+from phagecommander.Utilities import QueryJournal
+from phagecommander.Utilities.Tools import *
+
+DIGEST = 'a' * 64
+
+
+def test_sessions_with_other_species_or_tools_have_their_own_journals(tmp_path):
+    journal = QueryJournal.QueryJournal.forSession(DIGEST, 'Phage', [GLIMMER, ARAGORN], str(tmp_path))
+    assert journal.path == QueryJournal.QueryJournal.forSession(DIGEST, 'Phage', [ARAGORN, GLIMMER],
+                                                                str(tmp_path)).path
+    others = [QueryJournal.QueryJournal.forSession(DIGEST, 'Mycobacterium', [GLIMMER, ARAGORN], str(tmp_path)),
+              QueryJournal.QueryJournal.forSession(DIGEST, 'Phage', [GLIMMER], str(tmp_path)),
+              QueryJournal.QueryJournal.forSession('b' * 64, 'Phage', [GLIMMER, ARAGORN], str(tmp_path))]
+    assert len({journal.path} | {other.path for other in others}) == 4
+
+    journal.record(GLIMMER, 'key', QueryJournal.DONE, output='calls')
+    assert others[1].entry(GLIMMER, 'key') is None
+
+
+def test_outputs_are_kept_out_of_the_journal(tmp_path):
+    fasta = tmp_path / 'phage.fasta'
+    fasta.write_text('>phage\nACGT\n')
+    journal = QueryJournal.QueryJournal.forSession(DIGEST, 'Phage', [GLIMMER, PRODIGAL, RAST], str(tmp_path))
+    journal.setSession(str(fasta), 'Phage', [GLIMMER, PRODIGAL, RAST])
+
+    text = 'x' * 1000000
+    data = bytes(range(256)) * 4000
+    journal.record(GLIMMER, 'glimmerKey', QueryJournal.DONE, output=text)
+    journal.record(PRODIGAL, 'prodigalKey', QueryJournal.DONE, output=data)
+    journal.record(RAST, 'rastKey', QueryJournal.SUBMITTED, jobId='1')
+    # polls only rewrite the small state records
+    for _ in range(10):
+        journal.update(RAST, 'rastKey', lastPoll=1.0)
+    assert os.path.getsize(journal.path) < 2000
+
+    reloaded = QueryJournal.QueryJournal(journal.path)
+    assert reloaded.output(GLIMMER, 'glimmerKey') == text
+    assert reloaded.output(PRODIGAL, 'prodigalKey') == data
+    assert reloaded.output(GLIMMER, 'otherKey') is None
+    assert reloaded.output(RAST, 'rastKey') is None
+    assert reloaded.unfinished() == [RAST]
+    assert [other.path for other in QueryJournal.QueryJournal.interrupted(str(tmp_path))] == [journal.path]
+
+    reloaded.remove()
+    assert not os.path.exists(journal.path)
+    assert not os.path.exists(journal.outputDir)
+
+
+def test_write_errors_are_logged(tmp_path, caplog):
+    # the journal directory is a file - nothing can be written under it
+    (tmp_path / 'sessions').write_text('')
+    journal = QueryJournal.QueryJournal.forSession(DIGEST, 'Phage', [GLIMMER], str(tmp_path / 'sessions'))
+    with caplog.at_level(logging.WARNING, logger='phagecommander.Utilities.QueryJournal'):
+        journal.record(GLIMMER, 'key', QueryJournal.DONE, output='calls')
+        journal.record(GLIMMER, 'key', QueryJournal.FAILED, error='timeout')
+    assert 'Unable to write query journal output' in caplog.text
+    assert 'Unable to write query journal:' in caplog.text
+    # the state is kept in memory
+    assert journal.entry(GLIMMER, 'key')['state'] == QueryJournal.FAILED
@@ -0,0 +1,26 @@
+import pytest
+from phagecommander.Utilities.SequenceFile import SequenceFile
+
+
+def test_records(tmp_path):
+    path = tmp_path / 'genome.fasta'
+    path.write_bytes(b'>contig1 first\nACGT\nacgt\n>contig2\r\nAC GT\r\n>empty')
+    seqFile = SequenceFile(str(path))
+    assert seqFile.name == 'genome'
+    assert seqFile.data == path.read_bytes() and len(seqFile) == len(path.read_bytes())
+    assert seqFile.records() == [('contig1 first', b'>contig1 first\nACGT\nacgt\n'),
+                                 ('contig2', b'>contig2\r\nAC GT\r\n'), ('empty', b'>empty')]
+    assert seqFile.sequenceLength() == 12
+
+
+def test_digest_ignores_headers_whitespace_and_case(tmp_path):
+    digest = SequenceFile('a.fasta', data=b'>a\nACGT\nACGT\n').digest()
+    assert SequenceFile('b.fasta', data=b'>other header\r\nacgtA CGT').digest() == digest
+    assert SequenceFile('c.fasta', data=b'>a\nACGTACGA\n').digest() != digest
+    # records are not joined
+    assert SequenceFile('d.fasta', data=b'>a\nACGT\n>b\nACGT\n').digest() != digest
+
+
+def test_missing_file():
+    with pytest.raises(FileNotFoundError):
+        SequenceFile('/nonexistent/genome.fasta')
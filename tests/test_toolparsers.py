@@ -0,0 +1,63 @@
+import pytest
+from phagecommander import Gene
+from phagecommander.Utilities import ToolParsers
+from phagecommander.Utilities.Tools import *
+
+GENOME_LENGTH = 5000
+# (start, stop, direction, length) of the genes of every output below - the last one wraps around the genome end
+EXPECTED = [(2, 1234, '+', 1233), (1300, 1599, '-', 300), (4900, 99, '+', 200)]
+
+GENEMARK_LINES = ['    1        +          <2         1234        1233       1',
+                  '    2        -        1300         1599         300       1',
+                  '    3        +        4900           99         200       1']
+OUTPUTS = {GENEMARK: '\n'.join(['GeneMark 2.5p', 'Sequence file name: genome.fna', '', 'Predicted genes',
+                                '   ' + ToolParsers._GENEMARK_HEADER,
+                                '    #                                         Length'] + GENEMARK_LINES +
+                               ['', '    9        +           1           90          90       1']),
+           GENEMARKS: '\n'.join(['GeneMark.hmm PROKARYOTIC (Version 3.25)', '',
+                                 '   ' + ToolParsers._GENEMARK_HEADER, ''] + GENEMARK_LINES),
+           GENEMARKS2: '\n'.join(['# GeneMark.hmm-2 LST format', 'SequenceID: genome',
+                                  '     1   +   &lt;2   1234   1233  native  ATG  0',
+                                  '     2   -   1300   1599    300  native  ATG  0',
+                                  '     3   +   4900     99    200  native  ATG  0', '# end']),
+           GLIMMER: '\n'.join(['>genome', 'orf00001         2     1234  +2   5.00', '<html>',
+                               'orf00002      1599     1300  -1   5.00', 'orf00003      4900       99  +1   5.00']),
+           PRODIGAL: '\n'.join(['DEFINITION  seqnum=1;seqlen=5000;seqhdr="genome"',
+                                'FEATURES             Location/Qualifiers',
+                                '     CDS             <2..1234', '     CDS             complement(1300..1599)',
+                                '     CDS             4900..99']),
+           RAST: '\n'.join(['##gff-version 3', 'genome\tFIG\tCDS\t2\t1234\t.\t+\t0\tID=fig|1',
+                            'genome\tFIG\trna\t1250\t1290\t.\t+\t0\tID=fig|rna', '',
+                            'genome\tFIG\tCDS\t1300\t1599\t.\t-\t0\tID=fig|2',
+                            'genome\tFIG\tCDS\t4900\t99\t.\t+\t0\tID=fig|3'])}
+
+
+@pytest.mark.parametrize('tool', sorted(OUTPUTS))
+def test_formats(tool):
+    for output in (OUTPUTS[tool], iter(OUTPUTS[tool].splitlines())):
+        table = ToolParsers.parse(tool, output, tool, GENOME_LENGTH)
+        assert [(gene.start, gene.stop, gene.direction, gene.length) for gene in table] == EXPECTED
+        assert {gene.identity for gene in table} == {tool}
+
+
+@pytest.mark.parametrize('tool', sorted(OUTPUTS))
+def test_table_matches_gene_objects(tool):
+    table = ToolParsers.parse(tool, OUTPUTS[tool], tool, GENOME_LENGTH)
+    genes = [Gene.Gene(start, stop, direction, tool, GENOME_LENGTH)
+             for start, stop, direction in ToolParsers.FORMATS[tool].rows(OUTPUTS[tool].splitlines())]
+    assert [repr(gene) for gene in table] == [repr(gene) for gene in genes]
+
+
+@pytest.mark.parametrize('tool', [GENEMARK, GENEMARKS, GENEMARKS2])
+def test_missing_header_is_an_error(tool):
+    with pytest.raises(Gene.GeneError, match=ToolParsers.FORMATS[tool].error):
+        ToolParsers.parse(tool, 'GeneMark.hmm\nnothing here')
+
+
+def test_gff_records():
+    output = '\n'.join(['##gff-version 3', 'b\tFIG\tCDS\t1\t90\t.\t+\t0\tID=1', 'a\tFIG\tCDS\t5\t95\t.\t-\t0\tID=2',
+                        '##FASTA', '>a'])
+    assert ToolParsers.gffRecords(output, ['a', 'b', 'c']) == [[output.splitlines()[2]], [output.splitlines()[1]],
+                                                                []]
+    with pytest.raises(Gene.GeneError):
+        ToolParsers.gffRecords(output, ['a'])